@@ -253,6 +253,16 @@ def get_metadata(scope, name):
     return did.get_metadata(scope=scope, name=name)
 
 
+def get_metadata_bulk(dids):
+    """
+    Get the metadata of a list of data identifiers.
+
+    :param dids: The list of data identifiers, as dictionaries with scope and name.
+    :returns: Generator of the metadata dictionaries.
+    """
+    return did.get_metadata_bulk(dids=dids)
+
+
 def set_status(scope, name, issuer, **kwargs):
     """
     Set data identifier status
@@ -29,8 +29,10 @@ from tempfile import mkstemp
 from urlparse import urlparse
 
 from ConfigParser import NoOptionError, NoSectionError
+from threading import Lock
 from dogpile.cache import make_region
 from requests import session
+from requests.adapters import HTTPAdapter
 from requests.status_codes import codes, _codes
 from requests.exceptions import SSLError
 from requests_kerberos import HTTPKerberosAuth
@@ -51,6 +53,15 @@ REGION = make_region(function_key_generator=my_key_generator).configure(
 )
 
 
+# Process-wide HTTP sessions, one per host, shared by all the client instances and threads
+SESSIONS = {}
+SESSIONS_LOCK = Lock()
+
+# Process-wide auth tokens, shared by all the client instances with the same credentials
+TOKENS = {}
+TOKENS_LOCK = Lock()
+
+
 @REGION.cache_on_arguments(namespace='host_to_choose')
 def choice(hosts):
     """
@@ -62,6 +73,33 @@ def choice(hosts):
     return random.choice(hosts)
 
 
+def get_session(host, identity=None):
+    """
+    Returns the HTTP session of a host, shared by the whole process.
+
+    The session keeps the connections to the host alive, so that new client
+    instances and threads reuse them instead of doing a new TLS handshake.
+
+    :param host: The url of the host.
+    :param identity: The client certificate presented on the connections, if any.
+                     Connections authenticated with different certificates are never shared.
+    :return: A requests session.
+    """
+    prefix = '%s://%s' % urlparse(host)[:2]
+    key = (prefix, identity)
+    with SESSIONS_LOCK:
+        if key not in SESSIONS:
+            try:
+                pool_size = int(config_get('client', 'pool_maxsize'))
+            except (NoOptionError, NoSectionError, ValueError):
+                pool_size = 20
+            new_session = session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            new_session.mount(prefix, adapter)
+            SESSIONS[key] = new_session
+        return SESSIONS[key]
+
+
 class BaseClient(object):
 
     """Main client class for accessing Rucio resources. Handles the authentication."""
@@ -88,7 +126,6 @@ class BaseClient(object):
         self.host = rucio_host
         self.list_hosts = []
         self.auth_host = auth_host
-        self.session = session()
         self.user_agent = "%s/%s" % (user_agent, version.version_string())  # e.g. "rucio-clients/0.2.13"
         sys.argv[0] = sys.argv[0].split('/')[-1]
         self.script_id = '::'.join(sys.argv[0:2])
@@ -156,6 +193,8 @@ class BaseClient(object):
                 raise MissingClientParameter('Option \'%s\' cannot be found in config file' % error.args[0])
 
         self.list_hosts = [self.host]
+        self.session = get_session(self.host)
+        self.auth_session = get_session(self.auth_host, identity=self.creds.get('client_cert') or self.creds.get('client_proxy'))
 
         if account is None:
             LOG.debug('no account passed. Trying to get it from the config file.')
@@ -264,7 +303,7 @@ class BaseClient(object):
                 continue
 
             if result is not None and result.status_code == codes.unauthorized:  # pylint: disable-msg=E1101
-                self.__get_token()
+                self.__get_token(expired_token=hds['X-Rucio-Auth-Token'])
                 hds['X-Rucio-Auth-Token'] = self.auth_token
                 retry += 1
             else:
@@ -284,7 +323,7 @@ class BaseClient(object):
         retry = 0
         while retry <= self.AUTH_RETRIES:
             try:
-                result = self.session.get(url, headers=headers, verify=self.ca_cert)
+                result = self.auth_session.get(url, headers=headers, verify=self.ca_cert)
             except SSLError as error:
                 LOG.warning('SSLError: ' + str(error))
                 self.ca_cert = False
@@ -344,8 +383,8 @@ class BaseClient(object):
 
         while retry <= self.AUTH_RETRIES:
             try:
-                result = self.session.get(url, headers=headers, cert=cert,
-                                          verify=self.ca_cert)
+                result = self.auth_session.get(url, headers=headers, cert=cert,
+                                               verify=self.ca_cert)
             except SSLError as error:
                 if 'alert certificate expired' in str(error):
                     raise CannotAuthenticate(str(error))
@@ -384,8 +423,8 @@ class BaseClient(object):
         retry = 0
         while retry <= self.AUTH_RETRIES:
             try:
-                result = self.session.get(url, headers=headers,
-                                          verify=self.ca_cert, auth=HTTPKerberosAuth())
+                result = self.auth_session.get(url, headers=headers,
+                                               verify=self.ca_cert, auth=HTTPKerberosAuth())
             except SSLError as error:
                 LOG.warning('SSLError: ' + str(error))
                 self.ca_cert = False
@@ -409,9 +448,39 @@ class BaseClient(object):
         LOG.debug('got new token \'%s\'' % self.auth_token)
         return True
 
-    def __get_token(self):
+    def __token_key(self):
+        """
+        Identifies the credentials of this client, to share their token with the other clients of the process.
+        """
+        return (self.auth_host, self.account, self.auth_type, tuple(sorted(self.creds.items())))
+
+    def __get_token(self, expired_token=None):
         """
         Calls the corresponding method to receive an auth token depending on the auth type. To be used if a 401 - Unauthorized error is received.
+
+        Only one thread of the process requests a new token for the same credentials, the others wait and use it.
+
+        :param expired_token: The token which was refused. If another client already replaced it, its new token is used.
+        """
+
+        key = self.__token_key()
+        with TOKENS_LOCK:
+            if key not in TOKENS:
+                TOKENS[key] = {'token': None, 'lock': Lock()}
+            shared = TOKENS[key]
+
+        with shared['lock']:
+            if shared['token'] is not None and shared['token'] != expired_token and path.exists(self.token_file):
+                LOG.debug('use token refreshed by another client')
+                self.auth_token = shared['token']
+                self.headers['X-Rucio-Auth-Token'] = self.auth_token
+                return
+            self.__request_token()
+            shared['token'] = self.auth_token
+
+    def __request_token(self):
+        """
+        Requests a new auth token from the server and writes it to the token file.
         """
 
         retry = 0
@@ -448,6 +517,14 @@ class BaseClient(object):
         if not path.exists(self.token_file):
             return False
 
+        with TOKENS_LOCK:
+            shared = TOKENS.get(self.__token_key())
+        if shared and shared['token'] is not None:
+            self.auth_token = shared['token']
+            self.headers['X-Rucio-Auth-Token'] = self.auth_token
+            LOG.debug('use token \'%s\' shared in the process' % self.auth_token)
+            return True
+
         try:
             token_file_handler = open(self.token_file, 'r')
             self.auth_token = token_file_handler.readline()
@@ -457,6 +534,11 @@ class BaseClient(object):
         except Exception:
             raise
 
+        with TOKENS_LOCK:
+            if self.__token_key() not in TOKENS:
+                TOKENS[self.__token_key()] = {'token': None, 'lock': Lock()}
+            TOKENS[self.__token_key()]['token'] = self.auth_token
+
         LOG.debug('read token \'%s\' from file' % self.auth_token)
         return True
 
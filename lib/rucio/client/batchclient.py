@@ -0,0 +1,132 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Coalescing of many small catalog calls into the bulk endpoints.
+"""
+
+from threading import Lock
+
+
+class BatchClient(object):
+    """
+    Collects single DID, replica and attachment registrations and sends them
+    with add_dids, add_replicas and attach_dids_to_dids once batch_size of them
+    are pending, or when flush is called. DIDs are sent first, then replicas,
+    then attachments, so an attachment can refer to a DID or a replica
+    registered in the same batch.
+
+    Usage::
+
+        with BatchClient(Client()) as batch:
+            batch.add_did(scope, dataset, 'DATASET')
+            for name in files:
+                batch.add_replica(rse, scope, name, bytes, adler32)
+                batch.attach_did(scope, dataset, scope, name)
+    """
+
+    def __init__(self, client, batch_size=500):
+        """
+        :param client: The Client used to send the requests.
+        :param batch_size: Number of pending operations which triggers a flush.
+        """
+        self.client = client
+        self.batch_size = batch_size
+        self.__lock = Lock()
+        self.__dids = []
+        self.__replicas = {}
+        self.__attachments = {}
+        self.__pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def __added(self):
+        self.__pending += 1
+        return self.__pending >= self.batch_size
+
+    def add_did(self, scope, name, type, statuses=None, meta=None, rules=None, lifetime=None):
+        """
+        Queues the registration of a dataset or container.
+
+        :param scope: The scope name.
+        :param name: The data identifier name.
+        :param type: The data identifier type, 'DATASET' or 'CONTAINER'.
+        :param statuses: Dictionary with statuses, e.g. {'monotonic': True}.
+        :param meta: Meta-data associated with the data identifier.
+        :param rules: Replication rules associated with the data identifier.
+        :param lifetime: DID's lifetime (in seconds).
+        """
+        did = {'scope': scope, 'name': name, 'type': type}
+        for key, value in (('statuses', statuses), ('meta', meta), ('rules', rules), ('lifetime', lifetime)):
+            if value is not None:
+                did[key] = value
+        with self.__lock:
+            self.__dids.append(did)
+            full = self.__added()
+        if full:
+            self.flush()
+
+    def add_replica(self, rse, scope, name, bytes, adler32=None, md5=None, pfn=None, meta=None):
+        """
+        Queues the registration of a file replica.
+
+        :param rse: The RSE name.
+        :param scope: The scope name.
+        :param name: The file name.
+        :param bytes: The file size in bytes.
+        :param adler32: The adler32 checksum.
+        :param md5: The md5 checksum.
+        :param pfn: The PFN, for non-deterministic RSEs.
+        :param meta: Meta-data associated with the file.
+        """
+        replica = {'scope': scope, 'name': name, 'bytes': bytes}
+        for key, value in (('adler32', adler32), ('md5', md5), ('pfn', pfn), ('meta', meta)):
+            if value is not None:
+                replica[key] = value
+        with self.__lock:
+            self.__replicas.setdefault(rse, []).append(replica)
+            full = self.__added()
+        if full:
+            self.flush()
+
+    def attach_did(self, scope, name, child_scope, child_name):
+        """
+        Queues the attachment of a DID to a dataset or container.
+
+        :param scope: The scope of the dataset or container.
+        :param name: The name of the dataset or container.
+        :param child_scope: The scope of the attached DID.
+        :param child_name: The name of the attached DID.
+        """
+        with self.__lock:
+            self.__attachments.setdefault((scope, name), []).append({'scope': child_scope, 'name': child_name})
+            full = self.__added()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Sends the pending operations.
+
+        If a call fails, its operations and the ones after it are kept pending and the exception is raised.
+        """
+        with self.__lock:
+            if self.__dids:
+                self.client.add_dids(self.__dids)
+                self.__dids = []
+            for rse in self.__replicas.keys():
+                self.client.add_replicas(rse=rse, files=self.__replicas[rse])
+                del self.__replicas[rse]
+            if self.__attachments:
+                self.client.attach_dids_to_dids([{'scope': scope, 'name': name, 'dids': dids}
+                                                 for (scope, name), dids in self.__attachments.iteritems()])
+                self.__attachments = {}
+            self.__pending = 0
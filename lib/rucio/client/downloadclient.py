@@ -0,0 +1,434 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Concurrent download of file replicas.
+
+The DownloadClient fetches files from the replicas returned by list_replicas
+with a bounded number of concurrent transfers overall and per source RSE.
+A replica which fails, is corrupted or stalls is abandoned for the next
+candidate. The adler32 of each file is computed while the protocol writes it,
+so the file is not read a second time to validate it.
+"""
+
+import os
+import random
+import time
+
+from copy import deepcopy
+from logging import getLogger
+from Queue import Queue, Empty
+from threading import BoundedSemaphore, Event, Lock, Thread
+from urlparse import urlparse
+
+from rucio.common.exception import FileConsistencyMismatch, RSEProtocolNotSupported, ServiceUnavailable
+from rucio.common.utils import CHECKSUM_BUFFER_SIZE, Checksum, adler32
+from rucio.rse import rsemanager as rsemgr
+
+LOG = getLogger(__name__)
+
+
+class StreamingAdler32(Thread):
+    """
+    Follows a file while it is written and keeps its adler32 up to date.
+
+    If the file shrinks, e.g. because the protocol restarted the transfer,
+    the checksum is restarted from the beginning.
+    """
+
+    def __init__(self, path, poll_interval=0.5):
+        super(StreamingAdler32, self).__init__()
+        self.daemon = True
+        self.path = path
+        self.poll_interval = poll_interval
+        self.offset = 0
+        self.last_growth = None
+        self.__checksum = Checksum(('adler32',))
+        self.__stop = Event()
+
+    def __consume(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size < self.offset:
+            self.offset, self.__checksum = 0, Checksum(('adler32',))
+        if size == self.offset:
+            return
+        with open(self.path, 'rb') as stream:
+            stream.seek(self.offset)
+            while True:
+                chunk = stream.read(CHECKSUM_BUFFER_SIZE)
+                if not chunk:
+                    break
+                self.__checksum.update(chunk)
+                self.offset += len(chunk)
+        self.last_growth = time.time()
+
+    def run(self):
+        while not self.__stop.wait(self.poll_interval):
+            self.__consume()
+
+    def finish(self):
+        """
+        Stops following the file and reads what was written since the last poll.
+
+        :returns: the adler32 of the file as an 8 character hex string.
+        """
+        self.__stop.set()
+        self.join()
+        self.__consume()
+        return self.__checksum.adler32()
+
+    def cancel(self):
+        """ Stops following the file. """
+        self.__stop.set()
+
+
+class DownloadClient(object):
+    """
+    Downloads files from their replicas with bounded concurrency and failover.
+    """
+
+    def __init__(self, client, threads=3, threads_per_rse=2, scheme=None, allow_tape=False,
+                 retries_per_source=2, transfer_timeout=None, stall_timeout=300, min_rate=100 * 1024,
+                 trace_callback=None, trace_pattern=None):
+        """
+        :param client: The Client used to report corrupted replicas.
+        :param threads: Maximum number of concurrent transfers.
+        :param threads_per_rse: Maximum number of concurrent transfers from a single RSE.
+        :param scheme: Force the protocol scheme to use.
+        :param allow_tape: Also download from tape RSEs if no disk replica is available.
+        :param retries_per_source: Number of attempts on a replica before failing over to the next one.
+        :param transfer_timeout: Maximum duration of an attempt in seconds. Defaults to the file size divided by min_rate, with a minimum of 300 seconds.
+        :param stall_timeout: Abandon an attempt if the local file did not grow for this many seconds.
+        :param min_rate: Rate in bytes per second used to derive the default transfer timeout.
+        :param trace_callback: Function called with each trace dictionary.
+        :param trace_pattern: Dictionary of fields added to each trace.
+        """
+        self.client = client
+        self.threads = threads
+        self.threads_per_rse = threads_per_rse
+        self.scheme = scheme
+        self.allow_tape = allow_tape
+        self.retries_per_source = retries_per_source
+        self.transfer_timeout = transfer_timeout
+        self.stall_timeout = stall_timeout
+        self.min_rate = min_rate
+        self.trace_callback = trace_callback
+        self.trace_pattern = trace_pattern or {}
+
+        self.__lock = Lock()
+        self.__rse_infos = {}
+        self.__rse_semaphores = {}
+        self.__rse_active = {}
+        self.__stats = {'started_at': None, 'ended_at': None, 'files': {}, 'rses': {}}
+
+    def __get_rse_info(self, rse):
+        with self.__lock:
+            if rse not in self.__rse_infos:
+                self.__rse_infos[rse] = rsemgr.get_rse_info(rse)
+                self.__rse_semaphores[rse] = BoundedSemaphore(self.threads_per_rse)
+                self.__rse_active[rse] = 0
+                self.__stats['rses'][rse] = {'files': 0, 'failures': 0, 'bytes': 0, 'seconds': 0.0}
+            return self.__rse_infos[rse]
+
+    def __sort_sources(self, file):
+        """
+        Orders the candidate RSEs: readable disk replicas first, least busy and
+        least failing RSEs first, random among equals. Tape replicas are only
+        kept if allowed and no disk replica exists.
+        """
+        disk, tape = [], []
+        for rse in file.get('rses', {}):
+            try:
+                rse_info = self.__get_rse_info(rse)
+            except Exception, error:
+                LOG.warning('Cannot get the description of %s: %s' % (rse, error))
+                continue
+            if not rse_info['availability_read']:
+                LOG.info('RSE %s is blacklisted for reading' % rse)
+                continue
+            if rse_info['rse_type'] == 'TAPE':
+                tape.append(rse)
+            else:
+                disk.append(rse)
+        candidates = disk or (tape if self.allow_tape else [])
+        random.shuffle(candidates)
+        with self.__lock:
+            return sorted(candidates, key=lambda rse: (self.__rse_active[rse], self.__stats['rses'][rse]['failures']))
+
+    def __send_trace(self, trace):
+        if self.trace_callback:
+            try:
+                self.trace_callback(trace)
+            except Exception, error:
+                LOG.debug(error)
+
+    def __acquire_slot(self, rse):
+        """ Waits for a free transfer slot on the RSE. """
+        self.__rse_semaphores[rse].acquire()
+        with self.__lock:
+            self.__rse_active[rse] += 1
+
+    def __release_slot(self, rse):
+        """ Frees a transfer slot of the RSE. """
+        with self.__lock:
+            self.__rse_active[rse] -= 1
+        self.__rse_semaphores[rse].release()
+
+    def __transfer(self, protocol, pfn, tempfile, timeout, cleanup):
+        """
+        Runs protocol.get in a separate thread and follows the written file.
+        cleanup is called with failed=True or False once the transfer thread exited.
+        A transfer which timed out or stalled is abandoned but keeps running
+        until the protocol gives up, so its cleanup is left to a background thread.
+
+        :returns: the adler32 of the downloaded file.
+        :raises ServiceUnavailable: if the transfer timed out or stalled.
+        """
+        result = {}
+
+        def get():
+            try:
+                protocol.get(pfn, tempfile)
+            except Exception, error:
+                result['error'] = error
+
+        def abandon():
+            transfer.join()
+            cleanup(failed=True)
+
+        follower = StreamingAdler32(tempfile)
+        transfer = Thread(target=get)
+        transfer.daemon = True
+        started_at = time.time()
+        follower.start()
+        transfer.start()
+        while transfer.is_alive():
+            transfer.join(1)
+            now = time.time()
+            if now - started_at > timeout:
+                error = ServiceUnavailable('Transfer did not finish in %s seconds' % timeout)
+            elif self.stall_timeout and follower.last_growth and now - follower.last_growth > self.stall_timeout:
+                error = ServiceUnavailable('Transfer stalled for %s seconds' % self.stall_timeout)
+            else:
+                continue
+            follower.cancel()
+            waiter = Thread(target=abandon)
+            waiter.daemon = True
+            waiter.start()
+            raise error
+        if 'error' in result:
+            follower.cancel()
+            cleanup(failed=True)
+            raise result['error']
+        try:
+            checksum = follower.finish()
+        except Exception:
+            cleanup(failed=True)
+            raise
+        cleanup(failed=False)
+        return checksum
+
+    def __attempt(self, file, rse, attempt):
+        """
+        Downloads the file from one RSE.
+        A transfer slot of the RSE is held until the transfer thread exited,
+        even if the attempt was abandoned before.
+
+        :returns: the number of downloaded bytes.
+        """
+        rse_info = self.__get_rse_info(rse)
+        pfns = file['rses'].get(rse) or []
+        scheme = self.scheme or (urlparse(pfns[0]).scheme if pfns else None)
+        protocol = rsemgr.create_protocol(rse_info, 'read', scheme)
+        if self.scheme or not pfns:
+            pfn = protocol.lfns2pfns({'scope': file['scope'], 'name': file['name']}).values()[0]
+        else:
+            pfn = pfns[0]
+        file['pfn'] = pfn
+
+        finalfile = os.path.join(file['dest_dir'], file['name'])
+        # Abandoned attempts may still be writing, so every attempt gets its own temporary file
+        tempfile = '%s.%s.%i.part' % (finalfile, rse, attempt)
+        if os.path.isfile(tempfile):
+            os.unlink(tempfile)
+
+        def cleanup(failed):
+            try:
+                protocol.close()
+            except Exception:
+                pass
+            if failed and os.path.isfile(tempfile):
+                os.unlink(tempfile)
+            self.__release_slot(rse)
+
+        timeout = self.transfer_timeout or max(300, (file.get('bytes') or 0) / self.min_rate)
+        self.__acquire_slot(rse)
+        try:
+            protocol.connect()
+        except Exception:
+            cleanup(failed=True)
+            raise
+        checksum = self.__transfer(protocol, pfn, tempfile, timeout, cleanup)
+
+        if file.get('adler32'):
+            if checksum != file['adler32']:
+                # The protocol may have rewritten the file in place, verify once on the final content
+                checksum = adler32(tempfile)
+            if checksum != file['adler32']:
+                os.unlink(tempfile)
+                raise FileConsistencyMismatch('Checksum mismatch : local %s vs recorded %s' % (checksum, file['adler32']))
+        os.rename(tempfile, finalfile)
+        return os.path.getsize(finalfile)
+
+    def __download_file(self, file):
+        """
+        Downloads one file, failing over between its replicas.
+
+        :returns: the result dictionary of the file.
+        """
+        did = '%s:%s' % (file['scope'], file['name'])
+        result = {'scope': file['scope'], 'name': file['name'], 'state': 'FAILED', 'rse': None,
+                  'attempts': 0, 'bytes': 0, 'seconds': 0.0, 'rate': 0.0}
+        trace = deepcopy(self.trace_pattern)
+        trace.update({'scope': file['scope'], 'filename': file['name'], 'filesize': file.get('bytes'),
+                      'datasetScope': file.get('datasetScope', ''), 'dataset': file.get('datasetName', '')})
+
+        sources = self.__sort_sources(file)
+        if not sources:
+            LOG.warning('File %s has no available replicas. Cannot be downloaded.' % did)
+            result['state'] = 'FILE_NOT_FOUND'
+            trace.update({'clientState': 'FILE_NOT_FOUND', 'transferStart': time.time(), 'transferEnd': time.time()})
+            self.__send_trace(trace)
+            return result
+
+        if not os.path.isdir(file['dest_dir']):
+            try:
+                os.makedirs(file['dest_dir'])
+            except OSError:
+                pass  # created by another thread
+
+        for rse in sources:
+            rse_info = self.__get_rse_info(rse)
+            for attempt in xrange(self.retries_per_source):
+                result['attempts'] += 1
+                trace.update({'remoteSite': rse, 'transferStart': time.time(), 'clientState': 'DOWNLOAD_ATTEMPT',
+                              'protocol': self.scheme or (rse_info['protocols'][0]['scheme'] if rse_info['protocols'] else None)})
+                LOG.debug('Getting file %s from %s, attempt %s/%s' % (did, rse, attempt + 1, self.retries_per_source))
+                started_at = time.time()
+                try:
+                    transferred = self.__attempt(file, rse, result['attempts'])
+                    error = None
+                except Exception, error:
+                    transferred = None
+                seconds = time.time() - started_at
+
+                trace['transferEnd'] = time.time()
+                if error is None:
+                    result.update({'state': 'DONE', 'rse': rse, 'bytes': transferred, 'seconds': seconds,
+                                   'rate': transferred / seconds if seconds else 0.0})
+                    with self.__lock:
+                        self.__stats['rses'][rse]['files'] += 1
+                        self.__stats['rses'][rse]['bytes'] += transferred
+                        self.__stats['rses'][rse]['seconds'] += seconds
+                    trace['clientState'] = 'DONE'
+                    self.__send_trace(trace)
+                    LOG.info('File %s successfully downloaded from %s. %s bytes in %.2f seconds' % (did, rse, transferred, seconds))
+                    return result
+
+                with self.__lock:
+                    self.__stats['rses'][rse]['failures'] += 1
+                LOG.warning('Failed attempt %s/%s for %s on %s: %s' % (attempt + 1, self.retries_per_source, did, rse, error))
+                if isinstance(error, FileConsistencyMismatch):
+                    trace['clientState'] = 'FAIL_VALIDATE'
+                    self.__send_trace(trace)
+                    result['state'] = 'CORRUPTED'
+                    try:
+                        self.client.declare_suspicious_file_replicas([file['pfn'], ], reason='Corrupted')
+                    except Exception, declare_error:
+                        LOG.debug(declare_error)
+                    break
+                trace['clientState'] = str(type(error).__name__)
+                self.__send_trace(trace)
+                if isinstance(error, (RSEProtocolNotSupported, ServiceUnavailable)):
+                    # No point retrying a source without a usable protocol or which is too slow
+                    break
+            LOG.debug('Will retry download of %s on another RSE' % did)
+
+        LOG.error('Cannot download file %s' % did)
+        if result['state'] != 'CORRUPTED':
+            result['state'] = 'FAILED'
+        return result
+
+    def __worker(self, files, results):
+        while True:
+            try:
+                file = files.get_nowait()
+            except Empty:
+                return
+            try:
+                result = self.__download_file(file)
+            except Exception, error:
+                LOG.error('Unexpected error downloading %s:%s: %s' % (file['scope'], file['name'], error))
+                result = {'scope': file['scope'], 'name': file['name'], 'state': 'FAILED', 'rse': None,
+                          'attempts': 0, 'bytes': 0, 'seconds': 0.0, 'rate': 0.0}
+            with self.__lock:
+                self.__stats['files']['%s:%s' % (file['scope'], file['name'])] = result
+            results.append(result)
+            files.task_done()
+
+    def download(self, files):
+        """
+        Downloads a list of files.
+
+        :param files: List of dictionaries as returned by list_replicas, with the additional key 'dest_dir'
+                      and optionally 'datasetScope' and 'datasetName' for the traces.
+
+        :returns: List of result dictionaries with scope, name, state (DONE, FAILED, CORRUPTED or FILE_NOT_FOUND),
+                  rse, attempts, bytes, seconds and rate.
+        """
+        queue = Queue()
+        for file in files:
+            queue.put(file)
+        results = []
+
+        self.__stats['started_at'] = self.__stats['started_at'] or time.time()
+        workers = [Thread(target=self.__worker, kwargs={'files': queue, 'results': results}) for _ in xrange(min(self.threads, len(files)))]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        # Interruptible joins require a timeout.
+        while [worker for worker in workers if worker.is_alive()]:
+            for worker in workers:
+                worker.join(timeout=1)
+        self.__stats['ended_at'] = time.time()
+        return results
+
+    def get_statistics(self):
+        """
+        Returns the throughput statistics of the downloads done so far.
+
+        :returns: Dictionary with the aggregate figures (files, failed, bytes, seconds, rate),
+                  the per RSE figures under 'rses' and the per file results under 'files'.
+        """
+        with self.__lock:
+            files = dict(self.__stats['files'])
+            rses = deepcopy(self.__stats['rses'])
+            started_at, ended_at = self.__stats['started_at'], self.__stats['ended_at'] or time.time()
+        done = [result for result in files.values() if result['state'] == 'DONE']
+        total_bytes = sum(result['bytes'] for result in done)
+        seconds = ended_at - started_at if started_at else 0.0
+        for rse in rses.values():
+            rse['rate'] = rse['bytes'] / rse['seconds'] if rse['seconds'] else 0.0
+        return {'files': files,
+                'rses': rses,
+                'downloaded': len(done),
+                'failed': len(files) - len(done),
+                'bytes': total_bytes,
+                'seconds': seconds,
+                'rate': total_bytes / seconds if seconds else 0.0}
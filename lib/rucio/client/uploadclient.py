@@ -10,77 +10,341 @@
 # - Thomas Beermann, <thomas.beermann@cern.ch>, 2012
 # - Ralph Vigne, <ralph.vigne@cern.ch>, 2015
 
+"""
+Parallel upload of files to a RSE.
 
+The UploadClient checksums, transfers and registers files concurrently:
+files are checksummed by a pool of threads, the replicas are registered with
+add_replicas in batches, a pool of threads copies them to the storage, and a
+registration thread marks the copied replicas available and attaches them to
+the dataset in batches while the other transfers go on. An optional journal
+records the progress of each file so that an interrupted upload can be resumed
+without redoing the completed files.
+"""
+
+import json
 import os
 import os.path
+import time
 
+from copy import deepcopy
 from logging import getLogger
+from Queue import Queue, Empty
+from threading import Lock, Thread
 
-from rucio.client.baseclient import BaseClient
-from rucio.common.exception import SourceAccessDenied
-from rucio.common.exception import SourceNotFound
-from rucio.common.exception import RSEAccessDenied
-from rucio.common.exception import FullStorage
+from rucio.common.exception import DataIdentifierAlreadyExists, FileReplicaAlreadyExists
+from rucio.common.utils import checksum_file, chunks
+from rucio.rse import rsemanager as rsemgr
 
 LOG = getLogger(__name__)
 
 
-class UploadClient(BaseClient):
-    """ This class cover all functionality related to file uploads into Rucio."""
+class UploadJournal(object):
+    """
+    Append-only record of the upload progress of files.
+
+    Each line holds the state reached by a file, identified by its DID, together
+    with the path, size and modification time of the local file and its checksums.
+    An entry is only reused if the local file did not change.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Path of the journal file. Created if it does not exist.
+        """
+        self.path = path
+        self.__lock = Lock()
+        self.__entries = {}
+        if os.path.isfile(path):
+            with open(path) as stream:
+                for line in stream:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # partially written line of an interrupted upload
+                    self.__entries[entry['did']] = entry
+        self.__stream = open(path, 'a+')
+        self.__stream.seek(0, os.SEEK_END)
+        if self.__stream.tell():
+            self.__stream.seek(-1, os.SEEK_END)
+            if self.__stream.read(1) != '\n':
+                self.__stream.write('\n')
+
+    def get(self, file):
+        """
+        :param file: File dictionary with scope, name, path, bytes and mtime.
+
+        :returns: The journal entry of the file, or None if the file is unknown or changed.
+        """
+        entry = self.__entries.get('%s:%s' % (file['scope'], file['name']))
+        if entry and (entry['path'], entry['bytes'], entry['mtime']) == (file['path'], file['bytes'], file['mtime']):
+            return entry
+        return None
+
+    def record(self, file, state):
+        """
+        Records that a file reached a state.
+
+        :param file: File dictionary with scope, name, path, bytes, mtime, adler32 and md5.
+        :param state: The reached state: 'CHECKSUMMED', 'TRANSFERRED' or 'DONE'.
+        """
+        entry = {'did': '%s:%s' % (file['scope'], file['name']),
+                 'path': file['path'],
+                 'bytes': file['bytes'],
+                 'mtime': file['mtime'],
+                 'adler32': file['adler32'],
+                 'md5': file['md5'],
+                 'state': state}
+        with self.__lock:
+            self.__stream.write(json.dumps(entry) + '\n')
+            self.__stream.flush()
+            os.fsync(self.__stream.fileno())
+            self.__entries[entry['did']] = entry
+
+    def close(self):
+        self.__stream.close()
 
-    BASEURL = '??_uploadclient_??'
 
-    def __init__(self, rucio_host=None, auth_host=None, account=None, ca_cert=None, auth_type=None, creds=None, timeout=None, user_agent='rucio-clients'):
-        super(UploadClient, self).__init__(rucio_host, auth_host, account, ca_cert, auth_type, creds, timeout, user_agent)
+class UploadClient(object):
+    """
+    Uploads files to a RSE with concurrent checksumming, transfers and registration.
+    """
 
-    def upload_files(account, sources):
+    def __init__(self, client, rse_settings, threads=3, register=True, lifetime=None,
+                 dataset_scope=None, dataset_name=None, batch_size=100, flush_interval=30, journal=None,
+                 trace_callback=None, trace_pattern=None):
         """
-        This operation is used to upload files into the system. First, file size,
-        file checksum and access permissions on the local file system are derived.
-        Second, the rucio-server is called to register all necessary data in the
-        database i.e. add the file to file catalogue, add file metadata, add
-        replication rules. Note that file replicas without replication rule will be
-        deleted automatically and therefore at least one replication rule (default)
-        must be created. After the rucio server responded without error, the physical
-        copy of the file can be started. After the physical copy finished successfully
-        the replica's state is changed from 'queued' to 'active' to enable the
-        replica for users.
-
-        :param account Account identifier
-        :param sources Dictonary with the following structure: { path_to_file: { 'scope': scope, 'replication_spec': {replication_rules}, 'dataset': datasetname, 'checksum': checksum, 'filesize': filesize}}
-        :return: report represented by dictonary with informtion on a per file basis, e.g. { 'file.a': True, 'File.b': SourceNotFound, 'File.c': RSEAccessDenied, 'File.d': DatasetAcessDenied, ... }
+        :param client: The Client used for the registration.
+        :param rse_settings: The RSE description as returned by rsemanager.get_rse_info.
+        :param threads: Number of concurrent checksum and transfer threads.
+        :param register: Register the replicas in the catalog. Without it the files are only copied.
+        :param lifetime: Lifetime in seconds of the rules created for files uploaded without dataset.
+        :param dataset_scope: Scope of the dataset to attach the files to.
+        :param dataset_name: Name of the dataset to attach the files to.
+        :param batch_size: Number of files per registration call.
+        :param flush_interval: Maximum time in seconds a transferred file waits for its batch to be full before it is registered.
+        :param journal: Path of the journal file, or None to upload without journal.
+        :param trace_callback: Function called with each trace dictionary.
+        :param trace_pattern: Dictionary of fields added to each trace.
         """
-        report = {}
+        self.client = client
+        self.rse_settings = rse_settings
+        self.rse = rse_settings['rse']
+        self.threads = threads
+        self.register = register
+        self.lifetime = lifetime
+        self.dataset_scope = dataset_scope
+        self.dataset_name = dataset_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal = UploadJournal(journal) if journal else None
+        self.trace_callback = trace_callback
+        self.trace_pattern = trace_pattern or {}
+
+        self.__lock = Lock()
+        self.__results = {}
+
+    def __set_result(self, file, state, error=None):
+        with self.__lock:
+            self.__results['%s:%s' % (file['scope'], file['name'])] = {'state': state, 'error': error,
+                                                                      'bytes': file.get('bytes'),
+                                                                      'seconds': file.get('seconds', 0.0)}
+        if error:
+            LOG.error('Failed to upload %s:%s: %s' % (file['scope'], file['name'], error))
+
+    def __run_pool(self, function, items):
+        """ Calls function on every item with the configured number of threads. """
+        queue = Queue()
+        for item in items:
+            queue.put(item)
+
+        def worker():
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except Empty:
+                    return
+                try:
+                    function(item)
+                except Exception, error:
+                    self.__set_result(item, 'FAILED', error)
+
+        workers = [Thread(target=worker) for _ in xrange(min(self.threads, len(items)))]
+        for thread in workers:
+            thread.daemon = True
+            thread.start()
+        # Interruptible joins require a timeout.
+        while [thread for thread in workers if thread.is_alive()]:
+            for thread in workers:
+                thread.join(timeout=1)
 
-        for src in sources:
+    def __checksum(self, file):
+        checksums = checksum_file(file['path'])
+        file['adler32'], file['md5'] = checksums['adler32'], checksums['md5']
+        if self.journal:
+            self.journal.record(file, 'CHECKSUMMED')
+
+    def __add_replicas(self, files):
+        """ Registers replicas in batches, isolating the failing files if a batch fails. """
+        registered = []
+        for chunk in chunks(files, self.batch_size):
+            replicas = [{'scope': f['scope'], 'name': f['name'], 'bytes': f['bytes'], 'adler32': f['adler32'],
+                         'md5': f['md5'], 'state': 'C', 'meta': f.get('meta', {})} for f in chunk]
             try:
-                if not os.access(src, os.R_OK):
-                    report[src] = SourceAccessDenied()
-                    continue
-            except Exception:
-                report[src] = SourceNotFound()
-            if not sources[src].filesize:
-                sources[src].filesize = os.path.getsize(src)
-            if not sources[src].checksum:
-                pass  # sources[src].cheksum = TODO: Derive checksum
-
-        # Remove unaccessible/unexisting files from sources to avoid unnecessary checks on the server
-        for src in report:
-            del(sources[src])
-
-        # ToDo the REST call for:  report = rucio_server.declare_for_upload(sources, atomic=False)
-        # ToDo: Merge the response from above into the report array (per file)
-        #       possible file status are: DatasetAcessDenied, ScopeAccessDenied, RSEOverQuota, InvalidMetadata, FileReplicaAlreadyExsists, FileConsitencyConfilct, InvalidRepliactionRule, FullStorage
-        #       if the transfer is considered to be fine, the value fo the file will be True
-        RSEMgr, recommendation = None, None  # In waiting
-        for src in sources:
-            if report[src]:
-                # ToDo the REST call for: recommendation = rucio_server.recommend_storage(account, sources[src])
-                # ToDo the REST call for: rucio_server.prepare_upload(account, sources[src], recommendation)
+                self.client.add_replicas(rse=self.rse, files=replicas)
+                registered.extend(chunk)
+                continue
+            except Exception, error:
+                LOG.debug('Bulk registration failed, registering one by one: %s' % error)
+            for file, replica in zip(chunk, replicas):
                 try:
-                    RSEMgr.upload(src, recommendation)
-                except (RSEAccessDenied, FullStorage), e:
-                    report[src] = e
-                    continue
-                # ToDo the REST call for: rucio_server.confirm_upload(src, recommendation)
-                report[src] = True
+                    self.client.add_replicas(rse=self.rse, files=[replica])
+                    registered.append(file)
+                except Exception, error:
+                    self.__set_result(file, 'FAILED', error)
+        return registered
+
+    def __prepare_registration(self, files):
+        """
+        Registers the replicas of the files which are not known at the RSE yet.
+
+        :returns: The files which can be transferred.
+        """
+        existing = {}
+        for chunk in chunks(files, 50):
+            for replica in self.client.list_replicas([{'scope': f['scope'], 'name': f['name']} for f in chunk], all_states=True):
+                existing[replica['scope'], replica['name']] = replica
+
+        new_files, to_register, to_transfer = [], [], []
+        for file in files:
+            replica = existing.get((file['scope'], file['name']))
+            if replica is None:
+                new_files.append(file)
+            elif replica.get('adler32') and replica['adler32'] != file['adler32']:
+                self.__set_result(file, 'FAILED', DataIdentifierAlreadyExists('%s:%s is already registered with a different checksum' % (file['scope'], file['name'])))
+            elif self.rse not in replica['rses']:
+                to_register.append(file)
+            else:
+                to_transfer.append(file)
+
+        new_files = self.__add_replicas(new_files)
+        if new_files and not self.dataset_name:
+            # Files without dataset need their own rule
+            for chunk in chunks(new_files, self.batch_size):
+                try:
+                    self.client.add_replication_rule([{'scope': f['scope'], 'name': f['name']} for f in chunk],
+                                                     copies=1, rse_expression=self.rse, lifetime=self.lifetime)
+                except Exception, error:
+                    LOG.warning('Failed to add the replication rules: %s' % error)
+        return to_transfer + new_files + self.__add_replicas(to_register)
+
+    def __transfer(self, file, registration):
+        trace = deepcopy(self.trace_pattern)
+        trace.update({'scope': file['scope'], 'filename': file['name'], 'filesize': file['bytes'],
+                      'remoteSite': self.rse, 'protocol': self.rse_settings['protocols'][0]['scheme'],
+                      'transferStart': time.time()})
+        started_at = time.time()
+        try:
+            rsemgr.upload(rse_settings=deepcopy(self.rse_settings),
+                          lfns=[{'name': file['name'], 'scope': file['scope'], 'adler32': file['adler32'], 'filesize': file['bytes']}],
+                          source_dir=os.path.dirname(file['path']) or '.')
+            LOG.info('File %s:%s successfully uploaded on the storage' % (file['scope'], file['name']))
+        except FileReplicaAlreadyExists:
+            LOG.warning('File %s:%s already exists on RSE. Will not try to reupload' % (file['scope'], file['name']))
+        file['seconds'] = time.time() - started_at
+        trace.update({'transferEnd': time.time(), 'clientState': 'DONE'})
+        if self.trace_callback:
+            try:
+                self.trace_callback(trace)
+            except Exception, error:
+                LOG.debug(error)
+        if self.journal:
+            self.journal.record(file, 'TRANSFERRED')
+        registration.put(file)
+
+    def __finish_registration(self, files):
+        """ Marks the replicas available and attaches the files to the dataset. """
+        dids = [{'scope': f['scope'], 'name': f['name']} for f in files]
+        try:
+            if self.register:
+                self.client.update_replicas_states(rse=self.rse, files=[{'scope': f['scope'], 'name': f['name'], 'state': 'A'} for f in files])
+                if self.dataset_name:
+                    self.client.attach_dids_to_dids([{'scope': self.dataset_scope, 'name': self.dataset_name, 'dids': dids}], ignore_duplicate=True)
+        except Exception, error:
+            for file in files:
+                self.__set_result(file, 'FAILED', error)
+            return
+        for file in files:
+            if self.journal:
+                self.journal.record(file, 'DONE')
+            self.__set_result(file, 'DONE')
+
+    def __registration_worker(self, registration):
+        """
+        Collects the transferred files and registers them in batches of batch_size files.
+        An incomplete batch is registered once its oldest file waited for flush_interval seconds,
+        and whatever is left once all the transfers are done.
+        """
+        pending, pending_since, done = [], None, False
+        while not done:
+            try:
+                file = registration.get(timeout=1)
+                if file is None:
+                    done = True
+                else:
+                    if not pending:
+                        pending_since = time.time()
+                    pending.append(file)
+            except Empty:
+                pass
+            if pending and (done or len(pending) >= self.batch_size or time.time() - pending_since >= self.flush_interval):
+                self.__finish_registration(pending)
+                pending = []
+
+    def upload(self, files):
+        """
+        Uploads files.
+
+        :param files: List of dictionaries with the local 'path', the 'scope' and 'name' of the file, and optionally its 'meta'.
+
+        :returns: Dictionary with 'scope:name' as keys and dictionaries with state (DONE, ALREADY_DONE or FAILED),
+                  error, bytes and seconds as values.
+        """
+        to_checksum, to_register, to_finish = [], [], []
+        for file in files:
+            stat = os.stat(file['path'])
+            file['bytes'], file['mtime'] = stat.st_size, int(stat.st_mtime)
+            entry = self.journal.get(file) if self.journal else None
+            if entry:
+                file['adler32'], file['md5'] = entry['adler32'], entry['md5']
+                if entry['state'] == 'DONE':
+                    self.__set_result(file, 'ALREADY_DONE')
+                elif entry['state'] == 'TRANSFERRED':
+                    to_finish.append(file)
+                else:
+                    to_register.append(file)
+            else:
+                to_checksum.append(file)
+
+        self.__run_pool(self.__checksum, to_checksum)
+        to_register.extend([f for f in to_checksum if 'adler32' in f])
+
+        if self.register and to_register:
+            to_transfer = self.__prepare_registration(to_register)
+        else:
+            to_transfer = to_register
+
+        registration = Queue()
+        for file in to_finish:
+            registration.put(file)
+        registrar = Thread(target=self.__registration_worker, kwargs={'registration': registration})
+        registrar.daemon = True
+        registrar.start()
+
+        self.__run_pool(lambda file: self.__transfer(file, registration), to_transfer)
+
+        registration.put(None)
+        while registrar.is_alive():
+            registrar.join(timeout=1)
+
+        return dict(self.__results)
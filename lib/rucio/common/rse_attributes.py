@@ -15,19 +15,8 @@ methods to get closeness between sites
 import logging
 import traceback
 
-from dogpile.cache import make_region
-from dogpile.cache.api import NoValue
-
 from rucio.core import rse as rse_core
 
-region = make_region().configure('dogpile.cache.memcached',
-                                 expiration_time=3600,
-                                 arguments={'url': "127.0.0.1:11211", 'distributed_lock': True})
-
-# for local test
-# region = make_region().configure('dogpile.cache.memory',
-#                                  expiration_time=3600)
-
 
 def get_rse_attributes(rse_id, session=None):
     """
@@ -40,12 +29,9 @@ def get_rse_attributes(rse_id, session=None):
     :returns: A dictionary with RSE attributes for a RSE.
     """
 
-    result = region.get(rse_id)
-    if type(result) is NoValue:
-        try:
-            result = None
-            result = rse_core.list_rse_attributes(None, rse_id=rse_id, session=session)
-            region.set(rse_id, result)
-        except:
-            logging.warning("Failed to get RSE %s attributes, error: %s" % (rse_id, traceback.format_exc()))
+    result = None
+    try:
+        result = rse_core.list_cached_rse_attributes(None, rse_id=rse_id, session=session)
+    except:
+        logging.warning("Failed to get RSE %s attributes, error: %s" % (rse_id, traceback.format_exc()))
     return result
@@ -15,7 +15,9 @@ Rucio utilities.
 
 import datetime
 import errno
+import hashlib
 import json
+import mmap
 import os
 import pwd
 import re
@@ -68,6 +70,9 @@ codes = {
 # RFC 1123 (ex RFC 822)
 DATE_FORMAT = '%a, %d %b %Y %H:%M:%S UTC'
 
+# Read size of the checksum functions
+CHECKSUM_BUFFER_SIZE = 4 * 1024 * 1024
+
 
 def build_url(url, path=None, params=None, doseq=False):
     """
@@ -104,6 +109,88 @@ def clean_headers(msg):
     return msg
 
 
+class Checksum(object):
+    """
+    Incremental adler32 and md5 computation.
+
+    Data can be fed in pieces of any size, e.g. while it comes in from the network,
+    and both checksums are computed in the same pass over the data.
+    """
+
+    def __init__(self, algorithms=('adler32', 'md5')):
+        """
+        :param algorithms: The checksums to compute, a subset of ('adler32', 'md5').
+        """
+        for algorithm in algorithms:
+            if algorithm not in ('adler32', 'md5'):
+                raise ValueError('Unsupported checksum algorithm %s' % algorithm)
+        # adler starting value is _not_ 0
+        self.__adler = 1L if 'adler32' in algorithms else None
+        self.__md5 = hashlib.md5() if 'md5' in algorithms else None
+        self.bytes = 0
+
+    def update(self, data):
+        """
+        Adds data to the checksums.
+
+        :param data: A string or a read-only buffer.
+        """
+        if self.__adler is not None:
+            self.__adler = zlib.adler32(data, self.__adler)
+        if self.__md5 is not None:
+            self.__md5.update(data)
+        self.bytes += len(data)
+
+    def adler32(self):
+        """ :returns: The adler32 as hexified string, padded to 8 values. """
+        # backflip on 32bit
+        return str('%08x' % (self.__adler & 0xffffffff))
+
+    def md5(self):
+        """ :returns: The md5 as hexified string. """
+        return self.__md5.hexdigest()
+
+    def hexdigests(self):
+        """ :returns: Dictionary of the computed checksums as hexified strings. """
+        digests = {}
+        if self.__adler is not None:
+            digests['adler32'] = self.adler32()
+        if self.__md5 is not None:
+            digests['md5'] = self.md5()
+        return digests
+
+
+def checksum_file(file, algorithms=('adler32', 'md5'), buffer_size=CHECKSUM_BUFFER_SIZE, use_mmap=False):
+    """
+    Computes checksums of a file in a single pass, reading it with a fixed size buffer.
+
+    :param file: Path of the file.
+    :param algorithms: The checksums to compute, a subset of ('adler32', 'md5').
+    :param buffer_size: Number of bytes read at once.
+    :param use_mmap: Map the file in memory instead of reading it.
+
+    :returns: Dictionary of the checksums as hexified strings.
+    """
+    checksum = Checksum(algorithms)
+    with open(file, 'rb') as stream:
+        size = os.fstat(stream.fileno()).st_size
+        if use_mmap and size:
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for offset in xrange(0, size, buffer_size):
+                    checksum.update(buffer(mapped, offset, buffer_size))
+            finally:
+                mapped.close()
+        else:
+            data = bytearray(buffer_size)
+            while True:
+                length = stream.readinto(data)
+                if not length:
+                    break
+                checksum.update(buffer(data, 0, length))
+    return checksum.hexdigests()
+
+
 def adler32(file):
     """
     An Adler-32 checksum is obtained by calculating two 16-bit checksums A and B and concatenating their bits into a 32-bit integer. A is the sum of all bytes in the stream plus one, and B is the sum of the individual values of A from each step.
@@ -111,21 +198,23 @@ def adler32(file):
     :returns: Hexified string, padded to 8 values.
     """
 
-    # adler starting value is _not_ 0
-    adler = 1L
-
     try:
-        openFile = open(file, 'rb')
-        for line in openFile:
-            adler = zlib.adler32(line, adler)
+        return checksum_file(file, algorithms=('adler32',))['adler32']
     except:
         raise Exception('FATAL - could not get checksum of file %s' % file)
 
-    # backflip on 32bit
-    if adler < 0:
-        adler = adler + 2 ** 32
 
-    return str('%08x' % adler)
+def md5(file):
+    """
+    Runs the MD5 algorithm (RFC-1321) on the binary content of the file named file and returns the hexadecimal digest
+
+    :returns: Hexified string.
+    """
+
+    try:
+        return checksum_file(file, algorithms=('md5',))['md5']
+    except:
+        raise Exception('FATAL - could not get MD5 checksum of file %s' % file)
 
 
 def str_to_date(string):
@@ -16,6 +16,8 @@
 
 from datetime import datetime
 from re import match
+from threading import Lock
+from time import time
 from traceback import format_exc
 
 from sqlalchemy.exc import IntegrityError
@@ -27,7 +29,14 @@ from rucio.common import exception
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import AccountStatus, AccountType
 from rucio.db.sqla.enum import EnumSymbol
-from rucio.db.sqla.session import read_session, transactional_session, stream_session
+from rucio.db.sqla.session import on_commit, read_session, transactional_session, stream_session
+
+
+# The account attributes used by the permission checks are kept in a process-local snapshot.
+# An entry is reloaded after ACCOUNT_ATTRIBUTES_TTL seconds, or right away once a change made by this process is committed.
+ACCOUNT_ATTRIBUTES_TTL = 30
+ACCOUNT_ATTRIBUTES = {'version': 0, 'accounts': {}}  # accounts: {account: (loaded_at, attributes)}
+ACCOUNT_ATTRIBUTES_LOCK = Lock()
 
 
 @transactional_session
@@ -96,6 +105,8 @@ def del_account(account, session=None):
         raise exception.AccountNotFound('Account with ID \'%s\' cannot be found' % account)
 
     account.update({'status': AccountStatus.DELETED, 'deleted_at': datetime.utcnow()})
+    account_name = account.account
+    on_commit(session, lambda: invalidate_account_attributes(account=account_name))
 
 
 @read_session
@@ -132,6 +143,8 @@ def set_account_status(account, status, session=None):
         query.update({'status': status, 'suspended_at': datetime.utcnow()})
     elif status == AccountStatus.ACTIVE:
         query.update({'status': status, 'suspended_at': None})
+    account_name = account.account
+    on_commit(session, lambda: invalidate_account_attributes(account=account_name))
 
 
 @stream_session
@@ -252,6 +265,7 @@ def add_account_attribute(account, key, value, session=None):
             raise exception.Duplicate('Key {0} already exist for account {1}!'.format(key, account))
     except:
         raise exception.RucioException(str(format_exc()))
+    on_commit(session, lambda: invalidate_account_attributes(account=account))
 
 
 @transactional_session
@@ -267,3 +281,81 @@ def del_account_attribute(account, key, session=None):
     if aid is None:
         raise exception.AccountNotFound('Attribute ({0}) does not exist for the account {0}!'.format(key, account))
     aid.delete(session=session)
+    on_commit(session, lambda: invalidate_account_attributes(account=account))
+
+
+def list_cached_account_attributes(account, session=None):
+    """
+    Get all attributes defined for an account from the local account attribute snapshot.
+    Unlike list_account_attributes, an account which is not active has no attributes instead of raising.
+    The snapshot is loaded in its own session, so it only holds committed attributes.
+
+    :param account: the account name.
+    :param session: The database session in use, not used to load the snapshot.
+
+    :returns: a list of all key, value pairs for this account.
+    """
+    entry = ACCOUNT_ATTRIBUTES['accounts'].get(account)
+    if entry is not None and time() - entry[0] < ACCOUNT_ATTRIBUTES_TTL:
+        return entry[1]
+
+    attributes = __load_account_attributes(account=account)
+    with ACCOUNT_ATTRIBUTES_LOCK:
+        ACCOUNT_ATTRIBUTES['accounts'][account] = (time(), attributes)
+    return attributes
+
+
+@read_session
+def __load_account_attributes(account, session=None):
+    """
+    Load the attributes of an account for the local account attribute snapshot.
+
+    :param account: the account name.
+    :param session: The database session in use.
+
+    :returns: a tuple of all key, value pairs for this account.
+    """
+    query = session.query(models.AccountAttrAssociation.key, models.AccountAttrAssociation.value).\
+        join(models.Account, models.Account.account == models.AccountAttrAssociation.account).\
+        filter(models.AccountAttrAssociation.account == account, models.Account.status == AccountStatus.ACTIVE)
+    return tuple({'key': key, 'value': value} for key, value in query)
+
+
+def has_cached_account_attribute(account, key, session=None):
+    """
+    Indicates whether the named key is present for the account in the local account attribute snapshot.
+
+    :param account: the account name.
+    :param key: the key for the attribute.
+    :param session: The database session in use.
+
+    :returns: True or False
+    """
+    for attribute in list_cached_account_attributes(account=account, session=session):
+        if attribute['key'] == key:
+            return True
+    return False
+
+
+def invalidate_account_attributes(account=None):
+    """
+    Drop an account, or all accounts, from the local account attribute snapshot and change its version.
+
+    :param account: the account name. If None, all accounts are dropped.
+    """
+    with ACCOUNT_ATTRIBUTES_LOCK:
+        if account is None:
+            ACCOUNT_ATTRIBUTES['accounts'] = {}
+        else:
+            ACCOUNT_ATTRIBUTES['accounts'].pop(account, None)
+        ACCOUNT_ATTRIBUTES['version'] += 1
+
+
+def get_account_attributes_version():
+    """
+    Get the version of the local account attribute snapshot, which changes with every change of the
+    account attributes made by this process.
+
+    :returns: The version number.
+    """
+    return ACCOUNT_ATTRIBUTES['version']
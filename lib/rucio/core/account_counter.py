@@ -10,12 +10,14 @@
 # - Mario Lassnig, <mario.lassnig@cern.ch>, 2013-2014
 # - Martin Barisits, <martin.barisits@cern.ch>, 2014
 
+from sqlalchemy import func
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.sql.expression import bindparam, text
+from sqlalchemy.sql.expression import and_, bindparam, or_, text
 
 import rucio.core.account
 import rucio.core.rse
 
+from rucio.common.utils import chunks
 from rucio.db.sqla import models
 from rucio.db.sqla.session import read_session, transactional_session
 
@@ -122,6 +124,22 @@ def get_counter(rse_id, account, session=None):
         return {'bytes': 0, 'files': 0, 'updated_at': None}
 
 
+@read_session
+def get_account_counters(account, session=None):
+    """
+    Returns the counters of an account on all RSEs.
+
+    :param account:          The account name.
+    :param session:          The database session in use.
+    :returns:                Dictionary {rse_id: {'bytes':, 'files':}}.
+    """
+
+    counters = {}
+    for rse_id, bytes, files in session.query(models.AccountUsage.rse_id, models.AccountUsage.bytes, models.AccountUsage.files).filter_by(account=account):
+        counters[rse_id] = {'bytes': bytes, 'files': files}
+    return counters
+
+
 @read_session
 def get_updated_account_counters(total_workers, worker_number, session=None):
     """
@@ -135,6 +153,19 @@ def get_updated_account_counters(total_workers, worker_number, session=None):
     query = session.query(models.UpdatedAccountCounter.account, models.UpdatedAccountCounter.rse_id).\
         distinct(models.UpdatedAccountCounter.account, models.UpdatedAccountCounter.rse_id)
 
+    return __filter_worker(query, total_workers=total_workers, worker_number=worker_number, session=session).all()
+
+
+def __filter_worker(query, total_workers, worker_number, session):
+    """
+    Restrict a query on the updated_account_counters to the account and rse pairs of a worker.
+
+    :param query:              The query.
+    :param total_workers:      Number of total workers.
+    :param worker_number:      id of the executing worker.
+    :param session:            Database session in use.
+    :returns:                  The filtered query.
+    """
     if total_workers > 0:
         if session.bind.dialect.name == 'oracle':
             bindparams = [bindparam('worker_number', worker_number),
@@ -144,8 +175,7 @@ def get_updated_account_counters(total_workers, worker_number, session=None):
             query = query.filter('mod(md5(concat(account, rse_id)), %s) = %s' % (total_workers + 1, worker_number))
         elif session.bind.dialect.name == 'postgresql':
             query = query.filter('mod(abs((\'x\'||md5(concat(account, rse_id)))::bit(32)::int), %s) = %s' % (total_workers + 1, worker_number))
-
-    return query.all()
+    return query
 
 
 @transactional_session
@@ -172,3 +202,51 @@ def update_account_counter(account, rse_id, session=None):
 
     for update in updated_account_counters:
         update.delete(flush=False, session=session)
+
+
+@transactional_session
+def update_account_counters(total_workers, worker_number, limit=10000, session=None):
+    """
+    Apply a slice of the updated_account_counters of a worker to the account counters.
+
+    The database sums the slice per account and rse, and every account counter is then updated once.
+
+    :param total_workers:  Number of total workers.
+    :param worker_number:  id of the executing worker.
+    :param limit:          Maximum number of updated_account_counters in the slice.
+    :param session:        Database session in use.
+    :returns:              Number of updated_account_counters applied.
+    """
+
+    query = session.query(models.UpdatedAccountCounter.id)
+    ids = [id for id, in __filter_worker(query, total_workers=total_workers, worker_number=worker_number, session=session).limit(limit)]
+
+    deltas = {}  # {(account, rse_id): [files, bytes]}
+    for chunk in chunks(ids, 1000):
+        query = session.query(models.UpdatedAccountCounter.account,
+                              models.UpdatedAccountCounter.rse_id,
+                              func.sum(models.UpdatedAccountCounter.files),
+                              func.sum(models.UpdatedAccountCounter.bytes)).\
+            filter(models.UpdatedAccountCounter.id.in_(chunk)).\
+            group_by(models.UpdatedAccountCounter.account, models.UpdatedAccountCounter.rse_id)
+        for account, rse_id, files, bytes in query:
+            delta = deltas.setdefault((account, rse_id), [0, 0])
+            delta[0] += files or 0
+            delta[1] += bytes or 0
+
+    keys = deltas.keys()
+    for chunk in chunks(keys, 100):
+        counters = session.query(models.AccountUsage).\
+            filter(or_(*[and_(models.AccountUsage.account == account, models.AccountUsage.rse_id == rse_id) for account, rse_id in chunk])).all()
+        counters = dict(((counter.account, counter.rse_id), counter) for counter in counters)
+        for account, rse_id in chunk:
+            files, bytes = deltas[(account, rse_id)]
+            if (account, rse_id) in counters:
+                counters[(account, rse_id)].files += files
+                counters[(account, rse_id)].bytes += bytes
+            else:
+                models.AccountUsage(rse_id=rse_id, account=account, files=files, bytes=bytes).save(flush=False, session=session)
+
+    for chunk in chunks(ids, 1000):
+        session.query(models.UpdatedAccountCounter).filter(models.UpdatedAccountCounter.id.in_(chunk)).delete(synchronize_session=False)
+    return len(ids)
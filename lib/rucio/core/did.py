@@ -37,7 +37,7 @@ import rucio.core.replica  # import add_replicas
 
 from rucio.common import exception
 from rucio.common.config import config_get
-from rucio.common.utils import str_to_date
+from rucio.common.utils import chunks, str_to_date
 from rucio.core import account_counter, rse_counter
 from rucio.core.message import add_message
 from rucio.core.monitor import record_timer_block, record_counter
@@ -413,15 +413,12 @@ def delete_dids(dids, account, session=None):
     :param session: The database session in use.
     """
     rule_id_clause, content_clause = [], []
-    parent_content_clause, did_clause = [], []
-    collection_replica_clause, file_clause = [], []
+    parent_content_clause = []
+    collection_replica_clause = []
     not_purge_replicas = []
     for did in dids:
         logging.info('Removing did %(scope)s:%(name)s (%(did_type)s)' % did)
-        if did['did_type'] == DIDType.FILE:
-            file_clause.append(and_(models.DataIdentifier.scope == did['scope'], models.DataIdentifier.name == did['name']))
-        else:
-            did_clause.append(and_(models.DataIdentifier.scope == did['scope'], models.DataIdentifier.name == did['name']))
+        if did['did_type'] != DIDType.FILE:
             content_clause.append(and_(models.DataIdentifierAssociation.scope == did['scope'], models.DataIdentifierAssociation.name == did['name']))
             collection_replica_clause.append(and_(models.CollectionReplica.scope == did['scope'],
                                                   models.CollectionReplica.name == did['name']))
@@ -476,13 +473,22 @@ def delete_dids(dids, account, session=None):
                     purge_replicas = True
                 rucio.core.rule.delete_rule(rule_id=rule_id, purge_replicas=purge_replicas, delete_parent=True, nowait=True, session=session)
 
-    # Detach from parent dids:
-    existing_parent_dids = False
+    # Detach from parent dids, with one detach per parent. The content of the parents deleted here is removed below.
+    deleted_collections = set((did['scope'], did['name']) for did in dids if did['did_type'] != DIDType.FILE)
+    attached_dids = set()
     if parent_content_clause:
         with record_timer_block('undertaker.parent_content'):
-            for parent_did in session.query(models.DataIdentifierAssociation).filter(or_(*parent_content_clause)):
-                existing_parent_dids = True
-                detach_dids(scope=parent_did.scope, name=parent_did.name, dids=[{'scope': parent_did.child_scope, 'name': parent_did.child_name}], session=session)
+            parent_contents = {}
+            for scope, name, child_scope, child_name in session.query(models.DataIdentifierAssociation.scope,
+                                                                      models.DataIdentifierAssociation.name,
+                                                                      models.DataIdentifierAssociation.child_scope,
+                                                                      models.DataIdentifierAssociation.child_name).filter(or_(*parent_content_clause)):
+                if (scope, name) in deleted_collections:
+                    continue
+                attached_dids.add((child_scope, child_name))
+                parent_contents.setdefault((scope, name), []).append({'scope': child_scope, 'name': child_name})
+            for (scope, name), children in parent_contents.iteritems():
+                detach_dids(scope=scope, name=name, dids=children, session=session)
 
     # Remove content
     if content_clause:
@@ -498,10 +504,15 @@ def delete_dids(dids, account, session=None):
                 delete(synchronize_session=False)
 
     # remove data identifier
-    if existing_parent_dids:
-        # Exit method early to give Judge time to remove locks (Otherwise, due to foreign keys, did removal does not work
-        logging.debug('Leaving delete_dids early for Judge-Evaluator checks')
-        return
+    # The dids which were detached are kept to give Judge time to remove locks (Otherwise, due to foreign keys, did removal does not work)
+    did_clause, file_clause = [], []
+    for did in dids:
+        if (did['scope'], did['name']) in attached_dids:
+            logging.debug('Keeping did %(scope)s:%(name)s for Judge-Evaluator checks' % did)
+        elif did['did_type'] == DIDType.FILE:
+            file_clause.append(and_(models.DataIdentifier.scope == did['scope'], models.DataIdentifier.name == did['name']))
+        else:
+            did_clause.append(and_(models.DataIdentifier.scope == did['scope'], models.DataIdentifier.name == did['name']))
 
     if did_clause:
         with record_timer_block('undertaker.dids'):
@@ -1109,6 +1120,35 @@ def get_metadata(scope, name, session=None):
         raise exception.DataIdentifierNotFound("Data identifier '%(scope)s:%(name)s' not found" % locals())
 
 
+@stream_session
+def get_metadata_bulk(dids, chunk_size=1000, session=None):
+    """
+    Get the metadata of a list of data identifiers.
+
+    The names are queried per scope with IN queries of chunk_size names.
+    Data identifiers which do not exist are skipped.
+
+    :param dids: The list of data identifiers, as dictionaries with scope and name.
+    :param chunk_size: The number of names per query.
+    :param session: The database session in use.
+    :returns: Generator of the metadata dictionaries.
+    """
+    names_per_scope = {}
+    for did in dids:
+        names_per_scope.setdefault(did['scope'], set()).add(did['name'])
+
+    for scope, names in names_per_scope.iteritems():
+        for chunk in chunks(list(names), chunk_size):
+            query = session.query(models.DataIdentifier).\
+                with_hint(models.DataIdentifier, "INDEX(DIDS DIDS_PK)", 'oracle').\
+                filter(models.DataIdentifier.scope == scope, models.DataIdentifier.name.in_(chunk))
+            for row in query:
+                d = {}
+                for column in row.__table__.columns:
+                    d[column.name] = getattr(row, column.name)
+                yield d
+
+
 @transactional_session
 def set_status(scope, name, session=None, **kwargs):
     """
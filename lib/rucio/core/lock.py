@@ -25,6 +25,7 @@ import rucio.core.did
 
 from rucio.common.config import config_get
 from rucio.common.policy import define_eol
+from rucio.common.utils import chunks
 from rucio.core.rse import get_rse_name, get_rse_id
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import LockState, RuleState, RuleGrouping, DIDType, RuleNotification
@@ -364,6 +365,211 @@ def failed_transfer(scope, name, rse_id, error_message=None, broken_rule_id=None
         rucio.core.rule.insert_rule_history(rule=rule, recent=True, longterm=False, session=session)
 
 
+def __get_locks_of_files(files, nowait, session, chunk_size=500):
+    """
+    Select for update the replica locks of a list of files, in one query per RSE and chunk.
+
+    :param files:       List of dictionaries with scope, name and rse_id.
+    :param nowait:      Nowait parameter for the for_update queries.
+    :param session:     The database session in use.
+    :param chunk_size:  Number of files per query.
+    :returns:           List of (scope, name, rse_id, rule_id, state) tuples.
+    """
+    files_by_rse = {}
+    for file in files:
+        files_by_rse.setdefault(file['rse_id'], set()).add((file['scope'], file['name']))
+
+    locks = []
+    for rse_id, dids in files_by_rse.iteritems():
+        for chunk in chunks(list(dids), chunk_size):
+            file_clause = [and_(models.ReplicaLock.scope == scope, models.ReplicaLock.name == name) for scope, name in chunk]
+            query = session.query(models.ReplicaLock.scope,
+                                  models.ReplicaLock.name,
+                                  models.ReplicaLock.rse_id,
+                                  models.ReplicaLock.rule_id,
+                                  models.ReplicaLock.state).\
+                with_for_update(nowait=nowait).\
+                filter(models.ReplicaLock.rse_id == rse_id).\
+                filter(or_(*file_clause))
+            locks.extend(query.all())
+    return locks
+
+
+def __set_locks_state(locks, state, session, chunk_size=500):
+    """
+    Update the state of replica locks with one statement per rule, RSE and chunk.
+
+    :param locks:       List of (scope, name, rse_id, rule_id) tuples.
+    :param state:       The new LockState.
+    :param session:     The database session in use.
+    :param chunk_size:  Number of locks per statement.
+    """
+    dids = {}
+    for scope, name, rse_id, rule_id in locks:
+        dids.setdefault((rule_id, rse_id), []).append((scope, name))
+
+    for (rule_id, rse_id), rule_dids in dids.iteritems():
+        for chunk in chunks(rule_dids, chunk_size):
+            file_clause = [and_(models.ReplicaLock.scope == scope, models.ReplicaLock.name == name) for scope, name in chunk]
+            session.query(models.ReplicaLock).\
+                filter(models.ReplicaLock.rule_id == rule_id, models.ReplicaLock.rse_id == rse_id).\
+                filter(or_(*file_clause)).\
+                update({'state': state}, synchronize_session=False)
+
+
+def __get_rules(rule_ids, nowait, session, chunk_size=500):
+    """
+    Select for update a list of rules.
+
+    :param rule_ids:    List of rule ids.
+    :param nowait:      Nowait parameter for the for_update queries.
+    :param session:     The database session in use.
+    :param chunk_size:  Number of rules per query.
+    :returns:           Dictionary rule_id: ReplicationRule.
+    """
+    rules = {}
+    for chunk in chunks(list(rule_ids), chunk_size):
+        for rule in session.query(models.ReplicationRule).with_for_update(nowait=nowait).filter(models.ReplicationRule.id.in_(chunk)):
+            rules[rule.id] = rule
+    return rules
+
+
+@transactional_session
+def successful_transfers(files, nowait, session=None):
+    """
+    Bulk version of successful_transfer.
+
+    The locks are read and updated with one statement per RSE and rule, the rule
+    counters are changed once per rule and the rule state is evaluated after all
+    locks of the rule have been counted.
+
+    :param files:    List of dictionaries with scope, name and rse_id.
+    :param nowait:   Nowait parameter for the for_update queries.
+    :param session:  DB Session.
+    """
+
+    locks_by_rule = {}
+    for scope, name, rse_id, rule_id, state in __get_locks_of_files(files, nowait=nowait, session=session):
+        if state != LockState.OK:
+            locks_by_rule.setdefault(rule_id, []).append((scope, name, rse_id, state))
+    if not locks_by_rule:
+        return
+
+    rules = __get_rules(locks_by_rule.keys(), nowait=nowait, session=session)
+    collection_replicas = set()
+    for rule_id, locks in locks_by_rule.iteritems():
+        rule = rules[rule_id]
+        logging.debug('Marking %d locks for rule %s as OK [%d/%d/%d]' % (len(locks), str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
+        for scope, name, rse_id, state in locks:
+            if state == LockState.REPLICATING:
+                rule.locks_replicating_cnt -= 1
+            elif state == LockState.STUCK:
+                rule.locks_stuck_cnt -= 1
+            rule.locks_ok_cnt += 1
+        logging.debug('Finished updating rule counters for rule %s [%d/%d/%d]' % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
+
+        # Insert UpdatedCollectionReplica, once per collection and RSE
+        rse_ids = set(rse_id for _, _, rse_id, _ in locks)
+        if rule.did_type == DIDType.DATASET:
+            collection_replicas.update((rule.scope, rule.name, rule.did_type, rse_id) for rse_id in rse_ids)
+        elif rule.did_type == DIDType.CONTAINER:
+            # Resolve to all child datasets
+            for dataset in rucio.core.did.list_child_datasets(scope=rule.scope, name=rule.name, session=session):
+                collection_replicas.update((dataset['scope'], dataset['name'], dataset['type'], rse_id) for rse_id in rse_ids)
+
+        # Update the rule state
+        if (rule.state == RuleState.SUSPENDED):
+            pass
+        elif (rule.locks_stuck_cnt > 0):
+            pass
+        elif (rule.locks_replicating_cnt == 0 and rule.state == RuleState.REPLICATING):
+            rule.state = RuleState.OK
+            # Try to update the DatasetLocks
+            if rule.grouping != RuleGrouping.NONE:
+                session.query(models.DatasetLock).filter_by(rule_id=rule.id).update({'state': LockState.OK}, synchronize_session=False)
+                session.flush()
+                rucio.core.rule.generate_message_for_dataset_ok_callback(rule=rule, session=session)
+            if rule.notification == RuleNotification.YES:
+                rucio.core.rule.generate_email_for_rule_ok_notification(rule=rule, session=session)
+            # Try to release potential parent rules
+            rucio.core.rule.release_parent_rule(child_rule_id=rule.id, session=session)
+
+        # Insert rule history
+        rucio.core.rule.insert_rule_history(rule=rule, recent=True, longterm=False, session=session)
+
+    __set_locks_state([(scope, name, rse_id, rule_id) for rule_id, locks in locks_by_rule.iteritems() for scope, name, rse_id, _ in locks],
+                      LockState.OK, session=session)
+    if collection_replicas:
+        session.bulk_insert_mappings(models.UpdatedCollectionReplica,
+                                     [{'scope': scope, 'name': name, 'did_type': did_type, 'rse_id': rse_id}
+                                      for scope, name, did_type, rse_id in collection_replicas])
+    session.flush()
+
+
+@transactional_session
+def failed_transfers(files, nowait=True, session=None):
+    """
+    Bulk version of failed_transfer.
+
+    The locks are read and updated with one statement per RSE and rule, the rule
+    counters are changed once per rule and the rule state is evaluated after all
+    locks of the rule have been counted. The error of the rule is the one of its last file.
+
+    :param files:    List of dictionaries with scope, name, rse_id and optionally error_message, broken_rule_id and broken_message.
+    :param nowait:   Nowait parameter for the for_update queries.
+    :param session:  The database session in use.
+    """
+
+    files_by_key = dict(((file['scope'], file['name'], file['rse_id']), file) for file in files)
+    locks_by_rule = {}
+    for scope, name, rse_id, rule_id, state in __get_locks_of_files(files, nowait=nowait, session=session):
+        if state != LockState.STUCK:
+            locks_by_rule.setdefault(rule_id, []).append((scope, name, rse_id, state))
+    if not locks_by_rule:
+        return
+
+    rules = __get_rules(locks_by_rule.keys(), nowait=nowait, session=session)
+    for rule_id, locks in locks_by_rule.iteritems():
+        rule = rules[rule_id]
+        logging.debug('Marking %d locks for rule %s as STUCK [%d/%d/%d]' % (len(locks), str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
+        error_message, broken_message = None, None
+        for scope, name, rse_id, state in locks:
+            if state == LockState.REPLICATING:
+                rule.locks_replicating_cnt -= 1
+            elif state == LockState.OK:
+                rule.locks_ok_cnt -= 1
+            rule.locks_stuck_cnt += 1
+            file = files_by_key[(scope, name, rse_id)]
+            error_message = file.get('error_message') or error_message
+            if file.get('broken_rule_id') == rule_id:
+                broken_message = file.get('broken_message') or ''
+        logging.debug('Finished updating rule counters for rule %s [%d/%d/%d]' % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
+
+        # Update the rule state
+        if rule.state == RuleState.SUSPENDED:
+            pass
+        elif broken_message is not None:
+            rule.state = RuleState.SUSPENDED
+            rule.error = (broken_message[:245] + '...') if len(broken_message) > 245 else broken_message
+            # Try to update the DatasetLocks
+            if rule.grouping != RuleGrouping.NONE:
+                session.query(models.DatasetLock).filter_by(rule_id=rule.id).update({'state': LockState.STUCK}, synchronize_session=False)
+        elif rule.locks_stuck_cnt > 0:
+            if rule.state != RuleState.STUCK:
+                rule.state = RuleState.STUCK
+                # Try to update the DatasetLocks
+                if rule.grouping != RuleGrouping.NONE:
+                    session.query(models.DatasetLock).filter_by(rule_id=rule.id).update({'state': LockState.STUCK}, synchronize_session=False)
+            if error_message and rule.error != error_message:
+                rule.error = (error_message[:245] + '...') if len(error_message) > 245 else error_message
+
+        # Insert rule history
+        rucio.core.rule.insert_rule_history(rule=rule, recent=True, longterm=False, session=session)
+
+    __set_locks_state([(scope, name, rse_id, rule_id) for rule_id, locks in locks_by_rule.iteritems() for scope, name, rse_id, _ in locks],
+                      LockState.STUCK, session=session)
+
+
 @transactional_session
 def touch_dataset_locks(dataset_locks, session=None):
     """
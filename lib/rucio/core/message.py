@@ -14,9 +14,10 @@ import json
 import re
 
 from sqlalchemy.exc import DatabaseError, IntegrityError
-from sqlalchemy.sql.expression import bindparam, text
+from sqlalchemy.sql.expression import bindparam, select, text
 
 from rucio.common.exception import InvalidObject, RucioException
+from rucio.common.utils import chunks
 from rucio.db.sqla.models import Message, MessageHistory
 from rucio.db.sqla.session import transactional_session
 
@@ -95,25 +96,31 @@ def retrieve_messages(bulk=1000, thread=None, total_threads=None, event_type=Non
 
 
 @transactional_session
-def delete_messages(ids, session=None):
+def delete_messages(ids, chunk_size=500, session=None):
     """
     Delete all messages with the given IDs, and archive them to the history.
 
+    The messages are copied to the history with INSERT ... SELECT and removed
+    with DELETE ... WHERE id IN (...), both in chunks of chunk_size ids.
+
     :param ids: The message IDs, as a list of strings.
+    :param chunk_size: Number of ids per statement.
+    :param session: The database session to use.
+
+    :returns: The number of deleted messages.
     """
 
+    columns = ['id', 'created_at', 'updated_at', 'event_type', 'payload']
+    deleted = 0
     try:
-        for id in ids:
-            m = session.query(Message).filter_by(id=id).one()
-            m_prime = MessageHistory(id=m['id'],
-                                     created_at=m['created_at'],
-                                     updated_at=m['updated_at'],
-                                     payload=m['payload'],
-                                     event_type=m['event_type'])
-            m_prime.save(session=session)
-            session.query(Message).filter_by(id=id).delete(synchronize_session=False)
+        for chunk in chunks(list(set(ids)), chunk_size):
+            archive = MessageHistory.__table__.insert().from_select(columns,
+                                                                    select([Message.__table__.c[column] for column in columns]).where(Message.id.in_(chunk)))
+            session.execute(archive)
+            deleted += session.query(Message).filter(Message.id.in_(chunk)).delete(synchronize_session=False)
     except IntegrityError, e:
         raise RucioException(e.args)
+    return deleted
 
 
 @transactional_session
@@ -8,8 +8,12 @@
 # - Vincent Garonne, <vincent.garonne@cern.ch>, 2016
 
 from ConfigParser import NoOptionError, NoSectionError
+from threading import Lock
+from time import time
 
 from rucio.common import config
+from rucio.core.account import get_account_attributes_version
+from rucio.core.monitor import record_counter
 
 if config.config_has_section('permission'):
 
@@ -26,3 +30,83 @@ if config.config_has_section('permission'):
         from rucio.core.permission.generic import *  # NOQA
 else:
     from rucio.core.permission.generic import *  # NOQA
+
+# The decisions of the CACHED_ACTIONS of the policy are memoized per process for DECISION_CACHE_TTL seconds, 0 disables the cache.
+# They are keyed by issuer, action and arguments, so only calls with scalar arguments are cached.
+try:
+    DECISION_CACHE_TTL = config.config_get_int('permission', 'decision_cache_ttl')
+except (NoOptionError, NoSectionError):
+    DECISION_CACHE_TTL = 10
+DECISION_CACHE_SIZE = 100000
+DECISION_CACHE_STATS = {'hits': 0, 'misses': 0}
+
+__DECISIONS = {}  # {(issuer, action, arguments): (expires_at, account attributes version, decision)}
+__DECISIONS_LOCK = Lock()
+__has_permission = has_permission  # NOQA
+
+
+def __decision_key(issuer, action, kwargs):
+    """
+    Get the key of a decision, or None if the decision cannot be cached.
+
+    :param issuer: Account identifier which issues the command.
+    :param action: The action (API call) called by the account.
+    :param kwargs: List of arguments for the action.
+    :returns: The key, or None.
+    """
+    if not DECISION_CACHE_TTL or action not in CACHED_ACTIONS:  # NOQA
+        return None
+    arguments = []
+    for key, value in kwargs.iteritems():
+        if value is not None and not isinstance(value, (basestring, bool, int, long, float)):
+            return None
+        arguments.append((key, value))
+    return issuer, action, frozenset(arguments)
+
+
+def has_permission(issuer, action, kwargs):
+    """
+    Checks if an account has the specified permission to
+    execute an action with parameters, using the decisions memoized by this process.
+
+    :param issuer: Account identifier which issues the command.
+    :param action: The action (API call) called by the account.
+    :param kwargs: List of arguments for the action.
+    :returns: True if account is allowed, otherwise False
+    """
+    key = __decision_key(issuer, action, kwargs)
+    if key is None:
+        return __has_permission(issuer=issuer, action=action, kwargs=kwargs)
+
+    version = get_account_attributes_version()
+    decision = __DECISIONS.get(key)
+    if decision is not None and decision[0] > time() and decision[1] == version:
+        DECISION_CACHE_STATS['hits'] += 1
+        record_counter('permission.decision_cache.hits')
+        return decision[2]
+
+    DECISION_CACHE_STATS['misses'] += 1
+    record_counter('permission.decision_cache.misses')
+    allowed = __has_permission(issuer=issuer, action=action, kwargs=kwargs)
+    with __DECISIONS_LOCK:
+        if len(__DECISIONS) >= DECISION_CACHE_SIZE:
+            __DECISIONS.clear()
+        __DECISIONS[key] = (time() + DECISION_CACHE_TTL, version, allowed)
+    return allowed
+
+
+def get_decision_cache_stats():
+    """
+    Get the number of decisions served from the cache and evaluated by this process.
+
+    :returns: Dictionary {'hits':, 'misses':}.
+    """
+    return dict(DECISION_CACHE_STATS)
+
+
+def clear_decision_cache():
+    """
+    Drop all the memoized decisions.
+    """
+    with __DECISIONS_LOCK:
+        __DECISIONS.clear()
@@ -11,8 +11,8 @@
 
 import rucio.core.authentication
 import rucio.core.scope
-from rucio.core.account import list_account_attributes, has_account_attribute
-from rucio.core.rse import list_rse_attributes
+from rucio.core.account import list_cached_account_attributes, has_cached_account_attribute
+from rucio.core.rse import list_cached_rse_attributes
 from rucio.db.sqla.constants import IdentityType
 
 
@@ -26,69 +26,7 @@ def has_permission(issuer, action, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    perm = {'add_account': perm_add_account,
-            'del_account': perm_del_account,
-            'set_account_status': perm_set_account_status,
-            'add_rule': perm_add_rule,
-            'add_subscription': perm_add_subscription,
-            'add_scope': perm_add_scope,
-            'add_rse': perm_add_rse,
-            'update_rse': perm_update_rse,
-            'add_protocol': perm_add_protocol,
-            'del_protocol': perm_del_protocol,
-            'update_protocol': perm_update_protocol,
-            'declare_bad_file_replicas': perm_declare_bad_file_replicas,
-            'declare_suspicious_file_replicas': perm_declare_suspicious_file_replicas,
-            'add_replicas': perm_add_replicas,
-            'delete_replicas': perm_delete_replicas,
-            'skip_availability_check': perm_skip_availability_check,
-            'update_replicas_states': perm_update_replicas_states,
-            'add_rse_attribute': perm_add_rse_attribute,
-            'del_rse_attribute': perm_del_rse_attribute,
-            'del_rse': perm_del_rse,
-            'del_rule': perm_del_rule,
-            'update_rule': perm_update_rule,
-            'approve_rule': perm_approve_rule,
-            'update_subscription': perm_update_subscription,
-            'reduce_rule': perm_reduce_rule,
-            'get_auth_token_user_pass': perm_get_auth_token_user_pass,
-            'get_auth_token_gss': perm_get_auth_token_gss,
-            'get_auth_token_x509': perm_get_auth_token_x509,
-            'add_account_identity': perm_add_account_identity,
-            'add_did': perm_add_did,
-            'add_dids': perm_add_dids,
-            'attach_dids': perm_attach_dids,
-            'detach_dids': perm_detach_dids,
-            'attach_dids_to_dids': perm_attach_dids_to_dids,
-            'create_did_sample': perm_create_did_sample,
-            'set_metadata': perm_set_metadata,
-            'set_status': perm_set_status,
-            'queue_requests': perm_queue_requests,
-            'set_rse_usage': perm_set_rse_usage,
-            'set_rse_limits': perm_set_rse_limits,
-            'query_request': perm_query_request,
-            'get_request_by_did': perm_get_request_by_did,
-            'cancel_request': perm_cancel_request,
-            'get_next': perm_get_next,
-            'set_account_limit': perm_set_account_limit,
-            'delete_account_limit': perm_delete_account_limit,
-            'config_sections': perm_config,
-            'config_add_section': perm_config,
-            'config_has_section': perm_config,
-            'config_options': perm_config,
-            'config_has_option': perm_config,
-            'config_get': perm_config,
-            'config_items': perm_config,
-            'config_set': perm_config,
-            'config_remove_section': perm_config,
-            'config_remove_option': perm_config,
-            'get_account_usage': perm_get_account_usage,
-            'add_attribute': perm_add_account_attribute,
-            'del_attribute': perm_del_account_attribute,
-            'list_heartbeats': perm_list_heartbeats,
-            'resurrect': perm_resurrect}
-
-    return perm.get(action, perm_default)(issuer=issuer, kwargs=kwargs)
+    return PERMISSIONS.get(action, perm_default)(issuer=issuer, kwargs=kwargs)
 
 
 def perm_default(issuer, kwargs):
@@ -99,7 +37,7 @@ def perm_default(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_add_rse(issuer, kwargs):
@@ -110,7 +48,7 @@ def perm_add_rse(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_update_rse(issuer, kwargs):
@@ -121,7 +59,7 @@ def perm_update_rse(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_add_rule(issuer, kwargs):
@@ -134,7 +72,7 @@ def perm_add_rule(issuer, kwargs):
     """
     if kwargs['account'] == issuer and not kwargs['locked']:
         return True
-    if issuer == 'root' or has_account_attribute(account=issuer, key='admin'):
+    if issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin'):
         return True
     return False
 
@@ -147,7 +85,7 @@ def perm_add_subscription(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    if issuer == 'root' or has_account_attribute(account=issuer, key='admin'):
+    if issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin'):
         return True
     return False
 
@@ -160,7 +98,7 @@ def perm_add_rse_attribute(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    if issuer == 'root' or has_account_attribute(account=issuer, key='admin'):
+    if issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin'):
         return True
     return False
 
@@ -173,7 +111,7 @@ def perm_del_rse_attribute(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    if issuer == 'root' or has_account_attribute(account=issuer, key='admin'):
+    if issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin'):
         return True
     return False
 
@@ -186,7 +124,7 @@ def perm_del_rse(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_add_account(issuer, kwargs):
@@ -219,7 +157,7 @@ def perm_set_account_status(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_add_scope(issuer, kwargs):
@@ -293,13 +231,13 @@ def perm_add_did(issuer, kwargs):
     :returns: True if account is allowed, otherwise False
     """
     # Check the accounts of the issued rules
-    if issuer != 'root' and not has_account_attribute(account=issuer, key='admin'):
+    if issuer != 'root' and not has_cached_account_attribute(account=issuer, key='admin'):
         for rule in kwargs.get('rules', []):
             if rule['account'] != issuer:
                 return False
 
     return issuer == 'root'\
-        or has_account_attribute(account=issuer, key='admin')\
+        or has_cached_account_attribute(account=issuer, key='admin')\
         or rucio.core.scope.is_scope_owner(scope=kwargs['scope'], account=issuer)\
         or kwargs['scope'] == u'mock'
 
@@ -313,13 +251,13 @@ def perm_add_dids(issuer, kwargs):
     :returns: True if account is allowed, otherwise False
     """
     # Check the accounts of the issued rules
-    if issuer != 'root' and not has_account_attribute(account=issuer, key='admin'):
+    if issuer != 'root' and not has_cached_account_attribute(account=issuer, key='admin'):
         for did in kwargs['dids']:
             for rule in did.get('rules', []):
                 if rule['account'] != issuer:
                     return False
 
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_attach_dids(issuer, kwargs):
@@ -331,7 +269,7 @@ def perm_attach_dids(issuer, kwargs):
     :returns: True if account is allowed, otherwise False
     """
     return issuer == 'root'\
-        or has_account_attribute(account=issuer, key='admin')\
+        or has_cached_account_attribute(account=issuer, key='admin')\
         or rucio.core.scope.is_scope_owner(scope=kwargs['scope'], account=issuer)\
         or kwargs['scope'] == 'mock'
 
@@ -344,7 +282,7 @@ def perm_attach_dids_to_dids(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    if issuer == 'root' or has_account_attribute(account=issuer, key='admin'):
+    if issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin'):
         return True
     else:
         attachments = kwargs['attachments']
@@ -365,7 +303,7 @@ def perm_create_did_sample(issuer, kwargs):
     :returns: True if account is allowed, otherwise False
     """
     return issuer == 'root'\
-        or has_account_attribute(account=issuer, key='admin')\
+        or has_cached_account_attribute(account=issuer, key='admin')\
         or rucio.core.scope.is_scope_owner(scope=kwargs['scope'], account=issuer)\
         or kwargs['scope'] == 'mock'
 
@@ -378,7 +316,7 @@ def perm_del_rule(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed to call the API call, otherwise False
     """
-    if issuer == 'root' or has_account_attribute(account=issuer, key='admin'):
+    if issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin'):
         return True
     return False
 
@@ -391,7 +329,7 @@ def perm_update_rule(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed to call the API call, otherwise False
     """
-    if issuer == 'root' or has_account_attribute(account=issuer, key='admin'):
+    if issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin'):
         return True
     return False
 
@@ -404,7 +342,7 @@ def perm_approve_rule(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed to call the API call, otherwise False
     """
-    if issuer == 'root' or has_account_attribute(account=issuer, key='admin'):
+    if issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin'):
         return True
     return False
 
@@ -417,7 +355,7 @@ def perm_reduce_rule(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed to call the API call, otherwise False
     """
-    if issuer == 'root' or has_account_attribute(account=issuer, key='admin'):
+    if issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin'):
         return True
     return False
 
@@ -430,7 +368,7 @@ def perm_update_subscription(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    if issuer == 'root' or has_account_attribute(account=issuer, key='admin'):
+    if issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin'):
         return True
 
     return False
@@ -455,7 +393,7 @@ def perm_set_metadata(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin') or rucio.core.scope.is_scope_owner(scope=kwargs['scope'], account=issuer)
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin') or rucio.core.scope.is_scope_owner(scope=kwargs['scope'], account=issuer)
 
 
 def perm_set_status(issuer, kwargs):
@@ -467,10 +405,10 @@ def perm_set_status(issuer, kwargs):
     :returns: True if account is allowed, otherwise False
     """
     if kwargs.get('open', False):
-        if issuer != 'root' and not has_account_attribute(account=issuer, key='admin'):
+        if issuer != 'root' and not has_cached_account_attribute(account=issuer, key='admin'):
             return False
 
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin') or rucio.core.scope.is_scope_owner(scope=kwargs['scope'], account=issuer)
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin') or rucio.core.scope.is_scope_owner(scope=kwargs['scope'], account=issuer)
 
 
 def perm_add_protocol(issuer, kwargs):
@@ -481,7 +419,7 @@ def perm_add_protocol(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_del_protocol(issuer, kwargs):
@@ -492,7 +430,7 @@ def perm_del_protocol(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_update_protocol(issuer, kwargs):
@@ -503,7 +441,7 @@ def perm_update_protocol(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_declare_bad_file_replicas(issuer, kwargs):
@@ -514,8 +452,8 @@ def perm_declare_bad_file_replicas(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    is_cloud_admin = bool(filter(lambda x: (x['key'].startswith('cloud-')) and (x['value'] == 'admin'), list_account_attributes(account=issuer)))
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin') or is_cloud_admin
+    is_cloud_admin = bool(filter(lambda x: (x['key'].startswith('cloud-')) and (x['value'] == 'admin'), list_cached_account_attributes(account=issuer)))
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin') or is_cloud_admin
 
 
 def perm_declare_suspicious_file_replicas(issuer, kwargs):
@@ -542,7 +480,7 @@ def perm_add_replicas(issuer, kwargs):
         or str(kwargs.get('rse', '')).endswith('MOCK')\
         or str(kwargs.get('rse', '')).endswith('LOCALGROUPDISK')\
         or issuer == 'root'\
-        or has_account_attribute(account=issuer, key='admin')
+        or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_skip_availability_check(issuer, kwargs):
@@ -553,7 +491,7 @@ def perm_skip_availability_check(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_delete_replicas(issuer, kwargs):
@@ -575,7 +513,7 @@ def perm_update_replicas_states(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_queue_requests(issuer, kwargs):
@@ -652,7 +590,7 @@ def perm_set_rse_limits(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed to call the API call, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_set_account_limit(issuer, kwargs):
@@ -663,14 +601,14 @@ def perm_set_account_limit(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    if issuer == 'root' or has_account_attribute(account=issuer, key='admin'):
+    if issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin'):
         return True
     # Check if user is a country admin
     admin_in_country = []
-    for kv in list_account_attributes(account=issuer):
+    for kv in list_cached_account_attributes(account=issuer):
         if kv['key'].startswith('country-') and kv['value'] == 'admin':
             admin_in_country.append(kv['key'].partition('-')[2])
-    if admin_in_country and list_rse_attributes(rse=kwargs['rse'], rse_id=None).get('country') in admin_in_country:
+    if admin_in_country and list_cached_rse_attributes(rse=kwargs['rse'], rse_id=None).get('country') in admin_in_country:
         return True
     return False
 
@@ -683,14 +621,14 @@ def perm_delete_account_limit(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    if issuer == 'root' or has_account_attribute(account=issuer, key='admin'):
+    if issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin'):
         return True
     # Check if user is a country admin
     admin_in_country = []
-    for kv in list_account_attributes(account=issuer):
+    for kv in list_cached_account_attributes(account=issuer):
         if kv['key'].startswith('country-') and kv['value'] == 'admin':
             admin_in_country.append(kv['key'].partition('-')[2])
-    if admin_in_country and list_rse_attributes(rse=kwargs['rse'], rse_id=None).get('country') in admin_in_country:
+    if admin_in_country and list_cached_rse_attributes(rse=kwargs['rse'], rse_id=None).get('country') in admin_in_country:
         return True
     return False
 
@@ -703,7 +641,7 @@ def perm_config(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed to call the API call, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_get_account_usage(issuer, kwargs):
@@ -714,10 +652,10 @@ def perm_get_account_usage(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed, otherwise False
     """
-    if issuer == 'root' or has_account_attribute(account=issuer, key='admin') or kwargs.get('account') == issuer:
+    if issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin') or kwargs.get('account') == issuer:
         return True
     # Check if user is a country admin
-    for kv in list_account_attributes(account=issuer):
+    for kv in list_cached_account_attributes(account=issuer):
         if kv['key'].startswith('country-') and kv['value'] == 'admin':
             return True
     return False
@@ -731,7 +669,7 @@ def perm_add_account_attribute(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed to call the API call, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
 
 
 def perm_del_account_attribute(issuer, kwargs):
@@ -764,4 +702,79 @@ def perm_resurrect(issuer, kwargs):
     :param kwargs: List of arguments for the action.
     :returns: True if account is allowed to call the API call, otherwise False
     """
-    return issuer == 'root' or has_account_attribute(account=issuer, key='admin')
+    return issuer == 'root' or has_cached_account_attribute(account=issuer, key='admin')
+
+
+# The dispatch table of the actions, built once the checks are defined
+PERMISSIONS = {'add_account': perm_add_account,
+               'del_account': perm_del_account,
+               'set_account_status': perm_set_account_status,
+               'add_rule': perm_add_rule,
+               'add_subscription': perm_add_subscription,
+               'add_scope': perm_add_scope,
+               'add_rse': perm_add_rse,
+               'update_rse': perm_update_rse,
+               'add_protocol': perm_add_protocol,
+               'del_protocol': perm_del_protocol,
+               'update_protocol': perm_update_protocol,
+               'declare_bad_file_replicas': perm_declare_bad_file_replicas,
+               'declare_suspicious_file_replicas': perm_declare_suspicious_file_replicas,
+               'add_replicas': perm_add_replicas,
+               'delete_replicas': perm_delete_replicas,
+               'skip_availability_check': perm_skip_availability_check,
+               'update_replicas_states': perm_update_replicas_states,
+               'add_rse_attribute': perm_add_rse_attribute,
+               'del_rse_attribute': perm_del_rse_attribute,
+               'del_rse': perm_del_rse,
+               'del_rule': perm_del_rule,
+               'update_rule': perm_update_rule,
+               'approve_rule': perm_approve_rule,
+               'update_subscription': perm_update_subscription,
+               'reduce_rule': perm_reduce_rule,
+               'get_auth_token_user_pass': perm_get_auth_token_user_pass,
+               'get_auth_token_gss': perm_get_auth_token_gss,
+               'get_auth_token_x509': perm_get_auth_token_x509,
+               'add_account_identity': perm_add_account_identity,
+               'add_did': perm_add_did,
+               'add_dids': perm_add_dids,
+               'attach_dids': perm_attach_dids,
+               'detach_dids': perm_detach_dids,
+               'attach_dids_to_dids': perm_attach_dids_to_dids,
+               'create_did_sample': perm_create_did_sample,
+               'set_metadata': perm_set_metadata,
+               'set_status': perm_set_status,
+               'queue_requests': perm_queue_requests,
+               'set_rse_usage': perm_set_rse_usage,
+               'set_rse_limits': perm_set_rse_limits,
+               'query_request': perm_query_request,
+               'get_request_by_did': perm_get_request_by_did,
+               'cancel_request': perm_cancel_request,
+               'get_next': perm_get_next,
+               'set_account_limit': perm_set_account_limit,
+               'delete_account_limit': perm_delete_account_limit,
+               'config_sections': perm_config,
+               'config_add_section': perm_config,
+               'config_has_section': perm_config,
+               'config_options': perm_config,
+               'config_has_option': perm_config,
+               'config_get': perm_config,
+               'config_items': perm_config,
+               'config_set': perm_config,
+               'config_remove_section': perm_config,
+               'config_remove_option': perm_config,
+               'get_account_usage': perm_get_account_usage,
+               'add_attribute': perm_add_account_attribute,
+               'del_attribute': perm_del_account_attribute,
+               'list_heartbeats': perm_list_heartbeats,
+               'resurrect': perm_resurrect}
+
+# The actions whose decision only depends on the issuer, the arguments and the account attributes,
+# which the permission module may memoize. The checks of the other actions read mutable state like ownerships.
+CACHED_ACTIONS = frozenset(['add_account', 'del_account', 'set_account_status', 'add_rule', 'add_subscription', 'add_scope', 'add_rse', 'update_rse',
+                            'add_protocol', 'del_protocol', 'update_protocol', 'declare_bad_file_replicas', 'declare_suspicious_file_replicas',
+                            'add_replicas', 'delete_replicas', 'skip_availability_check', 'update_replicas_states', 'add_rse_attribute',
+                            'del_rse_attribute', 'del_rse', 'del_rule', 'update_rule', 'approve_rule', 'update_subscription', 'reduce_rule',
+                            'add_account_identity', 'add_dids', 'queue_requests', 'set_rse_usage', 'set_rse_limits', 'query_request',
+                            'get_request_by_did', 'cancel_request', 'get_next', 'config_sections', 'config_add_section', 'config_has_section',
+                            'config_options', 'config_has_option', 'config_get', 'config_items', 'config_set', 'config_remove_section',
+                            'config_remove_option', 'get_account_usage', 'add_attribute', 'del_attribute', 'list_heartbeats', 'resurrect'])
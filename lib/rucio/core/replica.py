@@ -1297,6 +1297,77 @@ def update_replicas_states(replicas, nowait=False, session=None):
     return True
 
 
+@transactional_session
+def bulk_update_replicas_states(replicas, nowait=False, session=None):
+    """
+    Set-based version of update_replicas_states for AVAILABLE and UNAVAILABLE replicas.
+
+    The replicas are grouped by RSE and state: their existence is checked and their
+    state is changed with one statement per group and chunk, and the locks and rules
+    are updated with lock.successful_transfers and lock.failed_transfers. Paths are
+    set with a single executemany. Other states go through update_replicas_states.
+
+    :param replicas: The list of replicas.
+    :param nowait:   Nowait parameter for the for_update queries.
+    :param session:  The database session in use.
+    """
+    rse_ids, groups, others, paths = {}, {}, [], []
+    for replica in replicas:
+        if 'rse_id' not in replica:
+            if replica['rse'] not in rse_ids:
+                rse_ids[replica['rse']] = get_rse_id(rse=replica['rse'], session=session)
+            replica['rse_id'] = rse_ids[replica['rse']]
+
+        if isinstance(replica['state'], str) or isinstance(replica['state'], unicode):
+            replica['state'] = ReplicaState.from_string(replica['state'])
+
+        if replica['state'] not in (ReplicaState.AVAILABLE, ReplicaState.UNAVAILABLE):
+            others.append(replica)
+            continue
+        groups.setdefault((replica['rse_id'], replica['state']), []).append(replica)
+        if replica.get('path'):
+            paths.append({'b_rse_id': replica['rse_id'], 'b_scope': replica['scope'], 'b_name': replica['name'], 'b_path': replica['path']})
+
+    for (rse_id, state), rse_replicas in groups.iteritems():
+        for chunk in chunks(rse_replicas, 500):
+            file_clause = [and_(models.RSEFileAssociation.scope == replica['scope'], models.RSEFileAssociation.name == replica['name']) for replica in chunk]
+            query = session.query(models.RSEFileAssociation.scope, models.RSEFileAssociation.name).\
+                with_hint(models.RSEFileAssociation, "index(REPLICAS REPLICAS_PK)", 'oracle').\
+                filter(models.RSEFileAssociation.rse_id == rse_id).\
+                filter(or_(*file_clause))
+            if nowait:
+                query = query.with_for_update(nowait=True)
+            found = set(query.all())
+            for replica in chunk:
+                if (replica['scope'], replica['name']) not in found:
+                    raise exception.ReplicaNotFound("No row found for scope: %s name: %s rse_id: %s" % (replica['scope'], replica['name'], rse_id))
+
+        if state == ReplicaState.AVAILABLE:
+            rucio.core.lock.successful_transfers(rse_replicas, nowait=nowait, session=session)
+        else:
+            rucio.core.lock.failed_transfers(rse_replicas, nowait=nowait, session=session)
+
+        for chunk in chunks(rse_replicas, 500):
+            file_clause = [and_(models.RSEFileAssociation.scope == replica['scope'], models.RSEFileAssociation.name == replica['name']) for replica in chunk]
+            session.query(models.RSEFileAssociation).\
+                filter(models.RSEFileAssociation.rse_id == rse_id).\
+                filter(or_(*file_clause)).\
+                update({'state': state}, synchronize_session=False)
+
+    if paths:
+        replica_table = models.RSEFileAssociation.__table__
+        session.execute(replica_table.update().
+                        where(and_(replica_table.c.rse_id == bindparam('b_rse_id'),
+                                   replica_table.c.scope == bindparam('b_scope'),
+                                   replica_table.c.name == bindparam('b_name'))).
+                        values(path=bindparam('b_path')),
+                        paths)
+
+    if others:
+        update_replicas_states(others, nowait=nowait, session=session)
+    return True
+
+
 @transactional_session
 def touch_replica(replica, session=None):
     """
@@ -1345,6 +1416,82 @@ def touch_replica(replica, session=None):
     return True
 
 
+@transactional_session
+def touch_replicas(replicas, session=None):
+    """
+    Bulk update the accessed_at timestamp of file replicas/dids but don't wait if rows are locked.
+    Duplicated (scope, name, rse) keys are merged, keeping the latest timestamp,
+    and the replicas are updated with one statement per RSE.
+
+    :param replicas: a list of dictionaries with the information of the affected replicas.
+    :param session: The database session in use.
+
+    :returns: True, if successful, False otherwise.
+    """
+    none_value = None
+    rse_ids, replicas_per_rse, dids = {}, {}, {}
+    for replica in replicas:
+        rse_id = replica.get('rse_id')
+        if rse_id is None:
+            if replica['rse'] not in rse_ids:
+                rse_ids[replica['rse']] = get_rse_id(rse=replica['rse'], session=session)
+            rse_id = rse_ids[replica['rse']]
+        accessed_at = replica.get('accessed_at') or datetime.utcnow()
+
+        key = (replica['scope'], replica['name'])
+        rse_replicas = replicas_per_rse.setdefault(rse_id, {})
+        if key not in rse_replicas or rse_replicas[key] < accessed_at:
+            rse_replicas[key] = accessed_at
+        if key not in dids or dids[key] < accessed_at:
+            dids[key] = accessed_at
+
+    replica_table = models.RSEFileAssociation.__table__
+    replica_stmt = replica_table.update().\
+        where(and_(replica_table.c.rse_id == bindparam('b_rse_id'),
+                   replica_table.c.scope == bindparam('b_scope'),
+                   replica_table.c.name == bindparam('b_name'))).\
+        values(accessed_at=bindparam('b_accessed_at'),
+               tombstone=case([(and_(replica_table.c.tombstone != none_value,
+                                     replica_table.c.tombstone != OBSOLETE),
+                                bindparam('b_accessed_at'))],
+                              else_=replica_table.c.tombstone))
+
+    did_table = models.DataIdentifier.__table__
+    did_stmt = did_table.update().\
+        where(and_(did_table.c.scope == bindparam('b_scope'),
+                   did_table.c.name == bindparam('b_name'),
+                   did_table.c.did_type == DIDType.FILE)).\
+        values(accessed_at=bindparam('b_accessed_at'))
+
+    try:
+        for rse_id, rse_replicas in replicas_per_rse.items():
+            for chunk in chunks(rse_replicas.keys(), 100):
+                session.query(models.RSEFileAssociation.scope).\
+                    with_hint(models.RSEFileAssociation, "index(REPLICAS REPLICAS_PK)", 'oracle').\
+                    filter(models.RSEFileAssociation.rse_id == rse_id).\
+                    filter(or_(*[and_(models.RSEFileAssociation.scope == scope, models.RSEFileAssociation.name == name) for scope, name in chunk])).\
+                    with_for_update(nowait=True).all()
+
+            session.execute(replica_stmt, [{'b_rse_id': rse_id, 'b_scope': scope, 'b_name': name, 'b_accessed_at': timestamp}
+                                           for (scope, name), timestamp in rse_replicas.items()])
+
+        for chunk in chunks(dids.keys(), 100):
+            session.query(models.DataIdentifier.scope).\
+                with_hint(models.DataIdentifier, "INDEX(DIDS DIDS_PK)", 'oracle').\
+                filter(models.DataIdentifier.did_type == DIDType.FILE).\
+                filter(or_(*[and_(models.DataIdentifier.scope == scope, models.DataIdentifier.name == name) for scope, name in chunk])).\
+                with_for_update(nowait=True).all()
+
+        if dids:
+            session.execute(did_stmt, [{'b_scope': scope, 'b_name': name, 'b_accessed_at': timestamp}
+                                       for (scope, name), timestamp in dids.items()])
+
+    except DatabaseError:
+        return False
+
+    return True
+
+
 @transactional_session
 def update_replica_state(rse, scope, name, state, session=None):
     """
@@ -23,17 +23,17 @@ from ConfigParser import NoOptionError
 from dogpile.cache import make_region
 from dogpile.cache.api import NoValue
 
-from sqlalchemy import and_, or_, func
+from sqlalchemy import and_, func, not_
 from sqlalchemy.orm import aliased
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.sql.expression import asc, bindparam, text
+from sqlalchemy.sql.expression import asc, bindparam, literal, select, text
 
 from rucio.common.config import config_get
 from rucio.common.exception import RequestNotFound, RucioException, UnsupportedOperation
 from rucio.common.utils import generate_uuid, chunks
-from rucio.core import config as config_core, message as message_core
+from rucio.core import config as config_core, message as message_core, request_counter
 from rucio.core.monitor import record_counter, record_timer
-from rucio.core.rse import get_rse_id, get_rse_name, get_rse_transfer_limits
+from rucio.core.rse import get_rse_id, get_cached_rse_name, get_rse_transfer_limits
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import RequestState, RequestType, FTSState, ReplicaState, LockState
 from rucio.db.sqla.session import read_session, transactional_session
@@ -237,146 +237,229 @@ def requeue_and_archive(request_id, session=None):
 
 
 @transactional_session
-def queue_requests(requests, session=None):
+def requeue_and_archive_requests(request_ids, session=None):
     """
-    Submit transfer requests on destination RSEs for data identifiers.
+    Bulk version of requeue_and_archive: archive the given requests and queue
+    the next attempt of the ones which should be retried.
+    Requests which do not exist anymore are skipped.
 
-    :param requests: List of dictionaries containing request metadata.
+    :param request_ids: List of original request IDs as strings.
     :param session: Database session to use.
-    :returns: List of Request-IDs as 32 character hex strings.
-    """
-    record_counter('core.request.queue_requests')
+    :returns: List of the new requests.
+    """
+
+    record_counter('core.request.requeue_request', len(request_ids))
+    reqs, sources = {}, {}
+    for chunk in chunks(list(request_ids), 500):
+        for tmp in session.query(models.Request).filter(models.Request.id.in_(chunk)).with_for_update():
+            req = dict(tmp)
+            req.pop('_sa_instance_state')
+            reqs[req['id']] = req
+        for tmp in session.query(models.Source).filter(models.Source.request_id.in_(chunk)):
+            source = dict(tmp)
+            source.pop('_sa_instance_state')
+            sources.setdefault(source['request_id'], []).append(source)
+
+    archive_requests(reqs.keys(), session=session)
+
+    new_reqs = []
+    for request_id, new_req in reqs.iteritems():
+        new_req['sources'] = sources.get(request_id)
+        if should_retry_request(new_req):
+            new_req['request_id'] = generate_uuid()
+            new_req['previous_attempt_id'] = request_id
+            if new_req['retry_count'] is None:
+                new_req['retry_count'] = 1
+            elif new_req['state'] != RequestState.SUBMITTING:
+                new_req['retry_count'] += 1
 
-    logging.debug("queue requests")
+            if new_req['sources']:
+                for source in new_req['sources']:
+                    if source['is_using']:
+                        if source['ranking'] is None:
+                            source['ranking'] = -1
+                        else:
+                            source['ranking'] -= 1
+                        source['is_using'] = False
+            new_reqs.append(new_req)
 
-    request_clause = []
-    transfer_limits, rses = {}, {}
-    for req in requests:
+    if new_reqs:
+        queue_requests(new_reqs, session=session)
+    return new_reqs
 
-        if isinstance(req['attributes'], (str, unicode)):
-            req['attributes'] = json.loads(req['attributes'])
-            if isinstance(req['attributes'], (str, unicode)):
-                req['attributes'] = json.loads(req['attributes'])
 
-        if req['request_type'] == RequestType.TRANSFER:
-            request_clause.append(and_(models.Request.scope == req['scope'],
-                                       models.Request.name == req['name'],
-                                       models.Request.dest_rse_id == req['dest_rse_id'],
-                                       models.Request.request_type == RequestType.TRANSFER))
-
-        if req['dest_rse_id'] not in rses:
-            rses[req['dest_rse_id']] = get_rse_name(req['dest_rse_id'], session=session)
-
-        if req['attributes']['activity'] not in transfer_limits:
-            transfer_limits[req['attributes']['activity']] = {req['dest_rse_id']: get_transfer_limits(req['attributes']['activity'], req['dest_rse_id'])}
-        elif req['dest_rse_id'] not in transfer_limits[req['attributes']['activity']]:
-            transfer_limits[req['attributes']['activity']] = {req['dest_rse_id']: get_transfer_limits(req['attributes']['activity'], req['dest_rse_id'])}
-
-    # Check existing requests
-    if request_clause:
-        existing_requests = []
-        for requests_condition in chunks(request_clause, 1000):
-            query_existing_requests = session.query(models.Request.scope,
-                                                    models.Request.name,
-                                                    models.Request.dest_rse_id).\
+def __list_existing_requests(keys, session):
+    """
+    Find which of the given transfer requests already exist.
+
+    :param keys: Set of (scope, name, dest_rse_id) tuples.
+    :param session: Database session to use.
+    :returns: Set of the (scope, name, dest_rse_id) tuples which already exist.
+    """
+
+    names_by_scope_rse = {}
+    for scope, name, dest_rse_id in keys:
+        names_by_scope_rse.setdefault((scope, dest_rse_id), set()).add(name)
+
+    existing_requests = set()
+    for (scope, dest_rse_id), names in names_by_scope_rse.iteritems():
+        for names_chunk in chunks(list(names), 500):
+            query = session.query(models.Request.name).\
                 with_hint(models.Request,
                           "INDEX(REQUESTS REQUESTS_SC_NA_RS_TY_UQ_IDX)",
                           'oracle').\
-                filter(or_(*requests_condition))
-            for request in query_existing_requests:
-                existing_requests.append(request)
-
-    new_requests, sources, messages = [], [], []
-    for request in requests:
-
-        if req['request_type'] == RequestType.TRANSFER and (request['scope'], request['name'], request['dest_rse_id']) in existing_requests:
-            logging.warn('Request TYPE %s for DID %s:%s at RSE %s exists - ignoring' % (request['request_type'],
-                                                                                        request['scope'],
-                                                                                        request['name'],
-                                                                                        rses[request['dest_rse_id']]))
-            continue
+                filter(models.Request.scope == scope).\
+                filter(models.Request.name.in_(names_chunk)).\
+                filter(models.Request.dest_rse_id == dest_rse_id).\
+                filter(models.Request.request_type == RequestType.TRANSFER)
+            for name, in query:
+                existing_requests.add((scope, name, dest_rse_id))
+    return existing_requests
 
-        transfer_limit = transfer_limits[request['attributes']['activity']]
-        request['state'] = RequestState.WAITING if transfer_limit else RequestState.QUEUED
-
-        if 'previous_attempt_id' in request and 'retry_count' in request:
-            new_requests.append({'id': request['request_id'],
-                                 'request_type': request['request_type'],
-                                 'scope': request['scope'],
-                                 'name': request['name'],
-                                 'dest_rse_id': request['dest_rse_id'],
-                                 'attributes': json.dumps(request['attributes']),
-                                 'state': request['state'],
-                                 'previous_attempt_id': request['previous_attempt_id'],
-                                 'retry_count': request['retry_count'],
-                                 'rule_id': request['rule_id'],
-                                 'activity': request['attributes']['activity'],
-                                 'bytes': request['attributes']['bytes'],
-                                 'md5': request['attributes']['md5'],
-                                 'adler32': request['attributes']['adler32']})
-        else:
-            request['request_id'] = generate_uuid()
-            new_requests.append({'id': request['request_id'],
-                                 'request_type': request['request_type'],
-                                 'scope': request['scope'],
-                                 'name': request['name'],
-                                 'dest_rse_id': request['dest_rse_id'],
-                                 'attributes': json.dumps(request['attributes']),
-                                 'state': request['state'],
-                                 'rule_id': request['rule_id'],
-                                 'activity': request['attributes']['activity'],
-                                 'bytes': request['attributes']['bytes'],
-                                 'md5': request['attributes']['md5'],
-                                 'adler32': request['attributes']['adler32'],
-                                 'account': request['attributes'].get('account', None),
-                                 'priority': request['attributes'].get('priority', None),
-                                 'requested_at': request['attributes'].get('requested_at', None),
-                                 'retry_count': request['retry_count']})
-
-        if 'sources' in request and request['sources']:
-            for source in request['sources']:
-                sources.append({'request_id': request['request_id'],
-                                'scope': request['scope'],
-                                'name': request['name'],
-                                'rse_id': source['rse_id'],
-                                'dest_rse_id': request['dest_rse_id'],
-                                'ranking': source['ranking'],
-                                'bytes': source['bytes'],
-                                'url': source['url'],
-                                'is_using': source['is_using']})
-
-        if request['request_type']:
-            transfer_status = '%s-%s' % (request['request_type'], request['state'])
-        else:
-            transfer_status = 'transfer-%s' % request['state']
 
-        payload = {'request-id': request['request_id'],
-                   'request-type': str(request['request_type']).lower(),
-                   'scope': request['scope'],
-                   'name': request['name'],
-                   'dst-rse-id': request['dest_rse_id'],
-                   'dst-rse': rses[request['dest_rse_id']],
-                   'state': str(request['state']),
-                   'retry-count': request['retry_count'],
-                   'rule-id': str(request['rule_id']),
-                   'activity': request['attributes']['activity'],
-                   'file-size': request['attributes']['bytes'],
-                   'bytes': request['attributes']['bytes'],
-                   'checksum-md5': request['attributes']['md5'],
-                   'checksum-adler': request['attributes']['adler32'],
-                   'queued_at': str(datetime.datetime.utcnow())}
+@transactional_session
+def queue_requests(requests, batch_size=1000, session=None):
+    """
+    Submit transfer requests on destination RSEs for data identifiers.
 
-        messages.append({'event_type': transfer_status.lower(),
-                         'payload': json.dumps(payload)})
+    The requests are processed in batches: the existing transfer requests of a
+    batch are looked up with one query per scope and destination RSE, the transfer limits
+    are computed once per (activity, destination RSE), and the requests, sources
+    and messages are bulk inserted.
 
-    for requests_chunk in chunks(new_requests, 1000):
-        session.bulk_insert_mappings(models.Request, requests_chunk)
+    :param requests: List of dictionaries containing request metadata.
+    :param batch_size: Number of requests processed per batch.
+    :param session: Database session to use.
+    """
+    record_counter('core.request.queue_requests')
 
-    for sources_chunk in chunks(sources, 1000):
-        session.bulk_insert_mappings(models.Source, sources_chunk)
+    logging.debug("queue requests")
+
+    transfer_limits, rses = {}, {}
+    queued = set()
+    counters = {}
+    for requests_batch in chunks(requests, batch_size):
+
+        transfer_keys = set()
+        for req in requests_batch:
 
-    for messages_chunk in chunks(messages, 1000):
-        session.bulk_insert_mappings(models.Message, messages_chunk)
+            if isinstance(req['attributes'], (str, unicode)):
+                req['attributes'] = json.loads(req['attributes'])
+                if isinstance(req['attributes'], (str, unicode)):
+                    req['attributes'] = json.loads(req['attributes'])
+
+            if req['request_type'] == RequestType.TRANSFER:
+                transfer_keys.add((req['scope'], req['name'], req['dest_rse_id']))
+
+            if req['dest_rse_id'] not in rses:
+                rses[req['dest_rse_id']] = get_cached_rse_name(req['dest_rse_id'], session=session)
+
+            limit_key = (req['attributes']['activity'], req['dest_rse_id'])
+            if limit_key not in transfer_limits:
+                transfer_limits[limit_key] = get_transfer_limits(*limit_key)
+
+        # Check existing requests
+        existing_requests = __list_existing_requests(transfer_keys, session=session) if transfer_keys else set()
+
+        queued_at = str(datetime.datetime.utcnow())
+        new_requests, sources, messages = [], [], []
+        for request in requests_batch:
+
+            if request['request_type'] == RequestType.TRANSFER:
+                key = (request['scope'], request['name'], request['dest_rse_id'])
+                if key in existing_requests or key in queued:
+                    logging.warn('Request TYPE %s for DID %s:%s at RSE %s exists - ignoring' % (request['request_type'],
+                                                                                                request['scope'],
+                                                                                                request['name'],
+                                                                                                rses[request['dest_rse_id']]))
+                    continue
+                queued.add(key)
+
+            transfer_limit = transfer_limits[(request['attributes']['activity'], request['dest_rse_id'])]
+            request['state'] = RequestState.WAITING if transfer_limit else RequestState.QUEUED
+
+            if 'previous_attempt_id' in request and 'retry_count' in request:
+                new_requests.append({'id': request['request_id'],
+                                     'request_type': request['request_type'],
+                                     'scope': request['scope'],
+                                     'name': request['name'],
+                                     'dest_rse_id': request['dest_rse_id'],
+                                     'attributes': json.dumps(request['attributes']),
+                                     'state': request['state'],
+                                     'previous_attempt_id': request['previous_attempt_id'],
+                                     'retry_count': request['retry_count'],
+                                     'rule_id': request['rule_id'],
+                                     'activity': request['attributes']['activity'],
+                                     'bytes': request['attributes']['bytes'],
+                                     'md5': request['attributes']['md5'],
+                                     'adler32': request['attributes']['adler32']})
+            else:
+                request['request_id'] = generate_uuid()
+                new_requests.append({'id': request['request_id'],
+                                     'request_type': request['request_type'],
+                                     'scope': request['scope'],
+                                     'name': request['name'],
+                                     'dest_rse_id': request['dest_rse_id'],
+                                     'attributes': json.dumps(request['attributes']),
+                                     'state': request['state'],
+                                     'rule_id': request['rule_id'],
+                                     'activity': request['attributes']['activity'],
+                                     'bytes': request['attributes']['bytes'],
+                                     'md5': request['attributes']['md5'],
+                                     'adler32': request['attributes']['adler32'],
+                                     'account': request['attributes'].get('account', None),
+                                     'priority': request['attributes'].get('priority', None),
+                                     'requested_at': request['attributes'].get('requested_at', None),
+                                     'retry_count': request['retry_count']})
+
+            if 'sources' in request and request['sources']:
+                for source in request['sources']:
+                    sources.append({'request_id': request['request_id'],
+                                    'scope': request['scope'],
+                                    'name': request['name'],
+                                    'rse_id': source['rse_id'],
+                                    'dest_rse_id': request['dest_rse_id'],
+                                    'ranking': source['ranking'],
+                                    'bytes': source['bytes'],
+                                    'url': source['url'],
+                                    'is_using': source['is_using']})
+
+            if request['request_type']:
+                transfer_status = '%s-%s' % (request['request_type'], request['state'])
+            else:
+                transfer_status = 'transfer-%s' % request['state']
+
+            payload = {'request-id': request['request_id'],
+                       'request-type': str(request['request_type']).lower(),
+                       'scope': request['scope'],
+                       'name': request['name'],
+                       'dst-rse-id': request['dest_rse_id'],
+                       'dst-rse': rses[request['dest_rse_id']],
+                       'state': str(request['state']),
+                       'retry-count': request['retry_count'],
+                       'rule-id': str(request['rule_id']),
+                       'activity': request['attributes']['activity'],
+                       'file-size': request['attributes']['bytes'],
+                       'bytes': request['attributes']['bytes'],
+                       'checksum-md5': request['attributes']['md5'],
+                       'checksum-adler': request['attributes']['adler32'],
+                       'queued_at': queued_at}
+
+            messages.append({'event_type': transfer_status.lower(),
+                             'payload': json.dumps(payload)})
+
+        if new_requests:
+            session.bulk_insert_mappings(models.Request, new_requests)
+            for new_request in new_requests:
+                key = (new_request['activity'], new_request['dest_rse_id'], new_request.get('account'), request_counter.counter_state(new_request['state']))
+                counters[key] = counters.get(key, 0) + 1
+        if sources:
+            for sources_chunk in chunks(sources, 1000):
+                session.bulk_insert_mappings(models.Source, sources_chunk)
+        if messages:
+            session.bulk_insert_mappings(models.Message, messages)
+
+    request_counter.update_counters(counters, session=session)
 
 
 def submit_bulk_transfers(external_host, files, transfertool='fts3', job_params={}, timeout=None):
@@ -413,6 +496,41 @@ def submit_bulk_transfers(external_host, files, transfertool='fts3', job_params=
     return transfer_id
 
 
+def __update_requests(query, values, single=False, session=None):
+    """
+    Updates the requests selected by a query, and the request counters if their state changes.
+
+    The requests whose counter state does not change are updated directly. The other ones are
+    locked and read first, so that the counter changes match the updated rows exactly.
+
+    :param query: Query on models.Request selecting the requests.
+    :param values: Dictionary of the new column values, including the 'state'.
+    :param single: True if the query selects at most one request.
+    :param session: Database session to use.
+    :returns: The number of updated requests.
+    """
+
+    same_counter_clause = request_counter.same_counter_clause(values['state'])
+    rowcount = query.filter(same_counter_clause).update(values, synchronize_session=False)
+    if single and rowcount:
+        return rowcount
+
+    rows = query.filter(not_(same_counter_clause)).\
+        with_entities(models.Request.id,
+                      models.Request.activity,
+                      models.Request.dest_rse_id,
+                      models.Request.account,
+                      models.Request.state).\
+        with_for_update().all()
+    for chunk in chunks(rows, 1000):
+        rowcount += session.query(models.Request).\
+            filter(models.Request.id.in_([row.id for row in chunk])).\
+            update(values, synchronize_session=False)
+    changes = request_counter.state_changes([(row.activity, row.dest_rse_id, row.account, row.state, 1) for row in rows], values['state'])
+    request_counter.update_counters(changes, session=session)
+    return rowcount
+
+
 @transactional_session
 def set_request_transfers(transfers, session=None):
     """
@@ -424,13 +542,13 @@ def set_request_transfers(transfers, session=None):
 
     try:
         for request_id in transfers:
-            rowcount = session.query(models.Request).filter_by(id=request_id)\
-                              .update({'state': transfers[request_id]['state'],
-                                       'external_id': transfers[request_id]['external_id'],
-                                       'external_host': transfers[request_id]['external_host'],
-                                       'dest_url': transfers[request_id]['dest_url'],
-                                       'submitted_at': datetime.datetime.utcnow()},
-                                      synchronize_session=False)
+            rowcount = __update_requests(session.query(models.Request).filter_by(id=request_id),
+                                         {'state': transfers[request_id]['state'],
+                                          'external_id': transfers[request_id]['external_id'],
+                                          'external_host': transfers[request_id]['external_host'],
+                                          'dest_url': transfers[request_id]['dest_url'],
+                                          'submitted_at': datetime.datetime.utcnow()},
+                                         single=True, session=session)
             if rowcount and 'file' in transfers[request_id]:
                 file = transfers[request_id]['file']
                 used_src_rse_ids = get_source_rse_ids(request_id, session=session)
@@ -461,15 +579,15 @@ def prepare_request_transfers(transfers, session=None):
 
     try:
         for request_id in transfers:
-            rowcount = session.query(models.Request)\
-                              .filter_by(id=request_id)\
-                              .filter(models.Request.state == RequestState.QUEUED)\
-                              .update({'state': transfers[request_id]['state'],
-                                       'external_id': transfers[request_id]['external_id'],
-                                       'external_host': transfers[request_id]['external_host'],
-                                       'dest_url': transfers[request_id]['dest_url'],
-                                       'submitted_at': datetime.datetime.utcnow()},
-                                      synchronize_session=False)
+            rowcount = __update_requests(session.query(models.Request)
+                                                .filter_by(id=request_id)
+                                                .filter(models.Request.state == RequestState.QUEUED),
+                                         {'state': transfers[request_id]['state'],
+                                          'external_id': transfers[request_id]['external_id'],
+                                          'external_host': transfers[request_id]['external_host'],
+                                          'dest_url': transfers[request_id]['dest_url'],
+                                          'submitted_at': datetime.datetime.utcnow()},
+                                         single=True, session=session)
             if rowcount == 0:
                 raise RucioException("Failed to prepare transfer: request %s does not exist or is not in queued state" % (request_id))
 
@@ -507,15 +625,15 @@ def set_request_transfers_state(transfers, submitted_at, session=None):
 
     try:
         for request_id in transfers:
-            rowcount = session.query(models.Request)\
-                              .filter_by(id=request_id)\
-                              .filter(models.Request.state == RequestState.SUBMITTING)\
-                              .update({'state': transfers[request_id]['state'],
-                                       'external_id': transfers[request_id]['external_id'],
-                                       'external_host': transfers[request_id]['external_host'],
-                                       'source_rse_id': transfers[request_id]['src_rse_id'],
-                                       'submitted_at': submitted_at},
-                                      synchronize_session=False)
+            rowcount = __update_requests(session.query(models.Request)
+                                                .filter_by(id=request_id)
+                                                .filter(models.Request.state == RequestState.SUBMITTING),
+                                         {'state': transfers[request_id]['state'],
+                                          'external_id': transfers[request_id]['external_id'],
+                                          'external_host': transfers[request_id]['external_host'],
+                                          'source_rse_id': transfers[request_id]['src_rse_id'],
+                                          'submitted_at': submitted_at},
+                                         single=True, session=session)
             if rowcount == 0:
                 raise RucioException("Failed to set requests %s tansfer %s: request doesn't exist or is not in SUBMITTING state" % (request_id, transfers[request_id]))
 
@@ -869,13 +987,15 @@ def bulk_query_requests(request_host, request_ids, transfertool='fts3'):
     return None
 
 
-def bulk_query_transfers(request_host, transfer_ids, transfertool='fts3', timeout=None):
+def bulk_query_transfers(request_host, transfer_ids, transfertool='fts3', timeout=None, fts_session=None):
     """
     Query the status of a request.
 
     :param request_host: Name of the external host.
     :param transfer_ids: List of (External-ID as a 32 character hex string)
     :param transfertool: Transfertool name as a string.
+    :param timeout: Timeout of the query in seconds.
+    :param fts_session: requests.Session to reuse for the fts3 query.
     :returns: Request status information as a dictionary.
     """
 
@@ -884,7 +1004,7 @@ def bulk_query_transfers(request_host, transfer_ids, transfertool='fts3', timeou
     if transfertool == 'fts3':
         try:
             ts = time.time()
-            fts_resps = fts3.bulk_query(transfer_ids, request_host, timeout)
+            fts_resps = fts3.bulk_query(transfer_ids, request_host, timeout, fts_session=fts_session)
             record_timer('core.request.bulk_query_transfers', (time.time() - ts) * 1000 / len(transfer_ids))
         except Exception:
             raise
@@ -945,14 +1065,13 @@ def set_requests_external(transfer_ids, submitted_at, session=None):
     """
 
     for transfer_id in transfer_ids:
-        session.query(models.Request)\
-               .filter_by(id=transfer_id)\
-               .update({'state': RequestState.SUBMITTED,
-                        'external_id': transfer_ids[transfer_id]['external_id'],
-                        'external_host': transfer_ids[transfer_id]['external_host'],
-                        'dest_url': transfer_ids[transfer_id]['dest_urls'][0],
-                        'submitted_at': submitted_at},
-                       synchronize_session=False)
+        __update_requests(session.query(models.Request).filter_by(id=transfer_id),
+                          {'state': RequestState.SUBMITTED,
+                           'external_id': transfer_ids[transfer_id]['external_id'],
+                           'external_host': transfer_ids[transfer_id]['external_host'],
+                           'dest_url': transfer_ids[transfer_id]['dest_urls'][0],
+                           'submitted_at': submitted_at},
+                          single=True, session=session)
 
 
 @transactional_session
@@ -980,12 +1099,12 @@ def set_request_state(request_id, new_state, transfer_id=None, transferred_at=No
             update_items['err_msg'] = err_msg
 
         if transfer_id:
-            rowcount = session.query(models.Request).filter_by(id=request_id, external_id=transfer_id).update(update_items, synchronize_session=False)
+            rowcount = __update_requests(session.query(models.Request).filter_by(id=request_id, external_id=transfer_id), update_items, single=True, session=session)
         else:
             if new_state in [RequestState.FAILED, RequestState.DONE]:
                 logging.error("Request %s should not be updated to 'Failed' or 'Done' without external transfer_id" % request_id)
             else:
-                rowcount = session.query(models.Request).filter_by(id=request_id).update(update_items, synchronize_session=False)
+                rowcount = __update_requests(session.query(models.Request).filter_by(id=request_id), update_items, single=True, session=session)
     except IntegrityError, e:
         raise RucioException(e.args)
 
@@ -1069,7 +1188,9 @@ def set_transfer_state(external_host, transfer_id, new_state, session=None):
     record_counter('core.request.set_transfer_state')
 
     try:
-        rowcount = session.query(models.Request).filter_by(external_id=transfer_id).update({'state': new_state, 'updated_at': datetime.datetime.utcnow()}, synchronize_session=False)
+        rowcount = __update_requests(session.query(models.Request).filter_by(external_id=transfer_id),
+                                     {'state': new_state, 'updated_at': datetime.datetime.utcnow()},
+                                     session=session)
     except IntegrityError, e:
         raise RucioException(e.args)
 
@@ -1271,6 +1392,62 @@ def archive_request(request_id, session=None):
             session.query(models.Request).filter_by(id=request_id).delete()
         except IntegrityError, e:
             raise RucioException(e.args)
+        request_counter.update_counters({(req['activity'], req['dest_rse_id'], req['account'], request_counter.counter_state(req['state'])): -1}, session=session)
+
+
+@transactional_session
+def archive_requests(request_ids, session=None):
+    """
+    Move requests to the history table, with one INSERT ... SELECT and
+    one DELETE per table and chunk of requests.
+
+    :param request_ids: List of Request-IDs as 32 character hex strings.
+    :param session: Database session to use.
+    :returns: List of the archived Request-IDs.
+    """
+
+    request_table = models.Request.__table__
+    history_table = models.Request.__history_mapper__.local_table
+    columns = ['id', 'created_at', 'request_type', 'scope', 'name', 'dest_rse_id', 'source_rse_id', 'attributes', 'state',
+               'external_id', 'retry_count', 'err_msg', 'previous_attempt_id', 'external_host', 'rule_id', 'activity',
+               'bytes', 'md5', 'adler32', 'dest_url', 'submitted_at', 'started_at', 'transferred_at']
+    now = datetime.datetime.utcnow()
+
+    archived, counters = [], {}
+    for chunk in chunks(list(request_ids), 500):
+        rows = session.query(models.Request.id,
+                             models.Request.activity,
+                             models.Request.dest_rse_id,
+                             models.Request.account,
+                             models.Request.state,
+                             models.Request.created_at,
+                             models.Request.updated_at).\
+            with_for_update().\
+            filter(models.Request.id.in_(chunk)).all()
+        if not rows:
+            continue
+        ids = [row.id for row in rows]
+
+        record_counter('core.request.archive', len(ids))
+        for row in rows:
+            time_diff = row.updated_at - row.created_at
+            time_diff_s = time_diff.seconds + time_diff.days * 24 * 3600
+            record_timer('core.request.archive_request.%s' % row.activity.replace(' ', '_'), time_diff_s)
+            key = (row.activity, row.dest_rse_id, row.account, request_counter.counter_state(row.state))
+            counters[key] = counters.get(key, 0) - 1
+
+        try:
+            session.execute(history_table.insert().
+                            from_select(columns + ['updated_at'],
+                                        select([request_table.c[column] for column in columns] + [literal(now, type_=request_table.c.updated_at.type)]).
+                                        where(request_table.c.id.in_(ids))))
+            session.query(models.Source).filter(models.Source.request_id.in_(ids)).delete(synchronize_session=False)
+            session.query(models.Request).filter(models.Request.id.in_(ids)).delete(synchronize_session=False)
+        except IntegrityError, e:
+            raise RucioException(e.args)
+        archived.extend(ids)
+    request_counter.update_counters(counters, session=session)
+    return archived
 
 
 @transactional_session
@@ -1670,39 +1847,59 @@ def get_stats_by_activity_dest_state(state, session=None):
 @transactional_session
 def release_waiting_requests(rse, activity=None, rse_id=None, count=None, account=None, session=None):
     """
-    Release waiting requests.
+    Release waiting requests, and update the request counters accordingly.
 
     :param rse: The RSE name.
     :param activity: The activity.
     :param rse_id: The RSE id.
     :param count: The count to be released. If None, release all waiting requests.
+    :param account: The account.
+    :returns: The number of released requests.
     """
     try:
         if not rse_id:
             rse_id = get_rse_id(rse=rse, session=session)
         rowcount = 0
+        counters = {}
 
         if count is None:
-            query = session.query(models.Request).filter_by(dest_rse_id=rse_id, state=RequestState.WAITING)
+            # one update per activity and account, to count the released requests exactly
+            groups = session.query(models.Request.activity, models.Request.account)\
+                            .filter(models.Request.dest_rse_id == rse_id)\
+                            .filter(models.Request.state == RequestState.WAITING)
             if activity:
-                query = query.filter_by(activity=activity)
+                groups = groups.filter(models.Request.activity == activity)
             if account:
-                query = query.filter_by(account=account)
-            rowcount = query.update({'state': RequestState.QUEUED}, synchronize_session=False)
+                groups = groups.filter(models.Request.account == account)
+            for group_activity, group_account in groups.distinct().all():
+                released = session.query(models.Request)\
+                                  .filter_by(dest_rse_id=rse_id, state=RequestState.WAITING, activity=group_activity, account=group_account)\
+                                  .update({'state': RequestState.QUEUED}, synchronize_session=False)
+                counters[(group_activity, rse_id, group_account)] = released
+                rowcount += released
         elif count > 0:
-            subquery = session.query(models.Request.id)\
-                              .filter(models.Request.dest_rse_id == rse_id)\
-                              .filter(models.Request.state == RequestState.WAITING)\
-                              .order_by(asc(models.Request.requested_at))
+            query = session.query(models.Request.id, models.Request.activity, models.Request.account)\
+                           .filter(models.Request.dest_rse_id == rse_id)\
+                           .filter(models.Request.state == RequestState.WAITING)\
+                           .order_by(asc(models.Request.requested_at))
             if activity:
-                subquery = subquery.filter(models.Request.activity == activity)
+                query = query.filter(models.Request.activity == activity)
             if account:
-                subquery = subquery.filter(models.Request.account == account)
-            subquery = subquery.limit(count).with_for_update()
-
-            rowcount = session.query(models.Request)\
-                              .filter(models.Request.id.in_(subquery))\
-                              .update({'state': RequestState.QUEUED}, synchronize_session=False)
+                query = query.filter(models.Request.account == account)
+            rows = query.limit(count).with_for_update().all()
+
+            for chunk in chunks(rows, 1000):
+                rowcount += session.query(models.Request)\
+                                   .filter(models.Request.id.in_([row.id for row in chunk]))\
+                                   .update({'state': RequestState.QUEUED}, synchronize_session=False)
+            for row in rows:
+                counters[(row.activity, rse_id, row.account)] = counters.get((row.activity, rse_id, row.account), 0) + 1
+
+        changes = {}
+        for (group_activity, group_rse_id, group_account), released in counters.iteritems():
+            changes[(group_activity, group_rse_id, group_account, RequestState.WAITING)] = -released
+            changes[(group_activity, group_rse_id, group_account, RequestState.QUEUED)] = released
+        request_counter.update_counters(changes, session=session)
         return rowcount
     except IntegrityError, e:
         raise RucioException(e.args)
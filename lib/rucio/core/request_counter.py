@@ -0,0 +1,155 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Counters of the requests per activity, destination RSE, account and state.
+
+The counters only distinguish the WAITING requests from the ones in transfer,
+i.e., QUEUED, SUBMITTING or SUBMITTED, which are all counted as QUEUED. The
+requests in any other state are not counted. The changes are inserted as rows
+by the functions which create, release, update and archive requests, and
+summed up by the throttler with compact_counters, so that writers do not
+contend for the same counter row.
+"""
+
+from sqlalchemy import func, not_
+
+from rucio.common.utils import chunks
+from rucio.db.sqla import models
+from rucio.db.sqla.constants import RequestState
+from rucio.db.sqla.session import read_session, transactional_session
+
+TRANSFER_STATES = (RequestState.QUEUED, RequestState.SUBMITTING, RequestState.SUBMITTED)
+
+
+def counter_state(state):
+    """
+    Returns the counter state of a request state.
+
+    :param state: The state of the request.
+    :returns: RequestState.WAITING, RequestState.QUEUED, or None if the request is not counted.
+    """
+    if state == RequestState.WAITING:
+        return RequestState.WAITING
+    if state in TRANSFER_STATES:
+        return RequestState.QUEUED
+    return None
+
+
+def same_counter_clause(state):
+    """
+    Returns a clause selecting the requests counted in the same counter state as a request state.
+
+    :param state: The state of the request.
+    :returns: A clause on models.Request.state.
+    """
+    if counter_state(state) == RequestState.WAITING:
+        return models.Request.state == RequestState.WAITING
+    if counter_state(state) == RequestState.QUEUED:
+        return models.Request.state.in_(TRANSFER_STATES)
+    return not_(models.Request.state.in_((RequestState.WAITING, ) + TRANSFER_STATES))
+
+
+def state_changes(rows, new_state):
+    """
+    Returns the changes of the counters when requests move to a new state.
+
+    :param rows: Iterable of (activity, dest_rse_id, account, state, count) of the requests before the change.
+    :param new_state: The new state of the requests.
+    :returns: Dictionary {(activity, dest_rse_id, account, state): change}.
+    """
+    counters = {}
+    new_counter_state = counter_state(new_state)
+    for activity, dest_rse_id, account, state, count in rows:
+        old_counter_state = counter_state(state)
+        if old_counter_state == new_counter_state:
+            continue
+        if old_counter_state is not None:
+            key = (activity, dest_rse_id, account, old_counter_state)
+            counters[key] = counters.get(key, 0) - count
+        if new_counter_state is not None:
+            key = (activity, dest_rse_id, account, new_counter_state)
+            counters[key] = counters.get(key, 0) + count
+    return counters
+
+
+@transactional_session
+def update_counters(counters, session=None):
+    """
+    Records changes of the counters. The changes with a None state are ignored.
+
+    :param counters: Dictionary {(activity, dest_rse_id, account, state): change}.
+    :param session: The database session in use.
+    """
+    changes = [{'activity': activity, 'dest_rse_id': dest_rse_id, 'account': account, 'state': state, 'counter': counter}
+               for (activity, dest_rse_id, account, state), counter in counters.iteritems() if counter and state is not None]
+    if changes:
+        session.bulk_insert_mappings(models.RequestCounter, changes)
+
+
+@read_session
+def get_counters(session=None):
+    """
+    Returns the non-zero counters.
+
+    :param session: The database session in use.
+    :returns: List of (activity, dest_rse_id, account, state, counter).
+    """
+    counter = func.sum(models.RequestCounter.counter)
+    return session.query(models.RequestCounter.activity,
+                         models.RequestCounter.dest_rse_id,
+                         models.RequestCounter.account,
+                         models.RequestCounter.state,
+                         counter.label('counter')).\
+        group_by(models.RequestCounter.activity,
+                 models.RequestCounter.dest_rse_id,
+                 models.RequestCounter.account,
+                 models.RequestCounter.state).\
+        having(counter != 0).all()
+
+
+@transactional_session
+def compact_counters(session=None):
+    """
+    Replaces the changes of every counter by a single row with their sum.
+
+    :param session: The database session in use.
+    """
+    counters, ids = {}, []
+    for row in session.query(models.RequestCounter).with_for_update():
+        key = (row.activity, row.dest_rse_id, row.account, row.state)
+        counters[key] = counters.get(key, 0) + row.counter
+        ids.append(row.id)
+
+    for chunk in chunks(ids, 1000):
+        session.query(models.RequestCounter).filter(models.RequestCounter.id.in_(chunk)).delete(synchronize_session=False)
+    update_counters(counters, session=session)
+
+
+@transactional_session
+def rebuild_counters(session=None):
+    """
+    Recomputes the counters from the requests table.
+    Requests changed during the rebuild can be miscounted until the next rebuild.
+
+    :param session: The database session in use.
+    """
+    ids = [row.id for row in session.query(models.RequestCounter.id).with_for_update()]
+
+    counters = {}
+    for activity, dest_rse_id, account, state, counter in session.query(models.Request.activity,
+                                                                           models.Request.dest_rse_id,
+                                                                           models.Request.account,
+                                                                           models.Request.state,
+                                                                           func.count(1).label('counter')).\
+            group_by(models.Request.activity, models.Request.dest_rse_id, models.Request.account, models.Request.state):
+        key = (activity, dest_rse_id, account, counter_state(state))
+        counters[key] = counters.get(key, 0) + counter
+
+    for chunk in chunks(ids, 1000):
+        session.query(models.RequestCounter).filter(models.RequestCounter.id.in_(chunk)).delete(synchronize_session=False)
+    update_counters(counters, session=session)
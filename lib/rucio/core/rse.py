@@ -14,13 +14,19 @@
 # - Thomas Beermann, <thomas.beermann@cern.ch>, 2014
 # - Wen Guan, <wen.guan@cern.ch>, 2015-2016
 
+from copy import deepcopy
 from re import match
 from StringIO import StringIO
+from threading import Lock
+from time import time
 
 import json
 import sqlalchemy
 import sqlalchemy.orm
 
+from dogpile.cache import make_region
+from dogpile.cache.api import NoValue
+
 from sqlalchemy.exc import DatabaseError, IntegrityError, OperationalError
 from sqlalchemy.orm import aliased
 from sqlalchemy.orm.exc import FlushError
@@ -33,7 +39,18 @@ from rucio.core.rse_counter import add_counter
 from rucio.common import exception, utils
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import RSEType
-from rucio.db.sqla.session import read_session, transactional_session, stream_session
+from rucio.db.sqla.session import on_commit, read_session, transactional_session, stream_session
+from rucio.db.sqla.types import BooleanString
+
+
+# The RSE metadata snapshot is local to the process. Its version is published in
+# memcached and changed by every update of the RSEs, their attributes or protocols.
+RSE_SNAPSHOT_REGION = make_region().configure('dogpile.cache.memcached',
+                                              expiration_time=3600,
+                                              arguments={'url': "127.0.0.1:11211", 'distributed_lock': True})
+RSE_SNAPSHOT_CHECK_INTERVAL = 30
+RSE_SNAPSHOT = {'snapshot': None, 'checked_at': 0}
+RSE_SNAPSHOT_LOCK = Lock()
 
 
 @transactional_session
@@ -72,6 +89,7 @@ def add_rse(rse, deterministic=True, volatile=False, city=None, region_code=None
     # Add account counter
     rucio.core.account_counter.create_counters_for_new_rse(rse_id=new_rse.id, session=session)
 
+    on_commit(session, invalidate_rse_snapshot)
     return new_rse.id
 
 
@@ -132,6 +150,7 @@ def del_rse(rse, session=None):
         raise exception.RSENotFound('RSE \'%s\' cannot be found' % rse)
     old_rse.delete(session=session)
     del_rse_attribute(rse=rse, key=rse, session=session)
+    on_commit(session, invalidate_rse_snapshot)
 
 
 @read_session
@@ -286,6 +305,7 @@ def add_rse_attribute(rse, key, value, session=None):
         new_rse_attr.save(session=session)
     except IntegrityError:
         raise exception.Duplicate("RSE attribute '%(key)s-%(value)s\' for RSE '%(rse)s' already exists!" % locals())
+    on_commit(session, invalidate_rse_snapshot)
     return True
 
 
@@ -304,6 +324,7 @@ def del_rse_attribute(rse, key, session=None):
     query = session.query(models.RSEAttrAssociation).filter_by(rse_id=rse_id).filter(models.RSEAttrAssociation.key == key)
     rse_attr = query.one()
     rse_attr.delete(session=session)
+    on_commit(session, invalidate_rse_snapshot)
     return True
 
 
@@ -629,9 +650,67 @@ def add_protocol(rse, parameter, session=None):
              or match('.*OperationalError.*cannot be null.*', e.args[0]):
             raise exception.InvalidObject('Missing values!')
         raise e
+    on_commit(session, invalidate_rse_snapshot)
     return new_protocol
 
 
+def __format_rse_info(rse):
+    """
+    Build the RSE information dictionary, without protocols, as used by the rsemanager.
+
+    :param rse: The RSE object or row.
+
+    :returns: A dict with RSE information.
+    """
+    info = {'id': rse.id,
+            'rse': rse.rse,
+            'availability_read': True if rse.availability & 4 else False,
+            'availability_write': True if rse.availability & 2 else False,
+            'availability_delete': True if rse.availability & 1 else False,
+            'domain': utils.rse_supported_protocol_domains(),
+            'protocols': list(),
+            'deterministic': rse.deterministic,
+            'rse_type': str(rse.rse_type),
+            'credentials': None,
+            'volatile': rse.volatile,
+            'staging_area': rse.staging_area}
+
+    for op in utils.rse_supported_protocol_operations():
+        info['%s_protocol' % op] = 1  # 1 indicates the default protocol
+    return info
+
+
+def __format_protocol(row):
+    """
+    Build the protocol dictionary of a RSE protocol row.
+
+    :param row: The RSE protocol object or row.
+
+    :returns: A dict with the protocol information.
+    """
+    p = {'hostname': row.hostname,
+         'scheme': row.scheme,
+         'port': row.port,
+         'prefix': row.prefix if row.prefix is not None else '',
+         'impl': row.impl,
+         'domains': {
+             'lan': {'read': row.read_lan,
+                     'write': row.write_lan,
+                     'delete': row.delete_lan},
+             'wan': {'read': row.read_wan,
+                     'write': row.write_wan,
+                     'delete': row.delete_wan,
+                     'third_party_copy': row.third_party_copy}
+         },
+         'extended_attributes': row.extended_attributes}
+
+    try:
+        p['extended_attributes'] = json.load(StringIO(p['extended_attributes']))
+    except ValueError:
+        pass  # If value is not a JSON string
+    return p
+
+
 @read_session
 def get_rse_protocols(rse, schemes=None, session=None):
     """
@@ -650,25 +729,7 @@ def get_rse_protocols(rse, schemes=None, session=None):
     if not _rse:
         raise exception.RSENotFound('RSE \'%s\' not found')
 
-    read = True if _rse.availability & 4 else False
-    write = True if _rse.availability & 2 else False
-    delete = True if _rse.availability & 1 else False
-
-    info = {'id': _rse.id,
-            'rse': _rse.rse,
-            'availability_read': read,
-            'availability_write': write,
-            'availability_delete': delete,
-            'domain': utils.rse_supported_protocol_domains(),
-            'protocols': list(),
-            'deterministic': _rse.deterministic,
-            'rse_type': str(_rse.rse_type),
-            'credentials': None,
-            'volatile': _rse.volatile,
-            'staging_area': _rse.staging_area}
-
-    for op in utils.rse_supported_protocol_operations():
-        info['%s_protocol' % op] = 1  # 1 indicates the default protocol
+    info = __format_rse_info(_rse)
 
     query = None
     terms = [models.RSEProtocols.rse_id == _rse.id]
@@ -692,28 +753,7 @@ def get_rse_protocols(rse, schemes=None, session=None):
                           models.RSEProtocols.extended_attributes).filter(*terms)
 
     for row in query:
-        p = {'hostname': row.hostname,
-             'scheme': row.scheme,
-             'port': row.port,
-             'prefix': row.prefix if row.prefix is not None else '',
-             'impl': row.impl,
-             'domains': {
-                 'lan': {'read': row.read_lan,
-                         'write': row.write_lan,
-                         'delete': row.delete_lan},
-                 'wan': {'read': row.read_wan,
-                         'write': row.write_wan,
-                         'delete': row.delete_wan,
-                         'third_party_copy': row.third_party_copy}
-             },
-             'extended_attributes': row.extended_attributes}
-
-        try:
-            p['extended_attributes'] = json.load(StringIO(p['extended_attributes']))
-        except ValueError:
-            pass  # If value is not a JSON string
-
-        info['protocols'].append(p)
+        info['protocols'].append(__format_protocol(row))
     return info
 
 
@@ -829,6 +869,7 @@ def update_protocols(rse, scheme, data, hostname, port, session=None):
         if match('.*DatabaseError.*ORA-01407: cannot update .*RSE_PROTOCOLS.*IMPL.*to NULL.*', e.args[0]):
             raise exception.InvalidObject('Invalid values !')
         raise e
+    on_commit(session, invalidate_rse_snapshot)
 
 
 @transactional_session
@@ -879,6 +920,7 @@ def del_protocols(rse, scheme, hostname=None, port=None, session=None):
             for p in prots:
                 p.update({op_name: i})
                 i += 1
+    on_commit(session, invalidate_rse_snapshot)
 
 
 @transactional_session
@@ -918,3 +960,218 @@ def update_rse(rse, parameters, session=None):
         query = session.query(models.RSEAttrAssociation).filter_by(rse_id=rse_id).filter(models.RSEAttrAssociation.key == rse)
         rse_attr = query.one()
         rse_attr.delete(session=session)
+    on_commit(session, invalidate_rse_snapshot)
+
+
+def __load_rse_snapshot(session):
+    """
+    Load the RSE metadata of all the active RSEs with one query per table.
+    The deleted RSEs are only kept in the mappings between ids and names, as get_rse_id and get_rse_name find them.
+
+    :param session: The database session in use.
+
+    :returns: A dictionary with the RSEs by id, the ids by name, the names by id, the attributes by id,
+              the RSE information by name and the RSE attribute index.
+    """
+    snapshot = {'by_id': {}, 'ids': {}, 'names': {}, 'attributes': {}, 'infos': {}, 'version': None}
+    index = {}
+    for row in session.query(models.RSE):
+        snapshot['ids'][row.rse] = row.id
+        snapshot['names'][row.id] = row.rse
+        if row.deleted:
+            continue
+        rse = {}
+        for column in row.__table__.columns:
+            rse[column.name] = getattr(row, column.name)
+            # RSE columns take precedence over attributes with the same key, as in list_rses
+            if column.name == 'rse_type':
+                index.setdefault((column.name, str(rse[column.name])), set()).add(row.id)
+            elif rse[column.name] is not None:
+                index.setdefault((column.name, normalize_rse_attribute_value(rse[column.name])), set()).add(row.id)
+        snapshot['by_id'][row.id] = rse
+        snapshot['attributes'][row.id] = {}
+        snapshot['infos'][row.rse] = __format_rse_info(row)
+
+    for attr in session.query(models.RSEAttrAssociation):
+        if attr.rse_id in snapshot['attributes']:
+            snapshot['attributes'][attr.rse_id][attr.key] = attr.value
+            if not hasattr(models.RSE, attr.key):
+                index.setdefault((attr.key, normalize_rse_attribute_value(attr.value)), set()).add(attr.rse_id)
+    snapshot['index'] = dict((key, frozenset(rse_ids)) for key, rse_ids in index.items())
+
+    for row in session.query(models.RSEProtocols):
+        if row.rse_id in snapshot['by_id']:
+            snapshot['infos'][snapshot['by_id'][row.rse_id]['rse']]['protocols'].append(__format_protocol(row))
+    return snapshot
+
+
+def __get_rse_snapshot(session=None, force_check=False):
+    """
+    Get the local RSE metadata snapshot, reloading it if the version published in memcached changed.
+    The version is checked at most every RSE_SNAPSHOT_CHECK_INTERVAL seconds unless force_check is set.
+    The snapshot is always loaded in a new session so that uncommitted changes of the caller are never cached.
+
+    :param session: The database session in use (not used to load the snapshot).
+    :param force_check: If True, check the published version right away.
+
+    :returns: The snapshot dictionary.
+    """
+    snapshot = RSE_SNAPSHOT['snapshot']
+    if snapshot is not None and not force_check and time() - RSE_SNAPSHOT['checked_at'] < RSE_SNAPSHOT_CHECK_INTERVAL:
+        return snapshot
+
+    with RSE_SNAPSHOT_LOCK:
+        version = RSE_SNAPSHOT_REGION.get('rse_snapshot_version')
+        if type(version) is NoValue:
+            version = utils.generate_uuid()
+            RSE_SNAPSHOT_REGION.set('rse_snapshot_version', version)
+        snapshot = RSE_SNAPSHOT['snapshot']
+        if snapshot is None or snapshot['version'] != version:
+            snapshot = __load_rse_snapshot_session()
+            snapshot['version'] = version
+            RSE_SNAPSHOT['snapshot'] = snapshot
+        RSE_SNAPSHOT['checked_at'] = time()
+    return snapshot
+
+
+@read_session
+def __load_rse_snapshot_session(session=None):
+    """
+    Load the RSE metadata snapshot in a new session.
+
+    :param session: The database session in use.
+    """
+    return __load_rse_snapshot(session=session)
+
+
+def normalize_rse_attribute_value(value):
+    """
+    Normalize a RSE attribute value the way it is stored in the database, e.g., True as '1'.
+
+    :param value: The attribute value.
+
+    :returns: The normalized value.
+    """
+    return BooleanString().process_bind_param(value, None)
+
+
+def get_cached_rse_index(session=None):
+    """
+    Get the RSE attribute index of the local RSE metadata snapshot.
+    A new index object is returned each time the snapshot is reloaded.
+
+    :param session: The database session in use.
+
+    :returns: A dictionary mapping (key, normalized value) to a frozenset of RSE ids.
+    """
+    return __get_rse_snapshot(session=session)['index']
+
+
+def invalidate_rse_snapshot():
+    """
+    Publish a new version of the RSE metadata so that all the snapshots get reloaded.
+    Must only be called once the changes are committed, see :py:func:`rucio.db.sqla.session.on_commit`.
+    """
+    RSE_SNAPSHOT_REGION.set('rse_snapshot_version', utils.generate_uuid())
+    RSE_SNAPSHOT['snapshot'] = None
+
+
+def get_cached_rse_id(rse, session=None):
+    """
+    Get a RSE ID from the local RSE metadata snapshot, deleted RSEs included.
+
+    :param rse: the rse name.
+    :param session: The database session in use.
+
+    :returns: The rse id.
+
+    :raises RSENotFound: If referred RSE was not found.
+    """
+    snapshot = __get_rse_snapshot(session=session)
+    if rse not in snapshot['ids']:
+        snapshot = __get_rse_snapshot(session=session, force_check=True)
+        if rse not in snapshot['ids']:
+            raise exception.RSENotFound('RSE \'%s\' cannot be found' % rse)
+    return snapshot['ids'][rse]
+
+
+def get_cached_rse(rse=None, rse_id=None, session=None):
+    """
+    Get a RSE from the local RSE metadata snapshot.
+
+    :param rse:     The rse name.
+    :param rse_id:  The rse id. To be used if the rse parameter is none.
+    :param session: The database session in use.
+
+    :returns: A dictionary with the RSE columns.
+
+    :raises RSENotFound: If referred RSE was not found.
+    """
+    if rse_id is None:
+        rse_id = get_cached_rse_id(rse=rse, session=session)
+    snapshot = __get_rse_snapshot(session=session)
+    if rse_id not in snapshot['by_id']:
+        snapshot = __get_rse_snapshot(session=session, force_check=True)
+        if rse_id not in snapshot['by_id']:
+            raise exception.RSENotFound('RSE with ID \'%s\' cannot be found' % rse_id)
+    return snapshot['by_id'][rse_id].copy()
+
+
+def get_cached_rse_name(rse_id, session=None):
+    """
+    Get a RSE name from the local RSE metadata snapshot, deleted RSEs included.
+
+    :param rse_id: the rse uuid from the database.
+    :param session: The database session in use.
+
+    :returns: The rse name.
+
+    :raises RSENotFound: If referred RSE was not found.
+    """
+    snapshot = __get_rse_snapshot(session=session)
+    if rse_id not in snapshot['names']:
+        snapshot = __get_rse_snapshot(session=session, force_check=True)
+        if rse_id not in snapshot['names']:
+            raise exception.RSENotFound('RSE with ID \'%s\' cannot be found' % rse_id)
+    return snapshot['names'][rse_id]
+
+
+def list_cached_rse_attributes(rse, rse_id=None, session=None):
+    """
+    List RSE attributes for a RSE from the local RSE metadata snapshot.
+    If both rse and rse_id is set, the rse_id will be used for the lookup.
+
+    :param rse:     the rse name.
+    :param rse_id:  The RSE id.
+    :param session: The database session in use.
+
+    :returns: A dictionary with RSE attributes for a RSE.
+    """
+    if rse_id is None:
+        rse_id = get_cached_rse_id(rse=rse, session=session)
+    snapshot = __get_rse_snapshot(session=session)
+    if rse_id not in snapshot['attributes']:
+        snapshot = __get_rse_snapshot(session=session, force_check=True)
+        if rse_id not in snapshot['attributes']:
+            raise exception.RSENotFound('RSE with ID \'%s\' cannot be found' % rse_id)
+    return snapshot['attributes'][rse_id].copy()
+
+
+def get_cached_rse_protocols(rse, session=None):
+    """
+    Returns the protocol information of a RSE from the local RSE metadata snapshot.
+
+    :param rse: The name of the rse.
+    :param session: The database session.
+
+    :returns: A dict with RSE information and supported protocols
+
+    :raises RSENotFound: If RSE is not found.
+    """
+    snapshot = __get_rse_snapshot(session=session)
+    if rse not in snapshot['infos']:
+        snapshot = __get_rse_snapshot(session=session, force_check=True)
+        if rse not in snapshot['infos']:
+            raise exception.RSENotFound('RSE \'%s\' not found' % rse)
+    # callers are allowed to modify the returned information, e.g., the protocol implementation
+    return deepcopy(snapshot['infos'][rse])
@@ -10,10 +10,12 @@
 # - Mario Lassnig, <mario.lassnig@cern.ch>, 2013-2014
 # - Martin Barisits, <martin.barisits@cern.ch>, 2014
 
+from sqlalchemy import func
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.sql.expression import bindparam, text
 
 from rucio.common.exception import CounterNotFound
+from rucio.common.utils import chunks
 from rucio.db.sqla import models
 from rucio.db.sqla.session import read_session, transactional_session
 
@@ -105,6 +107,20 @@ def get_updated_rse_counters(total_workers, worker_number, session=None):
     query = session.query(models.UpdatedRSECounter.rse_id).\
         distinct(models.UpdatedRSECounter.rse_id)
 
+    results = __filter_worker(query, total_workers=total_workers, worker_number=worker_number, session=session).all()
+    return [result.rse_id for result in results]
+
+
+def __filter_worker(query, total_workers, worker_number, session):
+    """
+    Restrict a query on the updated_rse_counters to the rses of a worker.
+
+    :param query:              The query.
+    :param total_workers:      Number of total workers.
+    :param worker_number:      id of the executing worker.
+    :param session:            Database session in use.
+    :returns:                  The filtered query.
+    """
     if total_workers > 0:
         if session.bind.dialect.name == 'oracle':
             bindparams = [bindparam('worker_number', worker_number),
@@ -114,9 +130,7 @@ def get_updated_rse_counters(total_workers, worker_number, session=None):
             query = query.filter('mod(md5(rse_id), %s) = %s' % (total_workers + 1, worker_number))
         elif session.bind.dialect.name == 'postgresql':
             query = query.filter('mod(abs((\'x\'||md5(rse_id))::bit(32)::int), %s) = %s' % (total_workers + 1, worker_number))
-
-    results = query.all()
-    return [result.rse_id for result in results]
+    return query
 
 
 @transactional_session
@@ -140,3 +154,43 @@ def update_rse_counter(rse_id, session=None):
 
     for update in updated_rse_counters:
         update.delete(flush=False, session=session)
+
+
+@transactional_session
+def update_rse_counters(total_workers, worker_number, limit=10000, session=None):
+    """
+    Apply a slice of the updated_rse_counters of a worker to the rse counters.
+
+    The database sums the slice per rse, and every rse counter is then updated once.
+
+    :param total_workers:  Number of total workers.
+    :param worker_number:  id of the executing worker.
+    :param limit:          Maximum number of updated_rse_counters in the slice.
+    :param session:        Database session in use.
+    :returns:              Number of updated_rse_counters applied.
+    """
+
+    query = session.query(models.UpdatedRSECounter.id)
+    ids = [id for id, in __filter_worker(query, total_workers=total_workers, worker_number=worker_number, session=session).limit(limit)]
+
+    deltas = {}  # {rse_id: [files, bytes]}
+    for chunk in chunks(ids, 1000):
+        query = session.query(models.UpdatedRSECounter.rse_id,
+                              func.sum(models.UpdatedRSECounter.files),
+                              func.sum(models.UpdatedRSECounter.bytes)).\
+            filter(models.UpdatedRSECounter.id.in_(chunk)).\
+            group_by(models.UpdatedRSECounter.rse_id)
+        for rse_id, files, bytes in query:
+            delta = deltas.setdefault(rse_id, [0, 0])
+            delta[0] += files or 0
+            delta[1] += bytes or 0
+
+    rse_ids = deltas.keys()
+    for chunk in chunks(rse_ids, 1000):
+        for rse_counter in session.query(models.RSEUsage).filter(models.RSEUsage.rse_id.in_(chunk), models.RSEUsage.source == 'rucio'):
+            rse_counter.files += deltas[rse_counter.rse_id][0]
+            rse_counter.used += deltas[rse_counter.rse_id][1]
+
+    for chunk in chunks(ids, 1000):
+        session.query(models.UpdatedRSECounter).filter(models.UpdatedRSECounter.id.in_(chunk)).delete(synchronize_session=False)
+    return len(ids)
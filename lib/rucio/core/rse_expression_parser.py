@@ -16,13 +16,11 @@ import abc
 import re
 import string
 
-from dogpile.cache import make_region
-from dogpile.cache.api import NoValue
-from hashlib import sha256
+from repoze.lru import LRUCache
 
 from rucio.common import schema
 from rucio.common.exception import InvalidRSEExpression, RSEBlacklisted
-from rucio.core.rse import list_rses
+from rucio.core.rse import get_cached_rse, get_cached_rse_index, normalize_rse_attribute_value
 from rucio.db.sqla.session import transactional_session
 
 
@@ -37,9 +35,10 @@ COMPLEMENT = r'(\\%s)' % (PRIMITIVE)
 PATTERN = r'^%s(%s|%s|%s)*' % (PRIMITIVE, UNION, INTERSECTION, COMPLEMENT)
 
 
-REGION = make_region().configure('dogpile.cache.memcached',
-                                 expiration_time=3600,
-                                 arguments={'url': "127.0.0.1:11211", 'distributed_lock': True})
+# Compiled expressions, independent of the RSE metadata
+COMPILED_EXPRESSIONS = LRUCache(10000)
+# Evaluated expressions, valid as long as the RSE attribute index they were evaluated against
+EVALUATED_EXPRESSIONS = LRUCache(10000)
 
 
 @transactional_session
@@ -53,38 +52,19 @@ def parse_expression(expression, filter=None, session=None):
     :returns:             A list of rse dictionaries.
     :raises:              InvalidRSEExpression, RSENotFound, RSEBlacklisted
     """
-    result = REGION.get(sha256(expression).hexdigest())
-    if type(result) is NoValue:
-        # Evaluate the correctness of the parentheses
-        parantheses_open_count = 0
-        parantheses_close_count = 0
-        for char in expression:
-            if (char == '('):
-                parantheses_open_count += 1
-            elif (char == ')'):
-                parantheses_close_count += 1
-            if (parantheses_close_count > parantheses_open_count):
-                raise InvalidRSEExpression('Problem with parantheses.')
-        if (parantheses_open_count != parantheses_close_count):
-            raise InvalidRSEExpression('Problem with parantheses.')
+    index = get_cached_rse_index(session=session)
+    evaluated = EVALUATED_EXPRESSIONS.get(expression)
+    if evaluated is not None and evaluated[0] is index:
+        rse_ids = evaluated[1]
+    else:
+        rse_ids = compile_expression(expression).resolve_elements(index=index)
+        EVALUATED_EXPRESSIONS.put(expression, (index, rse_ids))
 
-        # Check the expression pattern
-        match = re.match(PATTERN, expression)
-        if match is None:
-            raise InvalidRSEExpression('Expression does not comply to RSE Expression syntax')
-        else:
-            if match.group() != expression:
-                raise InvalidRSEExpression('Expression does not comply to RSE Expression syntax')
-        result_tuple = __resolve_term_expression(expression)[0].resolve_elements(session=session)
-        # result_tuple = ([rse_ids], {rse_id: {rse_info}})
-        result = []
-        for rse in list(result_tuple[0]):
-            result.append(result_tuple[1][rse])
-        REGION.set(sha256(expression).hexdigest(), result)
-
-    if not result:
+    if not rse_ids:
         raise InvalidRSEExpression('RSE Expression resulted in an empty set.')
 
+    result = [get_cached_rse(rse_id=rse_id, session=session) for rse_id in rse_ids]
+
     # Filter
     final_result = []
     if filter:
@@ -101,6 +81,45 @@ def parse_expression(expression, filter=None, session=None):
     return final_result
 
 
+def compile_expression(expression):
+    """
+    Compile a RSE expression into a tree of BaseExpressionElement.
+    Compiled expressions are cached.
+
+    :param expression:    RSE expression, e.g: 'CERN|BNL'.
+    :returns:             The root BaseExpressionElement of the expression.
+    :raises:              InvalidRSEExpression
+    """
+    compiled = COMPILED_EXPRESSIONS.get(expression)
+    if compiled is not None:
+        return compiled
+
+    # Evaluate the correctness of the parentheses
+    parantheses_open_count = 0
+    parantheses_close_count = 0
+    for char in expression:
+        if (char == '('):
+            parantheses_open_count += 1
+        elif (char == ')'):
+            parantheses_close_count += 1
+        if (parantheses_close_count > parantheses_open_count):
+            raise InvalidRSEExpression('Problem with parantheses.')
+    if (parantheses_open_count != parantheses_close_count):
+        raise InvalidRSEExpression('Problem with parantheses.')
+
+    # Check the expression pattern
+    match = re.match(PATTERN, expression)
+    if match is None:
+        raise InvalidRSEExpression('Expression does not comply to RSE Expression syntax')
+    else:
+        if match.group() != expression:
+            raise InvalidRSEExpression('Expression does not comply to RSE Expression syntax')
+
+    compiled = __resolve_term_expression(expression)[0]
+    COMPILED_EXPRESSIONS.put(expression, compiled)
+    return compiled
+
+
 def __resolve_term_expression(expression):
     """
     Resolves a Term Expression and returns an object of type BaseExpressionElement
@@ -195,13 +214,13 @@ class BaseExpressionElement:
     __metaclass__ = abc.ABCMeta
 
     @abc.abstractmethod
-    def resolve_elements(self, session):
+    def resolve_elements(self, index):
         """
         Resolve the ExpressionElement and return a set of RSE ids
 
-        :param session:  Database session in use
-        :returns:        (Set of RSE ids, Dictionary of RSE dicts)
-        :rtype:          (Set of Strings, Dictionary of RSE dicts organized by rse_id)
+        :param index:    RSE attribute index, see :py:func:`rucio.core.rse.get_cached_rse_index`
+        :returns:        Set of RSE ids
+        :rtype:          Frozenset of Strings
         """
         pass
 
@@ -219,19 +238,13 @@ class RSEAttribute(BaseExpressionElement):
         :param value:         Value of the RSE Attribute.
         """
         self.key = key
-        self.value = value
+        self.value = normalize_rse_attribute_value(value)
 
-    def resolve_elements(self, session):
+    def resolve_elements(self, index):
         """
         Inherited from :py:func:`BaseExpressionElement.resolve_elements`
         """
-        output = list_rses({self.key: self.value}, session=session)
-        if not output:
-            return (set(), {})
-        rse_dict = {}
-        for rse in output:
-            rse_dict[rse['id']] = rse
-        return (set([rse['id'] for rse in output]), rse_dict)
+        return index.get((self.key, self.value), frozenset())
 
 
 class BaseRSEOperator(BaseExpressionElement):
@@ -281,13 +294,11 @@ class ComplementOperator(BaseRSEOperator):
         """
         self.right_term = right_term
 
-    def resolve_elements(self, session):
+    def resolve_elements(self, index):
         """
         Inherited from :py:func:`BaseExpressionElement.resolve_elements`
         """
-        left_term_tuple = self.left_term.resolve_elements(session=session)
-        right_term_tuple = self.right_term.resolve_elements(session=session)
-        return (left_term_tuple[0] - right_term_tuple[0], dict(left_term_tuple[1].items() + right_term_tuple[1].items()))
+        return self.left_term.resolve_elements(index=index) - self.right_term.resolve_elements(index=index)
 
 
 class UnionOperator(BaseRSEOperator):
@@ -315,13 +326,11 @@ class UnionOperator(BaseRSEOperator):
         """
         self.right_term = right_term
 
-    def resolve_elements(self, session):
+    def resolve_elements(self, index):
         """
         Inherited from :py:func:`BaseExpressionElement.resolve_elements`
         """
-        left_term_tuple = self.left_term.resolve_elements(session=session)
-        right_term_tuple = self.right_term.resolve_elements(session=session)
-        return (left_term_tuple[0] | right_term_tuple[0], dict(left_term_tuple[1].items() + right_term_tuple[1].items()))
+        return self.left_term.resolve_elements(index=index) | self.right_term.resolve_elements(index=index)
 
 
 class IntersectOperator(BaseRSEOperator):
@@ -349,10 +358,8 @@ class IntersectOperator(BaseRSEOperator):
         """
         self.right_term = right_term
 
-    def resolve_elements(self, session):
+    def resolve_elements(self, index):
         """
         Inherited from :py:func:`BaseExpressionElement.resolve_elements`
         """
-        left_term_tuple = self.left_term.resolve_elements(session=session)
-        right_term_tuple = self.right_term.resolve_elements(session=session)
-        return (left_term_tuple[0] & right_term_tuple[0], dict(left_term_tuple[1].items() + right_term_tuple[1].items()))
+        return self.left_term.resolve_elements(index=index) & self.right_term.resolve_elements(index=index)
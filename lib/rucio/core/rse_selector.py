@@ -9,23 +9,62 @@
 # - Martin Barisits, <martin.barisits@cern.ch>, 2013-2015
 # - Cedric Serfon, <cedric.serfon@cern.ch>, 2015
 
-from random import uniform, shuffle
+from bisect import bisect_left
+from random import choice, uniform
 
 from rucio.common.exception import InsufficientAccountLimit, InsufficientTargetRSEs, InvalidRuleWeight
 from rucio.core.account import has_account_attribute
-from rucio.core.account_counter import get_counter
-from rucio.core.account_limit import get_account_limit
-from rucio.core.rse import list_rse_attributes, has_rse_attribute
+from rucio.core.account_counter import get_account_counters
+from rucio.core.account_limit import get_account_limits
+from rucio.core.rse import list_cached_rse_attributes
 from rucio.db.sqla.session import read_session
 
 
+@read_session
+def get_quota_snapshot(account, quota_snapshots=None, session=None):
+    """
+    Get the quota of an account on all RSEs, with one query each for the admin attribute,
+    the account limits and the account counters.
+
+    :param account:          The account.
+    :param quota_snapshots:  Dictionary {account: snapshot} of the snapshots already loaded, e.g., in the same daemon cycle.
+                             The loaded snapshot is added to it.
+    :param session:          DB Session in use.
+    :returns:                Dictionary {'admin':, 'limits': {rse_id: bytes}, 'usage': {rse_id: bytes}}.
+    """
+    if quota_snapshots is not None and account in quota_snapshots:
+        return quota_snapshots[account]
+
+    snapshot = {'admin': has_account_attribute(account=account, key='admin', session=session),
+                'limits': get_account_limits(account=account, session=session),
+                'usage': dict((rse_id, counter['bytes']) for rse_id, counter in get_account_counters(account=account, session=session).iteritems())}
+    if quota_snapshots is not None:
+        quota_snapshots[account] = snapshot
+    return snapshot
+
+
+def cumulative_weights(rses):
+    """
+    Get the running sum of the weights of a list of rses, to draw from it with bisect.
+
+    :param rses:  List of rse dictionaries with a weight.
+    :returns:     List of the cumulative weights.
+    """
+    cumulative = []
+    total = 0
+    for rse in rses:
+        total += rse['weight']
+        cumulative.append(total)
+    return cumulative
+
+
 class RSESelector():
     """
     Representation of the RSE selector
     """
 
     @read_session
-    def __init__(self, account, rses, weight, copies, ignore_account_limit=False, session=None):
+    def __init__(self, account, rses, weight, copies, ignore_account_limit=False, quota_snapshots=None, session=None):
         """
         Initialize the RSE Selector.
 
@@ -34,6 +73,7 @@ class RSESelector():
         :param weight:                Weighting to use.
         :param copies:                Number of copies to create.
         :param ignore_account_limit:  Flag if the quota should be ignored.
+        :param quota_snapshots:       Dictionary {account: snapshot} shared by the selectors of a daemon cycle, see get_quota_snapshot.
         :param session:               DB Session in use.
         :raises:                      InvalidRuleWeight, InsufficientAccountLimit, InsufficientTargetRSEs
         """
@@ -42,7 +82,7 @@ class RSESelector():
         self.copies = copies
         if weight is not None:
             for rse in rses:
-                attributes = list_rse_attributes(rse=None, rse_id=rse['id'], session=session)
+                attributes = list_cached_rse_attributes(rse=None, rse_id=rse['id'], session=session)
                 if weight not in attributes:
                     continue  # The RSE does not have the required weight set, therefore it is ignored
                 try:
@@ -54,7 +94,7 @@ class RSESelector():
                     raise InvalidRuleWeight('The RSE with id \'%s\' has a non-number specified for the weight \'%s\'' % (rse['id'], weight))
         else:
             for rse in rses:
-                mock_rse = has_rse_attribute(rse['id'], 'mock', session=session)
+                mock_rse = 'mock' in list_cached_rse_attributes(rse=None, rse_id=rse['id'], session=session)
                 self.rses.append({'rse_id': rse['id'],
                                   'weight': 1,
                                   'mock_rse': mock_rse,
@@ -63,26 +103,29 @@ class RSESelector():
         if len(self.rses) < self.copies:
             raise InsufficientTargetRSEs('Target RSE set not sufficient for number of copies. (%s copies requested, RSE set size %s)' % (self.copies, len(self.rses)))
 
-        if has_account_attribute(account=account, key='admin', session=session) or ignore_account_limit:
+        if ignore_account_limit:
             for rse in self.rses:
                 rse['quota_left'] = float('inf')
         else:
+            quota = get_quota_snapshot(account=account, quota_snapshots=quota_snapshots, session=session)
             for rse in self.rses:
-                if rse['mock_rse']:
+                if quota['admin'] or rse['mock_rse']:
                     rse['quota_left'] = float('inf')
                 else:
                     # TODO: Add RSE-space-left here!
-                    limit = get_account_limit(account=account, rse_id=rse['rse_id'], session=session)
+                    limit = quota['limits'].get(rse['rse_id'])
                     if limit is None:
                         rse['quota_left'] = 0
                     else:
-                        rse['quota_left'] = limit - get_counter(rse_id=rse['rse_id'], account=account, session=session)['bytes']
+                        rse['quota_left'] = limit - quota['usage'].get(rse['rse_id'], 0)
 
         self.rses = [rse for rse in self.rses if rse['quota_left'] > 0]
 
         if len(self.rses) < self.copies:
             raise InsufficientAccountLimit('There is insufficient quota on any of the target RSE\'s to fullfill the operation.')
 
+        self.__cumulative_weights = cumulative_weights(self.rses)
+
     def select_rse(self, size, preferred_rse_ids, copies=0, blacklist=[], prioritize_order_over_weight=False):
         """
         Select n RSEs to replicate data to.
@@ -97,11 +140,12 @@ class RSESelector():
         """
 
         result = []
-        rses = self.rses
         count = self.copies if copies == 0 else copies
 
         # Remove blacklisted rses
+        rses = self.rses
         if blacklist:
+            blacklist = set(blacklist)
             rses = [rse for rse in self.rses if rse['rse_id'] not in blacklist]
         if len(rses) < count:
             raise InsufficientTargetRSEs('There are not enough target RSEs to fulfil the request at this time.')
@@ -110,49 +154,49 @@ class RSESelector():
         if len(rses) < count:
             raise InsufficientAccountLimit('There is insufficient quota on any of the target RSE\'s to fullfill the operation.')
 
-        for copy in range(count):
-            # Remove rses already in the result set
-            rses = [rse for rse in rses if rse['rse_id'] not in [item[0] for item in result]]
-            rses_dict = {}
-            for rse in rses:
-                rses_dict[rse['rse_id']] = rse
+        # The running sum of the weights is only rebuilt if some rses were removed
+        if len(rses) == len(self.rses):
+            cumulative = self.__cumulative_weights
+        else:
+            cumulative = cumulative_weights(rses)
+
+        rses_dict = dict((rse['rse_id'], rse) for rse in rses)
+        preferred_rse_ids = [rse_id for rse_id in preferred_rse_ids if rse_id in rses_dict]
+        chosen = set()
+        for copy in xrange(count):
             # Prioritize the preffered rses
-            preferred_rses = [rses_dict[rse_id] for rse_id in preferred_rse_ids if rse_id in rses_dict]
+            preferred_rses = [rses_dict[rse_id] for rse_id in preferred_rse_ids if rse_id not in chosen]
             if prioritize_order_over_weight and preferred_rses:
-                rse = (preferred_rses[0]['rse_id'], preferred_rses[0]['staging_area'])
+                rse = preferred_rses[0]
             elif preferred_rses:
-                rse = self.__choose_rse(preferred_rses)
+                rse = self.__choose_rse(preferred_rses, cumulative_weights(preferred_rses), chosen)
             else:
-                rse = self.__choose_rse(rses)
-            result.append(rse)
-            self.__update_quota(rse, size)
+                rse = self.__choose_rse(rses, cumulative, chosen)
+            chosen.add(rse['rse_id'])
+            result.append((rse['rse_id'], rse['staging_area']))
+            # Update the internal quota value
+            rse['quota_left'] -= size
         return result
 
-    def __update_quota(self, rse, size):
-        """
-        Update the internal quota value.
-
-        :param rse:      RSE tuple to update.
-        :param size:     Size to substract.
-        """
-
-        for element in self.rses:
-            if element['rse_id'] == rse[0]:
-                element['quota_left'] -= size
-                return
-
-    def __choose_rse(self, rses):
+    def __choose_rse(self, rses, cumulative, chosen):
         """
         Choose an RSE based on weighting.
 
-        :param rses:  The rses to be considered for the choose.
-        :return:      The (rse_id, staging_area) tuple of the chosen RSE.
+        Draws from the running sum of the weights and draws again if the RSE was already chosen.
+        After a few unsuccessful draws the chosen RSEs are removed and the sum is rebuilt.
+
+        :param rses:        The rses to be considered for the choose.
+        :param cumulative:  The running sum of the weights of the rses.
+        :param chosen:      Set of the ids of the RSEs already chosen.
+        :return:            The dictionary of the chosen RSE.
         """
 
-        shuffle(rses)
-        pick = uniform(0, sum([rse['weight'] for rse in rses]))
-        weight = 0
-        for rse in rses:
-            weight += rse['weight']
-            if pick <= weight:
-                return (rse['rse_id'], rse['staging_area'])
+        for _ in xrange(8):
+            if cumulative[-1] > 0:
+                rse = rses[min(bisect_left(cumulative, uniform(0, cumulative[-1])), len(rses) - 1)]
+            else:
+                rse = choice(rses)
+            if rse['rse_id'] not in chosen:
+                return rse
+        rses = [item for item in rses if item['rse_id'] not in chosen]
+        return self.__choose_rse(rses, cumulative_weights(rses), ())
@@ -37,12 +37,12 @@ from rucio.common.exception import (InvalidRSEExpression, InvalidReplicationRule
                                     InvalidObject, RSEBlacklisted, RuleReplaceFailed, RequestNotFound,
                                     ManualRuleApprovalBlocked, UnsupportedOperation)
 from rucio.common.schema import validate_schema
-from rucio.common.utils import str_to_date, sizefmt
+from rucio.common.utils import str_to_date, sizefmt, chunks
 from rucio.common.policy import get_scratch_policy, define_eol
 from rucio.core import account_counter, rse_counter
 from rucio.core.account import get_account
 from rucio.core.message import add_message
-from rucio.core.monitor import record_timer_block
+from rucio.core.monitor import record_counter, record_timer_block
 from rucio.core.rse import get_rse_name, list_rse_attributes, get_rse
 from rucio.core.rse_expression_parser import parse_expression
 from rucio.core.request import get_request_by_did, queue_requests, cancel_request_did, update_requests_priority
@@ -226,34 +226,33 @@ def add_rule(dids, account, copies, rse_expression, grouping, weight, lifetime,
                 logging.debug("Created rule %s for injection" % (str(new_rule.id)))
                 continue
 
-            # 5. Resolve the did to its contents
-            with record_timer_block('rule.add_rule.resolve_dids_to_locks_replicas'):
+            # 5. Resolve the did to its contents and 6. apply the replication rule to create locks, replicas and transfers
+            with record_timer_block('rule.add_rule.create_locks_replicas_transfers'):
+                sumfiles = 0
                 # Get all Replicas, not only the ones interesting for the rse_expression
-                datasetfiles, locks, replicas, source_replicas = __resolve_did_to_locks_and_replicas(did=did,
-                                                                                                     nowait=False,
-                                                                                                     restrict_rses=[rse['id'] for rse in rses],
-                                                                                                     source_rses=[rse['id'] for rse in source_rses],
-                                                                                                     session=session)
+                for datasetfiles, locks, replicas, source_replicas in __resolve_did_to_locks_and_replicas_by_dataset(did=did,
+                                                                                                                      grouping=new_rule.grouping,
+                                                                                                                      nowait=False,
+                                                                                                                      restrict_rses=[rse['id'] for rse in rses],
+                                                                                                                      source_rses=[rse['id'] for rse in source_rses],
+                                                                                                                      session=session):
+                    sumfiles += sum([len(x['files']) for x in datasetfiles])
+                    try:
+                        __create_locks_replicas_transfers(datasetfiles=datasetfiles,
+                                                          locks=locks,
+                                                          replicas=replicas,
+                                                          source_replicas=source_replicas,
+                                                          rseselector=rseselector,
+                                                          rule=new_rule,
+                                                          preferred_rse_ids=[],
+                                                          source_rses=[rse['id'] for rse in source_rses],
+                                                          session=session)
+                    except IntegrityError, e:
+                        raise ReplicationRuleCreationTemporaryFailed(e.args[0])
 
-            sumfiles = sum([len(x['files']) for x in datasetfiles])
             if sumfiles > 30000:
                 logging.warning('Rule %s for %s:%s involves %d files' % (str(new_rule.id), new_rule.scope, new_rule.name, sumfiles))
 
-            # 6. Apply the replication rule to create locks, replicas and transfers
-            with record_timer_block('rule.add_rule.create_locks_replicas_transfers'):
-                try:
-                    __create_locks_replicas_transfers(datasetfiles=datasetfiles,
-                                                      locks=locks,
-                                                      replicas=replicas,
-                                                      source_replicas=source_replicas,
-                                                      rseselector=rseselector,
-                                                      rule=new_rule,
-                                                      preferred_rse_ids=[],
-                                                      source_rses=[rse['id'] for rse in source_rses],
-                                                      session=session)
-                except IntegrityError, e:
-                    raise ReplicationRuleCreationTemporaryFailed(e.args[0])
-
             if new_rule.locks_stuck_cnt > 0:
                 new_rule.state = RuleState.STUCK
                 new_rule.error = 'MissingSourceReplica'
@@ -296,6 +295,7 @@ def add_rules(dids, rules, session=None):
 
     with record_timer_block('rule.add_rules'):
         rule_ids = {}
+        quota_snapshots = {}
 
         # 1. Fetch the RSEs from the RSE expression to restrict further queries just on these RSEs
         restrict_rses = []
@@ -371,7 +371,7 @@ def add_rules(dids, rules, session=None):
 
                     # 5. Create the RSE selector
                     with record_timer_block('rule.add_rules.create_rse_selector'):
-                        rseselector = RSESelector(account=rule['account'], rses=rses, weight=rule.get('weight'), copies=rule['copies'], ignore_account_limit=rule.get('ask_approval', False), session=session)
+                        rseselector = RSESelector(account=rule['account'], rses=rses, weight=rule.get('weight'), copies=rule['copies'], ignore_account_limit=rule.get('ask_approval', False), quota_snapshots=quota_snapshots, session=session)
 
                     # 4. Create the replication rule
                     with record_timer_block('rule.add_rules.create_rule'):
@@ -489,13 +489,13 @@ def add_rules(dids, rules, session=None):
 
 
 @transactional_session
-def inject_rule(rule_id, session=None):
+def inject_rule(rule_id, quota_snapshots=None, session=None):
     """
     Inject a replication rule.
 
-    :param rule_id:    The id of the rule to inject.
-    :param new_owner:  The new owner of the rule.
-    :param session:    The database session in use.
+    :param rule_id:          The id of the rule to inject.
+    :param quota_snapshots:  Dictionary {account: quota snapshot} shared with other injections, see rse_selector.get_quota_snapshot.
+    :param session:          The database session in use.
     :raises:           InvalidReplicationRule, InsufficientAccountLimit, InvalidRSEExpression, DataId
     """
     try:
@@ -553,7 +553,7 @@ def inject_rule(rule_id, session=None):
 
     # 2. Create the rse selector
     with record_timer_block('rule.add_rule.create_rse_selector'):
-        rseselector = RSESelector(account=rule['account'], rses=rses, weight=rule.weight, copies=rule.copies, ignore_account_limit=rule.ignore_account_limit, session=session)
+        rseselector = RSESelector(account=rule['account'], rses=rses, weight=rule.weight, copies=rule.copies, ignore_account_limit=rule.ignore_account_limit, quota_snapshots=quota_snapshots, session=session)
 
     # 3. Get the did
     with record_timer_block('rule.add_rule.get_did'):
@@ -565,54 +565,118 @@ def inject_rule(rule_id, session=None):
         except TypeError, e:
             raise InvalidObject(e.args)
 
-    # 5. Resolve the did to its contents
-    with record_timer_block('rule.add_rule.resolve_dids_to_locks_replicas'):
+    # 5. Resolve the did to its contents and 6. apply the replication rule to create locks, replicas and transfers
+    with record_timer_block('rule.add_rule.create_locks_replicas_transfers'):
         # Get all Replicas, not only the ones interesting for the rse_expression
-        datasetfiles, locks, replicas, source_replicas = __resolve_did_to_locks_and_replicas(did=did,
-                                                                                             nowait=True,
-                                                                                             restrict_rses=[rse['id'] for rse in rses],
-                                                                                             source_rses=[rse['id'] for rse in source_rses],
-                                                                                             session=session)
+        for datasetfiles, locks, replicas, source_replicas in __resolve_did_to_locks_and_replicas_by_dataset(did=did,
+                                                                                                              grouping=rule.grouping,
+                                                                                                              nowait=True,
+                                                                                                              restrict_rses=[rse['id'] for rse in rses],
+                                                                                                              source_rses=[rse['id'] for rse in source_rses],
+                                                                                                              session=session):
+            try:
+                __create_locks_replicas_transfers(datasetfiles=datasetfiles,
+                                                  locks=locks,
+                                                  replicas=replicas,
+                                                  source_replicas=source_replicas,
+                                                  rseselector=rseselector,
+                                                  rule=rule,
+                                                  preferred_rse_ids=[],
+                                                  source_rses=[rse['id'] for rse in source_rses],
+                                                  session=session)
+            except IntegrityError, e:
+                raise ReplicationRuleCreationTemporaryFailed(e.args[0])
 
-    # 6. Apply the replication rule to create locks, replicas and transfers
-    with record_timer_block('rule.add_rule.create_locks_replicas_transfers'):
-        try:
-            __create_locks_replicas_transfers(datasetfiles=datasetfiles,
-                                              locks=locks,
-                                              replicas=replicas,
-                                              source_replicas=source_replicas,
-                                              rseselector=rseselector,
-                                              rule=rule,
-                                              preferred_rse_ids=[],
-                                              source_rses=[rse['id'] for rse in source_rses],
-                                              session=session)
-        except IntegrityError, e:
-            raise ReplicationRuleCreationTemporaryFailed(e.args[0])
+        __update_injected_rule_state(rule=rule, session=session)
 
-        if rule.locks_stuck_cnt > 0:
-            rule.state = RuleState.STUCK
-            rule.error = 'MissingSourceReplica'
-            if rule.grouping != RuleGrouping.NONE:
-                session.query(models.DatasetLock).filter_by(rule_id=rule.id).update({'state': LockState.STUCK})
-        elif rule.locks_replicating_cnt == 0:
-            rule.state = RuleState.OK
-            if rule.grouping != RuleGrouping.NONE:
-                session.query(models.DatasetLock).filter_by(rule_id=rule.id).update({'state': LockState.OK})
-                session.flush()
-                generate_message_for_dataset_ok_callback(rule=rule, session=session)
-            if rule.notification == RuleNotification.YES:
-                generate_email_for_rule_ok_notification(rule=rule, session=session)
-            # Try to release potential parent rules
-            release_parent_rule(child_rule_id=rule.id, session=session)
-        else:
-            rule.state = RuleState.REPLICATING
-            if rule.grouping != RuleGrouping.NONE:
-                session.query(models.DatasetLock).filter_by(rule_id=rule.id).update({'state': LockState.REPLICATING})
 
-        # Add rule to History
-        insert_rule_history(rule=rule, recent=True, longterm=True, session=session)
+@transactional_session
+def inject_rules(rule_ids, quota_snapshots=None, session=None):
+    """
+    Inject a batch of replication rules.
+
+    The rules are grouped by did, and each did is resolved once for all its rules. The locks and
+    transfers of the rules of a did are inserted and queued together, dataset by dataset, so the
+    locks of a file shared by several datasets are found when the next dataset is resolved.
 
-        logging.debug("Created rule %s [%d/%d/%d]" % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
+    :param rule_ids:         The ids of the rules to inject. Rules which do not exist anymore are skipped.
+    :param quota_snapshots:  Dictionary {account: quota snapshot} shared with other injections, see rse_selector.get_quota_snapshot.
+    :param session:          The database session in use.
+    :raises:                 InvalidReplicationRule, InsufficientAccountLimit, InvalidRSEExpression, DataIdentifierNotFound, ReplicationRuleCreationTemporaryFailed
+    """
+    if quota_snapshots is None:
+        quota_snapshots = {}
+
+    rules = []
+    for chunk in chunks(rule_ids, 1000):
+        rules.extend(session.query(models.ReplicationRule).filter(models.ReplicationRule.id.in_(chunk)).with_for_update(nowait=True).all())
+
+    grouped_rules = {}
+    for rule in rules:
+        if rule.did_type == DIDType.CONTAINER and '.r2d2_request.' in rule.name:
+            inject_rule(rule_id=rule.id, quota_snapshots=quota_snapshots, session=session)
+        else:
+            grouped_rules.setdefault((rule.scope, rule.name), []).append(rule)
+
+    for (scope, name), did_rules in grouped_rules.iteritems():
+        with record_timer_block('rule.inject_rules.did'):
+            # 1. Resolve the rse_expressions and create the rse selectors
+            targets = []  # [(rule, rseselector, source_rse_ids)]
+            restrict_rses, all_source_rses = set(), set()
+            for rule in did_rules:
+                if rule.ignore_availability:
+                    rses = parse_expression(rule.rse_expression, session=session)
+                else:
+                    rses = parse_expression(rule.rse_expression, filter={'availability_write': True}, session=session)
+                source_rse_ids = []
+                if rule.source_replica_expression:
+                    source_rse_ids = [rse['id'] for rse in parse_expression(rule.source_replica_expression, session=session)]
+                rseselector = RSESelector(account=rule.account, rses=rses, weight=rule.weight, copies=rule.copies, ignore_account_limit=rule.ignore_account_limit, quota_snapshots=quota_snapshots, session=session)
+                targets.append((rule, rseselector, source_rse_ids))
+                restrict_rses.update([rse['id'] for rse in rses])
+                all_source_rses.update(source_rse_ids)
+
+            # 2. Get the did
+            try:
+                did = session.query(models.DataIdentifier).filter(models.DataIdentifier.scope == scope,
+                                                                  models.DataIdentifier.name == name).one()
+            except NoResultFound:
+                raise DataIdentifierNotFound('Data identifier %s:%s is not valid.' % (scope, name))
+
+            # 3. Resolve the did once and apply all the rules to it
+            if [rule for rule in did_rules if rule.grouping == RuleGrouping.ALL]:
+                grouping = RuleGrouping.ALL
+            else:
+                grouping = RuleGrouping.DATASET
+            deferred_locks, deferred_transfers = [], []
+            for datasetfiles, locks, replicas, source_replicas in __resolve_did_to_locks_and_replicas_by_dataset(did=did,
+                                                                                                                  grouping=grouping,
+                                                                                                                  nowait=True,
+                                                                                                                  restrict_rses=list(restrict_rses),
+                                                                                                                  source_rses=list(all_source_rses),
+                                                                                                                  session=session):
+                for rule, rseselector, source_rse_ids in targets:
+                    try:
+                        __create_locks_replicas_transfers(datasetfiles=datasetfiles,
+                                                          locks=locks,
+                                                          replicas=replicas,
+                                                          source_replicas=source_replicas,
+                                                          rseselector=rseselector,
+                                                          rule=rule,
+                                                          preferred_rse_ids=[],
+                                                          source_rses=source_rse_ids,
+                                                          deferred_locks=deferred_locks,
+                                                          deferred_transfers=deferred_transfers,
+                                                          session=session)
+                    except IntegrityError, e:
+                        raise ReplicationRuleCreationTemporaryFailed(e.args[0])
+                __insert_locks_and_transfers(locks=deferred_locks, transfers=deferred_transfers, session=session)
+                deferred_locks, deferred_transfers = [], []
+
+            # 4. Update the state of the rules
+            for rule in did_rules:
+                __update_injected_rule_state(rule=rule, session=session)
+        record_counter('rule.inject_rules.rules', delta=len(did_rules))
 
 
 @stream_session
@@ -1261,13 +1325,14 @@ def reduce_rule(rule_id, copies, exclude_expression=None, session=None):
 
 
 @transactional_session
-def re_evaluate_did(scope, name, rule_evaluation_action, session=None):
+def re_evaluate_did(scope, name, rule_evaluation_action, quota_snapshots=None, session=None):
     """
     Re-Evaluates a did.
 
     :param scope:                   The scope of the did to be re-evaluated.
     :param name:                    The name of the did to be re-evaluated.
     :param rule_evaluation_action:  The Rule evaluation action.
+    :param quota_snapshots:         Dictionary {account: quota snapshot} shared with other evaluations, see rse_selector.get_quota_snapshot.
     :param session:                 The database session in use.
     :raises:                        DataIdentifierNotFound
     """
@@ -1279,7 +1344,7 @@ def re_evaluate_did(scope, name, rule_evaluation_action, session=None):
         raise DataIdentifierNotFound()
 
     if rule_evaluation_action == DIDReEvaluation.ATTACH:
-        __evaluate_did_attach(did, session=session)
+        __evaluate_did_attach(did, quota_snapshots=quota_snapshots, session=session)
     else:
         __evaluate_did_detach(did, session=session)
 
@@ -1424,16 +1489,17 @@ def get_injected_rules(total_workers, worker_number, limit=100, blacklisted_rule
     :param limit:              Maximum number of rules to return.
     :param blacklisted_rules:  Blacklisted rules not to include.
     :param session:            Database session in use.
+    :returns:                  List of (rule_id, scope, name) tuples.
     """
 
     if session.bind.dialect.name == 'oracle':
-        query = session.query(models.ReplicationRule.id).\
+        query = session.query(models.ReplicationRule.id, models.ReplicationRule.scope, models.ReplicationRule.name).\
             with_hint(models.ReplicationRule, "index(rules RULES_INJECTIONSTATE_IDX)", 'oracle').\
             filter(text("(CASE when rules.state='I' THEN rules.state ELSE null END)= 'I' ")).\
             filter(models.ReplicationRule.state == RuleState.INJECT).\
             order_by(models.ReplicationRule.created_at)
     else:
-        query = session.query(models.ReplicationRule.id).\
+        query = session.query(models.ReplicationRule.id, models.ReplicationRule.scope, models.ReplicationRule.name).\
             with_hint(models.ReplicationRule, "index(rules RULES_INJECTIONSTATE_IDX)", 'oracle').\
             filter(models.ReplicationRule.state == RuleState.INJECT).\
             order_by(models.ReplicationRule.created_at)
@@ -1549,6 +1615,46 @@ def delete_updated_did(id, scope, name, session=None):
     session.query(models.UpdatedDID).filter(models.UpdatedDID.id == id).delete()
 
 
+@transactional_session
+def delete_updated_dids(dids, session=None):
+    """
+    Delete the updated_dids of evaluated dids: the given rows and the duplicate rows older than a minute.
+
+    :param dids:     List of dictionaries {'scope':, 'name':, 'rule_evaluation_action':, 'ids': [ids of updated_dids]}.
+    :param session:  The database session in use.
+    """
+    ids = [id for did in dids for id in did['ids']]
+    for chunk in chunks(ids, 1000):
+        session.query(models.UpdatedDID).filter(models.UpdatedDID.id.in_(chunk)).delete(synchronize_session=False)
+
+    older_than = datetime.utcnow() - timedelta(seconds=60)
+    for chunk in chunks(dids, 100):
+        session.query(models.UpdatedDID).filter(or_(*[and_(models.UpdatedDID.scope == did['scope'],
+                                                           models.UpdatedDID.name == did['name'],
+                                                           models.UpdatedDID.rule_evaluation_action == did['rule_evaluation_action']) for did in chunk]),
+                                                models.UpdatedDID.created_at < older_than).delete(synchronize_session=False)
+
+
+@transactional_session
+def re_evaluate_dids(dids, quota_snapshots=None, session=None):
+    """
+    Re-Evaluates a group of dids in one transaction and deletes their updated_dids.
+    Dids which do not exist anymore are skipped.
+
+    :param dids:             List of dictionaries {'scope':, 'name':, 'rule_evaluation_action':, 'ids': [ids of updated_dids]}.
+    :param quota_snapshots:  Dictionary {account: quota snapshot} shared with other evaluations, see rse_selector.get_quota_snapshot.
+    :param session:          The database session in use.
+    """
+    if quota_snapshots is None:
+        quota_snapshots = {}
+    for did in dids:
+        try:
+            re_evaluate_did(scope=did['scope'], name=did['name'], rule_evaluation_action=did['rule_evaluation_action'], quota_snapshots=quota_snapshots, session=session)
+        except DataIdentifierNotFound:
+            pass
+    delete_updated_dids(dids, session=session)
+
+
 @transactional_session
 def update_rules_for_lost_replica(scope, name, rse_id, nowait=False, session=None):
     """
@@ -2221,12 +2327,13 @@ def __evaluate_did_detach(eval_did, session=None):
 
 
 @transactional_session
-def __evaluate_did_attach(eval_did, session=None):
+def __evaluate_did_attach(eval_did, quota_snapshots=None, session=None):
     """
     Evaluate a parent did which has new childs
 
-    :param eval_did:  The did object in use.
-    :param session:   The database session in use.
+    :param eval_did:         The did object in use.
+    :param quota_snapshots:  Dictionary {account: quota snapshot} shared with other evaluations, see rse_selector.get_quota_snapshot.
+    :param session:          The database session in use.
     :raises:          ReplicationRuleCreationTemporaryFailed
     """
 
@@ -2317,6 +2424,7 @@ def __evaluate_did_attach(eval_did, session=None):
                                                       rses=rses,
                                                       weight=rule.weight,
                                                       copies=rule.copies,
+                                                      quota_snapshots=quota_snapshots,
                                                       session=session)
                         except (InvalidRuleWeight, InsufficientTargetRSEs, InsufficientAccountLimit) as e:
                             rule.state = RuleState.STUCK
@@ -2458,7 +2566,7 @@ def __resolve_did_to_locks_and_replicas(did, nowait=False, restrict_rses=None, s
         for dataset in rucio.core.did.list_child_datasets(scope=did.scope, name=did.name, session=session):
             files = []
             tmp_locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, only_stuck=True, session=session)
-            locks = dict(locks.items() + tmp_locks.items())
+            locks.update(tmp_locks)
             for file in tmp_locks:
                 file_did = rucio.core.did.get_did(scope=file[0], name=file[1], session=session)
                 files.append({'scope': file[0], 'name': file[1], 'bytes': file_did['bytes'], 'md5': file_did['md5'], 'adler32': file_did['adler32']})
@@ -2474,14 +2582,13 @@ def __resolve_did_to_locks_and_replicas(did, nowait=False, restrict_rses=None, s
         for dataset in rucio.core.did.list_child_datasets(scope=did.scope, name=did.name, session=session):
             files, tmp_replicas = rucio.core.replica.get_and_lock_file_replicas_for_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, session=session)
             if source_rses:
-                tmp_source_replicas = rucio.core.replica.get_source_replicas_for_dataset(scope=dataset['scope'], name=dataset['name'], source_rses=source_rses, session=session)
-                source_replicas = dict(source_replicas.items() + tmp_source_replicas.items())
+                source_replicas.update(rucio.core.replica.get_source_replicas_for_dataset(scope=dataset['scope'], name=dataset['name'], source_rses=source_rses, session=session))
             tmp_locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, session=session)
             datasetfiles.append({'scope': dataset['scope'],
                                  'name': dataset['name'],
                                  'files': files})
-            replicas = dict(replicas.items() + tmp_replicas.items())
-            locks = dict(locks.items() + tmp_locks.items())
+            replicas.update(tmp_replicas)
+            locks.update(tmp_locks)
 
     else:
         raise InvalidReplicationRule('The did \"%s:%s\" has been deleted.' % (did.scope, did.name))
@@ -2489,6 +2596,34 @@ def __resolve_did_to_locks_and_replicas(did, nowait=False, restrict_rses=None, s
     return datasetfiles, locks, replicas, source_replicas
 
 
+def __resolve_did_to_locks_and_replicas_by_dataset(did, grouping, nowait=False, restrict_rses=None, source_rses=None, session=None):
+    """
+    Resolves a did like __resolve_did_to_locks_and_replicas, but yields the files, locks and replicas of
+    a container one dataset at a time, so that only one dataset is held in memory. Files and datasets,
+    and containers for rules with ALL grouping, whose files are placed together, are resolved in one step.
+
+    :param did:            The db object of the did the rule is applied on.
+    :param grouping:       The grouping of the rule.
+    :param nowait:         Nowait parameter for the FOR UPDATE statement.
+    :param restrict_rses:  Possible rses of the rule, so only these replica/locks should be considered.
+    :param source_rses:    Source rses for this rule. These replicas are not row-locked.
+    :param session:        Session of the db.
+    :returns:              Generator of (datasetfiles, locks, replicas, source_replicas)
+    """
+
+    if did.did_type != DIDType.CONTAINER or grouping == RuleGrouping.ALL:
+        yield __resolve_did_to_locks_and_replicas(did=did, nowait=nowait, restrict_rses=restrict_rses, source_rses=source_rses, session=session)
+        return
+
+    for dataset in rucio.core.did.list_child_datasets(scope=did.scope, name=did.name, session=session):
+        files, replicas = rucio.core.replica.get_and_lock_file_replicas_for_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, session=session)
+        source_replicas = {}
+        if source_rses:
+            source_replicas = rucio.core.replica.get_source_replicas_for_dataset(scope=dataset['scope'], name=dataset['name'], source_rses=source_rses, session=session)
+        locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, session=session)
+        yield [{'scope': dataset['scope'], 'name': dataset['name'], 'files': files}], locks, replicas, source_replicas
+
+
 @transactional_session
 def __resolve_dids_to_locks_and_replicas(dids, nowait=False, restrict_rses=[], source_rses=None, session=None):
     """
@@ -2595,26 +2730,28 @@ def __resolve_dids_to_locks_and_replicas(dids, nowait=False, restrict_rses=[], s
                                                                                                                  source_rses=source_rses,
                                                                                                                  session=session)
             datasetfiles.extend(tmp_datasetfiles)
-            locks = dict(locks.items() + tmp_locks.items())
-            replicas = dict(replicas.items() + tmp_replicas.items())
-            source_replicas = dict(source_replicas.items() + tmp_source_replicas.items())
+            locks.update(tmp_locks)
+            replicas.update(tmp_replicas)
+            source_replicas.update(tmp_source_replicas)
     return datasetfiles, locks, replicas, source_replicas
 
 
 @transactional_session
-def __create_locks_replicas_transfers(datasetfiles, locks, replicas, source_replicas, rseselector, rule, preferred_rse_ids=[], source_rses=[], session=None):
+def __create_locks_replicas_transfers(datasetfiles, locks, replicas, source_replicas, rseselector, rule, preferred_rse_ids=[], source_rses=[], deferred_locks=None, deferred_transfers=None, session=None):
     """
     Apply a created replication rule to a set of files
 
-    :param datasetfiles:       Dict holding all datasets and files.
-    :param locks:              Dict holding locks.
-    :param replicas:           Dict holding replicas.
-    :param source_replicas:    Dict holding source replicas.
-    :param rseselector:        The RSESelector to be used.
-    :param rule:               The rule.
-    :param preferred_rse_ids:  Preferred RSE's to select.
-    :param source_rses:        RSE ids of eglible source replicas.
-    :param session:            Session of the db.
+    :param datasetfiles:        Dict holding all datasets and files.
+    :param locks:               Dict holding locks.
+    :param replicas:            Dict holding replicas.
+    :param source_replicas:     Dict holding source replicas.
+    :param rseselector:         The RSESelector to be used.
+    :param rule:                The rule.
+    :param preferred_rse_ids:   Preferred RSE's to select.
+    :param source_rses:         RSE ids of eglible source replicas.
+    :param deferred_locks:      If given, the new locks are appended to this list instead of being inserted.
+    :param deferred_transfers:  If given, the new transfers are appended to this list instead of being queued.
+    :param session:             Session of the db.
     :raises:                   InsufficientAccountLimit, IntegrityError, InsufficientTargetRSEs
     :attention:                This method modifies the contents of the locks and replicas input parameters.
     """
@@ -2635,8 +2772,11 @@ def __create_locks_replicas_transfers(datasetfiles, locks, replicas, source_repl
     session.flush()
 
     # Add the locks
-    session.add_all([item for sublist in locks_to_create.values() for item in sublist])
-    session.flush()
+    if deferred_locks is not None:
+        deferred_locks.extend([item for sublist in locks_to_create.values() for item in sublist])
+    else:
+        session.add_all([item for sublist in locks_to_create.values() for item in sublist])
+        session.flush()
 
     # Increase rse_counters
     for rse_id in replicas_to_create.keys():
@@ -2648,11 +2788,71 @@ def __create_locks_replicas_transfers(datasetfiles, locks, replicas, source_repl
 
     # Add the transfers
     logging.debug("Rule %s  [%d/%d/%d] queued %d transfers" % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt, len(transfers_to_create)))
+    if deferred_transfers is not None:
+        deferred_transfers.extend(transfers_to_create)
+        return
     queue_requests(requests=transfers_to_create, session=session)
     session.flush()
     logging.debug("Finished creating locks and replicas for rule %s [%d/%d/%d]" % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
 
 
+@transactional_session
+def __update_injected_rule_state(rule, session=None):
+    """
+    Set the state of an injected rule from its lock counters and add it to the history.
+
+    :param rule:     The rule object.
+    :param session:  Session of the db.
+    """
+
+    if rule.locks_stuck_cnt > 0:
+        rule.state = RuleState.STUCK
+        rule.error = 'MissingSourceReplica'
+        if rule.grouping != RuleGrouping.NONE:
+            session.query(models.DatasetLock).filter_by(rule_id=rule.id).update({'state': LockState.STUCK})
+    elif rule.locks_replicating_cnt == 0:
+        rule.state = RuleState.OK
+        if rule.grouping != RuleGrouping.NONE:
+            session.query(models.DatasetLock).filter_by(rule_id=rule.id).update({'state': LockState.OK})
+            session.flush()
+            generate_message_for_dataset_ok_callback(rule=rule, session=session)
+        if rule.notification == RuleNotification.YES:
+            generate_email_for_rule_ok_notification(rule=rule, session=session)
+        # Try to release potential parent rules
+        release_parent_rule(child_rule_id=rule.id, session=session)
+    else:
+        rule.state = RuleState.REPLICATING
+        if rule.grouping != RuleGrouping.NONE:
+            session.query(models.DatasetLock).filter_by(rule_id=rule.id).update({'state': LockState.REPLICATING})
+
+    # Add rule to History
+    insert_rule_history(rule=rule, recent=True, longterm=True, session=session)
+
+    logging.debug("Created rule %s [%d/%d/%d]" % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
+
+
+@transactional_session
+def __insert_locks_and_transfers(locks, transfers, session=None):
+    """
+    Insert the locks and queue the transfers collected for several rules.
+
+    :param locks:      List of the lock objects.
+    :param transfers:  List of the transfer dictionaries.
+    :param session:    Session of the db.
+    :raises:           ReplicationRuleCreationTemporaryFailed
+    """
+
+    try:
+        if locks:
+            session.add_all(locks)
+            session.flush()
+        if transfers:
+            queue_requests(requests=transfers, session=session)
+            session.flush()
+    except IntegrityError, e:
+        raise ReplicationRuleCreationTemporaryFailed(e.args[0])
+
+
 @transactional_session
 def __delete_lock_and_update_replica(lock, purge_replicas=False, nowait=False, session=None):
     """
@@ -18,7 +18,8 @@ import time
 import traceback
 
 from rucio.common.config import config_get
-from rucio.core.account_counter import get_updated_account_counters, update_account_counter
+from rucio.core.account_counter import update_account_counters
+from rucio.core.monitor import record_counter
 
 graceful_stop = threading.Event()
 
@@ -27,9 +28,20 @@ logging.basicConfig(stream=sys.stdout,
                     format='%(asctime)s\t%(process)d\t%(levelname)s\t%(message)s')
 
 
-def account_update(once=False, process=0, total_processes=1, thread=0, threads_per_process=1):
+def account_update(once=False, process=0, total_processes=1, thread=0, threads_per_process=1, bulk=10000, sleep_time=2):
     """
     Main loop to check and update the Account Counters.
+
+    Each iteration applies the pending account counter updates of the worker in slices of bulk rows,
+    until a slice is not full.
+
+    :param once:                 Run only once.
+    :param process:              Number of the process.
+    :param total_processes:      Total number of processes.
+    :param thread:               Number of the thread in the process.
+    :param threads_per_process:  Total number of threads per process.
+    :param bulk:                 Number of updated_account_counters rows applied per transaction.
+    :param sleep_time:           Seconds to sleep when there is nothing to apply.
     """
 
     logging.info('account_update: starting')
@@ -38,26 +50,23 @@ def account_update(once=False, process=0, total_processes=1, thread=0, threads_p
 
     while not graceful_stop.is_set():
         try:
-            # Select a bunch of rses for to update for this worker
-            start = time.time()  # NOQA
-            account_rse_ids = get_updated_account_counters(total_workers=total_processes * threads_per_process - 1,
-                                                           worker_number=process * threads_per_process + thread)
-            logging.debug('Index query time %f size=%d' % (time.time() - start, len(account_rse_ids)))
-
-            # If the list is empty, sent the worker to sleep
-            if not account_rse_ids and not once:
+            applied = bulk
+            total = 0
+            while applied == bulk and not graceful_stop.is_set():
+                start_time = time.time()
+                applied = update_account_counters(total_workers=total_processes * threads_per_process - 1,
+                                                  worker_number=process * threads_per_process + thread,
+                                                  limit=bulk)
+                total += applied
+                record_counter('abacus.account.updates', delta=applied)
+                logging.debug('account_update[%s/%s]: applied %d updates in %f' % (process * threads_per_process + thread, total_processes * threads_per_process - 1, applied, time.time() - start_time))
+
+            # If there was nothing to apply, sent the worker to sleep
+            if not total and not once:
                 logging.info('account_update[%s/%s] did not get any work' % (process * threads_per_process + thread, total_processes * threads_per_process - 1))
-                time.sleep(10)
-            else:
-                for account_rse_id in account_rse_ids:
-                    if graceful_stop.is_set():
-                        break
-                    start_time = time.time()
-                    update_account_counter(account=account_rse_id[0], rse_id=account_rse_id[1])
-                    logging.debug('account_update[%s/%s]: update of account-rse counter "%s-%s" took %f' % (process * threads_per_process + thread, total_processes * threads_per_process - 1, account_rse_id[0], account_rse_id[1], time.time() - start_time))
+                time.sleep(sleep_time)
         except Exception:
             logging.error(traceback.format_exc())
-
         if once:
             break
 
@@ -74,16 +83,16 @@ def stop(signum=None, frame=None):
     graceful_stop.set()
 
 
-def run(once=False, process=0, total_processes=1, threads_per_process=11):
+def run(once=False, process=0, total_processes=1, threads_per_process=11, bulk=10000, sleep_time=2):
     """
     Starts up the Abacus-Account threads.
     """
     if once:
         logging.info('main: executing one iteration only')
-        account_update(once)
+        account_update(once=once, bulk=bulk)
     else:
         logging.info('main: starting threads')
-        threads = [threading.Thread(target=account_update, kwargs={'process': process, 'total_processes': total_processes, 'once': once, 'thread': i, 'threads_per_process': threads_per_process}) for i in xrange(0, threads_per_process)]
+        threads = [threading.Thread(target=account_update, kwargs={'process': process, 'total_processes': total_processes, 'once': once, 'thread': i, 'threads_per_process': threads_per_process, 'bulk': bulk, 'sleep_time': sleep_time}) for i in xrange(0, threads_per_process)]
         [t.start() for t in threads]
         logging.info('main: waiting for interrupts')
         # Interruptible joins require a timeout.
@@ -18,7 +18,8 @@ import time
 import traceback
 
 from rucio.common.config import config_get
-from rucio.core.rse_counter import get_updated_rse_counters, update_rse_counter
+from rucio.core.rse_counter import update_rse_counters
+from rucio.core.monitor import record_counter
 
 graceful_stop = threading.Event()
 
@@ -27,9 +28,20 @@ logging.basicConfig(stream=sys.stdout,
                     format='%(asctime)s\t%(process)d\t%(levelname)s\t%(message)s')
 
 
-def rse_update(once=False, process=0, total_processes=1, thread=0, threads_per_process=1):
+def rse_update(once=False, process=0, total_processes=1, thread=0, threads_per_process=1, bulk=10000, sleep_time=2):
     """
     Main loop to check and update the RSE Counters.
+
+    Each iteration applies the pending rse counter updates of the worker in slices of bulk rows,
+    until a slice is not full.
+
+    :param once:                 Run only once.
+    :param process:              Number of the process.
+    :param total_processes:      Total number of processes.
+    :param thread:               Number of the thread in the process.
+    :param threads_per_process:  Total number of threads per process.
+    :param bulk:                 Number of updated_rse_counters rows applied per transaction.
+    :param sleep_time:           Seconds to sleep when there is nothing to apply.
     """
 
     logging.info('rse_update: starting')
@@ -38,23 +50,21 @@ def rse_update(once=False, process=0, total_processes=1, thread=0, threads_per_p
 
     while not graceful_stop.is_set():
         try:
-            # Select a bunch of rses for to update for this worker
-            start = time.time()  # NOQA
-            rse_ids = get_updated_rse_counters(total_workers=total_processes * threads_per_process - 1,
-                                               worker_number=process * threads_per_process + thread)
-            logging.debug('Index query time %f size=%d' % (time.time() - start, len(rse_ids)))
-
-            # If the list is empty, sent the worker to sleep
-            if not rse_ids and not once:
+            applied = bulk
+            total = 0
+            while applied == bulk and not graceful_stop.is_set():
+                start_time = time.time()
+                applied = update_rse_counters(total_workers=total_processes * threads_per_process - 1,
+                                              worker_number=process * threads_per_process + thread,
+                                              limit=bulk)
+                total += applied
+                record_counter('abacus.rse.updates', delta=applied)
+                logging.debug('rse_update[%s/%s]: applied %d updates in %f' % (process * threads_per_process + thread, total_processes * threads_per_process - 1, applied, time.time() - start_time))
+
+            # If there was nothing to apply, sent the worker to sleep
+            if not total and not once:
                 logging.info('rse_update[%s/%s] did not get any work' % (process * threads_per_process + thread, total_processes * threads_per_process - 1))
-                time.sleep(10)
-            else:
-                for rse_id in rse_ids:
-                    if graceful_stop.is_set():
-                        break
-                    start_time = time.time()
-                    update_rse_counter(rse_id=rse_id)
-                    logging.debug('rse_update[%s/%s]: update of rse "%s" took %f' % (process * threads_per_process + thread, total_processes * threads_per_process - 1, rse_id, time.time() - start_time))
+                time.sleep(sleep_time)
         except Exception:
             logging.error(traceback.format_exc())
         if once:
@@ -73,16 +83,16 @@ def stop(signum=None, frame=None):
     graceful_stop.set()
 
 
-def run(once=False, process=0, total_processes=1, threads_per_process=11):
+def run(once=False, process=0, total_processes=1, threads_per_process=11, bulk=10000, sleep_time=2):
     """
     Starts up the Abacus-RSE threads.
     """
     if once:
         logging.info('main: executing one iteration only')
-        rse_update(once)
+        rse_update(once=once, bulk=bulk)
     else:
         logging.info('main: starting threads')
-        threads = [threading.Thread(target=rse_update, kwargs={'process': process, 'total_processes': total_processes, 'once': once, 'thread': i, 'threads_per_process': threads_per_process}) for i in xrange(0, threads_per_process)]
+        threads = [threading.Thread(target=rse_update, kwargs={'process': process, 'total_processes': total_processes, 'once': once, 'thread': i, 'threads_per_process': threads_per_process, 'bulk': bulk, 'sleep_time': sleep_time}) for i in xrange(0, threads_per_process)]
         [t.start() for t in threads]
         logging.info('main: waiting for interrupts')
         # Interruptible joins require a timeout.
@@ -37,11 +37,12 @@ class PlacementAlgorithm:
             if penalty > 0.1:
                 self._penalties[site] = penalty - 0.1
 
-    def place(self, did):
+    def place(self, did, meta=None):
         self.__update_penalties()
         decision = {'did': ':'.join(did)}
         try:
-            meta = get_did(did[0], did[1])
+            if meta is None:
+                meta = get_did(did[0], did[1])
         except DataIdentifierNotFound:
             decision['error_reason'] = 'did does not exist'
             return decision
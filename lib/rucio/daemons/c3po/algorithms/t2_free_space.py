@@ -49,7 +49,7 @@ class PlacementAlgorithm:
             if penalty > 1.0:
                 self._penalties[rse] = penalty - 1
 
-    def place(self, did):
+    def place(self, did, meta=None):
         self.__update_penalties()
         decision = {'did': ':'.join(did)}
         if (not did[0].startswith('data')) and (not did[0].startswith('mc')):
@@ -57,7 +57,8 @@ class PlacementAlgorithm:
             return decision
 
         try:
-            meta = get_did(did[0], did[1])
+            if meta is None:
+                meta = get_did(did[0], did[1])
         except DataIdentifierNotFound:
             decision['error_reason'] = 'did does not exist'
             return decision
@@ -81,7 +81,7 @@ class PlacementAlgorithm:
             if penalty < 100.0:
                 self._src_penalties[rse] += 10.0
 
-    def check_did(self, did):
+    def check_did(self, did, meta=None):
         decision = {'did': ':'.join(did)}
         if (self._added_cache.check_dataset(':'.join(did))):
             decision['error_reason'] = 'already added replica for this did in the last 24h'
@@ -98,7 +98,8 @@ class PlacementAlgorithm:
             return decision
 
         try:
-            meta = get_did(did[0], did[1])
+            if meta is None:
+                meta = get_did(did[0], did[1])
         except DataIdentifierNotFound:
             decision['error_reason'] = 'did does not exist'
             return decision
@@ -142,17 +143,18 @@ class PlacementAlgorithm:
 
         return decision
 
-    def place(self, did):
+    def place(self, did, meta=None):
         self.__update_penalties()
         self._added_bytes.trim()
         self._added_files.trim()
 
-        decision = self.check_did(did)
+        decision = self.check_did(did, meta)
 
         if 'error_reason' in decision:
             return decision
 
-        meta = get_did(did[0], did[1])
+        if meta is None:
+            meta = get_did(did[0], did[1])
         available_reps = {}
         reps = list_dataset_replicas(did[0], did[1])
         num_reps = 0
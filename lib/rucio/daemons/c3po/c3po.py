@@ -28,6 +28,7 @@ from threading import Event, Thread
 from rucio.client import Client
 from rucio.common.config import config_get, config_get_options
 from rucio.common.exception import RucioException
+from rucio.core.did import get_metadata_bulk
 from rucio.daemons.c3po.collectors.free_space import FreeSpaceCollector
 from rucio.daemons.c3po.collectors.jedi_did import JediDIDCollector
 from rucio.daemons.c3po.collectors.workload import WorkloadCollector
@@ -196,11 +197,15 @@ def place_replica(once=False,
             else:
                 logging.debug('(%s) no dids in queue' % (instance_id))
 
-            for i in xrange(0, len_dids):
-                did = did_queue.get()
+            dids = [did_queue.get() for i in xrange(0, len_dids)]
+            dids_metadata = {}
+            for meta in get_metadata_bulk([{'scope': did[0], 'name': did[1]} for did in dids]):
+                dids_metadata[(meta['scope'], meta['name'])] = meta
+
+            for did in dids:
                 for algorithm, instance in instances.items():
                     logging.info('(%s:%s) Retrieved %s:%s from queue. Run placement algorithm' % (algorithm, instance_id, did[0], did[1]))
-                    decision = instance.place(did)
+                    decision = instance.place(did, meta=dids_metadata.get((did[0], did[1])))
                     decision['@timestamp'] = datetime.utcnow().isoformat()
                     decision['algorithm'] = algorithm
                     decision['instance_id'] = instance_id
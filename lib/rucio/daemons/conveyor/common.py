@@ -47,14 +47,15 @@ region = make_region().configure('dogpile.cache.memory', expiration_time=3600)
 def update_requests_states(responses, session=None):
     """
     Bulk version used by poller and consumer to update the internal state of requests,
-    after the response by the external transfertool.
+    after the response by the external transfertool. An unexpected error is raised, so
+    the whole batch is rolled back.
 
-    :param reqs: List of (req, response) tuples.
+    :param responses: List of transfertool response dictionaries.
     :param session: The database session to use.
+    :returns: List with the result of update_request_state for each response.
     """
 
-    for response in responses:
-        update_request_state(response=response, session=session)
+    return [update_request_state(response=response, raise_exception=True, session=session) for response in responses]
 
 
 def get_transfer_error(state, reason=None):
@@ -75,12 +76,13 @@ def get_transfer_error(state, reason=None):
 
 
 @transactional_session
-def update_request_state(response, session=None):
+def update_request_state(response, raise_exception=False, session=None):
     """
     Used by poller and consumer to update the internal state of requests,
     after the response by the external transfertool.
 
     :param response: The transfertool response dictionary, retrieved via request.query_request().
+    :param raise_exception: Raise the unexpected errors instead of logging them, so the transaction is rolled back.
     :param session: The database session to use.
     :returns commit_or_rollback: Boolean.
     """
@@ -142,6 +144,8 @@ def update_request_state(response, session=None):
         return False
     except:
         logging.critical(traceback.format_exc())
+        if raise_exception:
+            raise
 
 
 def touch_transfer(external_host, transfer_id):
@@ -184,9 +188,9 @@ def set_transfer_state(external_host, transfer_id, state, session=None):
                 src_rse = None
                 dst_rse = None
                 if src_rse_id:
-                    src_rse = rse_core.get_rse_name(src_rse_id, session=session)
+                    src_rse = rse_core.get_cached_rse_name(src_rse_id, session=session)
                 if dst_rse_id:
-                    dst_rse = rse_core.get_rse_name(dst_rse_id, session=session)
+                    dst_rse = rse_core.get_cached_rse_name(dst_rse_id, session=session)
                 response = {'new_state': state,
                             'transfer_id': transfer_id,
                             'job_state': state,
@@ -274,16 +278,19 @@ def check_suspicious_files(req, suspicious_patterns):
     return is_suspicious
 
 
-def handle_requests(reqs, suspicious_patterns):
+def handle_requests(reqs, suspicious_patterns, bulk_mode=False):
     """
     used by finisher to handle terminated requests,
 
     :param reqs: List of requests.
+    :param suspicious_patterns: List of compiled patterns of errors which make the source replica suspicious.
+    :param bulk_mode: Requeue the requests and update the replicas, locks and rules of all requests at once.
     """
 
     undeterministic_rses = get_undeterministic_rses()
     rses_info, protocols = {}, {}
     replicas = {}
+    requeue = []
     for req in reqs:
         try:
             replica = {'scope': req['scope'], 'name': req['name'], 'rse_id': req['dest_rse_id'], 'bytes': req['bytes'], 'adler32': req['adler32'], 'request_id': req['request_id']}
@@ -304,7 +311,7 @@ def handle_requests(reqs, suspicious_patterns):
                 # for TAPE, replica path is needed
                 if req['request_type'] == RequestType.TRANSFER and req['dest_rse_id'] in undeterministic_rses:
                     if req['dest_rse_id'] not in rses_info:
-                        dest_rse = rse_core.get_rse_name(rse_id=req['dest_rse_id'])
+                        dest_rse = rse_core.get_cached_rse_name(rse_id=req['dest_rse_id'])
                         rses_info[req['dest_rse_id']] = rsemanager.get_rse_info(dest_rse)
                     pfn = req['dest_url']
                     scheme = urlparse(pfn).scheme
@@ -320,6 +327,9 @@ def handle_requests(reqs, suspicious_patterns):
             elif req['state'] == RequestState.FAILED:
                 check_suspicious_files(req, suspicious_patterns)
                 if request_core.should_retry_request(req):
+                    if bulk_mode:
+                        requeue.append(req['request_id'])
+                        continue
                     tss = time.time()
                     new_req = request_core.requeue_and_archive(req['request_id'])
                     record_timer('daemons.conveyor.common.update_request_state.request-requeue_and_archive', (time.time() - tss) * 1000)
@@ -342,6 +352,9 @@ def handle_requests(reqs, suspicious_patterns):
                     continue
 
                 if request_core.should_retry_request(req):
+                    if bulk_mode:
+                        requeue.append(req['request_id'])
+                        continue
                     tss = time.time()
                     new_req = request_core.requeue_and_archive(req['request_id'])
                     record_timer('daemons.conveyor.common.update_request_state.request-requeue_and_archive', (time.time() - tss) * 1000)
@@ -359,6 +372,9 @@ def handle_requests(reqs, suspicious_patterns):
                     replicas[req['request_type']][req['rule_id']].append(replica)
             elif req['state'] == RequestState.NO_SOURCES or req['state'] == RequestState.ONLY_TAPE_SOURCES or req['state'] == RequestState.MISMATCH_SCHEME:
                 if request_core.should_retry_request(req):
+                    if bulk_mode:
+                        requeue.append(req['request_id'])
+                        continue
                     tss = time.time()
                     new_req = request_core.requeue_and_archive(req['request_id'])
                     record_timer('daemons.conveyor.common.update_request_state.request-requeue_and_archive', (time.time() - tss) * 1000)
@@ -384,16 +400,48 @@ def handle_requests(reqs, suspicious_patterns):
                                                                                                        req['dest_rse_id'],
                                                                                                        traceback.format_exc()))
 
-    handle_terminated_replicas(replicas)
+    if requeue:
+        try:
+            tss = time.time()
+            new_reqs = request_core.requeue_and_archive_requests(requeue)
+            record_timer('daemons.conveyor.common.update_request_state.request-requeue_and_archive_requests', (time.time() - tss) * 1000)
+            for new_req in new_reqs:
+                logging.warn('REQUEUED DID %s:%s REQUEST %s AS %s TRY %s' % (new_req['scope'],
+                                                                             new_req['name'],
+                                                                             new_req['previous_attempt_id'],
+                                                                             new_req['request_id'],
+                                                                             new_req['retry_count']))
+        except:
+            logging.error("Something unexpected happened when requeuing %s requests: %s" % (len(requeue), traceback.format_exc()))
+
+    handle_terminated_replicas(replicas, bulk_mode=bulk_mode)
 
 
-def handle_terminated_replicas(replicas):
+def handle_terminated_replicas(replicas, bulk_mode=False):
     """
     Used by finisher to handle available and unavailable replicas.
 
     :param replicas: List of replicas.
+    :param bulk_mode: First try to handle the replicas of all rules in one transaction.
     """
 
+    if bulk_mode:
+        all_replicas = [replica for req_type in replicas for rule_id in replicas[req_type] for replica in replicas[req_type][rule_id]]
+        if not all_replicas:
+            return
+        try:
+            tss = time.time()
+            handle_bulk_requests(all_replicas)
+            record_timer('daemons.conveyor.common.handle_bulk_requests', (time.time() - tss) * 1000)
+            return
+        except (UnsupportedOperation, ReplicaNotFound), e:
+            logging.warn("Failed to handle %s replicas at once, will do it per rule: %s" % (len(all_replicas), str(e)))
+        except (DatabaseException, DatabaseError), e:
+            if isinstance(e.args[0], tuple) and (match('.*ORA-00054.*', e.args[0][0]) or ('ERROR 1205 (HY000)' in e.args[0][0])):
+                logging.warn("Locks detected when handling %s replicas at once, will do it per rule" % len(all_replicas))
+            else:
+                logging.error("Could not handle %s replicas at once, will do it per rule: %s" % (len(all_replicas), traceback.format_exc()))
+
     for req_type in replicas:
         for rule_id in replicas[req_type]:
             try:
@@ -450,6 +498,24 @@ def handle_bulk_replicas(replicas, req_type, rule_id, session=None):
     return True
 
 
+@transactional_session
+def handle_bulk_requests(replicas, session=None):
+    """
+    Used by the bulk finisher to handle available and unavailable replicas of many rules at once.
+    Replica states, locks and rule counters are updated with set-based statements
+    and the requests are archived with INSERT ... SELECT.
+
+    :param replicas: List of replicas.
+    :param session: The database session to use.
+    :returns commit_or_rollback: Boolean.
+    """
+    replica_core.bulk_update_replicas_states(replicas, nowait=True, session=session)
+    request_core.archive_requests([replica['request_id'] for replica in replicas if not replica['archived']], session=session)
+    for replica in replicas:
+        logging.info("HANDLED REQUEST %s DID %s:%s AT RSE %s STATE %s" % (replica['request_id'], replica['scope'], replica['name'], replica['rse_id'], str(replica['state'])))
+    return True
+
+
 @transactional_session
 def handle_one_replica(replica, req_type, rule_id, session=None):
     """
@@ -529,7 +595,7 @@ def get_source_rse(request_id, scope, name, src_url, session=None):
         for source in sources:
             if source['url'] == src_url:
                 src_rse_id = source['rse_id']
-                src_rse_name = rse_core.get_rse_name(src_rse_id, session=session)
+                src_rse_name = rse_core.get_cached_rse_name(src_rse_id, session=session)
                 logging.debug("Find rse name %s for %s" % (src_rse_name, src_url))
                 return src_rse_name, src_rse_id
         # cannot find matched surl
@@ -602,19 +668,30 @@ def add_monitor_message(request, response, session=None):
                 session=session)
 
 
-def poll_transfers(external_host, xfers, process=0, thread=0, timeout=None):
+def poll_transfers(external_host, xfers, process=0, thread=0, timeout=None, fts_session=None):
+    """
+    Used by poller to query a bulk of transfers and update their requests.
+
+    :param external_host: FTS server as a string.
+    :param xfers: List of transfer ids.
+    :param process: Identifier of the caller process as an integer.
+    :param thread: Identifier of the caller thread as an integer.
+    :param timeout: Timeout of the query in seconds.
+    :param fts_session: requests.Session to reuse for the query.
+    :returns: False if the FTS server could not be queried, True otherwise.
+    """
     try:
         try:
             ts = time.time()
             logging.info('%i:%i - polling %i transfers against %s with timeout %s' % (process, thread, len(xfers), external_host, timeout))
-            resps = request_core.bulk_query_transfers(external_host, xfers, 'fts3', timeout)
+            resps = request_core.bulk_query_transfers(external_host, xfers, 'fts3', timeout, fts_session=fts_session)
             record_timer('daemons.conveyor.poller.bulk_query_transfers', (time.time() - ts) * 1000 / len(xfers))
         except RequestException, e:
             logging.error("Failed to contact FTS server: %s" % (str(e)))
-            return
+            return False
         except:
             logging.error("Failed to query FTS info: %s" % (traceback.format_exc()))
-            return
+            return False
 
         logging.debug('%i:%i - updating %s requests status' % (process, thread, len(xfers)))
         for transfer_id in resps:
@@ -647,3 +724,4 @@ def poll_transfers(external_host, xfers, process=0, thread=0, timeout=None):
         logging.debug('%i:%i - finished updating %s requests status' % (process, thread, len(xfers)))
     except:
         logging.error(traceback.format_exc())
+    return True
@@ -44,14 +44,14 @@ logging.basicConfig(stream=sys.stdout,
 graceful_stop = threading.Event()
 
 
-def finisher(once=False, process=0, total_processes=1, thread=0, total_threads=1, sleep_time=60, activities=None, bulk=100, db_bulk=1000):
+def finisher(once=False, process=0, total_processes=1, thread=0, total_threads=1, sleep_time=60, activities=None, bulk=100, db_bulk=1000, bulk_mode=False):
     """
     Main loop to update the replicas and rules based on finished requests.
     """
 
-    logging.info('finisher starting - process (%i/%i) thread (%i/%i) db_bulk(%i) bulk (%i)' % (process, total_processes,
-                                                                                               thread, total_threads,
-                                                                                               db_bulk, bulk))
+    logging.info('finisher starting - process (%i/%i) thread (%i/%i) db_bulk(%i) bulk (%i) bulk_mode (%s)' % (process, total_processes,
+                                                                                                             thread, total_threads,
+                                                                                                             db_bulk, bulk, bulk_mode))
     try:
         suspicious_patterns = []
         pattern = config_get('conveyor', 'suspicious_pattern')
@@ -103,7 +103,7 @@ def finisher(once=False, process=0, total_processes=1, thread=0, total_threads=1
                 for chunk in chunks(reqs, bulk):
                     try:
                         ts = time.time()
-                        common.handle_requests(chunk, suspicious_patterns)
+                        common.handle_requests(chunk, suspicious_patterns, bulk_mode=bulk_mode)
                         record_timer('daemons.conveyor.finisher.handle_requests', (time.time() - ts) * 1000 / (len(chunk) if len(chunk) else 1))
                         record_counter('daemons.conveyor.finisher.handle_requests', len(chunk))
                     except:
@@ -139,14 +139,16 @@ def stop(signum=None, frame=None):
     graceful_stop.set()
 
 
-def run(once=False, process=0, total_processes=1, total_threads=1, sleep_time=60, activities=None, bulk=100, db_bulk=1000):
+def run(once=False, process=0, total_processes=1, total_threads=1, sleep_time=60, activities=None, bulk=100, db_bulk=1000, bulk_mode=False):
     """
     Starts up the conveyer threads.
+
+    :param bulk_mode: Handle each chunk of bulk requests with set-based statements instead of request by request.
     """
 
     if once:
         logging.info('executing one finisher iteration only')
-        finisher(once=once, activities=activities, bulk=bulk, db_bulk=db_bulk)
+        finisher(once=once, activities=activities, bulk=bulk, db_bulk=db_bulk, bulk_mode=bulk_mode)
 
     else:
 
@@ -158,7 +160,8 @@ def run(once=False, process=0, total_processes=1, total_threads=1, sleep_time=60
                                                              'sleep_time': sleep_time,
                                                              'activities': activities,
                                                              'db_bulk': db_bulk,
-                                                             'bulk': bulk}) for i in xrange(0, total_threads)]
+                                                             'bulk': bulk,
+                                                             'bulk_mode': bulk_mode}) for i in xrange(0, total_threads)]
 
         [t.start() for t in threads]
 
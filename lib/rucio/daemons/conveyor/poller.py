@@ -27,12 +27,13 @@ import traceback
 
 from collections import defaultdict
 from ConfigParser import NoOptionError
-from threadpool import ThreadPool, makeRequests
+from Queue import Queue, Empty
+
+import requests
 
 from rucio.common.config import config_get
-from rucio.common.utils import chunks
 from rucio.core import request, heartbeat
-from rucio.core.monitor import record_timer
+from rucio.core.monitor import record_counter, record_gauge, record_timer
 from rucio.daemons.conveyor import common
 from rucio.db.sqla.constants import RequestState, RequestType
 
@@ -47,11 +48,88 @@ graceful_stop = threading.Event()
 datetime.datetime.strptime('', '')
 
 
+class AdaptiveBatch(object):
+    """
+    Number of transfers per FTS query, adapted to the observed latency and errors
+    of one FTS host: halved when a query fails or is slower than the target latency,
+    increased by a tenth of the maximum when it is faster than half of it.
+    """
+
+    def __init__(self, maximum, target_latency, minimum=1):
+        """
+        :param maximum: Maximum and initial number of transfers per query.
+        :param target_latency: Target duration of a query in seconds.
+        :param minimum: Minimum number of transfers per query.
+        """
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.target_latency = target_latency
+        self.size = maximum
+        self.__step = max(1, maximum / 10)
+        self.__lock = threading.Lock()
+
+    def update(self, latency, failed=False):
+        """
+        Adapt the size after a query.
+
+        :param latency: Duration of the query in seconds.
+        :param failed: True if the query failed.
+        :returns: The new size.
+        """
+        with self.__lock:
+            if failed or latency > self.target_latency:
+                self.size = max(self.minimum, self.size / 2)
+            elif latency < self.target_latency / 2:
+                self.size = min(self.maximum, self.size + self.__step)
+            return self.size
+
+
+def __poll_worker(external_host, queue, batch, in_flight, in_flight_lock, stop_event, process, thread, timeout):
+    """
+    Polls the transfers queued for one FTS host, batch.size of them per query,
+    over its own persistent connection, until stop_event is set.
+    """
+    fts_session = requests.Session()
+    host = external_host.split('//')[-1].split(':')[0].split('.')[0]
+    while not stop_event.is_set():
+        try:
+            xfers = [queue.get(timeout=1)]
+        except Empty:
+            continue
+        while len(xfers) < batch.size:
+            try:
+                xfers.append(queue.get_nowait())
+            except Empty:
+                break
+
+        try:
+            ts = time.time()
+            polled = common.poll_transfers(external_host=external_host, xfers=xfers, process=process, thread=thread,
+                                           timeout=timeout, fts_session=fts_session)
+            size = batch.update(time.time() - ts, failed=not polled)
+            record_gauge('daemons.conveyor.poller.%s.batch_size' % host, size)
+            if not polled:
+                record_counter('daemons.conveyor.poller.%s.query_failure' % host)
+                # drop the connection, it is reopened by the next query
+                fts_session.close()
+        except:
+            logging.critical("%i:%i - %s" % (process, thread, traceback.format_exc()))
+        finally:
+            with in_flight_lock:
+                in_flight.difference_update(xfers)
+
+
 def poller(once=False,
            process=0, total_processes=1, thread=0, total_threads=1, activities=None, sleep_time=60,
            fts_bulk=100, db_bulk=1000, older_than=60, activity_shares=None):
     """
     Main loop to check the status of a transfer primitive with a transfertool.
+
+    The transfers are read from the database per activity and queued per FTS host,
+    without waiting for the previous ones to be polled. Each FTS host is polled by
+    total_threads workers, each with a persistent connection, with up to fts_bulk
+    transfers per query, fewer if the host is slow or failing. At most two db_bulk
+    of transfers are waiting or being polled at any time.
     """
 
     try:
@@ -60,6 +138,11 @@ def poller(once=False,
     except NoOptionError:
         timeout = None
 
+    try:
+        target_latency = float(config_get('conveyor', 'poll_target_latency'))
+    except NoOptionError:
+        target_latency = timeout / 2 if timeout else 10
+
     logging.info('poller starting - process (%i/%i) thread (%i/%i) bulk (%i) timeout (%s)' % (process, total_processes,
                                                                                               thread, total_threads,
                                                                                               db_bulk, timeout))
@@ -76,7 +159,9 @@ def poller(once=False,
                                                                                 db_bulk))
 
     activity_next_exe_time = defaultdict(time.time)
-    threadPool = ThreadPool(total_threads)
+    queues, workers = {}, []
+    in_flight, in_flight_lock = set(), threading.Lock()
+    stop_workers = threading.Event()
     sleeping = False
 
     while not graceful_stop.is_set():
@@ -96,6 +181,14 @@ def poller(once=False,
                     continue
                 sleeping = False
 
+                with in_flight_lock:
+                    nr_in_flight = len(in_flight)
+                record_gauge('daemons.conveyor.poller.in_flight', nr_in_flight)
+                if nr_in_flight >= 2 * db_bulk:
+                    # the workers are behind, do not read more transfers
+                    time.sleep(1)
+                    continue
+
                 ts = time.time()
                 logging.debug('%i:%i - start to poll transfers older than %i seconds for activity %s' % (process, hb['assign_thread'], older_than, activity))
                 transfs = request.get_next_transfers(request_type=[RequestType.TRANSFER, RequestType.STAGEIN, RequestType.STAGEOUT],
@@ -111,19 +204,28 @@ def poller(once=False,
                 if transfs:
                     logging.debug('%i:%i - polling %i transfers for activity %s' % (process, hb['assign_thread'], len(transfs), activity))
 
-                xfers_ids = {}
                 for transf in transfs:
-                    if not transf['external_host'] in xfers_ids:
-                        xfers_ids[transf['external_host']] = []
-                    xfers_ids[transf['external_host']].append(transf['external_id'])
-
-                for external_host in xfers_ids:
-                    for xfers in chunks(xfers_ids[external_host], fts_bulk):
-                        # poll transfers
-                        # xfer_requests = makeRequests(common.poll_transfers, args_list=[((external_host, xfers, process, thread), {})])
-                        xfer_requests = makeRequests(common.poll_transfers, args_list=[((), {'external_host': external_host, 'xfers': xfers, 'process': process, 'thread': hb['assign_thread'], 'timeout': timeout})])
-                        [threadPool.putRequest(xfer_req) for xfer_req in xfer_requests]
-                threadPool.wait()
+                    external_host, external_id = transf['external_host'], transf['external_id']
+                    with in_flight_lock:
+                        if external_id in in_flight:
+                            continue
+                        in_flight.add(external_id)
+                    if external_host not in queues:
+                        queues[external_host] = Queue()
+                        batch = AdaptiveBatch(maximum=fts_bulk, target_latency=target_latency)
+                        for i in xrange(total_threads):
+                            worker = threading.Thread(target=__poll_worker, kwargs={'external_host': external_host,
+                                                                                    'queue': queues[external_host],
+                                                                                    'batch': batch,
+                                                                                    'in_flight': in_flight,
+                                                                                    'in_flight_lock': in_flight_lock,
+                                                                                    'stop_event': stop_workers,
+                                                                                    'process': process,
+                                                                                    'thread': hb['assign_thread'],
+                                                                                    'timeout': timeout})
+                            worker.start()
+                            workers.append(worker)
+                    queues[external_host].put(external_id)
 
                 if len(transfs) < db_bulk / 2:
                     logging.info("%i:%i - only %s transfers for activity %s, which is less than half of the bulk %s, will sleep %s seconds" % (process, hb['assign_thread'], len(transfs), activity, db_bulk, sleep_time))
@@ -133,11 +235,16 @@ def poller(once=False,
             logging.critical("%i:%i - %s" % (process, hb['assign_thread'], traceback.format_exc()))
 
         if once:
+            # wait for the queued transfers to be polled
+            while in_flight and not graceful_stop.is_set():
+                time.sleep(0.1)
             break
 
     logging.info('%i:%i - graceful stop requests' % (process, hb['assign_thread']))
 
-    threadPool.dismissWorkers(total_threads, do_join=True)
+    stop_workers.set()
+    for worker in workers:
+        worker.join()
     heartbeat.die(executable, hostname, pid, hb_thread)
 
     logging.info('%i:%i - graceful stop done' % (process, hb['assign_thread']))
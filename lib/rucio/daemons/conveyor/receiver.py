@@ -24,13 +24,15 @@ import threading
 import time
 import traceback
 
+from Queue import Queue, Empty, Full
+
 import dns.resolver
 import json
 import stomp
 
 from rucio.common.config import config_get, config_get_int
 from rucio.core import heartbeat
-from rucio.core.monitor import record_counter
+from rucio.core.monitor import record_counter, record_gauge, record_timer
 from rucio.core.request import set_transfer_update_time
 from rucio.daemons.conveyor import common
 from rucio.db.sqla.constants import RequestState, FTSCompleteState
@@ -44,11 +46,15 @@ logging.basicConfig(stream=sys.stdout,
 
 graceful_stop = threading.Event()
 
+SUBSCRIPTION_ID = 'rucio-messaging-fts3'
+
 
 class Receiver(object):
 
-    def __init__(self, broker, id, total_threads, full_mode=False):
+    def __init__(self, broker, conn, queue, id, total_threads, full_mode=False):
         self.__broker = broker
+        self.__conn = conn
+        self.__queue = queue
         self.__id = id
         self.__total_threads = total_threads
         self.__full_mode = full_mode
@@ -58,8 +64,36 @@ class Receiver(object):
         logging.error('[%s] %s' % (self.__broker, message))
 
     def on_message(self, headers, message):
+        """
+        Parses the message and hands the response over to the flusher, which acknowledges
+        the message once the update is committed. Other messages are acknowledged directly.
+        """
         record_counter('daemons.conveyor.receiver.message_all')
 
+        id = headers['message-id']
+        try:
+            response = self.__parse(headers, message)
+        except:
+            logging.critical(traceback.format_exc())
+            response = None
+
+        if not response:
+            self.__conn.ack(id, SUBSCRIPTION_ID)
+            return
+
+        while not graceful_stop.is_set():
+            try:
+                # blocks the listener when the flusher falls behind, so the broker stops sending
+                self.__queue.put((response, self.__conn, id, time.time()), timeout=1)
+                return
+            except Full:
+                record_counter('daemons.conveyor.receiver.queue_full')
+        # not acknowledged, the broker redelivers it after the disconnection
+
+    def __parse(self, headers, message):
+        """
+        Returns the response of a terminated transfer submitted by rucio, or None.
+        """
         if 'vo' not in headers or headers['vo'] != 'atlas':
             return
 
@@ -131,31 +165,126 @@ class Receiver(object):
                 elif str(msg['t_final_transfer_state']) == str(FTSCompleteState.ERROR):
                     response['new_state'] = RequestState.FAILED
 
+                if response['new_state']:
+                    logging.info('RECEIVED DID %s:%s FROM %s TO %s REQUEST %s TRANSFER_ID %s STATE %s' % (response['scope'],
+                                                                                                          response['name'],
+                                                                                                          response['src_rse'],
+                                                                                                          response['dst_rse'],
+                                                                                                          response['request_id'],
+                                                                                                          response['transfer_id'],
+                                                                                                          response['new_state']))
+                    return response
+
+
+def __get_batch(queue, bulk, flush_interval):
+    """
+    Waits for a first response, then collects responses until bulk of them are
+    gathered or flush_interval seconds have passed.
+
+    :param queue: The queue filled by the listeners.
+    :param bulk: Maximum number of responses in the batch.
+    :param flush_interval: Maximum time in seconds to wait for the batch to fill up.
+    :returns: List of (response, connection, message id, time queued) tuples.
+    """
+    try:
+        batch = [queue.get(timeout=flush_interval)]
+    except Empty:
+        return []
+    deadline = time.time() + flush_interval
+    while len(batch) < bulk:
+        timeout = deadline - time.time()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(queue.get(timeout=timeout))
+        except Empty:
+            break
+    return batch
+
+
+def __update(responses, full_mode):
+    """
+    Applies the responses to the database.
+
+    In full mode the request states are updated in one transaction. If it fails, it is
+    rolled back and every response is retried in its own transaction, so a single bad
+    response does not hold back the others. The responses failing on their own are
+    reported as not applied. Otherwise the update time of the transfers is reset, once
+    per transfer, so the poller picks them up.
+
+    :param responses: List of responses.
+    :param full_mode: Update the request states.
+    :returns: List of booleans, False for the responses which could not be applied.
+    """
+    if full_mode:
+        try:
+            results = common.update_requests_states(responses)
+        except:
+            logging.warning('bulk update of %s responses failed, retrying one by one: %s' % (len(responses), traceback.format_exc()))
+            record_counter('daemons.conveyor.receiver.bulk_update_failed')
+            results = []
+            for response in responses:
                 try:
-                    if response['new_state']:
-                        logging.info('RECEIVED DID %s:%s FROM %s TO %s REQUEST %s TRANSFER_ID %s STATE %s' % (response['scope'],
-                                                                                                              response['name'],
-                                                                                                              response['src_rse'],
-                                                                                                              response['dst_rse'],
-                                                                                                              response['request_id'],
-                                                                                                              response['transfer_id'],
-                                                                                                              response['new_state']))
-
-                        if self.__full_mode:
-                            ret = common.update_request_state(response)
-                            record_counter('daemons.conveyor.receiver.update_request_state.%s' % ret)
-                        else:
-                            try:
-                                logging.debug("Update request %s update time" % response['request_id'])
-                                set_transfer_update_time(response['external_host'], response['transfer_id'], datetime.datetime.utcnow() - datetime.timedelta(hours=24))
-                                record_counter('daemons.conveyor.receiver.set_transfer_update_time')
-                            except Exception, e:
-                                logging.debug("Failed to update transfer's update time: %s" % str(e))
+                    results.append(common.update_request_state(response, raise_exception=True))
                 except:
-                    logging.critical(traceback.format_exc())
+                    results.append(None)
+        for ret in results:
+            record_counter('daemons.conveyor.receiver.update_request_state.%s' % ret)
+        return [ret is not None for ret in results]
+
+    transfers = set()
+    for response in responses:
+        if (response['external_host'], response['transfer_id']) in transfers:
+            continue
+        transfers.add((response['external_host'], response['transfer_id']))
+        try:
+            logging.debug("Update request %s update time" % response['request_id'])
+            set_transfer_update_time(response['external_host'], response['transfer_id'], datetime.datetime.utcnow() - datetime.timedelta(hours=24))
+            record_counter('daemons.conveyor.receiver.set_transfer_update_time')
+        except Exception, e:
+            logging.debug("Failed to update transfer's update time: %s" % str(e))
+    return [True] * len(responses)
+
 
+def flusher(queue, full_mode=False, bulk=500, flush_interval=1):
+    """
+    Applies the responses queued by the listeners in batches and acknowledges
+    the messages after the commit. Drains the queue before stopping.
 
-def receiver(id, total_threads=1, full_mode=False):
+    :param queue: The queue filled by the listeners.
+    :param full_mode: Update the request states.
+    :param bulk: Maximum number of responses updated in one transaction.
+    :param flush_interval: Maximum time in seconds a response waits in the queue for the batch to fill up.
+    """
+    while not graceful_stop.is_set() or not queue.empty():
+        batch = __get_batch(queue, bulk, flush_interval)
+        record_gauge('daemons.conveyor.receiver.queue_depth', queue.qsize())
+        if not batch:
+            continue
+
+        start_time = time.time()
+        record_gauge('daemons.conveyor.receiver.batch_size', len(batch))
+        record_timer('daemons.conveyor.receiver.queue_wait', (start_time - batch[0][3]) * 1000)
+        try:
+            applied = __update([response for response, _, _, _ in batch], full_mode)
+        except:
+            logging.critical(traceback.format_exc())
+            applied = [False] * len(batch)
+        record_timer('daemons.conveyor.receiver.flush', (time.time() - start_time) * 1000)
+
+        for (response, conn, id, _), ok in zip(batch, applied):
+            try:
+                if ok:
+                    conn.ack(id, SUBSCRIPTION_ID)
+                else:
+                    conn.nack(id, SUBSCRIPTION_ID)
+            except:
+                # lost connection, the broker redelivers the message
+                logging.warning('could not acknowledge message %s: %s' % (id, traceback.format_exc()))
+        logging.debug('flushed %s responses in %s seconds' % (len(batch), time.time() - start_time))
+
+
+def receiver(id, total_threads=1, full_mode=False, bulk=500, flush_interval=1, queue_size=10000):
     """
     Main loop to consume messages from the FTS3 producer.
     """
@@ -196,6 +325,13 @@ def receiver(id, total_threads=1, full_mode=False):
                                       ssl_version=ssl.PROTOCOL_TLSv1,
                                       reconnect_attempts_max=999))
 
+    queue = Queue(maxsize=max(queue_size, bulk))
+    flusher_thread = threading.Thread(target=flusher, kwargs={'queue': queue,
+                                                              'full_mode': full_mode,
+                                                              'bulk': bulk,
+                                                              'flush_interval': flush_interval})
+    flusher_thread.start()
+
     logging.info('receiver started')
 
     while not graceful_stop.is_set():
@@ -208,17 +344,21 @@ def receiver(id, total_threads=1, full_mode=False):
                 logging.info('connecting to %s' % conn.transport._Transport__host_and_ports[0][0])
                 record_counter('daemons.messaging.fts3.reconnect.%s' % conn.transport._Transport__host_and_ports[0][0].split('.')[0])
 
-                conn.set_listener('rucio-messaging-fts3', Receiver(broker=conn.transport._Transport__host_and_ports[0], id=id, total_threads=total_threads, full_mode=full_mode))
+                conn.set_listener('rucio-messaging-fts3', Receiver(broker=conn.transport._Transport__host_and_ports[0], conn=conn, queue=queue,
+                                                                   id=id, total_threads=total_threads, full_mode=full_mode))
                 conn.start()
                 conn.connect()
                 conn.subscribe(destination=config_get('messaging-fts3', 'destination'),
-                               id='rucio-messaging-fts3',
-                               ack='auto')
+                               id=SUBSCRIPTION_ID,
+                               ack='client-individual')
 
         time.sleep(1)
 
     logging.info('receiver graceful stop requested')
 
+    # acknowledge what is already queued before disconnecting
+    flusher_thread.join()
+
     for conn in conns:
         try:
             conn.disconnect()
@@ -238,14 +378,21 @@ def stop(signum=None, frame=None):
     graceful_stop.set()
 
 
-def run(once=False, total_threads=1, full_mode=False):
+def run(once=False, total_threads=1, full_mode=False, bulk=500, flush_interval=1, queue_size=10000):
     """
     Starts up the receiver thread
+
+    :param bulk: Maximum number of responses updated in one transaction.
+    :param flush_interval: Maximum time in seconds a response waits for its batch to fill up.
+    :param queue_size: Maximum number of parsed responses waiting for the flusher, per thread.
     """
 
     logging.info('starting receiver thread')
     threads = [threading.Thread(target=receiver, kwargs={'id': i,
                                                          'full_mode': full_mode,
+                                                         'bulk': bulk,
+                                                         'flush_interval': flush_interval,
+                                                         'queue_size': queue_size,
                                                          'total_threads': total_threads}) for i in xrange(0, total_threads)]
 
     [t.start() for t in threads]
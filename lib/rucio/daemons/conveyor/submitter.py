@@ -25,13 +25,13 @@ import traceback
 
 from collections import defaultdict
 from ConfigParser import NoOptionError
-from threadpool import ThreadPool, makeRequests
+from Queue import Queue, Empty, Full
 
 from rucio.common.config import config_get
 from rucio.core import heartbeat
-from rucio.core.monitor import record_counter, record_timer
+from rucio.core.monitor import record_counter, record_gauge, record_timer
 
-from rucio.daemons.conveyor.utils import get_rses, get_transfers, bulk_group_transfer, submit_transfer
+from rucio.daemons.conveyor.utils import get_rses, get_transfers, bulk_group_transfer, merge_jobs, submit_transfer
 
 logging.basicConfig(stream=sys.stdout,
                     level=getattr(logging, config_get('common', 'loglevel').upper()),
@@ -40,12 +40,36 @@ logging.basicConfig(stream=sys.stdout,
 graceful_stop = threading.Event()
 
 
+def __submit_worker(queue, in_flight, in_flight_lock, stop_event, process, cachedir, timeout):
+    """
+    Submits the jobs of the queue until stop_event is set.
+    """
+    while not stop_event.is_set():
+        try:
+            external_host, job, thread = queue.get(timeout=1)
+        except Empty:
+            continue
+        try:
+            submit_transfer(external_host=external_host, job=job, submitter='transfer_submitter',
+                            process=process, thread=thread, cachedir=cachedir, timeout=timeout)
+        except:
+            logging.critical('%s:%s %s' % (process, thread, traceback.format_exc()))
+        finally:
+            with in_flight_lock:
+                in_flight.difference_update(file['metadata']['request_id'] for file in job['files'])
+            queue.task_done()
+
+
 def submitter(once=False, rses=[], mock=False,
               process=0, total_processes=1, total_threads=1,
               bulk=100, group_bulk=1, group_policy='rule', fts_source_strategy='auto',
-              activities=None, sleep_time=600, max_sources=4, retry_other_fts=False):
+              activities=None, sleep_time=600, max_sources=4, retry_other_fts=False, job_size=None):
     """
     Main loop to submit a new transfer primitive to a transfertool.
+
+    The grouped jobs are put in a queue bounded to twice total_threads, from which
+    total_threads workers submit them, while the next transfers are read. With job_size,
+    the compatible jobs of an iteration are merged up to job_size files per job.
     """
 
     logging.info('Transfer submitter starting - process (%i/%i) threads (%i)' % (process,
@@ -100,7 +124,17 @@ def submitter(once=False, rses=[], mock=False,
                                                                                                 hb['assign_thread'], hb['nr_threads'],
                                                                                                 timeout))
 
-    threadPool = ThreadPool(total_threads)
+    queue = Queue(maxsize=2 * total_threads)
+    in_flight, in_flight_lock = set(), threading.Lock()
+    stop_workers = threading.Event()
+    workers = [threading.Thread(target=__submit_worker, kwargs={'queue': queue,
+                                                                'in_flight': in_flight,
+                                                                'in_flight_lock': in_flight_lock,
+                                                                'stop_event': stop_workers,
+                                                                'process': process,
+                                                                'cachedir': cachedir,
+                                                                'timeout': timeout}) for i in xrange(total_threads)]
+    [worker.start() for worker in workers]
     activity_next_exe_time = defaultdict(time.time)
     sleeping = False
 
@@ -142,35 +176,56 @@ def submitter(once=False, rses=[], mock=False,
                 record_timer('daemons.conveyor.transfer_submitter.get_transfers.transfers', len(transfers))
                 logging.info("%s:%s Got %s transfers for %s" % (process, hb['assign_thread'], len(transfers), activity))
 
-                # group transfers
-                logging.info("%s:%s Starting to group transfers for %s" % (process, hb['assign_thread'], activity))
-                ts = time.time()
-                grouped_jobs = bulk_group_transfer(transfers, group_policy, group_bulk, fts_source_strategy, max_time_in_queue)
-                record_timer('daemons.conveyor.transfer_submitter.bulk_group_transfer', (time.time() - ts) * 1000 / (len(transfers) if len(transfers) else 1))
-
-                logging.info("%s:%s Starting to submit transfers for %s" % (process, hb['assign_thread'], activity))
-                for external_host in grouped_jobs:
-                    for job in grouped_jobs[external_host]:
-                        # submit transfers
-                        # job_requests = makeRequests(submit_transfer, args_list=[((external_host, job, 'transfer_submitter', process, thread), {})])
-                        job_requests = makeRequests(submit_transfer, args_list=[((), {'external_host': external_host, 'job': job, 'submitter': 'transfer_submitter', 'process': process,
-                                                                                      'thread': hb['assign_thread'], 'cachedir': cachedir, 'timeout': timeout})])
-                        [threadPool.putRequest(job_req) for job_req in job_requests]
-                threadPool.wait()
-
-                if len(transfers) < group_bulk:
-                    logging.info('%i:%i - only %s transfers for %s which is less than group bulk %s, sleep %s seconds' % (process, hb['assign_thread'], len(transfers), activity, group_bulk, sleep_time))
+                # skip the transfers which are still queued for submission
+                with in_flight_lock:
+                    transfers = dict((request_id, transfer) for request_id, transfer in transfers.iteritems() if request_id not in in_flight)
+                    in_flight.update(transfers.keys())
+                nr_transfers = len(transfers)
+
+                enqueued = set()
+                try:
+                    # group transfers
+                    logging.info("%s:%s Starting to group transfers for %s" % (process, hb['assign_thread'], activity))
+                    ts = time.time()
+                    grouped_jobs = bulk_group_transfer(transfers, group_policy, group_bulk, fts_source_strategy, max_time_in_queue)
+                    if job_size:
+                        grouped_jobs = merge_jobs(grouped_jobs, job_size)
+                    record_timer('daemons.conveyor.transfer_submitter.bulk_group_transfer', (time.time() - ts) * 1000 / (len(transfers) if len(transfers) else 1))
+
+                    logging.info("%s:%s Starting to submit transfers for %s" % (process, hb['assign_thread'], activity))
+                    for external_host in grouped_jobs:
+                        for job in grouped_jobs[external_host]:
+                            # submit transfers, waits while the workers are busy with the previous jobs
+                            while True:
+                                try:
+                                    queue.put((external_host, job, hb['assign_thread']), timeout=1)
+                                    enqueued.update(file['metadata']['request_id'] for file in job['files'])
+                                    break
+                                except Full:
+                                    if graceful_stop.is_set():
+                                        raise
+                        record_counter('daemons.conveyor.transfer_submitter.jobs.%s' % external_host.split('//')[-1].split(':')[0].replace('.', '_'), len(grouped_jobs[external_host]))
+                    record_gauge('daemons.conveyor.transfer_submitter.queue', queue.qsize())
+                finally:
+                    # the workers release the enqueued transfers, the others can be read again
+                    with in_flight_lock:
+                        in_flight.difference_update(set(transfers) - enqueued)
+
+                if nr_transfers < group_bulk:
+                    logging.info('%i:%i - only %s transfers for %s which is less than group bulk %s, sleep %s seconds' % (process, hb['assign_thread'], nr_transfers, activity, group_bulk, sleep_time))
                     if activity_next_exe_time[activity] < time.time():
                         activity_next_exe_time[activity] = time.time() + sleep_time
         except:
             logging.critical('%s:%s %s' % (process, hb['assign_thread'], traceback.format_exc()))
 
         if once:
+            queue.join()
             break
 
     logging.info('%s:%s graceful stop requested' % (process, hb['assign_thread']))
 
-    threadPool.dismissWorkers(total_threads, do_join=True)
+    stop_workers.set()
+    [worker.join() for worker in workers]
     heartbeat.die(executable, hostname, pid, hb_thread)
 
     logging.info('%s:%s graceful stop done' % (process, hb['assign_thread']))
@@ -188,9 +243,11 @@ def stop(signum=None, frame=None):
 def run(once=False,
         process=0, total_processes=1, total_threads=1, group_bulk=1, group_policy='rule',
         mock=False, rses=[], include_rses=None, exclude_rses=None, bulk=100, fts_source_strategy='auto',
-        activities=None, sleep_time=600, max_sources=4, retry_other_fts=False):
+        activities=None, sleep_time=600, max_sources=4, retry_other_fts=False, job_size=None):
     """
     Starts up the conveyer threads.
+
+    :param job_size: Merge the compatible jobs of different groups up to this number of files per job.
     """
 
     if mock:
@@ -219,7 +276,8 @@ def run(once=False,
                                                           'sleep_time': sleep_time,
                                                           'max_sources': max_sources,
                                                           'fts_source_strategy': fts_source_strategy,
-                                                          'retry_other_fts': retry_other_fts})]
+                                                          'retry_other_fts': retry_other_fts,
+                                                          'job_size': job_size})]
 
     [t.start() for t in threads]
 
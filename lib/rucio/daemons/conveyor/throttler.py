@@ -26,6 +26,7 @@ import traceback
 
 from rucio.common.config import config_get
 from rucio.core import heartbeat
+from rucio.core.request_counter import rebuild_counters
 
 from rucio.daemons.conveyor.utils import schedule_requests
 
@@ -36,9 +37,13 @@ logging.basicConfig(stream=sys.stdout,
 graceful_stop = threading.Event()
 
 
-def throttler(once=False, sleep_time=600):
+def throttler(once=False, sleep_time=600, rebuild_interval=86400):
     """
     Main loop to check rse transfer limits.
+
+    :param once: Run only once.
+    :param sleep_time: Seconds between the cycles.
+    :param rebuild_interval: Seconds between the recomputations of the request counters from the requests table.
     """
 
     logging.info('Throttler starting')
@@ -53,6 +58,7 @@ def throttler(once=False, sleep_time=600):
     logging.info('Throttler started - thread (%i/%i) timeout (%s)' % (hb['assign_thread'], hb['nr_threads'], sleep_time))
 
     current_time = time.time()
+    rebuilt_at = None
     while not graceful_stop.is_set():
 
         try:
@@ -67,6 +73,11 @@ def throttler(once=False, sleep_time=600):
                 current_time = time.time()
                 continue
 
+            if rebuilt_at is None or time.time() > rebuilt_at + rebuild_interval:
+                logging.info("Throttler thread %s - rebuild request counters" % hb['assign_thread'])
+                rebuild_counters()
+                rebuilt_at = time.time()
+
             logging.info("Throttler thread %s - schedule requests" % hb['assign_thread'])
             schedule_requests()
 
@@ -96,13 +107,13 @@ def stop(signum=None, frame=None):
     graceful_stop.set()
 
 
-def run(once=False, sleep_time=600):
+def run(once=False, sleep_time=600, rebuild_interval=86400):
     """
     Starts up the conveyer threads.
     """
     threads = []
     logging.info('starting throttler thread')
-    throttler_thread = threading.Thread(target=throttler, kwargs={'once': once, 'sleep_time': sleep_time})
+    throttler_thread = threading.Thread(target=throttler, kwargs={'once': once, 'sleep_time': sleep_time, 'rebuild_interval': rebuild_interval})
 
     threads.append(throttler_thread)
     [t.start() for t in threads]
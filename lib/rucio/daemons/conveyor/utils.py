@@ -14,6 +14,7 @@
 """
 Methods common to different conveyor submitter daemons.
 """
+import heapq
 import math
 import datetime
 import json
@@ -29,7 +30,7 @@ from rucio.common.closeness_sorter import sort_sources
 from rucio.common.exception import DataIdentifierNotFound, RSEProtocolNotSupported, InvalidRSEExpression, InvalidRequest
 from rucio.common.rse_attributes import get_rse_attributes
 from rucio.common.utils import construct_surl, chunks
-from rucio.core import did, replica, request, rse as rse_core
+from rucio.core import did, replica, request, request_counter, rse as rse_core
 from rucio.core.monitor import record_counter, record_timer, record_gauge
 from rucio.core.rse_expression_parser import parse_expression
 from rucio.db.sqla.constants import DIDType, RequestType, RequestState, RSEType
@@ -146,7 +147,7 @@ def get_sources(dest_rse, schemes, req, max_sources=4):
             # we need to know upfront if we are mixed DISK/TAPE source
             mixed_source = []
             for source_rse in source['rses']:
-                mixed_source.append(rse_core.get_rse(source_rse).rse_type)
+                mixed_source.append(rse_core.get_cached_rse(source_rse)['rse_type'])
             mixed_source = True if len(set(mixed_source)) > 1 else False
 
             for source_rse in source['rses']:
@@ -172,11 +173,11 @@ def get_sources(dest_rse, schemes, req, max_sources=4):
                     # do not allow mixed source jobs, either all DISK or all TAPE
                     # do not use TAPE on the first try
                     if mixed_source:
-                        if not req['previous_attempt_id'] and rse_core.get_rse(source_rse).rse_type == RSEType.TAPE and source_rse not in allowed_source_rses:
+                        if not req['previous_attempt_id'] and rse_core.get_cached_rse(source_rse)['rse_type'] == RSEType.TAPE and source_rse not in allowed_source_rses:
                             logging.debug('Skip tape source %s for request %s' % (source_rse,
                                                                                   req['request_id']))
                             continue
-                        elif req['previous_attempt_id'] and rse_core.get_rse(source_rse).rse_type == RSEType.DISK and source_rse not in allowed_source_rses:
+                        elif req['previous_attempt_id'] and rse_core.get_cached_rse(source_rse)['rse_type'] == RSEType.DISK and source_rse not in allowed_source_rses:
                             logging.debug('Skip disk source %s for retrial request %s' % (source_rse,
                                                                                           req['request_id']))
                             continue
@@ -342,7 +343,7 @@ def get_transfer(rse, req, scheme, mock, max_sources=4):
         # Sources are properly set, so now we can finally force the source RSE to the destination RSE for STAGEIN
         dest_rse = sources[0][0]
 
-        rse_attr = rse_core.list_rse_attributes(sources[0][0])
+        rse_attr = rse_core.list_cached_rse_attributes(sources[0][0])
         fts_hosts = rse_attr.get('fts', None)
         naming_convention = rse_attr.get('naming_convention', None)
 
@@ -379,7 +380,7 @@ def get_transfer(rse, req, scheme, mock, max_sources=4):
     else:
         # for normal transfer, get the destination at first, then use the destination scheme to get sources
 
-        rse_attr = rse_core.list_rse_attributes(rse['rse'], rse['id'])
+        rse_attr = rse_core.list_cached_rse_attributes(rse['rse'], rse['id'])
         fts_hosts = rse_attr.get('fts', None)
         naming_convention = rse_attr.get('naming_convention', None)
 
@@ -431,9 +432,9 @@ def get_transfer(rse, req, scheme, mock, max_sources=4):
 
         # Extend the metadata dictionary with request attributes
         copy_pin_lifetime, overwrite, bring_online = -1, True, None
-        if rse_core.get_rse(sources[0][0]).rse_type == RSEType.TAPE:
+        if rse_core.get_cached_rse(sources[0][0])['rse_type'] == RSEType.TAPE:
             bring_online = 172800
-        if rse_core.get_rse(None, rse_id=req['dest_rse_id']).rse_type == RSEType.TAPE:
+        if rse_core.get_cached_rse(rse_id=req['dest_rse_id'])['rse_type'] == RSEType.TAPE:
             overwrite = False
         # make sure we only use one source when bring_online is needed
         if bring_online and len(sources) > 1:
@@ -522,7 +523,7 @@ def get_transfers_from_requests(process=0, total_processes=1, thread=0, total_th
                 # logging.info("Request dest %s is not in RSEs list, skip")
                 continue
             else:
-                dest_rse = rse_core.get_rse(rse=None, rse_id=req['dest_rse_id'])
+                dest_rse = rse_core.get_cached_rse(rse_id=req['dest_rse_id'])
                 rse_info = rsemgr.get_rse_info(dest_rse['rse'])
 
                 ts = time.time()
@@ -626,6 +627,35 @@ def bulk_group_transfer(transfers, policy='rule', group_bulk=200, fts_source_str
     return grouped_jobs
 
 
+def merge_jobs(grouped_jobs, job_size):
+    """
+    Merge the jobs of bulk_group_transfer which have the same job parameters,
+    up to job_size files per job, so that fewer and larger jobs are submitted.
+    Jobs with multiple source replicas are not merged.
+
+    :param grouped_jobs: Dictionary {external_host: [job]} as returned by bulk_group_transfer.
+    :param job_size: Maximum number of files of a merged job.
+    :returns: Dictionary {external_host: [job]}.
+    """
+    merged_jobs = {}
+    for external_host, jobs in grouped_jobs.iteritems():
+        merged_jobs[external_host] = []
+        open_jobs = {}
+        for job in jobs:
+            if job['job_params']['job_metadata'].get('multi_sources', False) or len(job['files']) >= job_size:
+                merged_jobs[external_host].append(job)
+                continue
+            job_key = json.dumps(job['job_params'], sort_keys=True)
+            merged_job = open_jobs.get(job_key)
+            if merged_job and len(merged_job['files']) + len(job['files']) <= job_size:
+                merged_job['files'].extend(job['files'])
+            else:
+                merged_job = {'files': list(job['files']), 'job_params': job['job_params']}
+                open_jobs[job_key] = merged_job
+                merged_jobs[external_host].append(merged_job)
+    return merged_jobs
+
+
 @read_session
 def get_unavailable_read_rse_ids(session=None):
     key = 'unavailable_read_rse_ids'
@@ -643,6 +673,56 @@ def get_unavailable_read_rse_ids(session=None):
     return result
 
 
+def __load_attributes(attributes):
+    """
+    Loads the attributes of a request.
+
+    :param attributes: The attributes as a dictionary or a JSON string.
+    :returns: Dictionary, or None if no attributes.
+    """
+    if not attributes:
+        return None
+    if type(attributes) is dict:
+        return json.loads(json.dumps(attributes))
+    return json.loads(str(attributes))
+
+
+def __get_allowed_rses(source_replica_expression, allowed_rses, session):
+    """
+    Resolves a source replica expression once per cycle.
+
+    :param source_replica_expression: The RSE expression.
+    :param allowed_rses: Dictionary {expression: set of RSE names or None} of the already resolved expressions.
+    :param session: The database session in use.
+    :returns: Set of RSE names, or None if the expression is invalid.
+    """
+    if source_replica_expression not in allowed_rses:
+        try:
+            allowed_rses[source_replica_expression] = set([x['rse'] for x in parse_expression(source_replica_expression, session=session)])
+        except InvalidRSEExpression, e:
+            logging.error("Invalid RSE exception %s: %s" % (source_replica_expression, e))
+            allowed_rses[source_replica_expression] = None
+    return allowed_rses[source_replica_expression]
+
+
+def __get_pfn(protocol, protocol_key, scope, name, path, pfns):
+    """
+    Constructs a PFN once per protocol, scope, name and path.
+
+    :param protocol: The protocol of the RSE.
+    :param protocol_key: The key of the protocol, made of the RSE id and the schemes.
+    :param scope: The scope of the file.
+    :param name: The name of the file.
+    :param path: The path of the file, None for deterministic RSEs.
+    :param pfns: Dictionary of the already constructed PFNs.
+    :returns: The PFN.
+    """
+    key = (protocol_key, scope, name, path)
+    if key not in pfns:
+        pfns[key] = protocol.lfns2pfns(lfns={'scope': scope, 'name': name, 'path': path}).values()[0]
+    return pfns[key]
+
+
 @read_session
 def get_transfer_requests_and_source_replicas(process=None, total_processes=None, thread=None, total_threads=None,
                                               limit=None, activity=None, older_than=None, rses=None, schemes=None,
@@ -650,10 +730,12 @@ def get_transfer_requests_and_source_replicas(process=None, total_processes=None
     req_sources = request.list_transfer_requests_and_source_replicas(process=process, total_processes=total_processes, thread=thread, total_threads=total_threads,
                                                                      limit=limit, activity=activity, older_than=older_than, rses=rses, session=session)
 
-    unavailable_read_rse_ids = get_unavailable_read_rse_ids(session=session)
+    unavailable_read_rse_ids = set(get_unavailable_read_rse_ids(session=session))
 
     bring_online_local = bring_online
     transfers, rses_info, protocols, rse_attrs, reqs_no_source, reqs_only_tape_source, reqs_scheme_mismatch = {}, {}, {}, {}, [], [], []
+    # the attributes of the requests, the source replica expressions and the PFNs are only resolved once per cycle
+    requests_attr, allowed_rses, pfns = {}, {}, {}
     for id, rule_id, scope, name, md5, adler32, bytes, activity, attributes, previous_attempt_id, dest_rse_id, source_rse_id, rse, deterministic, rse_type, path, retry_count, src_url, ranking, link_ranking in req_sources:
         transfer_src_type = "DISK"
         transfer_dst_type = "DISK"
@@ -684,30 +766,21 @@ def get_transfer_requests_and_source_replicas(process=None, total_processes=None
 
                 # Get destination rse information and protocol
                 if dest_rse_id not in rses_info:
-                    dest_rse = rse_core.get_rse_name(rse_id=dest_rse_id, session=session)
+                    dest_rse = rse_core.get_cached_rse_name(rse_id=dest_rse_id, session=session)
                     rses_info[dest_rse_id] = rsemgr.get_rse_info(dest_rse, session=session)
                 if dest_rse_id not in rse_attrs:
                     rse_attrs[dest_rse_id] = get_rse_attributes(dest_rse_id, session=session)
 
-                attr = None
-                if attributes:
-                    if type(attributes) is dict:
-                        attr = json.loads(json.dumps(attributes))
-                    else:
-                        attr = json.loads(str(attributes))
+                if id not in requests_attr:
+                    requests_attr[id] = __load_attributes(attributes)
+                attr = requests_attr[id]
 
                 # parse source expression
                 source_replica_expression = attr["source_replica_expression"] if (attr and "source_replica_expression" in attr) else None
                 if source_replica_expression:
-                    try:
-                        parsed_rses = parse_expression(source_replica_expression, session=session)
-                    except InvalidRSEExpression, e:
-                        logging.error("Invalid RSE exception %s: %s" % (source_replica_expression, e))
+                    source_rses = __get_allowed_rses(source_replica_expression, allowed_rses, session)
+                    if source_rses is None or rse not in source_rses:
                         continue
-                    else:
-                        allowed_rses = [x['rse'] for x in parsed_rses]
-                        if rse not in allowed_rses:
-                            continue
 
                 # parse allow tape source expression, not finally version.
                 # allow_tape_source = attr["allow_tape_source"] if (attr and "allow_tape_source" in attr) else True
@@ -735,7 +808,7 @@ def get_transfer_requests_and_source_replicas(process=None, total_processes=None
 
                 # Compute the destination url
                 if rses_info[dest_rse_id]['deterministic']:
-                    dest_url = protocols[dest_rse_id].lfns2pfns(lfns={'scope': scope, 'name': name}).values()[0]
+                    dest_url = __get_pfn(protocols[dest_rse_id], dest_rse_id, scope, name, None, pfns)
                 else:
                     # compute dest url in case of non deterministic
                     # naming convention, etc.
@@ -785,7 +858,7 @@ def get_transfer_requests_and_source_replicas(process=None, total_processes=None
                             reqs_scheme_mismatch.append(id)
                         continue
 
-                source_url = protocols[source_rse_id_key].lfns2pfns(lfns={'scope': scope, 'name': name, 'path': path}).values()[0]
+                source_url = __get_pfn(protocols[source_rse_id_key], source_rse_id_key, scope, name, path, pfns)
 
                 # Extend the metadata dictionary with request attributes
                 overwrite, bring_online = True, None
@@ -869,25 +942,16 @@ def get_transfer_requests_and_source_replicas(process=None, total_processes=None
                 if source_rse_id in unavailable_read_rse_ids:
                     continue
 
-                attr = None
-                if attributes:
-                    if type(attributes) is dict:
-                        attr = json.loads(json.dumps(attributes))
-                    else:
-                        attr = json.loads(str(attributes))
+                if id not in requests_attr:
+                    requests_attr[id] = __load_attributes(attributes)
+                attr = requests_attr[id]
 
                 # parse source expression
                 source_replica_expression = attr["source_replica_expression"] if (attr and "source_replica_expression" in attr) else None
                 if source_replica_expression:
-                    try:
-                        parsed_rses = parse_expression(source_replica_expression, session=session)
-                    except InvalidRSEExpression, e:
-                        logging.error("Invalid RSE exception %s: %s" % (source_replica_expression, e))
+                    source_rses = __get_allowed_rses(source_replica_expression, allowed_rses, session)
+                    if source_rses is None or rse not in source_rses:
                         continue
-                    else:
-                        allowed_rses = [x['rse'] for x in parsed_rses]
-                        if rse not in allowed_rses:
-                            continue
 
                 # parse allow tape source expression, not finally version.
                 allow_tape_source = attr["allow_tape_source"] if (attr and "allow_tape_source" in attr) else True
@@ -971,7 +1035,7 @@ def get_transfer_requests_and_source_replicas(process=None, total_processes=None
                         if id not in reqs_scheme_mismatch:
                             reqs_scheme_mismatch.append(id)
                         continue
-                source_url = protocols[source_rse_id_key].lfns2pfns(lfns={'scope': scope, 'name': name, 'path': path}).values()[0]
+                source_url = __get_pfn(protocols[source_rse_id_key], source_rse_id_key, scope, name, path, pfns)
 
                 # transfers[id]['src_urls'].append((source_rse_id, source_url))
                 transfers[id]['sources'].append((rse, source_url, source_rse_id, ranking, link_ranking))
@@ -1013,7 +1077,7 @@ def get_stagein_requests_and_source_replicas(process=None, total_processes=None,
 
                     # Get destination rse information and protocol
                     if dest_rse_id not in rses_info:
-                        dest_rse = rse_core.get_rse_name(rse_id=dest_rse_id, session=session)
+                        dest_rse = rse_core.get_cached_rse_name(rse_id=dest_rse_id, session=session)
                         rses_info[dest_rse_id] = rsemgr.get_rse_info(dest_rse, session=session)
 
                     if staging_buffer != rses_info[dest_rse_id]['rse']:
@@ -1180,47 +1244,26 @@ def handle_requests_with_scheme_mismatch(transfers=None, reqs_scheme_mismatch=No
 def mock_sources(sources):
     tmp_sources = []
     for s in sources:
-        tmp_sources.append((s[0], ':'.join(['mock'] + s[1].split(':')[1:]), s[2], s[3]))
-    sources = tmp_sources
+        tmp_sources.append((s[0], ':'.join(['mock'] + s[1].split(':')[1:]), s[2], s[3], s[4]))
     return tmp_sources
 
 
-def sort_link_ranking(sources):
-    rank_sources = {}
-    ret_sources = []
-    for source in sources:
-        rse, source_url, source_rse_id, ranking, link_ranking = source
-        if link_ranking not in rank_sources:
-            rank_sources[link_ranking] = []
-        rank_sources[link_ranking].append(source)
-    rank_keys = rank_sources.keys()
-    rank_keys.sort(reverse=True)
-    for rank_key in rank_keys:
-        sources_list = rank_sources[rank_key]
-        random.shuffle(sources_list)
-        ret_sources = ret_sources + sources_list
-    return ret_sources
-
+def rank_sources(sources, max_sources=None):
+    """
+    Orders the sources by decreasing ranking, the retries from the sources table, then by decreasing
+    link ranking, from the distances table, in random order for the same rankings.
 
-def sort_ranking(sources):
+    :param sources: List of (rse, source_url, source_rse_id, ranking, link_ranking).
+    :param max_sources: Only keep the max_sources best sources.
+    :returns: The ordered list of sources.
+    """
     logging.debug("Sources before sorting: %s" % sources)
-    rank_sources = {}
-    ret_sources = []
-    for source in sources:
-        # ranking is from sources table, is the retry times
-        # link_ranking is from distances table, is the link rank.
-        # link_ranking should not be None(None means no link, the source will not be used).
-        rse, source_url, source_rse_id, ranking, link_ranking = source
-        if ranking is None:
-            ranking = 0
-        if ranking not in rank_sources:
-            rank_sources[ranking] = []
-        rank_sources[ranking].append(source)
-    rank_keys = rank_sources.keys()
-    rank_keys.sort(reverse=True)
-    for rank_key in rank_keys:
-        sources_list = sort_link_ranking(rank_sources[rank_key])
-        ret_sources = ret_sources + sources_list
+    keyed_sources = [(-(source[3] or 0), -source[4], random.random(), source) for source in sources]
+    if max_sources is not None and max_sources < len(keyed_sources):
+        keyed_sources = heapq.nsmallest(max_sources, keyed_sources)
+    else:
+        keyed_sources.sort()
+    ret_sources = [keyed_source[3] for keyed_source in keyed_sources]
     logging.debug("Sources after sorting: %s" % ret_sources)
     return ret_sources
 
@@ -1238,10 +1281,7 @@ def get_transfers(process=None, total_processes=None, thread=None, total_threads
     request.set_requests_state(reqs_scheme_mismatch, RequestState.MISMATCH_SCHEME)
 
     for request_id in transfers:
-        sources = transfers[request_id]['sources']
-        sources = sort_ranking(sources)
-        if len(sources) > max_sources:
-            sources = sources[:max_sources]
+        sources = rank_sources(transfers[request_id]['sources'], max_sources)
         if not mock:
             transfers[request_id]['sources'] = sources
         else:
@@ -1346,9 +1386,16 @@ def submit_transfer(external_host, job, submitter='submitter', cachedir=None, pr
 
 
 def schedule_requests():
+    """
+    Sets the transfer limits and releases the waiting requests, from the request counters
+    instead of an aggregation of the requests table.
+    """
     try:
         logging.info("Throttler retrieve requests statistics")
-        results = request.get_stats_by_activity_dest_state(state=[RequestState.QUEUED, RequestState.SUBMITTING, RequestState.SUBMITTED, RequestState.WAITING])
+        ts = time.time()
+        request_counter.compact_counters()
+        results = request_counter.get_counters()
+        record_timer('daemons.conveyor.throttler.get_counters', (time.time() - ts) * 1000)
         result_dict = {}
         for activity, dest_rse_id, account, state, counter in results:
             threshold = request.get_config_limit(activity, dest_rse_id)
@@ -1377,12 +1424,12 @@ def schedule_requests():
                     logging.debug("Throttler remove limits(threshold: %s) and release all waiting requests for acitivity %s, rse_id %s" % (threshold, activity, dest_rse_id))
                     rse_core.delete_rse_transfer_limits(rse=None, activity=activity, rse_id=dest_rse_id)
                     request.release_waiting_requests(rse=None, activity=activity, rse_id=dest_rse_id)
-                    rse_name = rse_core.get_rse_name(rse_id=dest_rse_id)
+                    rse_name = rse_core.get_cached_rse_name(rse_id=dest_rse_id)
                     record_counter('daemons.conveyor.throttler.delete_rse_transfer_limits.%s.%s' % (activity, rse_name))
                 elif transfer + waiting > threshold:
                     logging.debug("Throttler set limits for acitivity %s, rse_id %s" % (activity, dest_rse_id))
                     rse_core.set_rse_transfer_limits(rse=None, activity=activity, rse_id=dest_rse_id, max_transfers=threshold, transfers=transfer, waitings=waiting)
-                    rse_name = rse_core.get_rse_name(rse_id=dest_rse_id)
+                    rse_name = rse_core.get_cached_rse_name(rse_id=dest_rse_id)
                     record_gauge('daemons.conveyor.throttler.set_rse_transfer_limits.%s.%s.max_transfers' % (activity, rse_name), threshold)
                     record_gauge('daemons.conveyor.throttler.set_rse_transfer_limits.%s.%s.transfers' % (activity, rse_name), transfer)
                     record_gauge('daemons.conveyor.throttler.set_rse_transfer_limits.%s.%s.waitings' % (activity, rse_name), waiting)
@@ -1424,7 +1471,7 @@ def schedule_requests():
                     logging.debug("Throttler remove limits(threshold: %s) and release all waiting requests for acitivity %s, rse_id %s" % (threshold, activity, dest_rse_id))
                     rse_core.delete_rse_transfer_limits(rse=None, activity=activity, rse_id=dest_rse_id)
                     request.release_waiting_requests(rse=None, activity=activity, rse_id=dest_rse_id)
-                    rse_name = rse_core.get_rse_name(rse_id=dest_rse_id)
+                    rse_name = rse_core.get_cached_rse_name(rse_id=dest_rse_id)
                     record_counter('daemons.conveyor.throttler.delete_rse_transfer_limits.%s.%s' % (activity, rse_name))
     except:
         logging.warning("Failed to schedule requests, error: %s" % (traceback.format_exc()))
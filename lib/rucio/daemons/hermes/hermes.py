@@ -16,6 +16,7 @@
 import json
 import logging
 import os
+import Queue
 import random
 import smtplib
 import socket
@@ -47,9 +48,108 @@ logging.basicConfig(stream=sys.stdout,
 graceful_stop = threading.Event()
 
 
-def deliver_emails(once=False, send_email=True, thread=0, bulk=1000, delay=10):
+def __deletion_worker(pipeline, prefix):
+    '''
+    Archives and deletes the batches of delivered messages handed over by a delivery thread.
+
+    :param pipeline: The pipeline state, as returned by __start_pipeline.
+    :param prefix: Log prefix of the owning delivery thread.
+    '''
+
+    while True:
+        ids = pipeline['queue'].get()
+        try:
+            if ids is None:
+                return
+            t_start = time.time()
+            delete_messages(ids)
+            record_counter('daemons.hermes.deleted', len(ids))
+            logging.debug('%s deleted %i messages in %s seconds' % (prefix, len(ids), time.time() - t_start))
+        except:
+            logging.critical(traceback.format_exc())
+        finally:
+            if ids:
+                with pipeline['lock']:
+                    pipeline['in_flight'].difference_update(ids)
+            pipeline['queue'].task_done()
+
+
+def __start_pipeline(prefix, depth=2):
+    '''
+    Starts the background deletion of delivered messages.
+
+    :param prefix: Log prefix of the owning delivery thread.
+    :param depth: Number of delivered batches which can wait for deletion before the delivery blocks.
+
+    :returns: The pipeline state.
+    '''
+
+    pipeline = {'queue': Queue.Queue(maxsize=depth),
+                'in_flight': set(),
+                'lock': threading.Lock()}
+    pipeline['thread'] = threading.Thread(target=__deletion_worker, args=(pipeline, prefix))
+    pipeline['thread'].start()
+    return pipeline
+
+
+def __stop_pipeline(pipeline):
+    '''
+    Waits for the pending deletions and stops the deletion thread.
+
+    :param pipeline: The pipeline state, or None.
+    '''
+
+    if pipeline:
+        pipeline['queue'].put(None)
+        pipeline['thread'].join()
+
+
+def __retrieve(pipeline, bulk, thread, total_threads, event_type=None):
+    '''
+    Retrieves up to bulk messages, leaving out the ones still waiting for deletion.
+
+    :param pipeline: The pipeline state, or None.
+    :param bulk: Number of messages as an integer.
+    :param thread: Identifier of the caller thread as an integer.
+    :param total_threads: Maximum number of threads as an integer.
+    :param event_type: Return only specified event_type. If None, returns everything except email.
+
+    :returns: List of message dictionaries.
+    '''
+
+    if not pipeline:
+        return retrieve_messages(bulk=bulk, thread=thread, total_threads=total_threads, event_type=event_type)
+
+    with pipeline['lock']:
+        in_flight = set(pipeline['in_flight'])
+    messages = retrieve_messages(bulk=bulk + len(in_flight), thread=thread, total_threads=total_threads, event_type=event_type)
+    return [message for message in messages if message['id'] not in in_flight][:bulk]
+
+
+def __delete(pipeline, ids):
+    '''
+    Deletes the delivered messages, in the background if pipelining is enabled.
+
+    :param pipeline: The pipeline state, or None.
+    :param ids: The message IDs, as a list of strings.
+    '''
+
+    if not ids:
+        return
+    if not pipeline:
+        delete_messages(ids)
+        return
+    with pipeline['lock']:
+        pipeline['in_flight'].update(ids)
+    pipeline['queue'].put(ids)
+
+
+def deliver_emails(once=False, send_email=True, thread=0, bulk=1000, delay=10, pipeline=False):
     '''
     Main loop to deliver emails via SMTP.
+
+    With pipeline, the delivered messages are deleted in the background while the next
+    batch is retrieved and sent, and no delay is applied as long as full batches come in.
     '''
 
     logging.info('[email] starting - threads (%i) bulk (%i)' % (thread, bulk))
@@ -66,68 +166,81 @@ def deliver_emails(once=False, send_email=True, thread=0, bulk=1000, delay=10):
 
     email_from = config_get('messaging-hermes', 'email_from')
 
-    while not graceful_stop.is_set():
+    deletion = __start_pipeline('[email]') if pipeline else None
 
-        hb = live(executable, hostname, pid, hb_thread)
-        logging.debug('[email] %i:%i - bulk %i' % (hb['assign_thread'],
-                                                   hb['nr_threads'],
-                                                   bulk))
+    try:
+        while not graceful_stop.is_set():
 
-        t_start = time.time()
+            hb = live(executable, hostname, pid, hb_thread)
+            logging.debug('[email] %i:%i - bulk %i' % (hb['assign_thread'],
+                                                       hb['nr_threads'],
+                                                       bulk))
 
-        tmp = retrieve_messages(bulk=bulk,
-                                thread=hb['assign_thread'],
-                                total_threads=hb['nr_threads'],
-                                event_type='email')
+            t_start = time.time()
 
-        if tmp != []:
-            to_delete = []
-            for t in tmp:
-                logging.debug('[email] %i:%i - submitting: %s' % (hb['assign_thread'],
-                                                                  hb['nr_threads'],
-                                                                  str(t)))
+            tmp = __retrieve(deletion,
+                             bulk=bulk,
+                             thread=hb['assign_thread'],
+                             total_threads=hb['nr_threads'],
+                             event_type='email')
 
-                msg = MIMEText(t['payload']['body'].encode('utf-8'))
+            if tmp != []:
+                to_delete = []
+                smtp = None
+                if send_email:
+                    smtp = smtplib.SMTP()
+                    smtp.connect()
+                for t in tmp:
+                    logging.debug('[email] %i:%i - submitting: %s' % (hb['assign_thread'],
+                                                                      hb['nr_threads'],
+                                                                      str(t)))
 
-                msg['From'] = email_from
-                msg['To'] = ', '.join(t['payload']['to'])
-                msg['Subject'] = t['payload']['subject'].encode('utf-8')
+                    msg = MIMEText(t['payload']['body'].encode('utf-8'))
 
-                if send_email:
-                    s = smtplib.SMTP()
-                    s.connect()
-                    s.sendmail(msg['From'], t['payload']['to'], msg.as_string())
-                    s.quit()
+                    msg['From'] = email_from
+                    msg['To'] = ', '.join(t['payload']['to'])
+                    msg['Subject'] = t['payload']['subject'].encode('utf-8')
 
-                to_delete.append(t['id'])
-                logging.debug('[email] %i:%i - submitting done: %s' % (hb['assign_thread'],
-                                                                       hb['nr_threads'],
-                                                                       str(t['id'])))
+                    if smtp:
+                        smtp.sendmail(msg['From'], t['payload']['to'], msg.as_string())
 
-            delete_messages(to_delete)
-            logging.info('[email] %i:%i - submitted %i messages' % (hb['assign_thread'],
-                                                                    hb['nr_threads'],
-                                                                    len(to_delete)))
+                    to_delete.append(t['id'])
+                    logging.debug('[email] %i:%i - submitting done: %s' % (hb['assign_thread'],
+                                                                           hb['nr_threads'],
+                                                                           str(t['id'])))
 
-        if once:
-            break
+                if smtp:
+                    smtp.quit()
 
-        t_delay = delay - (time.time() - t_start)
-        t_delay = t_delay if t_delay > 0 else 0
-        if t_delay:
-            logging.debug('[email] %i:%i - sleeping %s seconds' % (hb['assign_thread'], hb['nr_threads'], t_delay))
-        time.sleep(t_delay)
+                __delete(deletion, to_delete)
+                logging.info('[email] %i:%i - submitted %i messages' % (hb['assign_thread'],
+                                                                        hb['nr_threads'],
+                                                                        len(to_delete)))
 
-    logging.debug('[email] %i:%i - graceful stop requested' % (hb['assign_thread'], hb['nr_threads']))
+            if once:
+                break
+
+            t_delay = delay - (time.time() - t_start)
+            t_delay = t_delay if t_delay > 0 and not (deletion and len(tmp) == bulk) else 0
+            if t_delay:
+                logging.debug('[email] %i:%i - sleeping %s seconds' % (hb['assign_thread'], hb['nr_threads'], t_delay))
+            time.sleep(t_delay)
+
+        logging.debug('[email] %i:%i - graceful stop requested' % (hb['assign_thread'], hb['nr_threads']))
+    finally:
+        __stop_pipeline(deletion)
 
     die(executable, hostname, pid, hb_thread)
 
     logging.debug('[email] %i:%i - graceful stop done' % (hb['assign_thread'], hb['nr_threads']))
 
 
-def deliver_messages(once=False, brokers_resolved=None, thread=0, bulk=1000, delay=10):
+def deliver_messages(once=False, brokers_resolved=None, thread=0, bulk=1000, delay=10, pipeline=False):
     '''
     Main loop to deliver messages to a broker.
+
+    With pipeline, the delivered messages are deleted in the background while the next
+    batch is retrieved and sent, and no delay is applied as long as full batches come in.
     '''
 
     logging.info('[broker] starting - threads (%i) bulk (%i)' % (thread, bulk))
@@ -156,104 +269,111 @@ def deliver_messages(once=False, brokers_resolved=None, thread=0, bulk=1000, del
     live(executable=executable, hostname=hostname, pid=pid, thread=hb_thread)
     graceful_stop.wait(1)
 
-    while not graceful_stop.is_set():
+    deletion = __start_pipeline('[broker]') if pipeline else None
 
-        hb = live(executable, hostname, pid, hb_thread)
+    try:
+        while not graceful_stop.is_set():
 
-        t_start = time.time()
-        try:
-            for conn in conns:
+            hb = live(executable, hostname, pid, hb_thread)
 
-                if not conn.is_connected():
-                    logging.info('connecting to %s' % conn.transport._Transport__host_and_ports[0][0])
-                    record_counter('daemons.hermes.reconnect.%s' % conn.transport._Transport__host_and_ports[0][0].split('.')[0])
+            t_start = time.time()
+            tmp = []
+            try:
+                for conn in conns:
 
-                    conn.start()
-                    conn.connect()
+                    if not conn.is_connected():
+                        logging.info('connecting to %s' % conn.transport._Transport__host_and_ports[0][0])
+                        record_counter('daemons.hermes.reconnect.%s' % conn.transport._Transport__host_and_ports[0][0].split('.')[0])
 
-            tmp = retrieve_messages(bulk=bulk,
-                                    thread=hb['assign_thread'],
-                                    total_threads=hb['nr_threads'])
+                        conn.start()
+                        conn.connect()
 
-            if tmp != []:
-                logging.debug('[broker] %i:%i - retrieved %i messages' % (hb['assign_thread'],
-                                                                          hb['nr_threads'],
-                                                                          len(tmp)))
-                to_delete = []
-                for t in tmp:
+                tmp = __retrieve(deletion,
+                                 bulk=bulk,
+                                 thread=hb['assign_thread'],
+                                 total_threads=hb['nr_threads'])
 
-                    try:
-                        random.sample(conns, 1)[0].send(body=json.dumps({'event_type': str(t['event_type']).lower(),
-                                                                         'payload': t['payload'],
-                                                                         'created_at': str(t['created_at'])}),
-                                                        destination=destination,
-                                                        headers={'persistent': 'true'})
-                        to_delete.append(t['id'])
-                    except ValueError:
-                        logging.warn('Cannot serialize payload to JSON: %s' % str(t['payload']))
-                        to_delete.append(t['id'])
-                        continue
-                    except Exception, e:
-                        logging.warn('Could not deliver message: %s' % str(e))
-                        continue
-
-                    if str(t['event_type']).lower().startswith('transfer') or str(t['event_type']).lower().startswith('stagein'):
-                        logging.debug('[broker] %i:%i - event_type: %s, scope: %s, name: %s, rse: %s, request-id: %s, transfer-id: %s, created_at: %s' % (hb['assign_thread'],
-                                                                                                                                                          hb['nr_threads'],
-                                                                                                                                                          str(t['event_type']).lower(),
-                                                                                                                                                          t['payload'].get('scope', None),
-                                                                                                                                                          t['payload'].get('name', None),
-                                                                                                                                                          t['payload'].get('dst-rse', None),
-                                                                                                                                                          t['payload'].get('request-id', None),
-                                                                                                                                                          t['payload'].get('transfer-id', None),
-                                                                                                                                                          str(t['created_at'])))
-                    elif str(t['event_type']).lower().startswith('dataset'):
-                        logging.debug('[broker] %i:%i - event_type: %s, scope: %s, name: %s, rse: %s, rule-id: %s, created_at: %s)' % (hb['assign_thread'],
+                if tmp != []:
+                    logging.debug('[broker] %i:%i - retrieved %i messages' % (hb['assign_thread'],
+                                                                              hb['nr_threads'],
+                                                                              len(tmp)))
+                    to_delete = []
+                    for t in tmp:
+
+                        try:
+                            random.sample(conns, 1)[0].send(body=json.dumps({'event_type': str(t['event_type']).lower(),
+                                                                             'payload': t['payload'],
+                                                                             'created_at': str(t['created_at'])}),
+                                                            destination=destination,
+                                                            headers={'persistent': 'true'})
+                            to_delete.append(t['id'])
+                        except ValueError:
+                            logging.warn('Cannot serialize payload to JSON: %s' % str(t['payload']))
+                            to_delete.append(t['id'])
+                            continue
+                        except Exception, e:
+                            logging.warn('Could not deliver message: %s' % str(e))
+                            continue
+
+                        if str(t['event_type']).lower().startswith('transfer') or str(t['event_type']).lower().startswith('stagein'):
+                            logging.debug('[broker] %i:%i - event_type: %s, scope: %s, name: %s, rse: %s, request-id: %s, transfer-id: %s, created_at: %s' % (hb['assign_thread'],
+                                                                                                                                                              hb['nr_threads'],
+                                                                                                                                                              str(t['event_type']).lower(),
+                                                                                                                                                              t['payload'].get('scope', None),
+                                                                                                                                                              t['payload'].get('name', None),
+                                                                                                                                                              t['payload'].get('dst-rse', None),
+                                                                                                                                                              t['payload'].get('request-id', None),
+                                                                                                                                                              t['payload'].get('transfer-id', None),
+                                                                                                                                                              str(t['created_at'])))
+                        elif str(t['event_type']).lower().startswith('dataset'):
+                            logging.debug('[broker] %i:%i - event_type: %s, scope: %s, name: %s, rse: %s, rule-id: %s, created_at: %s)' % (hb['assign_thread'],
+                                                                                                                                           hb['nr_threads'],
+                                                                                                                                           str(t['event_type']).lower(),
+                                                                                                                                           t['payload']['scope'],
+                                                                                                                                           t['payload']['name'],
+                                                                                                                                           t['payload']['rse'],
+                                                                                                                                           t['payload']['rule_id'],
+                                                                                                                                           str(t['created_at'])))
+                        elif str(t['event_type']).lower().startswith('deletion'):
+                            if 'url' not in t['payload']:
+                                t['payload']['url'] = 'unknown'
+                            logging.debug('[broker] %i:%i - event_type: %s, scope: %s, name: %s, rse: %s, url: %s, created_at: %s)' % (hb['assign_thread'],
                                                                                                                                        hb['nr_threads'],
                                                                                                                                        str(t['event_type']).lower(),
                                                                                                                                        t['payload']['scope'],
                                                                                                                                        t['payload']['name'],
                                                                                                                                        t['payload']['rse'],
-                                                                                                                                       t['payload']['rule_id'],
+                                                                                                                                       t['payload']['url'],
                                                                                                                                        str(t['created_at'])))
-                    elif str(t['event_type']).lower().startswith('deletion'):
-                        if 'url' not in t['payload']:
-                            t['payload']['url'] = 'unknown'
-                        logging.debug('[broker] %i:%i - event_type: %s, scope: %s, name: %s, rse: %s, url: %s, created_at: %s)' % (hb['assign_thread'],
-                                                                                                                                   hb['nr_threads'],
-                                                                                                                                   str(t['event_type']).lower(),
-                                                                                                                                   t['payload']['scope'],
-                                                                                                                                   t['payload']['name'],
-                                                                                                                                   t['payload']['rse'],
-                                                                                                                                   t['payload']['url'],
-                                                                                                                                   str(t['created_at'])))
-
-                    else:
-                        logging.debug('[broker] %i:%i - other message: %s' % (hb['assign_thread'],
-                                                                              hb['nr_threads'],
-                                                                              t))
 
-                delete_messages(to_delete)
-                logging.info('[broker] %i:%i - submitted %i messages' % (hb['assign_thread'],
-                                                                         hb['nr_threads'],
-                                                                         len(to_delete)))
+                        else:
+                            logging.debug('[broker] %i:%i - other message: %s' % (hb['assign_thread'],
+                                                                                  hb['nr_threads'],
+                                                                                  t))
 
-                if once:
-                    break
+                    __delete(deletion, to_delete)
+                    logging.info('[broker] %i:%i - submitted %i messages' % (hb['assign_thread'],
+                                                                             hb['nr_threads'],
+                                                                             len(to_delete)))
 
-        except NoResultFound:
-            # silence this error: https://its.cern.ch/jira/browse/RUCIO-1699
-            pass
-        except:
-            logging.critical(traceback.format_exc())
+                    if once:
+                        break
+
+            except NoResultFound:
+                # silence this error: https://its.cern.ch/jira/browse/RUCIO-1699
+                pass
+            except:
+                logging.critical(traceback.format_exc())
 
-        t_delay = delay - (time.time() - t_start)
-        t_delay = t_delay if t_delay > 0 else 0
-        if t_delay:
-            logging.debug('[broker] %i:%i - sleeping %s seconds' % (hb['assign_thread'], hb['nr_threads'], t_delay))
-        time.sleep(t_delay)
+            t_delay = delay - (time.time() - t_start)
+            t_delay = t_delay if t_delay > 0 and not (deletion and len(tmp) == bulk) else 0
+            if t_delay:
+                logging.debug('[broker] %i:%i - sleeping %s seconds' % (hb['assign_thread'], hb['nr_threads'], t_delay))
+            time.sleep(t_delay)
 
-    logging.debug('[broker] %i:%i - graceful stop requested' % (hb['assign_thread'], hb['nr_threads']))
+        logging.debug('[broker] %i:%i - graceful stop requested' % (hb['assign_thread'], hb['nr_threads']))
+    finally:
+        __stop_pipeline(deletion)
 
     for conn in conns:
         try:
@@ -276,7 +396,7 @@ def stop(signum=None, frame=None):
     graceful_stop.set()
 
 
-def run(once=False, send_email=True, threads=1, bulk=1000, delay=10):
+def run(once=False, send_email=True, threads=1, bulk=1000, delay=10, pipeline=False):
     '''
     Starts up the hermes threads.
     '''
@@ -305,20 +425,22 @@ def run(once=False, send_email=True, threads=1, bulk=1000, delay=10):
 
     if once:
         logging.info('executing one hermes iteration only')
-        deliver_messages(once=once, brokers_resolved=brokers_resolved, bulk=bulk, delay=delay)
-        deliver_emails(once=once, send_email=send_email, bulk=bulk, delay=delay)
+        deliver_messages(once=once, brokers_resolved=brokers_resolved, bulk=bulk, delay=delay, pipeline=pipeline)
+        deliver_emails(once=once, send_email=send_email, bulk=bulk, delay=delay, pipeline=pipeline)
 
     else:
         logging.info('starting hermes threads')
         thread_list = [threading.Thread(target=deliver_messages, kwargs={'brokers_resolved': brokers_resolved,
                                                                          'thread': i,
                                                                          'bulk': bulk,
-                                                                         'delay': delay}) for i in xrange(0, threads)]
+                                                                         'delay': delay,
+                                                                         'pipeline': pipeline}) for i in xrange(0, threads)]
 
         for i in xrange(0, threads):
             thread_list.append(threading.Thread(target=deliver_emails, kwargs={'thread': i,
                                                                                'bulk': bulk,
-                                                                               'delay': delay}))
+                                                                               'delay': delay,
+                                                                               'pipeline': pipeline}))
 
         [t.start() for t in thread_list]
 
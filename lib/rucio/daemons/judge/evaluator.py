@@ -29,10 +29,11 @@ from sqlalchemy.exc import DatabaseError
 from sqlalchemy.orm.exc import FlushError
 
 from rucio.common.config import config_get
-from rucio.common.exception import DatabaseException, DataIdentifierNotFound, ReplicationRuleCreationTemporaryFailed
+from rucio.common.exception import DatabaseException, ReplicationRuleCreationTemporaryFailed
+from rucio.common.utils import chunks
 from rucio.core.heartbeat import live, die, sanity_check
-from rucio.core.rule import re_evaluate_did, get_updated_dids, delete_updated_did, delete_duplicate_updated_dids
-from rucio.core.monitor import record_counter
+from rucio.core.rule import re_evaluate_dids, get_updated_dids
+from rucio.core.monitor import record_counter, record_gauge
 
 graceful_stop = threading.Event()
 
@@ -41,9 +42,73 @@ logging.basicConfig(stream=sys.stdout,
                     format='%(asctime)s\t%(process)d\t%(levelname)s\t%(message)s')
 
 
-def re_evaluator(once=False):
+def collapse_updated_dids(updated_dids):
+    """
+    Collapses the updated_dids rows into one evaluation per scope, name and rule evaluation action,
+    in the order of their first row.
+
+    :param updated_dids:  List of updated_dids rows.
+    :returns:             List of dictionaries {'scope':, 'name':, 'rule_evaluation_action':, 'ids': [ids of the rows]}.
+    """
+    dids, collapsed = [], {}
+    for updated_did in updated_dids:
+        key = (updated_did.scope, updated_did.name, updated_did.rule_evaluation_action)
+        if key not in collapsed:
+            collapsed[key] = {'scope': updated_did.scope,
+                              'name': updated_did.name,
+                              'rule_evaluation_action': updated_did.rule_evaluation_action,
+                              'ids': []}
+            dids.append(collapsed[key])
+        collapsed[key]['ids'].append(updated_did.id)
+    return dids
+
+
+def __re_evaluate_did(did, paused_dids, heartbeat, quota_snapshots):
+    """
+    Re-evaluates a single did, pausing it if its rules or locks are locked by another transaction.
+
+    :param did:              Dictionary {'scope':, 'name':, 'rule_evaluation_action':, 'ids':}.
+    :param paused_dids:      Dictionary {(scope, name): datetime} of the paused dids.
+    :param heartbeat:        The heartbeat of the thread.
+    :param quota_snapshots:  Dictionary {account: quota snapshot} of the cycle.
+    """
+    try:
+        start_time = time.time()
+        re_evaluate_dids(dids=[did], quota_snapshots=quota_snapshots)
+        logging.debug('re_evaluator[%s/%s]: evaluation of %s:%s took %f' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, did['scope'], did['name'], time.time() - start_time))
+    except (DatabaseException, DatabaseError), e:
+        if match('.*ORA-00054.*', str(e.args[0])):
+            paused_dids[(did['scope'], did['name'])] = datetime.utcnow() + timedelta(seconds=randint(60, 600))
+            logging.warning('re_evaluator[%s/%s]: Locks detected for %s:%s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, did['scope'], did['name']))
+            record_counter('rule.judge.exceptions.LocksDetected')
+        elif match('.*QueuePool.*', str(e.args[0])):
+            logging.warning(traceback.format_exc())
+            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
+        elif match('.*ORA-03135.*', str(e.args[0])):
+            logging.warning(traceback.format_exc())
+            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
+        else:
+            logging.error(traceback.format_exc())
+            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
+    except ReplicationRuleCreationTemporaryFailed, e:
+        record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
+        logging.warning('re_evaluator[%s/%s]: Replica Creation temporary failed, retrying later for %s:%s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, did['scope'], did['name']))
+    except FlushError, e:
+        record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
+        logging.warning('re_evaluator[%s/%s]: Flush error for %s:%s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, did['scope'], did['name']))
+
+
+def re_evaluator(once=False, bulk=1000, group_size=10):
     """
     Main loop to check the re-evaluation of dids.
+
+    The fetched updated_dids are collapsed into one evaluation per did and action, and the
+    evaluations are committed in groups of group_size dids. If a group fails, its dids are
+    evaluated one by one.
+
+    :param once:        Run only once.
+    :param bulk:        Number of updated_dids rows fetched per cycle.
+    :param group_size:  Number of dids evaluated per transaction.
     """
 
     hostname = socket.gethostname()
@@ -67,61 +132,41 @@ def re_evaluator(once=False):
             paused_dids = dict((k, v) for k, v in paused_dids.iteritems() if datetime.utcnow() < v)
 
             # Select a bunch of dids for re evaluation for this worker
-            dids = get_updated_dids(total_workers=heartbeat['nr_threads'] - 1,
-                                    worker_number=heartbeat['assign_thread'],
-                                    limit=100,
-                                    blacklisted_dids=[key for key in paused_dids])
-            logging.debug('re_evaluator[%s/%s] index query time %f fetch size is %d' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, time.time() - start, len(dids)))
+            updated_dids = get_updated_dids(total_workers=heartbeat['nr_threads'] - 1,
+                                            worker_number=heartbeat['assign_thread'],
+                                            limit=bulk,
+                                            blacklisted_dids=[key for key in paused_dids])
+            logging.debug('re_evaluator[%s/%s] index query time %f fetch size is %d' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, time.time() - start, len(updated_dids)))
 
             # If the list is empty, sent the worker to sleep
-            if not dids and not once:
+            if not updated_dids and not once:
                 logging.debug('re_evaluator[%s/%s] did not get any work (paused_dids=%s)' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, str(len(paused_dids))))
                 graceful_stop.wait(30)
             else:
-                done_dids = {}
-                for did in dids:
+                dids = collapse_updated_dids(updated_dids)
+                # The account quotas are loaded once per cycle and shared by all the evaluations
+                quota_snapshots = {}
+                record_gauge('rule.judge.evaluator.updated_dids', len(updated_dids))
+                record_gauge('rule.judge.evaluator.collapsed_dids', len(dids))
+
+                for group in chunks(dids, group_size):
                     if graceful_stop.is_set():
                         break
 
-                    # Try to delete all duplicate dids
-                    delete_duplicate_updated_dids(scope=did.scope, name=did.name, rule_evaluation_action=did.rule_evaluation_action, id=did.id)
-
-                    # Check if this did has already been operated on
-                    if '%s:%s' % (did.scope, did.name) in done_dids:
-                        if did.rule_evaluation_action in done_dids['%s:%s' % (did.scope, did.name)]:
-                            logging.debug('re_evaluator[%s/%s]: evaluation of %s:%s already done' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, did.scope, did.name))
+                    if len(group) > 1:
+                        try:
+                            start_time = time.time()
+                            re_evaluate_dids(dids=group, quota_snapshots=quota_snapshots)
+                            logging.debug('re_evaluator[%s/%s]: evaluation of %d dids took %f' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, len(group), time.time() - start_time))
                             continue
-                    else:
-                        done_dids['%s:%s' % (did.scope, did.name)] = []
-
-                    try:
-                        start_time = time.time()
-                        re_evaluate_did(scope=did.scope, name=did.name, rule_evaluation_action=did.rule_evaluation_action)
-                        logging.debug('re_evaluator[%s/%s]: evaluation of %s:%s took %f' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, did.scope, did.name, time.time() - start_time))
-                        delete_updated_did(id=did.id, scope=did.scope, name=did.name)
-                        done_dids['%s:%s' % (did.scope, did.name)].append(did.rule_evaluation_action)
-                    except DataIdentifierNotFound, e:
-                        delete_updated_did(id=did.id, scope=did.scope, name=did.name)
-                    except (DatabaseException, DatabaseError), e:
-                        if match('.*ORA-00054.*', str(e.args[0])):
-                            paused_dids[(did.scope, did.name)] = datetime.utcnow() + timedelta(seconds=randint(60, 600))
-                            logging.warning('re_evaluator[%s/%s]: Locks detected for %s:%s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, did.scope, did.name))
-                            record_counter('rule.judge.exceptions.LocksDetected')
-                        elif match('.*QueuePool.*', str(e.args[0])):
-                            logging.warning(traceback.format_exc())
-                            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-                        elif match('.*ORA-03135.*', str(e.args[0])):
-                            logging.warning(traceback.format_exc())
-                            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-                        else:
-                            logging.error(traceback.format_exc())
-                            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-                    except ReplicationRuleCreationTemporaryFailed, e:
-                        record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-                        logging.warning('re_evaluator[%s/%s]: Replica Creation temporary failed, retrying later for %s:%s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, did.scope, did.name))
-                    except FlushError, e:
-                        record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-                        logging.warning('re_evaluator[%s/%s]: Flush error for %s:%s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, did.scope, did.name))
+                        except Exception, e:
+                            record_counter('rule.judge.evaluator.group_failures')
+                            logging.debug('re_evaluator[%s/%s]: evaluation of %d dids failed (%s), evaluating them one by one' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, len(group), e.__class__.__name__))
+
+                    for did in group:
+                        if graceful_stop.is_set():
+                            break
+                        __re_evaluate_did(did=did, paused_dids=paused_dids, heartbeat=heartbeat, quota_snapshots=quota_snapshots)
         except (DatabaseException, DatabaseError), e:
             if match('.*QueuePool.*', str(e.args[0])):
                 logging.warning(traceback.format_exc())
@@ -150,7 +195,7 @@ def stop(signum=None, frame=None):
     graceful_stop.set()
 
 
-def run(once=False, threads=1):
+def run(once=False, threads=1, bulk=1000, group_size=10):
     """
     Starts up the Judge-Eval threads.
     """
@@ -159,10 +204,10 @@ def run(once=False, threads=1):
     sanity_check(executable='rucio-judge-evaluator', hostname=hostname)
 
     if once:
-        re_evaluator(once)
+        re_evaluator(once=once, bulk=bulk, group_size=group_size)
     else:
         logging.info('Evaluator starting %s threads' % str(threads))
-        threads = [threading.Thread(target=re_evaluator, kwargs={'once': once}) for i in xrange(0, threads)]
+        threads = [threading.Thread(target=re_evaluator, kwargs={'once': once, 'bulk': bulk, 'group_size': group_size}) for i in xrange(0, threads)]
         [t.start() for t in threads]
         # Interruptible joins require a timeout.
         while threads[0].is_alive():
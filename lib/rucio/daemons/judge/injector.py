@@ -29,7 +29,7 @@ from sqlalchemy.exc import DatabaseError
 from rucio.common.config import config_get
 from rucio.common.exception import DatabaseException, RuleNotFound, RSEBlacklisted, ReplicationRuleCreationTemporaryFailed
 from rucio.core.heartbeat import live, die, sanity_check
-from rucio.core.rule import inject_rule, get_injected_rules
+from rucio.core.rule import inject_rule, inject_rules, get_injected_rules
 from rucio.core.monitor import record_counter
 
 graceful_stop = threading.Event()
@@ -39,9 +39,79 @@ logging.basicConfig(stream=sys.stdout,
                     format='%(asctime)s\t%(process)d\t%(levelname)s\t%(message)s')
 
 
-def rule_injector(once=False):
+def group_injected_rules(rules, batch_size):
+    """
+    Split the rules to inject into batches, keeping the rules of a did in the same batch.
+
+    :param rules:       List of (rule_id, scope, name) tuples.
+    :param batch_size:  Number of rules per batch. The rules of a did are never split, so a batch can be larger.
+    :returns:           List of lists of rule ids.
+    """
+    dids = {}
+    for rule_id, scope, name in rules:
+        dids.setdefault((scope, name), []).append(rule_id)
+    batches, batch = [], []
+    for rule_ids in dids.values():
+        if batch and len(batch) + len(rule_ids) > batch_size:
+            batches.append(batch)
+            batch = []
+        batch.extend(rule_ids)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def __inject_rule(rule_id, paused_rules, heartbeat, quota_snapshots):
+    """
+    Injects a single rule, pausing it if it is locked by another transaction or cannot be injected for now.
+
+    :param rule_id:          The id of the rule.
+    :param paused_rules:     Dictionary {rule_id: datetime} of the paused rules.
+    :param heartbeat:        The heartbeat of the thread.
+    :param quota_snapshots:  Dictionary {account: quota snapshot} of the cycle.
+    """
+    logging.info('rule_injector[%s/%s]: Injecting rule %s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, rule_id))
+    try:
+        start = time.time()
+        inject_rule(rule_id=rule_id, quota_snapshots=quota_snapshots)
+        logging.debug('rule_injector[%s/%s]: injection of %s took %f' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, rule_id, time.time() - start))
+    except (DatabaseException, DatabaseError), e:
+        if match('.*ORA-00054.*', str(e.args[0])):
+            paused_rules[rule_id] = datetime.utcnow() + timedelta(seconds=randint(60, 600))
+            record_counter('rule.judge.exceptions.LocksDetected')
+            logging.warning('rule_injector[%s/%s]: Locks detected for %s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, rule_id))
+        elif match('.*QueuePool.*', str(e.args[0])):
+            logging.warning(traceback.format_exc())
+            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
+        elif match('.*ORA-03135.*', str(e.args[0])):
+            logging.warning(traceback.format_exc())
+            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
+        else:
+            logging.error(traceback.format_exc())
+            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
+    except RSEBlacklisted, e:
+        paused_rules[rule_id] = datetime.utcnow() + timedelta(seconds=randint(60, 600))
+        logging.warning('rule_injector[%s/%s]: RSEBlacklisted for rule %s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, rule_id))
+        record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
+    except ReplicationRuleCreationTemporaryFailed, e:
+        paused_rules[rule_id] = datetime.utcnow() + timedelta(seconds=randint(60, 600))
+        logging.warning('rule_injector[%s/%s]: ReplicationRuleCreationTemporaryFailed for rule %s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, rule_id))
+        record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
+    except RuleNotFound, e:
+        pass
+
+
+def rule_injector(once=False, bulk=100, batch_size=50):
     """
     Main loop to check for asynchronous creation of replication rules
+
+    The fetched rules are injected in batches of batch_size rules, in which the rules of a did
+    share the resolution of the did and the insertion of their locks and transfers. If a batch
+    fails, its rules are injected one by one.
+
+    :param once:        Run only once.
+    :param bulk:        Number of rules fetched per cycle.
+    :param batch_size:  Number of rules injected per transaction.
     """
 
     hostname = socket.gethostname()
@@ -69,7 +139,7 @@ def rule_injector(once=False):
 
             rules = get_injected_rules(total_workers=heartbeat['nr_threads'] - 1,
                                        worker_number=heartbeat['assign_thread'],
-                                       limit=100,
+                                       limit=bulk,
                                        blacklisted_rules=[key for key in paused_rules])
             logging.debug('rule_injector[%s/%s] index query time %f fetch size is %d' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, time.time() - start, len(rules)))
 
@@ -77,39 +147,26 @@ def rule_injector(once=False):
                 logging.debug('rule_injector[%s/%s] did not get any work (paused_rules=%s)' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, str(len(paused_rules))))
                 graceful_stop.wait(60)
             else:
-                for rule in rules:
-                    rule_id = rule[0]
-                    logging.info('rule_injector[%s/%s]: Injecting rule %s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, rule_id))
+                # The account quotas are loaded once per cycle and shared by all the injections
+                quota_snapshots = {}
+                for batch in group_injected_rules(rules, batch_size):
                     if graceful_stop.is_set():
                         break
-                    try:
-                        start = time.time()
-                        inject_rule(rule_id=rule_id)
-                        logging.debug('rule_injector[%s/%s]: injection of %s took %f' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, rule_id, time.time() - start))
-                    except (DatabaseException, DatabaseError), e:
-                        if match('.*ORA-00054.*', str(e.args[0])):
-                            paused_rules[rule_id] = datetime.utcnow() + timedelta(seconds=randint(60, 600))
-                            record_counter('rule.judge.exceptions.LocksDetected')
-                            logging.warning('rule_injector[%s/%s]: Locks detected for %s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, rule_id))
-                        elif match('.*QueuePool.*', str(e.args[0])):
-                            logging.warning(traceback.format_exc())
-                            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-                        elif match('.*ORA-03135.*', str(e.args[0])):
-                            logging.warning(traceback.format_exc())
-                            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-                        else:
-                            logging.error(traceback.format_exc())
-                            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-                    except RSEBlacklisted, e:
-                        paused_rules[rule_id] = datetime.utcnow() + timedelta(seconds=randint(60, 600))
-                        logging.warning('rule_injector[%s/%s]: RSEBlacklisted for rule %s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, rule_id))
-                        record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-                    except ReplicationRuleCreationTemporaryFailed, e:
-                        paused_rules[rule_id] = datetime.utcnow() + timedelta(seconds=randint(60, 600))
-                        logging.warning('rule_injector[%s/%s]: ReplicationRuleCreationTemporaryFailed for rule %s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, rule_id))
-                        record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-                    except RuleNotFound, e:
-                        pass
+
+                    if len(batch) > 1:
+                        try:
+                            start = time.time()
+                            inject_rules(rule_ids=batch, quota_snapshots=quota_snapshots)
+                            logging.debug('rule_injector[%s/%s]: injection of %d rules took %f' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, len(batch), time.time() - start))
+                            continue
+                        except Exception, e:
+                            record_counter('rule.judge.injector.batch_failures')
+                            logging.debug('rule_injector[%s/%s]: injection of %d rules failed (%s), injecting them one by one' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, len(batch), e.__class__.__name__))
+
+                    for rule_id in batch:
+                        if graceful_stop.is_set():
+                            break
+                        __inject_rule(rule_id=rule_id, paused_rules=paused_rules, heartbeat=heartbeat, quota_snapshots=quota_snapshots)
         except (DatabaseException, DatabaseError), e:
             if match('.*QueuePool.*', str(e.args[0])):
                 logging.warning(traceback.format_exc())
@@ -137,19 +194,24 @@ def stop(signum=None, frame=None):
     graceful_stop.set()
 
 
-def run(once=False, threads=1):
+def run(once=False, threads=1, bulk=100, batch_size=50):
     """
     Starts up the Judge-Injector threads.
+
+    :param once:        Run only once.
+    :param threads:     Number of threads.
+    :param bulk:        Number of rules fetched per cycle.
+    :param batch_size:  Number of rules injected per transaction.
     """
 
     hostname = socket.gethostname()
     sanity_check(executable='rucio-judge-injector', hostname=hostname)
 
     if once:
-        rule_injector(once)
+        rule_injector(once=once, bulk=bulk, batch_size=batch_size)
     else:
         logging.info('Injector starting %s threads' % str(threads))
-        threads = [threading.Thread(target=rule_injector, kwargs={'once': once}) for i in xrange(0, threads)]
+        threads = [threading.Thread(target=rule_injector, kwargs={'once': once, 'bulk': bulk, 'batch_size': batch_size}) for i in xrange(0, threads)]
         [t.start() for t in threads]
         # Interruptible joins require a timeout.
         while threads[0].is_alive():
@@ -20,6 +20,7 @@ import hashlib
 import logging
 import math
 import os
+import Queue
 import random
 import socket
 import sys
@@ -52,6 +53,271 @@ logging.basicConfig(stream=sys.stdout,
 
 GRACEFUL_STOP = threading.Event()
 
+RSE_SEMAPHORES = {}
+RSE_SEMAPHORES_LOCK = threading.Lock()
+
+
+def __get_endpoint_semaphore(rse, scheme, max_inflight):
+    """
+    Internal method to get the semaphore bounding the number of concurrent
+    deletion calls against one storage endpoint. The semaphore is shared by all
+    the reaper threads of the process.
+
+    :param rse: the rse name.
+    :param scheme: the protocol scheme used for deletion.
+    :param max_inflight: maximum number of deletion calls in flight for this endpoint.
+
+    :returns: a threading.BoundedSemaphore.
+    """
+    key = '%s:%s' % (rse, scheme)
+    with RSE_SEMAPHORES_LOCK:
+        if key not in RSE_SEMAPHORES:
+            RSE_SEMAPHORES[key] = threading.BoundedSemaphore(max_inflight)
+        return RSE_SEMAPHORES[key]
+
+
+def __resolve_pfns(files, rse, rse_info, scheme, prefix):
+    """
+    Internal method to resolve the pfns of a chunk of replicas.
+    The pfns are resolved in bulk and replicas failing the resolution
+    are retried one by one.
+
+    :param files: list of replicas, updated in place with the 'pfn' key.
+    :param rse: the rse dictionary.
+    :param rse_info: the rse settings.
+    :param scheme: the protocol scheme used for deletion.
+    :param prefix: the logging prefix.
+    """
+    try:
+        pfns = rsemgr.lfns2pfns(rse_settings=rse_info,
+                                lfns=[{'scope': replica['scope'], 'name': replica['name'], 'path': replica['path']} for replica in files],
+                                operation='delete', scheme=scheme)
+        for replica in files:
+            replica['pfn'] = str(pfns['%s:%s' % (replica['scope'], replica['name'])])
+    except (ReplicaUnAvailable, ReplicaNotFound):
+        for replica in files:
+            try:
+                replica['pfn'] = str(rsemgr.lfns2pfns(rse_settings=rse_info,
+                                                      lfns=[{'scope': replica['scope'], 'name': replica['name'], 'path': replica['path']}],
+                                                      operation='delete', scheme=scheme).values()[0])
+            except (ReplicaUnAvailable, ReplicaNotFound) as error:
+                err_msg = 'Failed to get pfn UNAVAILABLE replica %s:%s on %s with error %s' % (replica['scope'], replica['name'], rse['rse'], str(error))
+                logging.warning('%s %s', prefix, err_msg)
+                replica['pfn'] = None
+
+
+def __delete_replica(prot, replica, rse, rse_info, prefix):
+    """
+    Internal method to physically delete one replica.
+
+    :param prot: the connected protocol.
+    :param replica: the replica dictionary.
+    :param rse: the rse dictionary.
+    :param rse_info: the rse settings.
+    :param prefix: the logging prefix.
+
+    :returns: True if the replica can be removed from the catalog, False otherwise.
+    """
+    try:
+        logging.info('%s Deletion ATTEMPT of %s:%s as %s on %s', prefix, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
+        start = time.time()
+        if rse['staging_area'] or rse['rse'].endswith("STAGING"):
+            logging.warning('%s Deletion STAGING of %s:%s as %s on %s, will only delete the catalog and not do physical deletion',
+                            prefix, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
+        else:
+            if replica['pfn']:
+                prot.delete(replica['pfn'])
+            else:
+                logging.warning('%s Deletion UNAVAILABLE of %s:%s as %s on %s', prefix, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
+        monitor.record_timer('daemons.reaper.delete.%s.%s' % (prot.attributes['scheme'], rse['rse']), (time.time() - start) * 1000)
+        duration = time.time() - start
+        __deletion_done(replica, rse, rse_info, duration, prefix)
+        return True
+    except SourceNotFound:
+        err_msg = '%s Deletion NOTFOUND of %s:%s as %s on %s' % (prefix, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
+        logging.warning(err_msg)
+        if replica['state'] == ReplicaState.AVAILABLE:
+            __deletion_failed(replica, rse_info, err_msg)
+        return True
+    except (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable) as error:
+        logging.warning('%s Deletion NOACCESS of %s:%s as %s on %s: %s', prefix, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(error))
+        __deletion_failed(replica, rse_info, error)
+    except Exception as error:
+        logging.critical('%s Deletion CRITICAL of %s:%s as %s on %s: %s', prefix, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(traceback.format_exc()))
+        __deletion_failed(replica, rse_info, error)
+    except:
+        logging.critical('%s Deletion CRITICAL of %s:%s as %s on %s: %s', prefix, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(traceback.format_exc()))
+    return False
+
+
+def __deletion_done(replica, rse, rse_info, duration, prefix):
+    """
+    Internal method to report a successful deletion.
+    """
+    add_message('deletion-done', {'scope': replica['scope'],
+                                  'name': replica['name'],
+                                  'rse': rse_info['rse'],
+                                  'file-size': replica['bytes'],
+                                  'bytes': replica['bytes'],
+                                  'url': replica['pfn'],
+                                  'duration': duration})
+    logging.info('%s Deletion SUCCESS of %s:%s as %s on %s in %s seconds', prefix, replica['scope'], replica['name'], replica['pfn'], rse['rse'], duration)
+
+
+def __deletion_failed(replica, rse_info, reason):
+    """
+    Internal method to report a failed deletion.
+    """
+    add_message('deletion-failed', {'scope': replica['scope'],
+                                    'name': replica['name'],
+                                    'rse': rse_info['rse'],
+                                    'file-size': replica['bytes'],
+                                    'bytes': replica['bytes'],
+                                    'url': replica['pfn'],
+                                    'reason': str(reason)})
+
+
+def __delete_bulk(prot, replicas, rse, rse_info, prefix):
+    """
+    Internal method to physically delete a list of replicas with one protocol call.
+    If the bulk call fails, the replicas are deleted one by one so that
+    every failure is reported against the right replica. If the storage
+    cannot be accessed, the replicas not yet deleted are handed back.
+
+    :param prot: the connected protocol.
+    :param replicas: list of replica dictionaries.
+    :param rse: the rse dictionary.
+    :param rse_info: the rse settings.
+    :param prefix: the logging prefix.
+
+    :returns: a tuple with the list of replicas which can be removed from the catalog and the list of replicas left to delete.
+    """
+    pfns = [replica['pfn'] for replica in replicas if replica['pfn']]
+    if len(pfns) < 2 or not prot.bulk_delete or rse['staging_area'] or rse['rse'].endswith("STAGING"):
+        return [replica for replica in replicas if __delete_replica(prot, replica, rse, rse_info, prefix)], []
+
+    logging.info('%s Deletion ATTEMPT of %s files in bulk on %s', prefix, len(pfns), rse['rse'])
+    start = time.time()
+    try:
+        prot.delete(pfns)
+    except (RSEAccessDenied, ResourceTemporaryUnavailable) as error:
+        logging.warning('%s Bulk deletion NOACCESS of %s files on %s: %s', prefix, len(pfns), rse['rse'], str(error))
+        return [], replicas
+    except Exception as error:
+        logging.warning('%s Bulk deletion of %s files on %s failed, retrying one by one: %s', prefix, len(pfns), rse['rse'], str(error))
+        return __delete_after_bulk_failure(prot, replicas, rse, rse_info, prefix)
+    monitor.record_timer('daemons.reaper.delete.%s.%s' % (prot.attributes['scheme'], rse['rse']), (time.time() - start) * 1000 / len(pfns))
+    duration = (time.time() - start) / len(pfns)
+
+    deleted = []
+    for replica in replicas:
+        if replica['pfn']:
+            __deletion_done(replica, rse, rse_info, duration, prefix)
+            deleted.append(replica)
+        elif __delete_replica(prot, replica, rse, rse_info, prefix):
+            deleted.append(replica)
+    return deleted, []
+
+
+def __delete_after_bulk_failure(prot, replicas, rse, rse_info, prefix):
+    """
+    Internal method to delete one by one the replicas of a failed bulk call.
+    The bulk call may have removed some of the files before failing,
+    so a file which cannot be found any more is reported as deleted.
+
+    :param prot: the connected protocol.
+    :param replicas: list of replica dictionaries.
+    :param rse: the rse dictionary.
+    :param rse_info: the rse settings.
+    :param prefix: the logging prefix.
+
+    :returns: a tuple with the list of replicas which can be removed from the catalog and the list of replicas left to delete.
+    """
+    deleted = []
+    for index, replica in enumerate(replicas):
+        if not replica['pfn']:
+            if __delete_replica(prot, replica, rse, rse_info, prefix):
+                deleted.append(replica)
+            continue
+
+        logging.info('%s Deletion ATTEMPT of %s:%s as %s on %s', prefix, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
+        start = time.time()
+        try:
+            prot.delete(replica['pfn'])
+        except SourceNotFound:
+            logging.info('%s Deletion NOTFOUND of %s:%s as %s on %s after bulk deletion', prefix, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
+        except (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable) as error:
+            logging.warning('%s Deletion NOACCESS of %s:%s as %s on %s: %s', prefix, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(error))
+            return deleted, replicas[index:]
+        except Exception as error:
+            logging.warning('%s Deletion FAILED of %s:%s as %s on %s: %s', prefix, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(error))
+            __deletion_failed(replica, rse_info, error)
+            continue
+        monitor.record_timer('daemons.reaper.delete.%s.%s' % (prot.attributes['scheme'], rse['rse']), (time.time() - start) * 1000)
+        __deletion_done(replica, rse, rse_info, time.time() - start, prefix)
+        deleted.append(replica)
+    return deleted, []
+
+
+def __deletion_worker(batches, deleted_files, rse, rse_info, scheme, max_inflight, prefix):
+    """
+    Internal method consuming batches of replicas to delete.
+    Each worker uses its own protocol instance.
+
+    :param batches: Queue of lists of replicas.
+    :param deleted_files: list updated with the replicas which can be removed from the catalog.
+    :param rse: the rse dictionary.
+    :param rse_info: the rse settings.
+    :param scheme: the protocol scheme used for deletion.
+    :param max_inflight: maximum number of deletion calls in flight for this endpoint.
+    :param prefix: the logging prefix.
+    """
+    prot = rsemgr.create_protocol(rse_info, 'delete', scheme=scheme)
+    semaphore = __get_endpoint_semaphore(rse['rse'], prot.attributes['scheme'], max_inflight)
+    try:
+        prot.connect()
+    except (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable) as error:
+        # The batches are left to the other workers
+        logging.warning('%s Connection to %s failed: %s', prefix, rse['rse'], str(error))
+        return
+
+    try:
+        while not GRACEFUL_STOP.is_set():
+            try:
+                replicas = batches.get_nowait()
+            except Queue.Empty:
+                break
+            with semaphore:
+                deleted, remaining = __delete_bulk(prot, replicas, rse, rse_info, prefix)
+            for replica in deleted:
+                deleted_files.append({'scope': replica['scope'], 'name': replica['name']})
+            if remaining:
+                # The connection is lost, the rest of the batch is left to the other workers
+                batches.put(remaining)
+                break
+    finally:
+        prot.close()
+
+
+def __delete_from_catalog(rse, deleted_files, prefix):
+    """
+    Internal method to remove the deleted replicas from the catalog.
+
+    :param rse: the rse dictionary.
+    :param deleted_files: list of dictionaries with scope and name.
+    :param prefix: the logging prefix.
+    """
+    try:
+        start = time.time()
+        with monitor.record_timer_block('reaper.delete_replicas'):
+            delete_replicas(rse=rse['rse'], files=deleted_files)
+        logging.debug('%s delete_replicas successes %s %s %s', prefix, rse['rse'], len(deleted_files), time.time() - start)
+        monitor.record_counter(counters='reaper.deletion.done', delta=len(deleted_files))
+    except DatabaseException as error:
+        logging.warning('%s DatabaseException %s', prefix, str(error))
+    except:
+        logging.critical(traceback.format_exc())
+
 
 def __check_rse_usage(rse, rse_id):
     """
@@ -88,7 +354,8 @@ def __check_rse_usage(rse, rse_id):
     return max_being_deleted_files, needed_free_space, used, free
 
 
-def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=100, once=False, greedy=False, scheme=None, delay_seconds=0):
+def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=100, once=False, greedy=False, scheme=None, delay_seconds=0,
+           deletion_threads=5, bulk_size=50, max_inflight=20):
     """
     Main loop to select and delete files.
 
@@ -101,6 +368,9 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
     :param greedy: If True, delete right away replicas with tombstone.
     :param scheme: Force the reaper to use a particular protocol, e.g., mock.
     :param exclude_rses: RSE expression to exclude RSEs from the Reaper.
+    :param deletion_threads: The number of threads deleting a chunk in parallel.
+    :param bulk_size: The maximum number of files deleted in one protocol call when the protocol supports bulk deletion.
+    :param max_inflight: The maximum number of concurrent deletion calls per storage endpoint in the process.
     """
     logging.info('Starting Reaper: Worker %(worker_number)s, child %(child_number)s will work on RSEs: ' % locals() + ', '.join([rse['rse'] for rse in rses]))
 
@@ -129,7 +399,7 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
                         checkpoint_time = datetime.datetime.now()
 
                     rse_info = rsemgr.get_rse_info(rse['rse'])
-                    rse_protocol = rse_core.get_rse_protocols(rse['rse'])
+                    rse_protocol = rse_core.get_cached_rse_protocols(rse['rse'])
 
                     if not rse_protocol['availability_delete']:
                         logging.info('Reaper %s-%s: RSE %s is not available for deletion', worker_number, child_number, rse_info['rse'])
@@ -172,21 +442,14 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
                         continue
                     nothing_to_do = False
 
-                    prot = rsemgr.create_protocol(rse_info, 'delete', scheme=scheme)
+                    prefix = 'Reaper %s-%s:' % (worker_number, child_number)
+                    nb_deleted, start_rse, catalog_thread = 0, time.time(), None
                     for files in chunks(replicas, chunk_size):
                         logging.debug('Reaper %s-%s: Running on : %s', worker_number, child_number, str(files))
                         try:
                             update_replicas_states(replicas=[dict(replica.items() + [('state', ReplicaState.BEING_DELETED), ('rse_id', rse['id'])]) for replica in files], nowait=True)
+                            __resolve_pfns(files=files, rse=rse, rse_info=rse_info, scheme=scheme, prefix=prefix)
                             for replica in files:
-                                try:
-                                    replica['pfn'] = str(rsemgr.lfns2pfns(rse_settings=rse_info,
-                                                                          lfns=[{'scope': replica['scope'], 'name': replica['name'], 'path': replica['path']}],
-                                                                          operation='delete', scheme=scheme).values()[0])
-                                except (ReplicaUnAvailable, ReplicaNotFound) as error:
-                                    err_msg = 'Failed to get pfn UNAVAILABLE replica %s:%s on %s with error %s' % (replica['scope'], replica['name'], rse['rse'], str(error))
-                                    logging.warning('Reaper %s-%s: %s', worker_number, child_number, err_msg)
-                                    replica['pfn'] = None
-
                                 add_message('deletion-planned', {'scope': replica['scope'],
                                                                  'name': replica['name'],
                                                                  'file-size': replica['bytes'],
@@ -196,83 +459,30 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
 
                             monitor.record_counter(counters='reaper.deletion.being_deleted', delta=len(files))
 
-                            try:
-                                deleted_files = []
-                                prot.connect()
-                                for replica in files:
-                                    try:
-                                        logging.info('Reaper %s-%s: Deletion ATTEMPT of %s:%s as %s on %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
-                                        start = time.time()
-                                        if rse['staging_area'] or rse['rse'].endswith("STAGING"):
-                                            logging.warning('Reaper %s-%s: Deletion STAGING of %s:%s as %s on %s, will only delete the catalog and not do physical deletion',
-                                                            worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
-                                        else:
-                                            if replica['pfn']:
-                                                prot.delete(replica['pfn'])
-                                            else:
-                                                logging.warning('Reaper %s-%s: Deletion UNAVAILABLE of %s:%s as %s on %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
-                                        monitor.record_timer('daemons.reaper.delete.%s.%s' % (prot.attributes['scheme'], rse['rse']), (time.time() - start) * 1000)
-                                        duration = time.time() - start
-
-                                        deleted_files.append({'scope': replica['scope'], 'name': replica['name']})
-
-                                        add_message('deletion-done', {'scope': replica['scope'],
-                                                                      'name': replica['name'],
-                                                                      'rse': rse_info['rse'],
-                                                                      'file-size': replica['bytes'],
-                                                                      'bytes': replica['bytes'],
-                                                                      'url': replica['pfn'],
-                                                                      'duration': duration})
-                                        logging.info('Reaper %s-%s: Deletion SUCCESS of %s:%s as %s on %s in %s seconds', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], duration)
-                                    except SourceNotFound:
-                                        err_msg = 'Reaper %s-%s: Deletion NOTFOUND of %s:%s as %s on %s' % (worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
-                                        logging.warning(err_msg)
-                                        deleted_files.append({'scope': replica['scope'], 'name': replica['name']})
-                                        if replica['state'] == ReplicaState.AVAILABLE:
-                                            add_message('deletion-failed', {'scope': replica['scope'],
-                                                                            'name': replica['name'],
-                                                                            'rse': rse_info['rse'],
-                                                                            'file-size': replica['bytes'],
-                                                                            'bytes': replica['bytes'],
-                                                                            'url': replica['pfn'],
-                                                                            'reason': str(err_msg)})
-                                    except (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable) as error:
-                                        logging.warning('Reaper %s-%s: Deletion NOACCESS of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(error))
-                                        add_message('deletion-failed', {'scope': replica['scope'],
-                                                                        'name': replica['name'],
-                                                                        'rse': rse_info['rse'],
-                                                                        'file-size': replica['bytes'],
-                                                                        'bytes': replica['bytes'],
-                                                                        'url': replica['pfn'],
-                                                                        'reason': str(error)})
-                                    except Exception as error:
-                                        logging.critical('Reaper %s-%s: Deletion CRITICAL of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(traceback.format_exc()))
-                                        add_message('deletion-failed', {'scope': replica['scope'],
-                                                                        'name': replica['name'],
-                                                                        'rse': rse_info['rse'],
-                                                                        'file-size': replica['bytes'],
-                                                                        'bytes': replica['bytes'],
-                                                                        'url': replica['pfn'],
-                                                                        'reason': str(error)})
-                                    except:
-                                        logging.critical('Reaper %s-%s: Deletion CRITICAL of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(traceback.format_exc()))
-                            except (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable) as error:
-                                for replica in files:
-                                    logging.warning('Reaper %s-%s: Deletion NOACCESS of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(error))
-                                    add_message('deletion-failed', {'scope': replica['scope'],
-                                                                    'name': replica['name'],
-                                                                    'rse': rse_info['rse'],
-                                                                    'file-size': replica['bytes'],
-                                                                    'bytes': replica['bytes'],
-                                                                    'url': replica['pfn'],
-                                                                    'reason': str(error)})
-                            finally:
-                                prot.close()
-                            start = time.time()
-                            with monitor.record_timer_block('reaper.delete_replicas'):
-                                delete_replicas(rse=rse['rse'], files=deleted_files)
-                            logging.debug('Reaper %s-%s: delete_replicas successes %s %s %s', worker_number, child_number, rse['rse'], len(deleted_files), time.time() - start)
-                            monitor.record_counter(counters='reaper.deletion.done', delta=len(deleted_files))
+                            # Physical deletion: the chunk is split in batches consumed by a bounded pool of workers
+                            batches = Queue.Queue()
+                            for batch in chunks(files, min(bulk_size, int(math.ceil(len(files) / float(deletion_threads))))):
+                                batches.put(batch)
+                            deleted_files = []
+                            workers = [threading.Thread(target=__deletion_worker,
+                                                        kwargs={'batches': batches, 'deleted_files': deleted_files, 'rse': rse, 'rse_info': rse_info,
+                                                                'scheme': scheme, 'max_inflight': max_inflight, 'prefix': prefix})
+                                       for _ in xrange(min(deletion_threads, batches.qsize()))]
+                            [worker.start() for worker in workers]
+                            [worker.join() for worker in workers]
+
+                            # Batches left over when none of the workers could access the storage
+                            while not GRACEFUL_STOP.is_set() and not batches.empty():
+                                for replica in batches.get_nowait():
+                                    logging.warning('%s Deletion NOACCESS of %s:%s as %s on %s', prefix, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
+                                    __deletion_failed(replica, rse_info, 'Storage not accessible')
+
+                            # The catalog update of this chunk overlaps with the deletion of the next one
+                            if catalog_thread:
+                                catalog_thread.join()
+                            catalog_thread = threading.Thread(target=__delete_from_catalog, kwargs={'rse': rse, 'deleted_files': deleted_files, 'prefix': prefix})
+                            catalog_thread.start()
+                            nb_deleted += len(deleted_files)
 
                         except DatabaseException as error:
                             logging.warning('Reaper %s-%s: DatabaseException %s', worker_number, child_number, str(error))
@@ -281,6 +491,12 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
                         except:
                             logging.critical(traceback.format_exc())
 
+                    if catalog_thread:
+                        catalog_thread.join()
+                    deletion_rate = nb_deleted / (time.time() - start_rse)
+                    monitor.record_gauge(stat='reaper.deletion_rate.%s' % rse['rse'], value=deletion_rate)
+                    logging.info('Reaper %s-%s: %s replicas deleted on %s at %.2f deletions per second', worker_number, child_number, nb_deleted, rse['rse'], deletion_rate)
+
                 except RSENotFound as error:
                     logging.warning('Reaper %s-%s: RSE not found %s', worker_number, child_number, str(error))
 
@@ -312,7 +528,8 @@ def stop(signum=None, frame=None):
     GRACEFUL_STOP.set()
 
 
-def run(total_workers=1, chunk_size=100, threads_per_worker=None, once=False, greedy=False, rses=[], scheme=None, exclude_rses=None, include_rses=None, delay_seconds=0):
+def run(total_workers=1, chunk_size=100, threads_per_worker=None, once=False, greedy=False, rses=[], scheme=None, exclude_rses=None, include_rses=None, delay_seconds=0,
+        deletion_threads=5, bulk_size=50, max_inflight=20):
     """
     Starts up the reaper threads.
 
@@ -325,6 +542,9 @@ def run(total_workers=1, chunk_size=100, threads_per_worker=None, once=False, gr
     :param scheme: Force the reaper to use a particular protocol/scheme, e.g., mock.
     :param exclude_rses: RSE expression to exclude RSEs from the Reaper.
     :param include_rses: RSE expression to include RSEs.
+    :param deletion_threads: The number of threads deleting a chunk in parallel.
+    :param bulk_size: The maximum number of files deleted in one protocol call when the protocol supports bulk deletion.
+    :param max_inflight: The maximum number of concurrent deletion calls per storage endpoint in the process.
     """
     logging.info('main: starting processes')
 
@@ -361,6 +581,9 @@ def run(total_workers=1, chunk_size=100, threads_per_worker=None, once=False, gr
                       'greedy': greedy,
                       'rses': rses_list,
                       'delay_seconds': delay_seconds,
+                      'deletion_threads': deletion_threads,
+                      'bulk_size': bulk_size,
+                      'max_inflight': max_inflight,
                       'scheme': scheme}
             threads.append(threading.Thread(target=reaper, kwargs=kwargs, name='Worker: %s, child: %s' % (worker, child + 1)))
     [t.start() for t in threads]
@@ -27,6 +27,7 @@ from traceback import format_exc
 from Queue import Queue
 
 from json import loads as jloads, dumps as jdumps
+from repoze.lru import ExpiringLRUCache
 from stomp import Connection
 
 from rucio.common.config import config_get, config_get_bool, config_get_int
@@ -34,7 +35,7 @@ from rucio.core.monitor import record_counter, record_timer
 from rucio.core.did import touch_dids, list_parent_dids
 from rucio.core.heartbeat import live, die, sanity_check
 from rucio.core.lock import touch_dataset_locks
-from rucio.core.replica import touch_replica, touch_collection_replicas
+from rucio.core.replica import touch_replica, touch_replicas, touch_collection_replicas
 from rucio.db.sqla.constants import DIDType
 
 logging.getLogger("stomp").setLevel(logging.CRITICAL)
@@ -45,6 +46,9 @@ logging.basicConfig(stream=stdout,
 
 graceful_stop = Event()
 
+# parent datasets of the files seen in the traces, shared by all consumers
+PARENT_DIDS_CACHE = ExpiringLRUCache(100000, default_timeout=3600)
+
 
 class AMQConsumer(object):
     def __init__(self, broker, conn, queue, chunksize, subscription_id, excluded_usrdns, dataset_queue):
@@ -171,27 +175,35 @@ class AMQConsumer(object):
                 record_counter('daemons.tracer.kronos.report_error')
                 continue
 
-            for did in list_parent_dids(report['scope'], report['filename']):
-                if did['type'] != DIDType.DATASET:
-                    continue
-                # do not update _dis datasets
-                if did['scope'] == 'panda' and '_dis' in did['name']:
-                    continue
+            for did in self.__get_parent_datasets(report['scope'], report['filename']):
                 for rse in rses:
                     self.__dataset_queue.put({'scope': did['scope'], 'name': did['name'], 'did_type': did['type'], 'rse': rse, 'accessed_at': datetime.utcfromtimestamp(report['traceTimeentryUnix'])})
 
         logging.debug(replicas)
 
+        # merge duplicated replicas, keeping the latest access time, and group them per rse
+        replicas_per_rse = {}
+        for replica in replicas:
+            key = (replica['scope'], replica['name'])
+            rse_replicas = replicas_per_rse.setdefault(replica['rse'], {})
+            if key not in rse_replicas or rse_replicas[key]['accessed_at'] < replica['accessed_at']:
+                rse_replicas[key] = replica
+
         try:
             ts = time()
-            for replica in replicas:
-                # if touch replica hits a locked row put the trace back into queue for later retry
-                if not touch_replica(replica):
-                    resubmit = {'filename': replica['name'], 'scope': replica['scope'], 'remoteSite': replica['rse'], 'traceTimeentryUnix': replica['traceTimeentryUnix'],
-                                'eventType': 'get', 'usrdn': 'someuser', 'clientState': 'DONE', 'eventVersion': replica['eventVersion']}
-                    self.__conn.send(body=jdumps(resubmit), destination=self.__queue, headers={'appversion': 'rucio', 'resubmitted': '1'})
-                    record_counter('daemons.tracer.kronos.sent_resubmitted')
-                    logging.warning('(kronos_file) hit locked row, resubmitted to queue')
+            for rse, rse_replicas in replicas_per_rse.items():
+                if touch_replicas(rse_replicas.values()):
+                    continue
+                # the bulk update hit a locked row, fall back on single updates for this rse
+                record_counter('daemons.tracer.kronos.bulk_update_locked')
+                for replica in rse_replicas.values():
+                    # if touch replica hits a locked row put the trace back into queue for later retry
+                    if not touch_replica(replica):
+                        resubmit = {'filename': replica['name'], 'scope': replica['scope'], 'remoteSite': replica['rse'], 'traceTimeentryUnix': replica['traceTimeentryUnix'],
+                                    'eventType': 'get', 'usrdn': 'someuser', 'clientState': 'DONE', 'eventVersion': replica['eventVersion']}
+                        self.__conn.send(body=jdumps(resubmit), destination=self.__queue, headers={'appversion': 'rucio', 'resubmitted': '1'})
+                        record_counter('daemons.tracer.kronos.sent_resubmitted')
+                        logging.warning('(kronos_file) hit locked row, resubmitted to queue')
             record_timer('daemons.tracer.kronos.update_atime', (time() - ts) * 1000)
         except:
             logging.error(format_exc())
@@ -199,6 +211,28 @@ class AMQConsumer(object):
 
         logging.info('(kronos_file) updated %d replicas' % len(replicas))
 
+    def __get_parent_datasets(self, scope, name):
+        """
+        Get the parent datasets of a file, excluding the _dis datasets.
+        The result is memoized in an expiring LRU cache shared by all consumers.
+        """
+        key = '%s:%s' % (scope, name)
+        datasets = PARENT_DIDS_CACHE.get(key)
+        if datasets is None:
+            record_counter('daemons.tracer.kronos.parent_cache.miss')
+            datasets = []
+            for did in list_parent_dids(scope, name):
+                if did['type'] != DIDType.DATASET:
+                    continue
+                # do not update _dis datasets
+                if did['scope'] == 'panda' and '_dis' in did['name']:
+                    continue
+                datasets.append(did)
+            PARENT_DIDS_CACHE.put(key, datasets)
+        else:
+            record_counter('daemons.tracer.kronos.parent_cache.hit')
+        return datasets
+
 
 def kronos_file(once=False, thread=0, brokers_resolved=None, dataset_queue=None):
     """
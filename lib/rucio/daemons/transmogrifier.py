@@ -24,7 +24,7 @@ from sys import exc_info, stdout, argv
 from traceback import format_exception
 
 
-from rucio.api.did import list_new_dids, set_new_dids, get_metadata
+from rucio.api.did import list_new_dids, set_new_dids, get_metadata_bulk
 from rucio.api.subscription import list_subscriptions, update_subscription
 from rucio.db.sqla.constants import DIDType, SubscriptionState
 from rucio.common.exception import (DatabaseException, DataIdentifierNotFound, InvalidReplicationRule, DuplicateRule, RSEBlacklisted,
@@ -72,6 +72,137 @@ def _retrial(func, *args, **kwargs):
             raise
 
 
+REGEX_CHARACTERS = frozenset('.^$*+?{}[]\\|()')
+
+
+def _is_literal(pattern):
+    """
+    Check if a filter value matches only the strings starting with itself.
+
+    :param pattern: The filter value.
+    :returns: True/False
+    """
+    return not REGEX_CHARACTERS.intersection(pattern)
+
+
+class SubscriptionMatcher(object):
+    """
+    Matches DIDs against a list of subscriptions compiled once.
+
+    The filters are parsed and their regexes compiled when the matcher is built.
+    Subscriptions whose scope, or one of whose metadata filters, only has literal
+    values are indexed on these values, so a DID is only tested against the
+    subscriptions which can match it and the ones without such a filter.
+    """
+
+    def __init__(self, subscriptions):
+        """
+        :param subscriptions: The list of subscription dictionaries, in priority order.
+        """
+        self.version = tuple((subscription['id'], subscription['updated_at']) for subscription in subscriptions)
+        self.__compiled = []
+        self.__index = {}  # {(key, literal value): [position]}
+        self.__unindexed = []
+        for subscription in subscriptions:
+            try:
+                compiled = self.__compile(subscription)
+            except (ValueError, TypeError, re.error), error:
+                logging.error('%s : Subscription %s will be skipped' % (error, subscription['name']))
+                continue
+            position = len(self.__compiled)
+            self.__compiled.append(compiled)
+            if compiled['index_key'] is None:
+                self.__unindexed.append(position)
+            else:
+                for value in compiled['index_values']:
+                    self.__index.setdefault((compiled['index_key'], value), []).append(position)
+        self.__index_keys = set(key for key, _ in self.__index)
+
+    @staticmethod
+    def __compile(subscription):
+        """
+        Parse the filter of a subscription and compile its regexes.
+
+        :param subscription: The subscription dictionary.
+        :returns: The compiled subscription dictionary.
+        """
+        filter = loads(subscription['filter'])
+        split_rule = filter.get('split_rule', False)
+        if split_rule == 'true':
+            split_rule = True
+        elif split_rule == 'false':
+            split_rule = False
+        compiled = {'subscription': subscription, 'split_rule': split_rule,
+                    'pattern': None, 'excluded_pattern': None, 'scope': None, 'meta': [],
+                    'index_key': None, 'index_values': None}
+        for key in filter:
+            values = filter[key]
+            if key in ('pattern', 'excluded_pattern'):
+                compiled[key] = re.compile(values)
+            elif key == 'split_rule':
+                pass
+            else:
+                if type(values) is not list:
+                    values = [values, ]
+                values = [str(value) for value in values]
+                if key == 'scope':
+                    compiled['scope'] = [re.compile(value) for value in values]
+                else:
+                    compiled['meta'].append((str(key), [re.compile(value) for value in values]))
+                if all(_is_literal(value) for value in values) and (compiled['index_key'] is None or key == 'scope'):
+                    compiled['index_key'], compiled['index_values'] = str(key), values
+        return compiled
+
+    @staticmethod
+    def __is_matching(compiled, did, metadata):
+        """
+        Check a DID against a compiled subscription.
+
+        :param compiled: The compiled subscription dictionary.
+        :param did: The DID dictionary.
+        :param metadata: The metadata dictionary of the DID.
+        :returns: True/False
+        """
+        if compiled['pattern'] and not compiled['pattern'].match(did['name']):
+            return False
+        if compiled['excluded_pattern'] and compiled['excluded_pattern'].match(did['name']):
+            return False
+        if compiled['scope'] is not None and not any(scope.match(did['scope']) for scope in compiled['scope']):
+            return False
+        for key, values in compiled['meta']:
+            if key not in metadata:
+                return False
+            value = str(metadata[key])
+            if not any(regex.match(value) for regex in values):
+                return False
+        return True
+
+    def match(self, did, metadata):
+        """
+        List the subscriptions matching a DID.
+
+        :param did: The DID dictionary.
+        :param metadata: The metadata dictionary of the DID.
+        :returns: List of (subscription dictionary, split_rule) in priority order.
+        """
+        if metadata['hidden']:
+            return []
+        metadata = dict((str(key), value) for key, value in metadata.iteritems())
+        candidates = set(self.__unindexed)
+        for key in self.__index_keys:
+            if key == 'scope':
+                value = did['scope']
+            elif key in metadata:
+                value = str(metadata[key])
+            else:
+                continue
+            # The filters are matched from the start of the value, so every prefix of the value is looked up
+            for length in xrange(len(value) + 1):
+                candidates.update(self.__index.get((key, value[:length]), []))
+        return [(self.__compiled[position]['subscription'], self.__compiled[position]['split_rule'])
+                for position in sorted(candidates) if self.__is_matching(self.__compiled[position], did, metadata)]
+
+
 def is_matching_subscription(subscription, did, metadata):
     """
     Method to identify if a DID matches a subscription.
@@ -81,49 +212,9 @@ def is_matching_subscription(subscription, did, metadata):
     param metadata: The metadata dictionnary for the DID
     return: True/False
     """
-    if metadata['hidden']:
-        return False
-    try:
-        filter = loads(subscription['filter'])
-    except ValueError, error:
-        logging.error('%s : Subscription will be skipped' % error)
-        return False
-    # Loop over the keys of filter for subscription
-    for key in filter:
-        values = filter[key]
-        if key == 'pattern':
-            if not re.match(values, did['name']):
-                return False
-        elif key == 'excluded_pattern':
-            if re.match(values, did['name']):
-                return False
-        elif key == 'split_rule':
-            pass
-        elif key == 'scope':
-            match_scope = False
-            for scope in values:
-                if re.match(scope, did['scope']):
-                    match_scope = True
-                    break
-            if not match_scope:
-                return False
-        else:
-            if type(values) is not list:
-                values = [values, ]
-            has_metadata = False
-            for meta in metadata:
-                if str(meta) == str(key):
-                    has_metadata = True
-                    match_meta = False
-                    for value in values:
-                        if re.match(str(value), str(metadata[meta])):
-                            match_meta = True
-                            break
-                    if not match_meta:
-                        return False
-            if not has_metadata:
-                return False
-    return True
+    subscription = dict(subscription)
+    subscription.setdefault('updated_at', None)
+    return len(SubscriptionMatcher([subscription]).match(did, metadata)) > 0
 
 
 def transmogrifier(bulk=5, once=False):
@@ -143,6 +234,7 @@ def transmogrifier(bulk=5, once=False):
     hb_thread = threading.current_thread()
     heartbeat.sanity_check(executable=executable, hostname=hostname)
 
+    matcher = None
     while not graceful_stop.is_set():
 
         heart_beat = heartbeat.live(executable, hostname, pid, hb_thread)
@@ -171,6 +263,10 @@ def transmogrifier(bulk=5, once=False):
             priorities.sort()
             for priority in priorities:
                 subscriptions.extend(sub_dict[priority])
+            if matcher is None or matcher.version != tuple((sub['id'], sub['updated_at']) for sub in subscriptions):
+                matcher = SubscriptionMatcher(subscriptions)
+                logging.info(prepend_str + 'Compiled %i subscriptions' % len(subscriptions))
+                monitor.record_counter(counters='transmogrifier.matcher.reload', delta=1)
         except SubscriptionNotFound, error:
             logging.warning(prepend_str + 'No subscriptions defined: %s' % (str(error)))
             time.sleep(10)
@@ -185,149 +281,148 @@ def transmogrifier(bulk=5, once=False):
 
         try:
             results = {}
+            quota_snapshots = {}
             start_time = time.time()
             blacklisted_rse_id = [rse['id'] for rse in list_rses({'availability_write': False})]
             logging.debug(prepend_str + 'In transmogrifier worker')
             identifiers = []
+            dids_metadata = {}
+            for metadata in get_metadata_bulk([did for did in dids if did['did_type'] in (str(DIDType.DATASET), str(DIDType.CONTAINER))]):
+                dids_metadata[(metadata['scope'], metadata['name'])] = metadata
             for did in dids:
                 did_success = True
                 if did['did_type'] == str(DIDType.DATASET) or did['did_type'] == str(DIDType.CONTAINER):
                     results['%s:%s' % (did['scope'], did['name'])] = []
                     try:
-                        metadata = get_metadata(did['scope'], did['name'])
-                        for subscription in subscriptions:
-                            if is_matching_subscription(subscription, did, metadata) is True:
-                                filter = loads(subscription['filter'])
-                                split_rule = filter.get('split_rule', False)
-                                if split_rule == 'true':
-                                    split_rule = True
-                                elif split_rule == 'false':
-                                    split_rule = False
-                                stime = time.time()
-                                results['%s:%s' % (did['scope'], did['name'])].append(subscription['id'])
-                                logging.info(prepend_str + '%s:%s matches subscription %s' % (did['scope'], did['name'], subscription['name']))
-                                for rule in loads(subscription['replication_rules']):
-                                    # Get all the rule and subscription parameters
-                                    grouping = rule.get('grouping', 'DATASET')
-                                    lifetime = rule.get('lifetime', None)
-                                    ignore_availability = rule.get('ignore_availability', None)
-                                    weight = rule.get('weight', None)
-                                    source_replica_expression = rule.get('source_replica_expression', None)
-                                    locked = rule.get('locked', None)
-                                    if locked == 'True':
-                                        locked = True
-                                    else:
-                                        locked = False
-                                    purge_replicas = rule.get('purge_replicas', False)
-                                    if purge_replicas == 'True':
-                                        purge_replicas = True
-                                    else:
-                                        purge_replicas = False
-                                    rse_expression = str(rule['rse_expression'])
-                                    comment = str(subscription['comments'])
-                                    subscription_id = str(subscription['id'])
-                                    account = subscription['account']
-                                    copies = int(rule['copies'])
-                                    activity = rule.get('activity', 'User Subscriptions')
+                        metadata = dids_metadata.get((did['scope'], did['name']))
+                        if metadata is None:
+                            raise DataIdentifierNotFound("Data identifier '%s:%s' not found" % (did['scope'], did['name']))
+                        for subscription, split_rule in matcher.match(did, metadata):
+                            stime = time.time()
+                            results['%s:%s' % (did['scope'], did['name'])].append(subscription['id'])
+                            logging.info(prepend_str + '%s:%s matches subscription %s' % (did['scope'], did['name'], subscription['name']))
+                            for rule in loads(subscription['replication_rules']):
+                                # Get all the rule and subscription parameters
+                                grouping = rule.get('grouping', 'DATASET')
+                                lifetime = rule.get('lifetime', None)
+                                ignore_availability = rule.get('ignore_availability', None)
+                                weight = rule.get('weight', None)
+                                source_replica_expression = rule.get('source_replica_expression', None)
+                                locked = rule.get('locked', None)
+                                if locked == 'True':
+                                    locked = True
+                                else:
+                                    locked = False
+                                purge_replicas = rule.get('purge_replicas', False)
+                                if purge_replicas == 'True':
+                                    purge_replicas = True
+                                else:
+                                    purge_replicas = False
+                                rse_expression = str(rule['rse_expression'])
+                                comment = str(subscription['comments'])
+                                subscription_id = str(subscription['id'])
+                                account = subscription['account']
+                                copies = int(rule['copies'])
+                                activity = rule.get('activity', 'User Subscriptions')
+                                try:
+                                    validate_schema(name='activity', obj=activity)
+                                except InputValidationError, error:
+                                    logging.error(prepend_str + 'Error validating the activity %s' % (str(error)))
+                                    activity = 'User Subscriptions'
+                                if lifetime:
+                                    lifetime = int(lifetime)
+
+                                str_activity = "".join(activity.split())
+                                success = False
+                                nattempt = 5
+                                attemptnr = 0
+                                skip_rule_creation = False
+
+                                if split_rule:
+                                    rses = parse_expression(rse_expression)
+                                    list_of_rses = [rse['rse'] for rse in rses]
+                                    # Check that some rule doesn't already exist for this DID and subscription
+                                    preferred_rse_ids = []
+                                    for rule in list_rules(filters={'subscription_id': subscription_id, 'scope': did['scope'], 'name': did['name']}):
+                                        already_existing_rses = [(rse['rse'], rse['id']) for rse in parse_expression(rule['rse_expression'])]
+                                        for rse, rse_id in already_existing_rses:
+                                            if (rse in list_of_rses) and (rse_id not in preferred_rse_ids):
+                                                preferred_rse_ids.append(rse_id)
+                                    if len(preferred_rse_ids) >= copies:
+                                        skip_rule_creation = True
+
+                                    rse_id_dict = {}
+                                    for rse in rses:
+                                        rse_id_dict[rse['id']] = rse['rse']
                                     try:
-                                        validate_schema(name='activity', obj=activity)
-                                    except InputValidationError, error:
-                                        logging.error(prepend_str + 'Error validating the activity %s' % (str(error)))
-                                        activity = 'User Subscriptions'
-                                    if lifetime:
-                                        lifetime = int(lifetime)
-
-                                    str_activity = "".join(activity.split())
-                                    success = False
-                                    nattempt = 5
-                                    attemptnr = 0
-                                    skip_rule_creation = False
-
-                                    if split_rule:
-                                        rses = parse_expression(rse_expression)
-                                        list_of_rses = [rse['rse'] for rse in rses]
-                                        # Check that some rule doesn't already exist for this DID and subscription
-                                        preferred_rse_ids = []
-                                        for rule in list_rules(filters={'subscription_id': subscription_id, 'scope': did['scope'], 'name': did['name']}):
-                                            already_existing_rses = [(rse['rse'], rse['id']) for rse in parse_expression(rule['rse_expression'])]
-                                            for rse, rse_id in already_existing_rses:
-                                                if (rse in list_of_rses) and (rse_id not in preferred_rse_ids):
-                                                    preferred_rse_ids.append(rse_id)
-                                        if len(preferred_rse_ids) >= copies:
-                                            skip_rule_creation = True
-
-                                        rse_id_dict = {}
-                                        for rse in rses:
-                                            rse_id_dict[rse['id']] = rse['rse']
+                                        rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids), quota_snapshots=quota_snapshots)
+                                        selected_rses = [rse_id_dict[rse_id] for rse_id, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=blacklisted_rse_id)]
+                                    except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
+                                        logging.warning(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Try including blacklisted sites' %
+                                                        (subscription['name'], account, str(error)))
+                                        # Now including the blacklisted sites
                                         try:
-                                            rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids))
-                                            selected_rses = [rse_id_dict[rse_id] for rse_id, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=blacklisted_rse_id)]
+                                            rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids), quota_snapshots=quota_snapshots)
+                                            selected_rses = [rse_id_dict[rse_id] for rse_id, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=[])]
+                                            ignore_availability = True
                                         except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
-                                            logging.warning(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Try including blacklisted sites' %
-                                                            (subscription['name'], account, str(error)))
-                                            # Now including the blacklisted sites
-                                            try:
-                                                rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids))
-                                                selected_rses = [rse_id_dict[rse_id] for rse_id, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=[])]
-                                                ignore_availability = True
-                                            except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
-                                                logging.error(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Skipping rule creation.' %
-                                                              (subscription['name'], account, str(error)))
-                                                monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
-                                                # The DID won't be reevaluated at the next cycle
-                                                did_success = did_success and True
-                                                continue
-
-                                    for attempt in xrange(0, nattempt):
-                                        attemptnr = attempt
-                                        nb_rule = 0
-                                        try:
-                                            if split_rule:
-                                                if not skip_rule_creation:
-                                                    for rse in selected_rses:
-                                                        logging.info(prepend_str + 'Will insert one rule for %s:%s on %s' % (did['scope'], did['name'], rse))
-                                                        add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], account=account, copies=1,
-                                                                 rse_expression=rse, grouping=grouping, weight=weight, lifetime=lifetime, locked=locked,
-                                                                 subscription_id=subscription_id, source_replica_expression=source_replica_expression, activity=activity,
-                                                                 purge_replicas=purge_replicas, ignore_availability=ignore_availability, comment=comment)
-
-                                                        nb_rule += 1
-                                                        if nb_rule == copies:
-                                                            success = True
-                                                            break
-                                            else:
-                                                add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], account=account, copies=copies,
-                                                         rse_expression=rse_expression, grouping=grouping, weight=weight, lifetime=lifetime, locked=locked,
-                                                         subscription_id=subscription['id'], source_replica_expression=source_replica_expression, activity=activity,
-                                                         purge_replicas=purge_replicas, ignore_availability=ignore_availability, comment=comment)
-                                                nb_rule += 1
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.done', delta=nb_rule)
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.activity.%s' % str_activity, delta=nb_rule)
-                                            success = True
-                                            break
-                                        except (InvalidReplicationRule, InvalidRuleWeight, InvalidRSEExpression, StagingAreaRuleRequiresLifetime, DuplicateRule) as error:
-                                            # Errors that won't be retried
-                                            success = True
-                                            logging.error(prepend_str + '%s' % (str(error)))
+                                            logging.error(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Skipping rule creation.' %
+                                                          (subscription['name'], account, str(error)))
                                             monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
-                                            break
-                                        except (ReplicationRuleCreationTemporaryFailed, InsufficientTargetRSEs, InsufficientAccountLimit, DatabaseException, RSEBlacklisted) as error:
-                                            # Errors to be retried
-                                            logging.error(prepend_str + '%s Will perform an other attempt %i/%i' % (str(error), attempt + 1, nattempt))
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
-                                        except Exception, error:
-                                            # Unexpected errors
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.unknown', delta=1)
-                                            exc_type, exc_value, exc_traceback = exc_info()
-                                            logging.critical(prepend_str + ''.join(format_exception(exc_type, exc_value, exc_traceback)).strip())
-
-                                    did_success = (did_success and success)
-                                    if (attemptnr + 1) == nattempt and not success:
-                                        logging.error(prepend_str + 'Rule for %s:%s on %s cannot be inserted' % (did['scope'], did['name'], rse_expression))
-                                    else:
-                                        logging.info(prepend_str + '%s rule(s) inserted in %f seconds' % (str(nb_rule), time.time() - stime))
+                                            # The DID won't be reevaluated at the next cycle
+                                            did_success = did_success and True
+                                            continue
+
+                                for attempt in xrange(0, nattempt):
+                                    attemptnr = attempt
+                                    nb_rule = 0
+                                    try:
+                                        if split_rule:
+                                            if not skip_rule_creation:
+                                                for rse in selected_rses:
+                                                    logging.info(prepend_str + 'Will insert one rule for %s:%s on %s' % (did['scope'], did['name'], rse))
+                                                    add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], account=account, copies=1,
+                                                             rse_expression=rse, grouping=grouping, weight=weight, lifetime=lifetime, locked=locked,
+                                                             subscription_id=subscription_id, source_replica_expression=source_replica_expression, activity=activity,
+                                                             purge_replicas=purge_replicas, ignore_availability=ignore_availability, comment=comment)
+
+                                                    nb_rule += 1
+                                                    if nb_rule == copies:
+                                                        success = True
+                                                        break
+                                        else:
+                                            add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], account=account, copies=copies,
+                                                     rse_expression=rse_expression, grouping=grouping, weight=weight, lifetime=lifetime, locked=locked,
+                                                     subscription_id=subscription['id'], source_replica_expression=source_replica_expression, activity=activity,
+                                                     purge_replicas=purge_replicas, ignore_availability=ignore_availability, comment=comment)
+                                            nb_rule += 1
+                                        monitor.record_counter(counters='transmogrifier.addnewrule.done', delta=nb_rule)
+                                        monitor.record_counter(counters='transmogrifier.addnewrule.activity.%s' % str_activity, delta=nb_rule)
+                                        success = True
+                                        break
+                                    except (InvalidReplicationRule, InvalidRuleWeight, InvalidRSEExpression, StagingAreaRuleRequiresLifetime, DuplicateRule) as error:
+                                        # Errors that won't be retried
+                                        success = True
+                                        logging.error(prepend_str + '%s' % (str(error)))
+                                        monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
+                                        break
+                                    except (ReplicationRuleCreationTemporaryFailed, InsufficientTargetRSEs, InsufficientAccountLimit, DatabaseException, RSEBlacklisted) as error:
+                                        # Errors to be retried
+                                        logging.error(prepend_str + '%s Will perform an other attempt %i/%i' % (str(error), attempt + 1, nattempt))
+                                        monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
+                                    except Exception, error:
+                                        # Unexpected errors
+                                        monitor.record_counter(counters='transmogrifier.addnewrule.errortype.unknown', delta=1)
+                                        exc_type, exc_value, exc_traceback = exc_info()
+                                        logging.critical(prepend_str + ''.join(format_exception(exc_type, exc_value, exc_traceback)).strip())
+
+                                did_success = (did_success and success)
+                                if (attemptnr + 1) == nattempt and not success:
+                                    logging.error(prepend_str + 'Rule for %s:%s on %s cannot be inserted' % (did['scope'], did['name'], rse_expression))
+                                else:
+                                    logging.info(prepend_str + '%s rule(s) inserted in %f seconds' % (str(nb_rule), time.time() - stime))
                     except DataIdentifierNotFound, error:
-                        logging.warning(prepend_str + error)
+                        logging.warning(prepend_str + str(error))
 
                 if did_success:
                     if did['did_type'] == str(DIDType.FILE):
@@ -25,8 +25,9 @@ from rucio.common.config import config_get
 from rucio.common.exception import DatabaseException, RuleNotFound
 from rucio.common.utils import chunks
 from rucio.core.heartbeat import live, die, sanity_check
-from rucio.core.monitor import record_counter
+from rucio.core.monitor import record_counter, record_gauge
 from rucio.core.did import list_expired_dids, delete_dids
+from rucio.db.sqla.constants import DIDType
 
 logging.getLogger("requests").setLevel(getattr(logging, config_get('common', 'loglevel').upper()))
 
@@ -36,8 +37,50 @@ logging.basicConfig(stream=sys.stdout,
 
 GRACEFUL_STOP = threading.Event()
 
+# Containers are removed before datasets, and datasets before files, so a did is detached from its expired parents before its own turn.
+DELETION_ORDER = {DIDType.CONTAINER: 0, DIDType.DATASET: 1, DIDType.FILE: 2}
 
-def undertaker(worker_number=1, total_workers=1, chunk_size=5, once=False):
+
+def order_dids(dids):
+    """
+    Sort expired dids in a dependency-safe deletion order.
+
+    :param dids: List of dids as returned by list_expired_dids.
+    :returns: The sorted list of dids.
+    """
+    return sorted(dids, key=lambda did: DELETION_ORDER.get(did['did_type'], len(DELETION_ORDER)))
+
+
+def __delete_dids(dids, worker_number):
+    """
+    Delete a chunk of dids in one transaction. If it fails, the dids are deleted one by one.
+
+    :param dids: The chunk of dids.
+    :param worker_number: The worker number, for logging.
+    :returns: Number of deleted dids.
+    """
+    try:
+        delete_dids(dids=dids, account='root')
+        return len(dids)
+    except (RuleNotFound, DatabaseException), error:
+        if len(dids) == 1:
+            logging.error('Undertaker(%s): Cannot delete %s:%s: %s', worker_number, dids[0]['scope'], dids[0]['name'], str(error))
+            return 0
+        logging.warning('Undertaker(%s): Cannot delete chunk of %s dids, deleting them one by one: %s', worker_number, len(dids), str(error))
+
+    deleted = 0
+    for did in dids:
+        try:
+            delete_dids(dids=[did], account='root')
+            deleted += 1
+        except RuleNotFound, error:
+            logging.error(error)
+        except DatabaseException, error:
+            logging.error('Undertaker(%s): Got database error %s.', worker_number, str(error))
+    return deleted
+
+
+def undertaker(worker_number=1, total_workers=1, chunk_size=100, once=False):
     """
     Main loop to select and delete dids.
     """
@@ -58,16 +101,21 @@ def undertaker(worker_number=1, total_workers=1, chunk_size=5, once=False):
                 time.sleep(60)
                 continue
 
-            for chunk in chunks(dids, chunk_size):
-                try:
-                    logging.info('Undertaker(%s): Receive %s dids to delete', worker_number, len(chunk))
-                    delete_dids(dids=chunk, account='root')
-                    logging.info('Undertaker(%s): Delete %s dids', worker_number, len(chunk))
-                    record_counter(counters='undertaker.delete_dids', delta=len(chunk))
-                except RuleNotFound, error:
-                    logging.error(error)
-                except DatabaseException, error:
-                    logging.error('Undertaker(%s): Got database error %s.', worker_number, str(error))
+            start_time = time.time()
+            deleted = 0
+            for chunk in chunks(order_dids(dids), chunk_size):
+                if GRACEFUL_STOP.is_set():
+                    break
+                logging.info('Undertaker(%s): Receive %s dids to delete', worker_number, len(chunk))
+                nb_deleted = __delete_dids(dids=chunk, worker_number=worker_number)
+                logging.info('Undertaker(%s): Delete %s dids', worker_number, nb_deleted)
+                record_counter(counters='undertaker.delete_dids', delta=nb_deleted)
+                deleted += nb_deleted
+
+            duration = max(time.time() - start_time, 0.001)
+            if deleted:
+                logging.info('Undertaker(%s): Deleted %s dids in %.2f seconds (%.2f dids/s)', worker_number, deleted, duration, deleted / duration)
+                record_gauge('undertaker.delete_dids.rate', deleted / duration)
         except:
             logging.critical(traceback.format_exc())
             time.sleep(1)
@@ -87,7 +135,7 @@ def stop(signum=None, frame=None):
     GRACEFUL_STOP.set()
 
 
-def run(once=False, total_workers=1, chunk_size=10):
+def run(once=False, total_workers=1, chunk_size=100):
     """
     Starts up the undertaker threads.
     """
@@ -0,0 +1,45 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+"""New request_counters table
+
+Revision ID: 3c9df354071b
+Revises: 914b8f02df38
+Create Date: 2016-10-12 10:21:37.516842
+
+"""
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from rucio.db.sqla.constants import RequestState
+from rucio.db.sqla.types import GUID
+
+# revision identifiers, used by Alembic.
+revision = '3c9df354071b'
+down_revision = '914b8f02df38'
+
+
+def upgrade():
+    op.create_table('request_counters',
+                    sa.Column('id', GUID()),
+                    sa.Column('activity', sa.String(50)),
+                    sa.Column('dest_rse_id', GUID()),
+                    sa.Column('account', sa.String(25)),
+                    sa.Column('state', RequestState.db_type(name='REQUEST_CNTRS_STATE_CHK')),
+                    sa.Column('counter', sa.BigInteger),
+                    sa.Column('updated_at', sa.DateTime),
+                    sa.Column('created_at', sa.DateTime))
+
+    if context.get_context().dialect.name != 'sqlite':
+        op.create_primary_key('REQUEST_CNTRS_PK', 'request_counters', ['id'])
+        op.create_check_constraint('REQUEST_CNTRS_RSE_ID_NN', 'request_counters', 'dest_rse_id is not null')
+        op.create_check_constraint('REQUEST_CNTRS_STATE_NN', 'request_counters', 'state is not null')
+        op.create_foreign_key('REQUEST_CNTRS_RSE_ID_FK', 'request_counters', 'rses', ['dest_rse_id'], ['id'])
+
+
+def downgrade():
+    op.drop_table('request_counters')
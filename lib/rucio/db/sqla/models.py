@@ -973,6 +973,21 @@ class Source(BASE, ModelBase, Versioned):
                    Index('SOURCES_DEST_RSEID_IDX', 'dest_rse_id'))
 
 
+class RequestCounter(BASE, ModelBase):
+    """Represents the changes of the number of requests per activity, destination RSE, account and state"""
+    __tablename__ = 'request_counters'
+    id = Column(GUID(), default=utils.generate_uuid)
+    activity = Column(String(50))
+    dest_rse_id = Column(GUID())
+    account = Column(String(25))
+    state = Column(RequestState.db_type(name='REQUEST_CNTRS_STATE_CHK'))
+    counter = Column(BigInteger)
+    _table_args = (PrimaryKeyConstraint('id', name='REQUEST_CNTRS_PK'),
+                   ForeignKeyConstraint(['dest_rse_id'], ['rses.id'], name='REQUEST_CNTRS_RSE_ID_FK'),
+                   CheckConstraint('DEST_RSE_ID IS NOT NULL', name='REQUEST_CNTRS_RSE_ID_NN'),
+                   CheckConstraint('STATE IS NOT NULL', name='REQUEST_CNTRS_STATE_NN'))
+
+
 class Distance(BASE, ModelBase):
     """Represents distance between rses"""
     __tablename__ = 'distances'
@@ -1166,6 +1181,7 @@ def register_models(engine):
               ReplicationRuleHistory,
               ReplicationRuleHistoryRecent,
               Request,
+              RequestCounter,
               Scope,
               Source,
               Subscription,
@@ -1219,6 +1235,7 @@ def unregister_models(engine):
               ReplicationRuleHistory,
               ReplicationRuleHistoryRecent,
               Request,
+              RequestCounter,
               Scope,
               Source,
               Subscription,
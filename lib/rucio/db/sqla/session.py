@@ -180,6 +180,20 @@ def get_session():
     return session
 
 
+def on_commit(session, function):
+    """
+    Calls a function once the current transaction of a session is committed, e.g. to invalidate
+    process-local caches only when the change is visible to the other sessions.
+    If the transaction is rolled back, the function is called after the next commit of the session, if any.
+
+    :param session: The database session in use, or its scoped_session.
+    :param function: The function, called without arguments.
+    """
+    if isinstance(session, scoped_session):
+        session = session()
+    event.listen(session, 'after_commit', lambda session: function(), once=True)
+
+
 def retry_if_db_connection_error(exception):
     """Return True if error in connecting to db."""
     print exception
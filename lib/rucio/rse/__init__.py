@@ -49,10 +49,7 @@ if rsemanager.CLIENT_MODE:
 
 
 if rsemanager.SERVER_MODE:
-    from rucio.core.rse import get_rse_protocols
-    setattr(rsemanager, '__request_rse_info', get_rse_protocols)
-    rse_region = make_region(function_key_generator=rse_key_generator).configure(
-        'dogpile.cache.memcached',
-        expiration_time=3600,
-        arguments={'url': "127.0.0.1:11211", 'distributed_lock': True})
-    setattr(rsemanager, 'rse_region', rse_region)
+    # The local RSE metadata snapshot of rucio.core.rse is the cache on the server side
+    from rucio.core.rse import get_cached_rse_protocols
+    setattr(rsemanager, '__request_rse_info', get_cached_rse_protocols)
+    setattr(rsemanager, 'rse_region', None)
@@ -30,6 +30,14 @@ except:
 class Default(protocol.RSEProtocol):
     """ Implementing access to RSEs using the srm protocol."""
 
+    def __init__(self, protocol_attr, rse_settings):
+        """ Initializes the object with information about the referred RSE.
+
+            :param props Properties derived from the RSE Repository
+        """
+        super(Default, self).__init__(protocol_attr, rse_settings)
+        self.bulk_delete = True
+
     def lfns2pfns(self, lfns):
         """
         Returns a fully qualified PFN for the file referred by path.
@@ -226,8 +234,9 @@ class Default(protocol.RSEProtocol):
     def delete(self, path):
         """
         Deletes a file from the connected RSE.
+        Providing a list indicates the bulk mode.
 
-        :param path: path to the to be deleted file
+        :param path: path to the to be deleted file or a list of paths
 
         :raises ServiceUnavailable: if some generic error occured in the library.
         :raises SourceNotFound: if the source file was not found on the referred storage.
@@ -36,6 +36,7 @@ class RSEProtocol(object):
         """
         self.attributes = protocol_attr
         self.renaming = True
+        self.bulk_delete = False
         self.rse = rse_settings
         if not self.rse['deterministic']:
             if rsemanager.CLIENT_MODE:
@@ -54,6 +54,8 @@ def get_rse_info(rse, session=None):
     """
     # __request_rse_info will be assigned when the module is loaded as it depends on the rucio environment (server or client)
     # __request_rse_info, rse_region are defined in /rucio/rse/__init__.py
+    if rse_region is None:  # NOQA
+        return __request_rse_info(str(rse), session=session)  # NOQA
     rse_info = rse_region.get(str(rse))   # NOQA
     if not rse_info:  # no cached entry found
         rse_info = __request_rse_info(str(rse), session=session)  # NOQA
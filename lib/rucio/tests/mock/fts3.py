@@ -8,9 +8,14 @@
 # - Mario Lassnig, <mario.lassnig@cern.ch>, 2013
 
 import datetime
+import json
 import random
+import threading
 import time
 
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
 from sqlalchemy import and_, or_
 
 from rucio.common.utils import generate_uuid
@@ -21,6 +26,10 @@ from rucio.db.sqla.session import read_session, transactional_session
 
 """
 This mock FTS3 server provides basic job control, with a random job progression model.
+
+MockFTS3Server is an in-memory stand-in of the FTS3 REST interface, with HTTP/1.1
+keep-alive, used to benchmark the submission and polling offline. Every job is
+FINISHED as soon as it is submitted.
 """
 
 
@@ -110,3 +119,112 @@ def cancel(tid, session):
     query.update({'state': FTSState.CANCELED,
                   'last_modified': datetime.datetime.utcnow()})
     record_timer('daemons.mock.fts3.cancel.update_state', (time.time() - ts) * 1000)
+
+
+class MockFTS3Handler(BaseHTTPRequestHandler):
+    """
+    Serves the FTS3 REST calls of rucio.transfertool.fts3 from the jobs of the server.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def __reply(self, code, body):
+        data = json.dumps(body)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def __path(self):
+        return [part for part in self.path.split('?')[0].split('/') if part]
+
+    def do_GET(self):
+        path = self.__path()
+        if not path:
+            self.__reply(200, {'api': {'major': 3, 'minor': 2, 'patch': 0}})
+        elif path == ['whoami']:
+            self.__reply(200, {'base_id': '01874efb-4735-4595-bc9c-591aef8240c9', 'vos': ['mock'], 'delegation_id': 'mock'})
+        elif path[0] == 'jobs' and len(path) == 3 and path[2] == 'files':
+            job = self.server.jobs.get(path[1])
+            if job:
+                self.__reply(200, job['files'])
+            else:
+                self.__reply(404, {'message': 'No job with the id %s has been found' % path[1]})
+        elif path[0] == 'jobs' and len(path) == 2:
+            jobs = []
+            for job_id in path[1].split(','):
+                job = self.server.jobs.get(job_id)
+                if job:
+                    jobs.append(job)
+                else:
+                    jobs.append({'job_id': job_id, 'http_status': '404 Not Found'})
+            self.__reply(207 if len(jobs) > 1 else 200, jobs if len(jobs) > 1 else jobs[0])
+        else:
+            self.__reply(404, {'message': 'Not found'})
+
+    def do_POST(self):
+        if self.__path() != ['jobs']:
+            self.__reply(404, {'message': 'Not found'})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.getheader('Content-Length', 0))))
+        record_counter('daemons.mock.fts3.submit')
+        now = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
+        job_id = generate_uuid()
+        files = [{'file_state': 'FINISHED',
+                  'source_surl': file['sources'][0],
+                  'dest_surl': file['destinations'][0],
+                  'start_time': now,
+                  'finish_time': now,
+                  'reason': '',
+                  'file_metadata': file.get('metadata', {})} for file in request['files']]
+        self.server.jobs[job_id] = {'job_id': job_id,
+                                    'http_status': '200 Ok',
+                                    'job_state': 'FINISHED',
+                                    'job_metadata': request['params'].get('job_metadata', {}),
+                                    'files': files}
+        self.__reply(200, {'job_id': job_id})
+
+    def do_DELETE(self):
+        path = self.__path()
+        if path[0] == 'jobs' and len(path) == 2 and path[1] in self.server.jobs:
+            self.server.jobs[path[1]]['job_state'] = 'CANCELED'
+            self.__reply(200, {'job_id': path[1], 'job_state': 'CANCELED'})
+        else:
+            self.__reply(404, {'message': 'Not found'})
+
+
+class MockFTS3Server(ThreadingMixIn, HTTPServer):
+    """
+    Threaded in-memory FTS3 stand-in.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        """
+        :param port: The port to listen on, 0 for any free port.
+        """
+        HTTPServer.__init__(self, ('localhost', port), MockFTS3Handler)
+        self.jobs = {}
+
+    @property
+    def url(self):
+        return 'http://localhost:%s' % self.server_address[1]
+
+
+def start_server(port=0):
+    """
+    Starts a MockFTS3Server in a daemon thread.
+
+    :param port: The port to listen on, 0 for any free port.
+    :returns: The server, its url is MockFTS3Server.url, stop it with shutdown().
+    """
+    server = MockFTS3Server(port)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
@@ -12,13 +12,14 @@
 import string
 import random
 
-from nose.tools import assert_equal, assert_in
+from nose.tools import assert_equal, assert_in, assert_true
 
 from rucio.client.accountclient import AccountClient
 from rucio.client.accountlimitclient import AccountLimitClient
 from rucio.core import account_limit
 from rucio.core.account import add_account
 from rucio.core.rse import get_rse
+from rucio.core.rse_selector import get_quota_snapshot
 from rucio.db.sqla.constants import AccountType
 
 
@@ -44,6 +45,19 @@ class TestCoreAccountLimits():
         assert_equal(account_limit.get_account_limit(account=self.account, rse_id=self.rse1_id), 100000)
         assert_equal(account_limit.get_account_limit(account=self.account, rse_id=self.rse2_id), None)
 
+    def test_get_quota_snapshot(self):
+        """ ACCOUNT_LIMIT (CORE): Quota snapshot of an account """
+        account = ''.join(random.choice(string.ascii_uppercase) for x in range(10))
+        add_account(account=account, type=AccountType.USER, email='rucio@email.com')
+        account_limit.set_account_limit(account=account, rse_id=self.rse2_id, bytes=200000)
+
+        quota_snapshots = {}
+        snapshot = get_quota_snapshot(account=account, quota_snapshots=quota_snapshots)
+        assert_equal(snapshot['admin'], False)
+        assert_equal(snapshot['limits'][self.rse2_id], 200000)
+        assert_equal(snapshot['usage'].get(self.rse2_id, 0), 0)
+        assert_true(get_quota_snapshot(account=account, quota_snapshots=quota_snapshots) is snapshot)
+
 
 class TestAccountClient():
 
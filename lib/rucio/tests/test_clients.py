@@ -11,12 +11,13 @@
 
 from os import remove
 
-from nose.tools import raises
+from nose.tools import assert_equal, raises
 
 from rucio.client.baseclient import BaseClient
+from rucio.client.batchclient import BatchClient
 from rucio.client.client import Client
 from rucio.common.config import config_get
-from rucio.common.utils import get_tmp_dir
+from rucio.common.utils import generate_uuid, get_tmp_dir
 from rucio.common.exception import CannotAuthenticate, ClientProtocolNotSupported
 
 
@@ -62,6 +63,14 @@ class TestBaseClient():
         creds = {'client_cert': '/opt/rucio/etc/web/notthere.crt'}
         BaseClient(account='root', ca_cert=self.cacert, auth_type='x509', creds=creds)
 
+    def testSharedSessionAndToken(self):
+        """ CLIENTS (BASECLIENT): clients of the process share connections and token."""
+        creds = {'username': 'ddmlab', 'password': 'secret'}
+        client1 = BaseClient(account='root', ca_cert=self.cacert, auth_type='userpass', creds=creds)
+        client2 = BaseClient(account='root', ca_cert=self.cacert, auth_type='userpass', creds=creds)
+        assert client1.session is client2.session
+        assert_equal(client1.auth_token, client2.auth_token)
+
     @raises(ClientProtocolNotSupported)
     def testClientProtocolNotSupported(self):
         """ CLIENTS (BASECLIENT): try to pass an host with a not supported protocol."""
@@ -82,3 +91,18 @@ class TestRucioClients():
         c = Client(account='root', ca_cert=self.cacert, auth_type='userpass', creds=creds)
 
         print c.ping()
+
+    def test_batch(self):
+        """ BATCH (CLIENT): Coalesce replica and attachment registrations """
+        creds = {'username': 'ddmlab', 'password': 'secret'}
+        c = Client(account='root', ca_cert=self.cacert, auth_type='userpass', creds=creds)
+
+        dataset = 'dataset_%s' % generate_uuid()
+        names = ['file_%s' % generate_uuid() for _ in xrange(5)]
+        with BatchClient(c, batch_size=4) as batch:
+            batch.add_did('mock', dataset, 'DATASET')
+            for name in names:
+                batch.add_replica('MOCK', 'mock', name, 1, '0cc737eb')
+                batch.attach_did('mock', dataset, 'mock', name)
+
+        assert_equal(sorted(f['name'] for f in c.list_files('mock', dataset)), sorted(names))
@@ -12,8 +12,14 @@
 
 import time
 
+from Queue import Queue
+
+from nose.tools import assert_equal
+
+from rucio.common.utils import generate_uuid
 from rucio.daemons.mock.conveyorinjector import request_transfer
-from rucio.daemons.conveyor import submitter, poller, finisher, throttler
+from rucio.daemons.conveyor import submitter, poller, finisher, receiver, throttler
+from rucio.daemons.conveyor.utils import merge_jobs, rank_sources
 
 
 class TestConveyorSubmitter:
@@ -31,3 +37,79 @@ class TestConveyorSubmitter:
         time.sleep(5)
         poller.run(once=True)
         finisher.run(once=True)
+
+    def test_merge_jobs(self):
+        """ CONVEYOR (DAEMON): Test the merging of the compatible jobs of the submitter."""
+        job_params = {'job_metadata': {'issuer': 'rucio'}, 'priority': 3}
+        multi_sources = {'job_metadata': {'issuer': 'rucio', 'multi_sources': True}, 'priority': 3}
+        grouped_jobs = {'https://fts:8446': [{'files': [1, 2], 'job_params': job_params},
+                                             {'files': [3], 'job_params': dict(job_params)},
+                                             {'files': [4], 'job_params': multi_sources},
+                                             {'files': [5], 'job_params': multi_sources},
+                                             {'files': [6, 7], 'job_params': job_params},
+                                             {'files': [8], 'job_params': {'job_metadata': {'issuer': 'rucio'}, 'priority': 2}}]}
+        merged_jobs = merge_jobs(grouped_jobs, job_size=4)
+        assert_equal([job['files'] for job in merged_jobs['https://fts:8446']], [[1, 2, 3], [4], [5], [6, 7], [8]])
+
+    def test_rank_sources(self):
+        """ CONVEYOR (DAEMON): Test the ranking of the source replicas of the submitter."""
+        sources = [('A', 'mock://a', 1, 0, 5), ('B', 'mock://b', 2, None, 7), ('C', 'mock://c', 3, 1, 1), ('D', 'mock://d', 4, 0, 7)]
+        ranked_sources = rank_sources(sources)
+        assert_equal(ranked_sources[0][0], 'C')
+        assert_equal(set([source[0] for source in ranked_sources[1:3]]), set(['B', 'D']))
+        assert_equal(ranked_sources[3][0], 'A')
+        assert_equal(len(rank_sources(sources, max_sources=2)), 2)
+        assert_equal(rank_sources(sources, max_sources=2)[0][0], 'C')
+
+
+class TestConveyorPoller:
+    """ TestConveyorPoller Class."""
+
+    def test_adaptive_batch(self):
+        """ CONVEYOR (DAEMON): Test the adaptive FTS query size of the poller."""
+        batch = poller.AdaptiveBatch(maximum=100, target_latency=10)
+        assert_equal(batch.size, 100)
+        assert_equal(batch.update(20), 50)
+        assert_equal(batch.update(1, failed=True), 25)
+        assert_equal(batch.update(7), 25)
+        assert_equal(batch.update(1), 35)
+        for _ in xrange(10):
+            batch.update(1)
+        assert_equal(batch.size, 100)
+        for _ in xrange(10):
+            batch.update(1, failed=True)
+        assert_equal(batch.size, 1)
+
+
+class MockConnection:
+    """ Records the acknowledged and rejected messages. """
+
+    def __init__(self):
+        self.acks, self.nacks = [], []
+
+    def ack(self, id, subscription):
+        self.acks.append(id)
+
+    def nack(self, id, subscription):
+        self.nacks.append(id)
+
+
+class TestConveyorReceiver:
+    """ TestConveyorReceiver Class."""
+
+    def test_flusher_nacks_failed_updates(self):
+        """ CONVEYOR (DAEMON): Test that the receiver rejects the messages it could not apply."""
+        conn = MockConnection()
+        queue = Queue()
+        # Unknown request: not updated but applied. Response without request_id: update fails.
+        queue.put(({'request_id': generate_uuid(), 'new_state': None}, conn, 'applied', time.time()))
+        queue.put(({'new_state': 'DONE', 'transfer_id': generate_uuid()}, conn, 'failed', time.time()))
+
+        receiver.graceful_stop.set()
+        try:
+            receiver.flusher(queue, full_mode=True, bulk=10, flush_interval=1)
+        finally:
+            receiver.graceful_stop.clear()
+
+        assert_equal(conn.acks, ['applied'])
+        assert_equal(conn.nacks, ['failed'])
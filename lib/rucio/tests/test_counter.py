@@ -11,10 +11,11 @@
 
 from nose.tools import assert_equal
 
-from rucio.core import account_counter, rse_counter
+from rucio.core import account_counter, request_counter, rse_counter
 from rucio.core.rse import get_rse
 from rucio.daemons.abacus.rse import rse_update
 from rucio.daemons.abacus.account import account_update
+from rucio.db.sqla.constants import RequestState
 
 
 class TestCoreRSECounter():
@@ -69,6 +70,21 @@ class TestCoreRSECounter():
 
 class TestCoreAccountCounter():
 
+    def test_update_account_counters(self):
+        """ACCOUNT COUNTER (CORE): Apply the counter updates in slices """
+        account_update(once=True)
+        rse_id = get_rse('MOCK').id
+        account = 'jdoe'
+        before = account_counter.get_counter(rse_id=rse_id, account=account)
+        for i in xrange(5):
+            account_counter.increase(rse_id=rse_id, account=account, files=1, bytes=10)
+
+        assert_equal(account_counter.update_account_counters(total_workers=0, worker_number=0, limit=3), 3)
+        assert_equal(account_counter.update_account_counters(total_workers=0, worker_number=0, limit=3), 2)
+        assert_equal(account_counter.update_account_counters(total_workers=0, worker_number=0, limit=3), 0)
+        cnt = account_counter.get_counter(rse_id=rse_id, account=account)
+        assert_equal((cnt['files'], cnt['bytes']), (before['files'] + 5, before['bytes'] + 50))
+
     def test_inc_dec_get_counter(self):
         """ACCOUNT COUNTER (CORE): Increase, decrease and get counter """
         account_update(once=True)
@@ -116,3 +132,31 @@ class TestCoreAccountCounter():
             cnt = account_counter.get_counter(rse_id=rse_id, account=account)
             del cnt['updated_at']
             assert_equal(cnt, {'files': count, 'bytes': sum})
+
+
+class TestCoreRequestCounter():
+
+    def test_update_compact_get_counters(self):
+        """REQUEST COUNTER (CORE): Update, compact and get counters """
+        rse_id = get_rse('MOCK').id
+        request_counter.rebuild_counters()
+
+        def get_counter(state):
+            for activity, dest_rse_id, account, counter_state, counter in request_counter.get_counters():
+                if (activity, dest_rse_id, account, counter_state) == ('test_counter', rse_id, 'jdoe', state):
+                    return counter
+            return 0
+
+        for i in xrange(10):
+            request_counter.update_counters({('test_counter', rse_id, 'jdoe', RequestState.WAITING): 1})
+        assert_equal(get_counter(RequestState.WAITING), 10)
+
+        request_counter.update_counters({('test_counter', rse_id, 'jdoe', RequestState.WAITING): -4,
+                                         ('test_counter', rse_id, 'jdoe', RequestState.QUEUED): 4})
+        request_counter.compact_counters()
+        assert_equal(get_counter(RequestState.WAITING), 6)
+        assert_equal(get_counter(RequestState.QUEUED), 4)
+
+        request_counter.rebuild_counters()
+        assert_equal(get_counter(RequestState.WAITING), 0)
+        assert_equal(get_counter(RequestState.QUEUED), 0)
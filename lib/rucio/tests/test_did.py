@@ -32,7 +32,7 @@ from rucio.common.exception import (DataIdentifierNotFound, DataIdentifierAlread
 from rucio.common.utils import generate_uuid
 from rucio.core.account_limit import set_account_limit
 from rucio.core.did import (list_dids, add_did, delete_dids, get_did_atime, touch_dids, attach_dids,
-                            get_metadata, set_metadata, get_did)
+                            get_metadata, get_metadata_bulk, set_metadata, get_did)
 from rucio.core.rse import get_rse_id
 from rucio.core.replica import add_replica
 from rucio.db.sqla.constants import DIDType
@@ -116,6 +116,19 @@ class TestDIDCore:
         assert_equal(get_did(scope=tmp_scope, name=tmp_dsn1, dynamic=True)['bytes'], 20)
         assert_equal(get_did(scope=tmp_scope, name=tmp_dsn4, dynamic=True)['bytes'], 20)
 
+    def test_get_metadata_bulk(self):
+        """ DATA IDENTIFIERS (CORE): Get the metadata of a list of dids"""
+        tmp_scope = 'mock'
+        dsns = ['dsn_%s' % generate_uuid() for i in xrange(5)]
+        for dsn in dsns:
+            add_did(scope=tmp_scope, name=dsn, type=DIDType.DATASET, account='root')
+
+        dids = [{'scope': tmp_scope, 'name': dsn} for dsn in dsns] + [{'scope': tmp_scope, 'name': 'dsn_%s' % generate_uuid()}]
+        metadata = dict((meta['name'], meta) for meta in get_metadata_bulk(dids=dids, chunk_size=2))
+        assert_equal(sorted(metadata.keys()), sorted(dsns))
+        for dsn in dsns:
+            assert_equal(metadata[dsn], get_metadata(scope=tmp_scope, name=dsn))
+
 
 class TestDIDApi:
 
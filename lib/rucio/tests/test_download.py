@@ -0,0 +1,132 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+import os
+import shutil
+import tempfile
+import time
+
+from threading import Event
+
+from nose.tools import assert_equal, assert_false, assert_true
+
+from rucio.client.downloadclient import DownloadClient, StreamingAdler32
+from rucio.common.exception import RucioException
+from rucio.common.utils import adler32
+from rucio.rse import rsemanager as rsemgr
+
+
+class MockReadProtocol(object):
+    """ Read protocol writing part of the file, then blocking or failing as requested. """
+
+    def __init__(self, content, failures=0, block=None):
+        self.content = content
+        self.failures = failures
+        self.block = block
+        self.connected = 0
+        self.closed = 0
+
+    def connect(self):
+        self.connected += 1
+
+    def close(self):
+        self.closed += 1
+
+    def get(self, pfn, dest):
+        with open(dest, 'wb') as stream:
+            stream.write(self.content[:len(self.content) / 2])
+            stream.flush()
+            if self.block:
+                self.block.wait()
+            if self.failures:
+                self.failures -= 1
+                raise RucioException('Connection reset by peer')
+            stream.write(self.content[len(self.content) / 2:])
+
+
+class TestDownloadClient():
+
+    def setup(self):
+        self.dest_dir = tempfile.mkdtemp()
+        self.protocols = {}
+        self.get_rse_info, self.create_protocol = rsemgr.get_rse_info, rsemgr.create_protocol
+        rsemgr.get_rse_info = lambda rse: {'rse': rse, 'availability_read': True, 'rse_type': 'DISK', 'protocols': []}
+        rsemgr.create_protocol = lambda rse_info, operation, scheme: self.protocols[rse_info['rse']]
+
+    def teardown(self):
+        rsemgr.get_rse_info, rsemgr.create_protocol = self.get_rse_info, self.create_protocol
+        shutil.rmtree(self.dest_dir)
+
+    def __file(self, rses):
+        return {'scope': 'mock', 'name': 'file', 'bytes': 1024, 'adler32': None, 'dest_dir': self.dest_dir,
+                'rses': dict((rse, ['mock://%s/mock/file' % rse]) for rse in rses)}
+
+    def test_streaming_adler32(self):
+        """ DOWNLOAD (CLIENT): Checksum computed while the file is written """
+
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            follower = StreamingAdler32(path, poll_interval=0.01)
+            follower.start()
+            with open(path, 'wb') as stream:
+                for i in xrange(20):
+                    stream.write(os.urandom(64 * 1024) + '\n' * i)
+                    stream.flush()
+                    time.sleep(0.02)
+            assert_equal(follower.finish(), adler32(path))
+
+            # A restarted transfer truncates the file, the checksum starts over
+            follower = StreamingAdler32(path, poll_interval=0.01)
+            follower.start()
+            time.sleep(0.05)
+            with open(path, 'wb') as stream:
+                stream.write(os.urandom(1024))
+            assert_equal(follower.finish(), adler32(path))
+        finally:
+            os.unlink(path)
+
+    def test_download_timeout(self):
+        """ DOWNLOAD (CLIENT): A timed out transfer keeps its slot until it exits and its file is removed """
+        block = Event()
+        self.protocols['MOCK_SLOW'] = MockReadProtocol(os.urandom(1024), block=block)
+        client = DownloadClient(client=None, threads_per_rse=1, transfer_timeout=1)
+        try:
+            result = client.download([self.__file(['MOCK_SLOW'])])[0]
+            assert_equal(result['state'], 'FAILED')
+            assert_equal(result['attempts'], 1)
+
+            # The abandoned transfer is still running
+            semaphore = client._DownloadClient__rse_semaphores['MOCK_SLOW']
+            assert_false(semaphore.acquire(False))
+            assert_equal(self.protocols['MOCK_SLOW'].closed, 0)
+            assert_equal(os.listdir(self.dest_dir), ['file.MOCK_SLOW.1.part'])
+        finally:
+            block.set()
+
+        for _ in xrange(50):
+            if self.protocols['MOCK_SLOW'].closed:
+                break
+            time.sleep(0.1)
+        assert_equal(self.protocols['MOCK_SLOW'].closed, 1)
+        assert_equal(os.listdir(self.dest_dir), [])
+        assert_true(semaphore.acquire(False))
+
+    def test_download_retry(self):
+        """ DOWNLOAD (CLIENT): A failed attempt is retried and its partial file removed """
+        content = os.urandom(1024)
+        self.protocols['MOCK'] = MockReadProtocol(content, failures=1)
+        client = DownloadClient(client=None, retries_per_source=2)
+        result = client.download([self.__file(['MOCK'])])[0]
+        assert_equal(result['state'], 'DONE')
+        assert_equal(result['rse'], 'MOCK')
+        assert_equal(result['attempts'], 2)
+        assert_equal(os.listdir(self.dest_dir), ['file'])
+        with open(os.path.join(self.dest_dir, 'file'), 'rb') as stream:
+            assert_equal(stream.read(), content)
+        assert_equal(self.protocols['MOCK'].connected, 2)
+        assert_equal(self.protocols['MOCK'].closed, 2)
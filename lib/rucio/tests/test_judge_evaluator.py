@@ -15,7 +15,7 @@ from rucio.core.account_limit import set_account_limit
 from rucio.core.did import add_did, attach_dids, detach_dids
 from rucio.core.lock import get_replica_locks, get_dataset_locks
 from rucio.core.rse import add_rse_attribute, get_rse
-from rucio.core.rule import add_rule, get_rule
+from rucio.core.rule import add_rule, get_rule, get_updated_dids
 from rucio.daemons.judge.evaluator import re_evaluator
 from rucio.daemons.abacus.account import account_update
 from rucio.db.sqla.constants import DIDType
@@ -233,3 +233,21 @@ class TestJudgeEvaluator():
         re_evaluator(once=True)
 
         assert(8 == get_rule(rule_id)['locks_ok_cnt'])
+
+    def test_judge_collapse_updated_dids(self):
+        """ JUDGE EVALUATOR: Test the judge with many attachments to the same dataset"""
+        scope = 'mock'
+        dataset = 'dataset_' + str(uuid())
+        add_did(scope, dataset, DIDType.from_sym('DATASET'), 'jdoe')
+
+        rule_id = add_rule(dids=[{'scope': scope, 'name': dataset}], account='jdoe', copies=1, rse_expression=self.rse1, grouping='DATASET', weight=None, lifetime=None, locked=False, subscription_id=None)[0]
+
+        # One updated_did per attachment
+        for i in xrange(10):
+            attach_dids(scope, dataset, create_files(1, scope, self.rse1), 'jdoe')
+
+        # Fake judge
+        re_evaluator(once=True, group_size=3)
+
+        assert(10 == get_rule(rule_id)['locks_ok_cnt'])
+        assert(not [did for did in get_updated_dids(total_workers=0, worker_number=0, limit=None) if (did.scope, did.name) == (scope, dataset)])
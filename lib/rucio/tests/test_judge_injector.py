@@ -14,10 +14,11 @@ from rucio.common.exception import RuleNotFound
 from rucio.common.utils import generate_uuid as uuid
 from rucio.core.account_limit import set_account_limit
 from rucio.core.did import add_did, attach_dids
-from rucio.core.lock import get_replica_locks
+from rucio.core.lock import get_replica_locks, get_replica_locks_for_rule_id
+from rucio.core.replica import get_replica
 from rucio.core.rse import add_rse_attribute, get_rse
-from rucio.core.rule import add_rule, get_rule, approve_rule, deny_rule, list_rules
-from rucio.daemons.judge.injector import rule_injector
+from rucio.core.rule import add_rule, get_rule, approve_rule, deny_rule, list_rules, inject_rules
+from rucio.daemons.judge.injector import rule_injector, group_injected_rules
 from rucio.db.sqla.constants import DIDType, RuleState
 from rucio.tests.test_rule import create_files, tag_generator
 
@@ -82,6 +83,59 @@ class TestJudgeEvaluator():
             assert(len(get_replica_locks(scope=file['scope'], name=file['name'])) == 2)
         assert(get_rule(rule_id)['state'] == RuleState.REPLICATING)
 
+    def test_judge_inject_rules(self):
+        """ JUDGE INJECTOR: Test the judge when injecting several rules on the same did"""
+        scope = 'mock'
+        files = create_files(3, scope, self.rse1)
+        dataset = 'dataset_' + str(uuid())
+        add_did(scope, dataset, DIDType.from_sym('DATASET'), 'jdoe')
+        attach_dids(scope, dataset, files, 'jdoe')
+
+        rule_id1 = add_rule(dids=[{'scope': scope, 'name': dataset}], account='jdoe', copies=1, rse_expression=self.rse3, grouping='DATASET', weight=None, lifetime=None, locked=False, subscription_id=None, asynchronous=True)[0]
+        rule_id2 = add_rule(dids=[{'scope': scope, 'name': dataset}], account='jdoe', copies=2, rse_expression=self.T1, grouping='NONE', weight=None, lifetime=None, locked=False, subscription_id=None, asynchronous=True)[0]
+
+        assert([rule_id1, rule_id2] in group_injected_rules([(rule_id1, scope, dataset), (uuid(), scope, 'other'), (rule_id2, scope, dataset)], 2))
+
+        inject_rules(rule_ids=[rule_id1, rule_id2])
+
+        # Check if the Locks are created properly
+        for file in files:
+            locks = get_replica_locks(scope=file['scope'], name=file['name'])
+            assert(len([lock for lock in locks if lock['rule_id'] == rule_id1]) == 1)
+            assert(len([lock for lock in locks if lock['rule_id'] == rule_id2]) == 2)
+        assert(get_rule(rule_id1)['state'] == RuleState.REPLICATING)
+        assert(get_rule(rule_id2)['state'] == RuleState.REPLICATING)
+
+    def test_judge_inject_rules_container_shared_file(self):
+        """ JUDGE INJECTOR: Test the judge when injecting rules on a container with a file in two datasets"""
+        scope = 'mock'
+        container = 'container_' + str(uuid())
+        add_did(scope, container, DIDType.from_sym('CONTAINER'), 'jdoe')
+        shared_file = create_files(1, scope, self.rse1)
+        all_files = list(shared_file)
+        for i in xrange(2):
+            files = create_files(2, scope, self.rse1)
+            all_files.extend(files)
+            dataset = 'dataset_' + str(uuid())
+            add_did(scope, dataset, DIDType.from_sym('DATASET'), 'jdoe')
+            attach_dids(scope, dataset, files + shared_file, 'jdoe')
+            attach_dids(scope, container, [{'scope': scope, 'name': dataset}], 'jdoe')
+
+        rule_id1 = add_rule(dids=[{'scope': scope, 'name': container}], account='jdoe', copies=1, rse_expression=self.rse3, grouping='DATASET', weight=None, lifetime=None, locked=False, subscription_id=None, asynchronous=True)[0]
+        rule_id2 = add_rule(dids=[{'scope': scope, 'name': container}], account='jdoe', copies=1, rse_expression=self.rse4, grouping='NONE', weight=None, lifetime=None, locked=False, subscription_id=None, asynchronous=True)[0]
+
+        inject_rules(rule_ids=[rule_id1, rule_id2])
+
+        # Check that the shared file is locked once per rule
+        for rule_id, rse in ((rule_id1, self.rse3), (rule_id2, self.rse4)):
+            locks = get_replica_locks_for_rule_id(rule_id)
+            assert(len(locks) == len(all_files))
+            assert(set((lock['scope'], lock['name']) for lock in locks) == set((file['scope'], file['name']) for file in all_files))
+            assert(get_rule(rule_id)['locks_replicating_cnt'] == len(all_files))
+            assert(get_rule(rule_id)['state'] == RuleState.REPLICATING)
+            for file in all_files:
+                assert(get_replica(rse=rse, scope=file['scope'], name=file['name'])['lock_cnt'] == 1)
+
     def test_judge_ask_approval(self):
         """ JUDGE INJECTOR: Test the judge when asking approval for a rule"""
         scope = 'mock'
@@ -52,3 +52,15 @@ class TestMessagesCore():
         delete_messages(to_delete)
 
         assert_equal(retrieve_messages(), [])
+
+    def test_delete_messages_chunked(self):
+        """ MESSAGE (CORE): Test archival and deletion of messages in chunks """
+
+        truncate_messages()
+        for i in xrange(25):
+            add_message(event_type='TEST', payload={'number': i})
+
+        ids = [message['id'] for message in retrieve_messages(25)]
+        assert_equal(len(ids), 25)
+        assert_equal(delete_messages(ids + ids[:5], chunk_size=7), 25)
+        assert_equal(retrieve_messages(), [])
@@ -9,11 +9,14 @@
 # - Vincent Garonne,  <vincent.garonne@cern.ch> , 2012
 # - Cedric Serfon, <cedric.serfon@cern.ch>, 2013
 
-from nose.tools import assert_true, assert_false
+from nose.tools import assert_true, assert_false, assert_equal
 
 from rucio.api.permission import has_permission
+from rucio.core.account import add_account, add_account_attribute, set_account_status
+from rucio.core.permission import get_decision_cache_stats
 from rucio.core.scope import add_scope
-from rucio.tests.common import scope_name_generator
+from rucio.db.sqla.constants import AccountStatus, AccountType
+from rucio.tests.common import account_name_generator, scope_name_generator
 
 
 class TestPermissionCoreApi():
@@ -58,3 +61,27 @@ class TestPermissionCoreApi():
         gsscred = 'ddmlab@CERN.CH'
         assert_true(has_permission(issuer='root', action='get_auth_token_gss', kwargs={'account': 'root', 'gsscred': gsscred}))
         assert_false(has_permission(issuer='root', action='get_auth_token_gss', kwargs={'account': self.usr, 'gsscred': gsscred}))
+
+    def test_permission_decision_cache(self):
+        """ PERMISSION(CORE): Check the memoization of permission decisions """
+        account = account_name_generator()
+        add_account(account=account, type=AccountType.USER, email='rucio@email.com')
+        hits = get_decision_cache_stats()['hits']
+        assert_false(has_permission(issuer=account, action='add_rse', kwargs={'rse': 'MOCK'}))
+        assert_false(has_permission(issuer=account, action='add_rse', kwargs={'rse': 'MOCK'}))
+        assert_equal(get_decision_cache_stats()['hits'], hits + 1)
+        # A change of the account attributes invalidates the decisions
+        add_account_attribute(account=account, key='admin', value=True)
+        assert_true(has_permission(issuer=account, action='add_rse', kwargs={'rse': 'MOCK'}))
+        # A suspended account loses its attributes
+        set_account_status(account=account, status=AccountStatus.SUSPENDED)
+        assert_false(has_permission(issuer=account, action='add_rse', kwargs={'rse': 'MOCK'}))
+
+    def test_permission_decision_cache_ownership(self):
+        """ PERMISSION(CORE): Check that the decisions depending on ownerships are not memoized """
+        scope = scope_name_generator()
+        add_scope(scope=scope, account='root')
+        hits = get_decision_cache_stats()['hits']
+        assert_false(has_permission(issuer='spock', action='add_did', kwargs={'scope': scope}))
+        assert_false(has_permission(issuer='spock', action='add_did', kwargs={'scope': scope}))
+        assert_equal(get_decision_cache_stats()['hits'], hits)
@@ -10,10 +10,40 @@
   - Vincent Garonne, <vincent.garonne@cern.ch>, 2013-2016
 '''
 
+from nose.tools import assert_equal
+
+from rucio.common.exception import RSEAccessDenied, RucioException, ServiceUnavailable, SourceNotFound
 from rucio.common.utils import generate_uuid
 from rucio.core import rse as rse_core
 from rucio.core import replica as replica_core
-from rucio.daemons.reaper.reaper import reaper
+from rucio.daemons.reaper.reaper import reaper, __delete_bulk as delete_bulk
+from rucio.db.sqla.constants import ReplicaState
+
+
+class MockBulkProtocol(object):
+    """ Deletion protocol removing the files one at a time, like the bulk deletion of gfal. """
+
+    def __init__(self, files, broken=(), busy=(), unreachable=False):
+        self.attributes = {'scheme': 'mock'}
+        self.bulk_delete = True
+        self.files = set(files)
+        self.broken = set(broken)
+        self.busy = set(busy)
+        self.unreachable = unreachable
+        self.calls = []
+
+    def delete(self, path):
+        self.calls.append(path)
+        if self.unreachable:
+            raise RSEAccessDenied('Connection refused')
+        for pfn in [path] if isinstance(path, basestring) else path:
+            if pfn in self.broken:
+                raise RucioException('Permission denied')
+            if pfn in self.busy:
+                raise ServiceUnavailable('Too many requests')
+            if pfn not in self.files:
+                raise SourceNotFound('No such file')
+            self.files.remove(pfn)
 
 
 class TestReaper:
@@ -33,3 +63,39 @@ class TestReaper:
         rses = [rse_core.get_rse('MOCK'), ]
         reaper(once=True, rses=rses)
         reaper(once=True, rses=rses)
+
+    def test_delete_bulk(self):
+        """ REAPER (DAEMON): Test the bulk deletion and its one by one fallback."""
+        rse, rse_info = {'rse': 'MOCK', 'staging_area': False}, {'rse': 'MOCK'}
+        replicas = [{'scope': 'mock', 'name': 'lfn' + generate_uuid(), 'bytes': 1L, 'state': ReplicaState.AVAILABLE} for _ in xrange(4)]
+        for replica in replicas:
+            replica['pfn'] = 'mock://localhost/%s' % replica['name']
+        pfns = [replica['pfn'] for replica in replicas]
+
+        prot = MockBulkProtocol(files=pfns)
+        assert_equal(delete_bulk(prot, replicas, rse, rse_info, ''), (replicas, []))
+        assert_equal(prot.calls, [pfns])
+        assert_equal(prot.files, set())
+
+        # The bulk call removes the first file and fails on the second one:
+        # the first file is reported as deleted and only the second one as failed
+        prot = MockBulkProtocol(files=pfns, broken=[pfns[1]])
+        deleted, remaining = delete_bulk(prot, replicas, rse, rse_info, '')
+        assert_equal(deleted, [replicas[0], replicas[2], replicas[3]])
+        assert_equal(remaining, [])
+        assert_equal(prot.calls, [pfns] + pfns)
+        assert_equal(prot.files, set([pfns[1]]))
+
+        # The storage becomes unavailable during the one by one deletion:
+        # the files not yet deleted are handed back
+        prot = MockBulkProtocol(files=pfns, busy=[pfns[2]])
+        deleted, remaining = delete_bulk(prot, replicas, rse, rse_info, '')
+        assert_equal(deleted, replicas[:2])
+        assert_equal(remaining, replicas[2:])
+        assert_equal(prot.calls, [pfns] + pfns[:3])
+        assert_equal(prot.files, set(pfns[2:]))
+
+        # The storage cannot be accessed: the whole batch is handed back
+        prot = MockBulkProtocol(files=pfns, unreachable=True)
+        assert_equal(delete_bulk(prot, replicas, rse, rse_info, ''), ([], replicas))
+        assert_equal(prot.calls, [pfns])
@@ -31,7 +31,7 @@ from rucio.core.replica import (add_replica, add_replicas, delete_replicas,
                                 update_replica_lock_counter, get_replica, list_replicas,
                                 declare_bad_file_replicas, list_bad_replicas,
                                 update_replicas_paths, update_replica_state,
-                                get_replica_atime, touch_replica)
+                                get_replica_atime, touch_replica, touch_replicas)
 from rucio.daemons.necromancer import run
 from rucio.rse import rsemanager as rsemgr
 from rucio.web.rest.authentication import app as auth_app
@@ -225,6 +225,26 @@ class TestReplicaCore:
         for i in range(0, nbfiles - 1):
             assert_equal(None, get_replica_atime({'scope': files2[i]['scope'], 'name': files2[i]['name'], 'rse': 'MOCK'}))
 
+    def test_touch_replicas_bulk(self):
+        """ REPLICA (CORE): Bulk touch replicas accessed_at timestamp"""
+        tmp_scope = 'mock'
+        nbfiles = 5
+        files = [{'scope': tmp_scope, 'name': 'file_%s' % generate_uuid(), 'bytes': 1L, 'adler32': '0cc737eb', 'meta': {'events': 10}} for i in xrange(nbfiles)]
+        add_replicas(rse='MOCK', files=files, account='root', ignore_availability=True)
+
+        now = datetime.utcnow()
+        now -= timedelta(microseconds=now.microsecond)
+        earlier = now - timedelta(hours=1)
+
+        # duplicated keys are merged and the latest timestamp wins
+        replicas = [{'scope': f['scope'], 'name': f['name'], 'rse': 'MOCK', 'accessed_at': now} for f in files]
+        replicas.append({'scope': files[0]['scope'], 'name': files[0]['name'], 'rse': 'MOCK', 'accessed_at': earlier})
+        assert_equal(True, touch_replicas(replicas))
+
+        for f in files:
+            assert_equal(now, get_replica_atime({'scope': f['scope'], 'name': f['name'], 'rse': 'MOCK'}))
+            assert_equal(now, get_did_atime(scope=tmp_scope, name=f['name']))
+
     def test_list_replicas_all_states(self):
         """ REPLICA (CORE): list file replicas with all_states"""
         tmp_scope = 'mock'
@@ -0,0 +1,108 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+from nose.tools import assert_equal
+
+from rucio.common.utils import generate_uuid
+from rucio.core import request_counter
+from rucio.core.replica import add_replica
+from rucio.core.request import (archive_request, archive_requests, get_request, queue_requests,
+                                release_waiting_requests, set_request_state, set_requests_state)
+from rucio.core.rse import add_rse, set_rse_transfer_limits
+from rucio.db.sqla.constants import RequestState, RequestType
+from rucio.tests.common import rse_name_generator
+
+
+def new_requests(rse_id, activity, nb_files):
+    """ Returns transfer requests of new files to the RSE. """
+    requests = []
+    for _ in xrange(nb_files):
+        name = 'file_%s' % generate_uuid()
+        add_replica(rse='MOCK', scope='mock', name=name, bytes=1L, account='root')
+        requests.append({'request_type': RequestType.TRANSFER, 'scope': 'mock', 'name': name, 'dest_rse_id': rse_id,
+                         'rule_id': generate_uuid(), 'retry_count': 0,
+                         'attributes': {'activity': activity, 'bytes': 1, 'md5': None, 'adler32': None, 'account': 'root'}})
+    return requests
+
+
+def get_counters(rse_id):
+    """ Returns the request counters of the RSE by (activity, state). """
+    return dict(((activity, state), counter) for activity, dest_rse_id, account, state, counter in request_counter.get_counters() if dest_rse_id == rse_id)
+
+
+class TestRequestCore():
+
+    def test_request_counters(self):
+        """ REQUEST (CORE): The request counters follow the queued, released, updated and archived requests """
+        rse = rse_name_generator()
+        rse_id = add_rse(rse)
+        set_rse_transfer_limits(rse, 'throttled', rse_id=rse_id, max_transfers=1)
+
+        throttled, free = new_requests(rse_id, 'throttled', 3), new_requests(rse_id, 'free', 2)
+        queue_requests(throttled + free)
+        assert_equal(get_counters(rse_id), {('throttled', RequestState.WAITING): 3, ('free', RequestState.QUEUED): 2})
+
+        assert_equal(release_waiting_requests(rse, activity='throttled', rse_id=rse_id, count=2), 2)
+        assert_equal(get_counters(rse_id), {('throttled', RequestState.WAITING): 1, ('throttled', RequestState.QUEUED): 2, ('free', RequestState.QUEUED): 2})
+
+        # A submitted request is still in transfer, a request without sources is not
+        set_request_state(free[0]['request_id'], RequestState.SUBMITTED)
+        assert_equal(get_counters(rse_id)[('free', RequestState.QUEUED)], 2)
+        set_request_state(free[0]['request_id'], RequestState.NO_SOURCES)
+        assert_equal(get_counters(rse_id)[('free', RequestState.QUEUED)], 1)
+
+        archive_request(free[0]['request_id'])
+        released = [req['request_id'] for req in throttled if get_request(req['request_id'])['state'] == RequestState.QUEUED]
+        archive_requests([free[1]['request_id'], released[0]])
+        assert_equal(get_counters(rse_id), {('throttled', RequestState.WAITING): 1, ('throttled', RequestState.QUEUED): 1})
+
+        archive_requests([req['request_id'] for req in throttled])
+        assert_equal(get_counters(rse_id), {})
+
+    def test_request_counters_state_changes(self):
+        """ REQUEST (CORE): The request counters follow a request changing state several times """
+        rse = rse_name_generator()
+        rse_id = add_rse(rse)
+        requests = new_requests(rse_id, 'free', 2)
+        queue_requests(requests)
+        request_id = requests[0]['request_id']
+
+        set_request_state(request_id, RequestState.SUBMITTING)
+        set_request_state(request_id, RequestState.SUBMITTED)
+        assert_equal(get_counters(rse_id), {('free', RequestState.QUEUED): 2})
+
+        # The second terminal state does not count the request out again
+        set_request_state(request_id, RequestState.NO_SOURCES)
+        set_request_state(request_id, RequestState.LOST)
+        assert_equal(get_counters(rse_id), {('free', RequestState.QUEUED): 1})
+
+        set_requests_state([req['request_id'] for req in requests], RequestState.QUEUED)
+        set_requests_state([req['request_id'] for req in requests], RequestState.QUEUED)
+        assert_equal(get_counters(rse_id), {('free', RequestState.QUEUED): 2})
+
+        set_requests_state([req['request_id'] for req in requests], RequestState.WAITING)
+        assert_equal(get_counters(rse_id), {('free', RequestState.WAITING): 2})
+
+    def test_queue_requests_limits(self):
+        """ REQUEST (CORE): The transfer limits of each (activity, destination RSE) apply to their own requests in a mixed batch """
+        rse, other_rse = rse_name_generator(), rse_name_generator()
+        rse_id, other_rse_id = add_rse(rse), add_rse(other_rse)
+        set_rse_transfer_limits(rse, 'throttled', rse_id=rse_id, max_transfers=1)
+
+        requests = []
+        for throttled, free, other_throttled, other_free in zip(new_requests(rse_id, 'throttled', 3), new_requests(rse_id, 'free', 3),
+                                                                new_requests(other_rse_id, 'throttled', 3), new_requests(other_rse_id, 'free', 3)):
+            requests.extend([throttled, free, other_throttled, other_free])
+        # The same transfer twice in the batch is queued once
+        requests.append(dict(requests[0], attributes=dict(requests[0]['attributes'])))
+        queue_requests(requests, batch_size=5)
+
+        for req in requests[:-1]:
+            expected = RequestState.WAITING if (req['attributes']['activity'], req['dest_rse_id']) == ('throttled', rse_id) else RequestState.QUEUED
+            assert_equal(get_request(req['request_id'])['state'], expected)
+        assert_equal(get_counters(rse_id), {('throttled', RequestState.WAITING): 3, ('free', RequestState.QUEUED): 3})
+        assert_equal(get_counters(other_rse_id), {('throttled', RequestState.QUEUED): 3, ('free', RequestState.QUEUED): 3})
@@ -26,7 +26,9 @@ from rucio.common.exception import (Duplicate, RSENotFound, RSEProtocolNotSuppor
                                     InvalidObject, RSEProtocolDomainNotSupported, RSEProtocolPriorityError, ResourceTemporaryUnavailable)
 from rucio.common.utils import generate_uuid
 from rucio.core.rse import (add_rse, get_rse_id, del_rse, list_rses, rse_exists, add_rse_attribute, list_rse_attributes,
-                            set_rse_transfer_limits, get_rse_transfer_limits, delete_rse_transfer_limits)
+                            set_rse_transfer_limits, get_rse_transfer_limits, delete_rse_transfer_limits,
+                            get_cached_rse, get_cached_rse_id, get_cached_rse_name, list_cached_rse_attributes, update_rse)
+from rucio.db.sqla.session import get_session
 from rucio.rse import rsemanager as mgr
 from rucio.tests.common import rse_name_generator
 from rucio.web.rest.rse import app as rse_app
@@ -71,6 +73,41 @@ class TestRSECoreApi():
         assert_in('tier', attr.keys())
         assert_in(rse, attr.keys())
 
+    def test_rse_snapshot(self):
+        """ RSE (CORE): Test the lookups and the invalidation of the RSE metadata snapshot """
+        rse = rse_name_generator()
+        rse_id = add_rse(rse)
+        assert_equal(get_cached_rse_id(rse), rse_id)
+        assert_equal(get_cached_rse_name(rse_id), rse)
+
+        add_rse_attribute(rse=rse, key='tier', value='1')
+        assert_equal(list_cached_rse_attributes(rse=None, rse_id=rse_id)['tier'], '1')
+
+        update_rse(rse, {'availability_write': False})
+        assert_equal(mgr.get_rse_info(rse)['availability_write'], False)
+
+        # A deleted RSE is still resolved by name and id, as by get_rse_id and get_rse_name
+        del_rse(rse)
+        assert_equal(get_cached_rse_id(rse), rse_id)
+        assert_equal(get_cached_rse_name(rse_id), rse)
+        with assert_raises(RSENotFound):
+            get_cached_rse(rse_id=rse_id)
+        with assert_raises(RSENotFound):
+            get_cached_rse_id(rse_name_generator())
+
+    def test_rse_snapshot_uncommitted(self):
+        """ RSE (CORE): Test that the RSE metadata snapshot is only invalidated once the changes are committed """
+        rse = rse_name_generator()
+        rse_id = add_rse(rse)
+        assert_equal(list_cached_rse_attributes(rse=None, rse_id=rse_id).get('tier'), None)
+
+        session = get_session()
+        add_rse_attribute(rse=rse, key='tier', value='1', session=session)
+        assert_equal(list_cached_rse_attributes(rse=None, rse_id=rse_id, session=session).get('tier'), None)
+        session.commit()
+        assert_equal(list_cached_rse_attributes(rse=None, rse_id=rse_id)['tier'], '1')
+        del_rse(rse)
+
     def test_create_and_check_rse_transfer_limits(self):
         """ RSE (CORE): Test the creation, query, and deletion of a RSE transfer limit"""
         rse = rse_name_generator()
@@ -120,6 +120,15 @@ class TestRSEExpressionParserCore():
         """ RSE_EXPRESSION_PARSER (CORE) Test some complicated expression 2"""
         assert_equal(sorted([rse['id'] for rse in rse_expression_parser.parse_expression("(((((%s))))|%s=us)&%s|(%s=at|%s=de)" % (self.tag1, self.attribute, self.tag2, self.attribute, self.attribute))]), sorted([self.rse1_id, self.rse2_id, self.rse5_id]))
 
+    def test_attribute_index_invalidation(self):
+        """ RSE_EXPRESSION_PARSER (CORE) Test that a changed RSE attribute is seen by an already evaluated expression"""
+        assert_equal([item['id'] for item in rse_expression_parser.parse_expression("%s=uk" % self.attribute)], [self.rse4_id])
+        rse.del_rse_attribute(self.rse4, self.attribute)
+        rse.add_rse_attribute(self.rse4, self.attribute, "fr")
+        assert_equal(sorted([item['id'] for item in rse_expression_parser.parse_expression("%s=fr" % self.attribute)]), sorted([self.rse3_id, self.rse4_id]))
+        with assert_raises(InvalidRSEExpression):
+            rse_expression_parser.parse_expression("%s=uk" % self.attribute)
+
     def test_list_rses_based_on_availability(self):
         """ RSE_EXPRESSION_PARSER (CORE) List rses based on availability filter"""
         rseWRITE_name = rse_name_generator()
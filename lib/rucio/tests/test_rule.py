@@ -32,7 +32,7 @@ from rucio.common.exception import (RuleNotFound, AccessDenied, InsufficientAcco
 from rucio.core.account_counter import get_counter as get_account_counter
 from rucio.daemons.judge.evaluator import re_evaluator
 from rucio.core.did import add_did, attach_dids, set_status
-from rucio.core.lock import get_replica_locks, get_dataset_locks, successful_transfer
+from rucio.core.lock import get_replica_locks, get_replica_locks_for_rule_id, get_dataset_locks, successful_transfer, successful_transfers, failed_transfers
 from rucio.core.account import add_account_attribute
 from rucio.core.account_limit import set_account_limit
 from rucio.core.request import get_request_by_did
@@ -350,6 +350,31 @@ class TestReplicationRuleCore():
                 assert(len(t1.intersection(rse_locks)) == 2)
                 assert(len(first_locks.intersection(rse_locks)) == 2)
 
+    def test_add_rule_container_shared_file(self):
+        """ REPLICATION RULE (CORE): Add a replication rule on a container with a file in two datasets"""
+        scope = 'mock'
+        for grouping in ('NONE', 'DATASET'):
+            container = 'container_' + str(uuid())
+            add_did(scope, container, DIDType.from_sym('CONTAINER'), 'jdoe')
+            shared_file = create_files(1, scope, self.rse1)
+            all_files = list(shared_file)
+            for i in xrange(2):
+                files = create_files(2, scope, self.rse1)
+                all_files.extend(files)
+                dataset = 'dataset_' + str(uuid())
+                add_did(scope, dataset, DIDType.from_sym('DATASET'), 'jdoe')
+                attach_dids(scope, dataset, files + shared_file, 'jdoe')
+                attach_dids(scope, container, [{'scope': scope, 'name': dataset}], 'jdoe')
+
+            rule_id = add_rule(dids=[{'scope': scope, 'name': container}], account='jdoe', copies=1, rse_expression=self.rse4, grouping=grouping, weight=None, lifetime=None, locked=False, subscription_id=None)[0]
+
+            locks = get_replica_locks_for_rule_id(rule_id)
+            assert_equal(len(locks), len(all_files))
+            assert_equal(set((lock['scope'], lock['name']) for lock in locks), set((file['scope'], file['name']) for file in all_files))
+            assert_equal(get_rule(rule_id)['locks_replicating_cnt'], len(all_files))
+            for file in all_files:
+                assert_equal(get_replica(rse=self.rse4, scope=file['scope'], name=file['name'])['lock_cnt'], 1)
+
     def test_add_rule_dataset_none_with_weights(self):
         """ REPLICATION RULE (CORE): Add a replication rule on a dataset, NONE Grouping, WEIGHTS"""
         scope = 'mock'
@@ -641,6 +666,50 @@ class TestReplicationRuleCore():
 
         assert(True is check_dataset_ok_callback(scope, dataset, self.rse3, rule_id))
 
+    def test_dataset_callback_bulk(self):
+        """ REPLICATION RULE (CORE): Test dataset callback with bulk successful transfers"""
+
+        scope = 'mock'
+        files = create_files(3, scope, self.rse1, bytes=100)
+        dataset = 'dataset_' + str(uuid())
+        add_did(scope, dataset, DIDType.from_sym('DATASET'), 'jdoe')
+        attach_dids(scope, dataset, files, 'jdoe')
+
+        set_status(scope=scope, name=dataset, open=False)
+
+        rule_id = add_rule(dids=[{'scope': scope, 'name': dataset}], account='jdoe', copies=1, rse_expression=self.rse3, grouping='DATASET', weight=None, lifetime=None, locked=False, subscription_id=None, notify='C')[0]
+
+        successful_transfers([{'scope': scope, 'name': file['name'], 'rse_id': self.rse3_id} for file in files[:2]], nowait=False)
+        assert(False is check_dataset_ok_callback(scope, dataset, self.rse3, rule_id))
+        assert_equal(get_rule(rule_id)['locks_ok_cnt'], 2)
+
+        successful_transfers([{'scope': scope, 'name': file['name'], 'rse_id': self.rse3_id} for file in files], nowait=False)
+        assert(True is check_dataset_ok_callback(scope, dataset, self.rse3, rule_id))
+        rule = get_rule(rule_id)
+        assert_equal(rule['state'], RuleState.OK)
+        assert_equal((rule['locks_ok_cnt'], rule['locks_replicating_cnt'], rule['locks_stuck_cnt']), (3, 0, 0))
+
+    def test_failed_transfers_bulk(self):
+        """ REPLICATION RULE (CORE): Test bulk failed transfers"""
+
+        scope = 'mock'
+        files = create_files(3, scope, self.rse1, bytes=100)
+        dataset = 'dataset_' + str(uuid())
+        add_did(scope, dataset, DIDType.from_sym('DATASET'), 'jdoe')
+        attach_dids(scope, dataset, files, 'jdoe')
+
+        rule_id = add_rule(dids=[{'scope': scope, 'name': dataset}], account='jdoe', copies=1, rse_expression=self.rse3, grouping='DATASET', weight=None, lifetime=None, locked=False, subscription_id=None)[0]
+
+        failed_transfers([{'scope': scope, 'name': file['name'], 'rse_id': self.rse3_id, 'error_message': 'transfer failed'} for file in files[:2]], nowait=False)
+        rule = get_rule(rule_id)
+        assert_equal(rule['state'], RuleState.STUCK)
+        assert_equal(rule['error'], 'transfer failed')
+        assert_equal((rule['locks_ok_cnt'], rule['locks_replicating_cnt'], rule['locks_stuck_cnt']), (0, 1, 2))
+
+        successful_transfers([{'scope': scope, 'name': file['name'], 'rse_id': self.rse3_id} for file in files], nowait=False)
+        rule = get_rule(rule_id)
+        assert_equal((rule['locks_ok_cnt'], rule['locks_replicating_cnt'], rule['locks_stuck_cnt']), (3, 0, 0))
+
     def test_add_rule_with_purge(self):
         """ REPLICATION RULE (CORE): Add a replication rule with purge setting"""
         scope = 'mock'
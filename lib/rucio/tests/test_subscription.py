@@ -25,7 +25,7 @@ from rucio.core.did import add_did, set_new_dids
 from rucio.core.rse import add_rse, get_rse_id
 from rucio.core.rule import add_rule
 from rucio.core.scope import add_scope
-from rucio.daemons.transmogrifier import run
+from rucio.daemons.transmogrifier import run, SubscriptionMatcher
 from rucio.db.sqla.constants import DIDType
 from rucio.web.rest.authentication import app as auth_app
 from rucio.web.rest.subscription import app as subs_app
@@ -118,6 +118,26 @@ class TestSubscriptionCoreApi():
         for rule in list_subscription_rule_states(account='root', name=subscription_name):
             assert_equal(rule[3], 2)
 
+    def test_subscription_matcher(self):
+        """ SUBSCRIPTION (DAEMON): Test the compiled subscription matcher """
+        subscriptions = [{'id': uuid(), 'name': 'scope', 'updated_at': None, 'filter': dumps({'scope': ['data12'], 'project': self.projects})},
+                         {'id': uuid(), 'name': 'datatype', 'updated_at': None, 'filter': dumps({'datatype': ['AOD', 'ESD'], 'split_rule': 'true'})},
+                         {'id': uuid(), 'name': 'pattern', 'updated_at': None, 'filter': dumps({'pattern': '.*AOD.*', 'scope': ['mc.*']})},
+                         {'id': uuid(), 'name': 'invalid', 'updated_at': None, 'filter': '{'},
+                         {'id': uuid(), 'name': 'excluded', 'updated_at': None, 'filter': dumps({'excluded_pattern': '.*_tid'})}]
+        matcher = SubscriptionMatcher(subscriptions)
+
+        did = {'scope': 'data12_8TeV', 'name': 'data12_8TeV.00123.AOD'}
+        metadata = {'hidden': False, 'project': 'data12_8TeV', 'datatype': 'AOD'}
+        assert_equal([(sub['name'], split_rule) for sub, split_rule in matcher.match(did, metadata)], [('scope', False), ('datatype', True), ('excluded', False)])
+
+        did = {'scope': 'mc15_13TeV', 'name': 'mc15_13TeV.00123.AOD_tid'}
+        metadata = {'hidden': False, 'project': 'mc15_13TeV', 'datatype': 'EVNT'}
+        assert_equal([sub['name'] for sub, _ in matcher.match(did, metadata)], ['pattern'])
+
+        metadata['hidden'] = True
+        assert_equal(matcher.match(did, metadata), [])
+
 
 class TestSubscriptionRestApi():
 
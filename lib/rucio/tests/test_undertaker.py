@@ -11,11 +11,12 @@
 
 from datetime import datetime, timedelta
 
-from nose.tools import assert_not_equal
+from nose.tools import assert_not_equal, assert_raises
 
 from rucio.common.utils import generate_uuid
 from rucio.core.account_limit import set_account_limit
-from rucio.core.did import add_dids, attach_dids, list_expired_dids
+from rucio.common.exception import DataIdentifierNotFound
+from rucio.core.did import add_dids, attach_dids, get_did, list_expired_dids
 from rucio.core.replica import get_replica
 from rucio.core.rule import add_rules
 from rucio.core.rse import get_rse_id
@@ -80,3 +81,17 @@ class TestUndertaker:
 
         for did in list_expired_dids(limit=1000):
             assert(did['scope'] != dsn['scope'] and did['name'] != dsn['name'])
+
+    def test_undertaker_container_and_datasets(self):
+        """ UNDERTAKER (CORE): Test that expired containers and their expired datasets are deleted in one pass. """
+        tmp_scope = 'mock'
+        container = {'name': 'container_%s' % generate_uuid(), 'scope': tmp_scope, 'type': 'CONTAINER', 'lifetime': -1}
+        dsns = [{'name': 'dsn_%s' % generate_uuid(), 'scope': tmp_scope, 'type': 'DATASET', 'lifetime': -1} for i in xrange(3)]
+        add_dids(dids=dsns + [container], account='root')
+        attach_dids(scope=tmp_scope, name=container['name'], dids=[{'scope': tmp_scope, 'name': dsn['name']} for dsn in dsns], account='root')
+
+        undertaker(worker_number=1, total_workers=1, chunk_size=2, once=True)
+
+        for did in dsns + [container]:
+            with assert_raises(DataIdentifierNotFound):
+                get_did(scope=did['scope'], name=did['name'])
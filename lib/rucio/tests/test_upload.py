@@ -0,0 +1,90 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+import os
+import shutil
+import tempfile
+import time
+
+from nose.tools import assert_equal, assert_is_none
+
+from rucio.client.uploadclient import UploadClient, UploadJournal
+from rucio.rse import rsemanager as rsemgr
+
+
+class MockRegistrationClient(object):
+    """ Records the registration calls of the UploadClient. """
+
+    def __init__(self):
+        self.calls = []
+
+    def list_replicas(self, dids, all_states=False):
+        return []
+
+    def add_replicas(self, rse, files):
+        self.calls.append(('add_replicas', sorted(f['name'] for f in files)))
+
+    def update_replicas_states(self, rse, files):
+        self.calls.append(('update_replicas_states', sorted(f['name'] for f in files)))
+
+    def attach_dids_to_dids(self, attachments, ignore_duplicate=False):
+        self.calls.append(('attach_dids_to_dids', sorted(did['name'] for did in attachments[0]['dids'])))
+
+
+class TestUploadClient():
+
+    def test_upload_journal(self):
+        """ UPLOAD (CLIENT): Resume state from the upload journal """
+
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        os.unlink(path)
+        file = {'scope': 'user.jdoe', 'name': 'file_1', 'path': '/tmp/file_1', 'bytes': 42, 'mtime': 1000, 'adler32': '0cc737eb', 'md5': 'dbc0c0b3a1f1e3e7b34e0a8ab9b0a4a1'}
+        try:
+            journal = UploadJournal(path)
+            journal.record(file, 'CHECKSUMMED')
+            journal.record(file, 'TRANSFERRED')
+            journal.close()
+            with open(path, 'a') as stream:
+                stream.write('{"did": "user.jdoe:file_2", "pa')  # interrupted write
+
+            journal = UploadJournal(path)
+            assert_equal(journal.get(file)['state'], 'TRANSFERRED')
+            assert_equal(journal.get(file)['adler32'], '0cc737eb')
+            changed = dict(file, mtime=2000)
+            assert_is_none(journal.get(changed))
+            journal.close()
+        finally:
+            os.unlink(path)
+
+    def test_upload_registration_batches(self):
+        """ UPLOAD (CLIENT): Transferred files are registered and attached in batches """
+
+        source_dir = tempfile.mkdtemp()
+        upload = rsemgr.upload
+        rsemgr.upload = lambda rse_settings, lfns, source_dir: time.sleep(0.2)
+        try:
+            files = []
+            for i in xrange(4):
+                path = os.path.join(source_dir, 'file_%i' % i)
+                with open(path, 'wb') as stream:
+                    stream.write(os.urandom(1024))
+                files.append({'scope': 'mock', 'name': 'file_%i' % i, 'path': path})
+
+            client = MockRegistrationClient()
+            uploader = UploadClient(client, {'rse': 'MOCK', 'protocols': [{'scheme': 'mock'}]}, threads=1,
+                                    dataset_scope='mock', dataset_name='dataset', batch_size=3)
+            results = uploader.upload(files)
+            assert_equal(set(result['state'] for result in results.values()), set(['DONE']))
+
+            first, last = ['file_0', 'file_1', 'file_2'], ['file_3']
+            assert_equal([call for call in client.calls if call[0] == 'add_replicas'], [('add_replicas', first), ('add_replicas', last)])
+            assert_equal([call for call in client.calls if call[0] == 'update_replicas_states'], [('update_replicas_states', first), ('update_replicas_states', last)])
+            assert_equal([call for call in client.calls if call[0] == 'attach_dids_to_dids'], [('attach_dids_to_dids', first), ('attach_dids_to_dids', last)])
+        finally:
+            rsemgr.upload = upload
+            shutil.rmtree(source_dir)
@@ -0,0 +1,41 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+import hashlib
+import os
+import tempfile
+import zlib
+
+from nose.tools import assert_equal
+
+from rucio.common.utils import Checksum, adler32, checksum_file, md5
+
+
+class TestUtils():
+
+    def test_checksums(self):
+        """ UTILS: Buffered, mmap-ed and incremental checksums """
+
+        data = os.urandom(3 * 1024 * 1024 + 17) + '\n' * 1000
+        expected = {'adler32': '%08x' % (zlib.adler32(data) & 0xffffffff), 'md5': hashlib.md5(data).hexdigest()}
+
+        fd, path = tempfile.mkstemp()
+        os.write(fd, data)
+        os.close(fd)
+        try:
+            assert_equal(checksum_file(path, buffer_size=65536), expected)
+            assert_equal(checksum_file(path, buffer_size=65536, use_mmap=True), expected)
+            assert_equal(adler32(path), expected['adler32'])
+            assert_equal(md5(path), expected['md5'])
+        finally:
+            os.unlink(path)
+
+        checksum = Checksum()
+        for offset in xrange(0, len(data), 1000):
+            checksum.update(data[offset:offset + 1000])
+        assert_equal(checksum.hexdigests(), expected)
+        assert_equal(checksum.bytes, len(data))
@@ -15,6 +15,7 @@ import json
 import logging
 import requests
 import sys
+import threading
 import time
 import urlparse
 import uuid
@@ -23,8 +24,9 @@ import traceback
 from ConfigParser import NoOptionError
 from dogpile.cache import make_region
 from dogpile.cache.api import NoValue
+from requests.adapters import HTTPAdapter
 
-from rucio.common.config import config_get, config_get_bool
+from rucio.common.config import config_get, config_get_bool, config_get_int
 from rucio.core.monitor import record_counter, record_timer
 from rucio.db.sqla.constants import FTSState
 
@@ -41,9 +43,40 @@ try:
 except NoOptionError:
     __USE_DETERMINISTIC_ID = False
 
+try:
+    __POOL_SIZE = config_get_int('conveyor', 'fts_pool_size')
+except NoOptionError:
+    __POOL_SIZE = 10
+
 REGION_SHORT = make_region().configure('dogpile.cache.memory',
                                        expiration_time=1800)
 
+# one session per FTS server, shared by all threads of the process
+__SESSIONS = {}
+__SESSIONS_LOCK = threading.Lock()
+
+
+def get_session(transfer_host):
+    """
+    Get the session shared by all calls to an FTS server. It keeps up to
+    [conveyor] fts_pool_size connections to the server alive, so the TLS
+    handshake and certificate authentication are done once per connection
+    instead of once per call.
+
+    :param transfer_host: FTS server as a string.
+    :returns: requests.Session.
+    """
+    with __SESSIONS_LOCK:
+        if transfer_host not in __SESSIONS:
+            session = requests.Session()
+            session.mount(transfer_host, HTTPAdapter(pool_connections=1, pool_maxsize=__POOL_SIZE))
+            session.headers.update({'Content-Type': 'application/json'})
+            if transfer_host.startswith('https://'):
+                session.verify = False
+                session.cert = (__USERCERT, __USERCERT)
+            __SESSIONS[transfer_host] = session
+        return __SESSIONS[transfer_host]
+
 
 def get_transfer_baseid_voname(external_host):
     """
@@ -61,22 +94,10 @@ def get_transfer_baseid_voname(external_host):
             logging.debug("Refresh transfer baseid and voname for %s" % external_host)
 
             r = None
-            if external_host.startswith('https://'):
-                try:
-                    r = requests.get('%s/whoami' % external_host,
-                                     verify=False,
-                                     cert=(__USERCERT, __USERCERT),
-                                     headers={'Content-Type': 'application/json'},
-                                     timeout=5)
-                except:
-                    logging.warn('Could not get baseid and voname from %s - %s' % (external_host, str(traceback.format_exc())))
-            else:
-                try:
-                    r = requests.get('%s/whoami' % external_host,
-                                     headers={'Content-Type': 'application/json'},
-                                     timeout=5)
-                except:
-                    logging.warn('Could not get baseid and voname from %s - %s' % (external_host, str(traceback.format_exc())))
+            try:
+                r = get_session(external_host).get('%s/whoami' % external_host, timeout=5)
+            except:
+                logging.warn('Could not get baseid and voname from %s - %s' % (external_host, str(traceback.format_exc())))
 
             if r and r.status_code == 200:
                 baseid = str(r.json()['base_id'])
@@ -178,28 +199,12 @@ def submit_transfers(transfers, job_metadata):
         params_str = json.dumps(params_dict)
 
         transfer_host = transfer['external_host']
-        if transfer_host.startswith('https://'):
-            try:
-                ts = time.time()
-                r = requests.post('%s/jobs' % transfer_host,
-                                  verify=False,
-                                  cert=(__USERCERT, __USERCERT),
-                                  data=params_str,
-                                  headers={'Content-Type': 'application/json'},
-                                  timeout=5)
-                record_timer('transfertool.fts3.submit_transfer.%s' % __extract_host(transfer_host), (time.time() - ts) * 1000)
-            except:
-                logging.warn('Could not submit transfer to %s' % transfer_host)
-        else:
-            try:
-                ts = time.time()
-                r = requests.post('%s/jobs' % transfer_host,
-                                  data=params_str,
-                                  headers={'Content-Type': 'application/json'},
-                                  timeout=5)
-                record_timer('transfertool.fts3.submit_transfer.%s' % __extract_host(transfer_host), (time.time() - ts) * 1000)
-            except:
-                logging.warn('Could not submit transfer to %s' % transfer_host)
+        try:
+            ts = time.time()
+            r = get_session(transfer_host).post('%s/jobs' % transfer_host, data=params_str, timeout=5)
+            record_timer('transfertool.fts3.submit_transfer.%s' % __extract_host(transfer_host), (time.time() - ts) * 1000)
+        except:
+            logging.warn('Could not submit transfer to %s' % transfer_host)
 
         if r and r.status_code == 200:
             record_counter('transfertool.fts3.%s.submission.success' % __extract_host(transfer_host))
@@ -275,28 +280,12 @@ def submit_bulk_transfers(external_host, files, job_params, timeout=None):
     params_str = json.dumps(params_dict)
 
     r = None
-    if external_host.startswith('https://'):
-        try:
-            ts = time.time()
-            r = requests.post('%s/jobs' % external_host,
-                              verify=False,
-                              cert=(__USERCERT, __USERCERT),
-                              data=params_str,
-                              headers={'Content-Type': 'application/json'},
-                              timeout=timeout)
-            record_timer('transfertool.fts3.submit_transfer.%s' % __extract_host(external_host), (time.time() - ts) * 1000 / len(files))
-        except:
-            logging.warn('Could not submit transfer to %s - %s' % (external_host, str(traceback.format_exc())))
-    else:
-        try:
-            ts = time.time()
-            r = requests.post('%s/jobs' % external_host,
-                              data=params_str,
-                              headers={'Content-Type': 'application/json'},
-                              timeout=timeout)
-            record_timer('transfertool.fts3.submit_transfer.%s' % __extract_host(external_host), (time.time() - ts) * 1000 / len(files))
-        except:
-            logging.warn('Could not submit transfer to %s - %s' % (external_host, str(traceback.format_exc())))
+    try:
+        ts = time.time()
+        r = get_session(external_host).post('%s/jobs' % external_host, data=params_str, timeout=timeout)
+        record_timer('transfertool.fts3.submit_transfer.%s' % __extract_host(external_host), (time.time() - ts) * 1000 / len(files))
+    except:
+        logging.warn('Could not submit transfer to %s - %s' % (external_host, str(traceback.format_exc())))
 
     if r and r.status_code == 200:
         record_counter('transfertool.fts3.%s.submission.success' % __extract_host(external_host), len(files))
@@ -321,18 +310,7 @@ def query(transfer_id, transfer_host):
     :returns: Transfer status information as a dictionary.
     """
 
-    job = None
-
-    if transfer_host.startswith('https://'):
-        job = requests.get('%s/jobs/%s' % (transfer_host, transfer_id),
-                           verify=False,
-                           cert=(__USERCERT, __USERCERT),
-                           headers={'Content-Type': 'application/json'},
-                           timeout=5)
-    else:
-        job = requests.get('%s/jobs/%s' % (transfer_host, transfer_id),
-                           headers={'Content-Type': 'application/json'},
-                           timeout=5)
+    job = get_session(transfer_host).get('%s/jobs/%s' % (transfer_host, transfer_id), timeout=5)
     if job and job.status_code == 200:
         record_counter('transfertool.fts3.%s.query.success' % __extract_host(transfer_host))
         return job.json()
@@ -352,42 +330,20 @@ def query_latest(transfer_host, state, last_nhours=1):
 
     jobs = None
 
-    if transfer_host.startswith('https://'):
-        try:
-            whoami = requests.get('%s/whoami' % (transfer_host),
-                                  verify=False,
-                                  cert=(__USERCERT, __USERCERT),
-                                  headers={'Content-Type': 'application/json'})
-            if whoami and whoami.status_code == 200:
-                delegation_id = whoami.json()['delegation_id']
-            else:
-                raise Exception('Could not retrieve delegation id: %s', whoami.content)
-            state_string = ','.join(state)
-            jobs = requests.get('%s/jobs?dlg_id=%s&state_in=%s&time_window=%s' % (transfer_host,
-                                                                                  delegation_id,
-                                                                                  state_string,
-                                                                                  last_nhours),
-                                verify=False,
-                                cert=(__USERCERT, __USERCERT),
-                                headers={'Content-Type': 'application/json'})
-        except Exception:
-            logging.warn('Could not query latest terminal states from %s' % transfer_host)
-    else:
-        try:
-            whoami = requests.get('%s/whoami' % (transfer_host),
-                                  headers={'Content-Type': 'application/json'})
-            if whoami and whoami.status_code == 200:
-                delegation_id = whoami.json()['delegation_id']
-            else:
-                raise Exception('Could not retrieve delegation id: %s', whoami.content)
-            state_string = ','.join(state)
-            jobs = requests.get('%s/jobs?dlg_id=%s&state_in=%s&time_window=%s' % (transfer_host,
-                                                                                  delegation_id,
-                                                                                  state_string,
-                                                                                  last_nhours),
-                                headers={'Content-Type': 'application/json'})
-        except Exception:
-            logging.warn('Could not query latest terminal states from %s' % transfer_host)
+    try:
+        fts_session = get_session(transfer_host)
+        whoami = fts_session.get('%s/whoami' % (transfer_host))
+        if whoami and whoami.status_code == 200:
+            delegation_id = whoami.json()['delegation_id']
+        else:
+            raise Exception('Could not retrieve delegation id: %s', whoami.content)
+        state_string = ','.join(state)
+        jobs = fts_session.get('%s/jobs?dlg_id=%s&state_in=%s&time_window=%s' % (transfer_host,
+                                                                                 delegation_id,
+                                                                                 state_string,
+                                                                                 last_nhours))
+    except Exception:
+        logging.warn('Could not query latest terminal states from %s' % transfer_host)
 
     if jobs and (jobs.status_code == 200 or jobs.status_code == 207):
         record_counter('transfertool.fts3.%s.query_latest.success' % __extract_host(transfer_host))
@@ -409,18 +365,7 @@ def query_details(transfer_id, transfer_host):
     :returns: Detailed transfer status information as a dictionary.
     """
 
-    files = None
-
-    if transfer_host.startswith('https://'):
-        files = requests.get('%s/jobs/%s/files' % (transfer_host, transfer_id),
-                             verify=False,
-                             cert=(__USERCERT, __USERCERT),
-                             headers={'Content-Type': 'application/json'},
-                             timeout=5)
-    else:
-        files = requests.get('%s/jobs/%s/files' % (transfer_host, transfer_id),
-                             headers={'Content-Type': 'application/json'},
-                             timeout=5)
+    files = get_session(transfer_host).get('%s/jobs/%s/files' % (transfer_host, transfer_id), timeout=5)
     if files and (files.status_code == 200 or files.status_code == 207):
         record_counter('transfertool.fts3.%s.query_details.success' % __extract_host(transfer_host))
         return files.json()
@@ -584,12 +529,14 @@ def bulk_query_responses(jobs_response, transfer_host):
     return responses
 
 
-def bulk_query(transfer_ids, transfer_host, timeout=None):
+def bulk_query(transfer_ids, transfer_host, timeout=None, fts_session=None):
     """
     Query the status of a bulk of transfers in FTS3 via JSON.
 
     :param transfer_ids: FTS transfer identifiers as a list.
     :param transfer_host: FTS server as a string.
+    :param timeout: Timeout of the request in seconds.
+    :param fts_session: requests.Session to use instead of the shared one of the server.
     :returns: Transfer status information as a dictionary.
     """
 
@@ -599,7 +546,8 @@ def bulk_query(transfer_ids, transfer_host, timeout=None):
         transfer_ids = [transfer_ids]
 
     responses = {}
-    fts_session = requests.Session()
+    if fts_session is None:
+        fts_session = get_session(transfer_host)
     xfer_ids = ','.join(transfer_ids)
     if transfer_host.startswith('https://'):
         jobs = fts_session.get('%s/jobs/%s?files=file_state,dest_surl,finish_time,start_time,reason,source_surl,file_metadata' % (transfer_host, xfer_ids),
@@ -683,38 +631,19 @@ def new_bulk_query(transfer_ids, transfer_host):
     """
 
     responses = {}
-    if transfer_host.startswith('https://'):
-        fts_session = requests.Session()
-        jobs = fts_session.get('%s/jobs/%s' % (transfer_host, ','.join(transfer_ids)),
-                               verify=False,
-                               cert=(__USERCERT, __USERCERT),
-                               headers={'Content-Type': 'application/json'})
-        if jobs and (jobs.status_code == 200 or jobs.status_code == 207):
-            record_counter('transfertool.fts3.%s.new_bulk.success' % __extract_host(transfer_host))
-            jobs_response = jobs.json()
-            responses = get_jobs_response(transfer_host, fts_session, jobs_response)
-            for transfer_id in transfer_ids:
-                if transfer_id not in responses.keys():
-                    responses[transfer_id] = None
-        else:
-            record_counter('transfertool.fts3.%s.new_bulk.failure' % __extract_host(transfer_host))
-            for transfer_id in transfer_ids:
-                responses[transfer_id] = Exception('Could not retrieve transfer information: %s' % jobs)
+    fts_session = get_session(transfer_host)
+    jobs = fts_session.get('%s/jobs/%s' % (transfer_host, ','.join(transfer_ids)))
+    if jobs and (jobs.status_code == 200 or jobs.status_code == 207):
+        record_counter('transfertool.fts3.%s.new_bulk.success' % __extract_host(transfer_host))
+        jobs_response = jobs.json()
+        responses = get_jobs_response(transfer_host, fts_session, jobs_response)
+        for transfer_id in transfer_ids:
+            if transfer_id not in responses.keys():
+                responses[transfer_id] = None
     else:
-        fts_session = requests.Session()
-        jobs = fts_session.get('%s/jobs/%s' % (transfer_host, transfer_id),
-                               headers={'Content-Type': 'application/json'})
-        if jobs and (jobs.status_code == 200 or jobs.status_code == 207):
-            record_counter('transfertool.fts3.%s.new_bulk.success' % __extract_host(transfer_host))
-            jobs_response = jobs.json()
-            responses = get_jobs_response(transfer_host, fts_session, jobs_response)
-            for transfer_id in transfer_ids:
-                if transfer_id not in responses.keys():
-                    responses[transfer_id] = None
-        else:
-            record_counter('transfertool.fts3.%s.new_bulk.failure' % __extract_host(transfer_host))
-            for transfer_id in transfer_ids:
-                responses[transfer_id] = Exception('Could not retrieve transfer information: %s' % jobs)
+        record_counter('transfertool.fts3.%s.new_bulk.failure' % __extract_host(transfer_host))
+        for transfer_id in transfer_ids:
+            responses[transfer_id] = Exception('Could not retrieve transfer information: %s' % jobs)
 
     return responses
 
@@ -727,16 +656,7 @@ def cancel(transfer_id, transfer_host):
     :param transfer_host: FTS server as a string.
     """
 
-    job = None
-
-    if transfer_host.startswith('https://'):
-        job = requests.delete('%s/jobs/%s' % (transfer_host, transfer_id),
-                              verify=False,
-                              cert=(__USERCERT, __USERCERT),
-                              headers={'Content-Type': 'application/json'})
-    else:
-        job = requests.delete('%s/jobs/%s' % (transfer_host, transfer_id),
-                              headers={'Content-Type': 'application/json'})
+    job = get_session(transfer_host).delete('%s/jobs/%s' % (transfer_host, transfer_id))
     if job and job.status_code == 200:
         record_counter('transfertool.fts3.%s.cancel.success' % __extract_host(transfer_host))
         return job.json()
@@ -754,22 +674,10 @@ def update_priority(transfer_id, transfer_host, priority):
     :param priority: FTS job priority as an integer from 1 to 5.
     """
 
-    job = None
     params_dict = {"params": {"priority": priority}}
     params_str = json.dumps(params_dict)
 
-    if transfer_host.startswith('https://'):
-        job = requests.post('%s/jobs/%s' % (transfer_host, transfer_id),
-                            verify=False,
-                            data=params_str,
-                            cert=(__USERCERT, __USERCERT),
-                            headers={'Content-Type': 'application/json'},
-                            timeout=3)
-    else:
-        job = requests.post('%s/jobs/%s' % (transfer_host, transfer_id),
-                            data=params_str,
-                            headers={'Content-Type': 'application/json'},
-                            timeout=3)
+    job = get_session(transfer_host).post('%s/jobs/%s' % (transfer_host, transfer_id), data=params_str, timeout=3)
     if job and job.status_code == 200:
         record_counter('transfertool.fts3.%s.update_priority.success' % __extract_host(transfer_host))
         return job.json()
@@ -787,16 +695,7 @@ def whoami(transfer_host):
     :returns: Credentials as stored by the FTS3 server as a dictionary.
     """
 
-    r = None
-
-    if transfer_host.startswith('https://'):
-        r = requests.get('%s/whoami' % transfer_host,
-                         verify=False,
-                         cert=(__USERCERT, __USERCERT),
-                         headers={'Content-Type': 'application/json'})
-    else:
-        r = requests.get('%s/whoami' % transfer_host,
-                         headers={'Content-Type': 'application/json'})
+    r = get_session(transfer_host).get('%s/whoami' % transfer_host)
 
     if r and r.status_code == 200:
         record_counter('transfertool.fts3.%s.whoami.success' % __extract_host(transfer_host))
@@ -815,16 +714,7 @@ def version(transfer_host):
     :returns: FTS3 server information as a dictionary.
     """
 
-    r = None
-
-    if transfer_host.startswith('https://'):
-        r = requests.get('%s/' % transfer_host,
-                         verify=False,
-                         cert=(__USERCERT, __USERCERT),
-                         headers={'Content-Type': 'application/json'})
-    else:
-        r = requests.get('%s/' % transfer_host,
-                         headers={'Content-Type': 'application/json'})
+    r = get_session(transfer_host).get('%s/' % transfer_host)
 
     if r and r.status_code == 200:
         record_counter('transfertool.fts3.%s.version.success' % __extract_host(transfer_host))
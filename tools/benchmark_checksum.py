@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#                       http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Compares the throughput of the file checksum implementations on a large file.
+
+A file of the given size is written (unless --file is given) and checksummed
+with the former line based adler32, and with rucio.common.utils.checksum_file
+using buffered reads and mmap, for adler32 alone and adler32 plus md5.
+Run it twice or drop the page cache in between to compare cold reads.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import zlib
+
+from rucio.common.utils import checksum_file
+
+
+def line_adler32(path):
+    """ The former implementation, iterating the file by lines. """
+    adler = 1L
+    with open(path, 'rb') as stream:
+        for line in stream:
+            adler = zlib.adler32(line, adler)
+    return '%08x' % (adler & 0xffffffff)
+
+
+def write_file(path, size):
+    """ Writes size bytes of random data, with the usual amount of newlines of binary files. """
+    block = os.urandom(16 * 1024 * 1024)
+    with open(path, 'wb') as stream:
+        written = 0
+        while written < size:
+            stream.write(block[:size - written])
+            written += len(block)
+
+
+def measure(label, function, size):
+    started_at = time.time()
+    result = function()
+    seconds = time.time() - started_at
+    print '%-32s %8.1f MB/s  %s' % (label, size / seconds / 1024 / 1024, result)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', action='store', default=4096, type=int, help='Size of the generated file in MB')
+    parser.add_argument('--file', action='store', help='Use this file instead of a generated one')
+    parser.add_argument('--buffer-size', action='store', default=4096, type=int, help='Read size in KB')
+    args = parser.parse_args()
+
+    path = args.file
+    if not path:
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        write_file(path, args.size * 1024 * 1024)
+    size = os.path.getsize(path)
+    buffer_size = args.buffer_size * 1024
+
+    try:
+        measure('adler32, lines', lambda: line_adler32(path), size)
+        measure('adler32, buffered', lambda: checksum_file(path, ('adler32',), buffer_size), size)
+        measure('adler32, mmap', lambda: checksum_file(path, ('adler32',), buffer_size, use_mmap=True), size)
+        measure('adler32 + md5, buffered', lambda: checksum_file(path, ('adler32', 'md5'), buffer_size), size)
+        measure('adler32 + md5, mmap', lambda: checksum_file(path, ('adler32', 'md5'), buffer_size, use_mmap=True), size)
+    finally:
+        if not args.file:
+            os.unlink(path)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#                       http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Measures the client side latency against the configured server.
+
+1. Creating a Client and calling whoami, with the process-wide connection
+   pool and shared token, and with a private session per client as before.
+2. Registering replicas one by one, and coalesced with the BatchClient.
+"""
+
+import argparse
+import time
+
+from requests import session
+
+from rucio.client import Client
+from rucio.client.batchclient import BatchClient
+from rucio.common.utils import generate_uuid
+
+
+def measure(label, function, count):
+    started_at = time.time()
+    function()
+    seconds = time.time() - started_at
+    print '%-40s %8.2f ms/op' % (label, seconds * 1000 / count)
+
+
+def clients(count, private):
+    for _ in xrange(count):
+        client = Client()
+        if private:
+            client.session = session()
+        client.whoami()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', action='store', default=50, type=int, help='Number of clients to create')
+    parser.add_argument('--replicas', action='store', default=500, type=int, help='Number of replicas to register')
+    parser.add_argument('--rse', action='store', default='MOCK', help='RSE to register the replicas on')
+    parser.add_argument('--scope', action='store', default='mock', help='Scope of the registered files')
+    args = parser.parse_args()
+
+    measure('client + whoami, private session', lambda: clients(args.clients, True), args.clients)
+    measure('client + whoami, pooled session', lambda: clients(args.clients, False), args.clients)
+
+    client = Client()
+    files = [{'scope': args.scope, 'name': 'benchmark_%s' % generate_uuid(), 'bytes': 1, 'adler32': '0cc737eb'} for _ in xrange(args.replicas)]
+
+    def single():
+        for file in files[:args.replicas / 2]:
+            client.add_replicas(rse=args.rse, files=[file])
+
+    def batched():
+        with BatchClient(client) as batch:
+            for file in files[args.replicas / 2:]:
+                batch.add_replica(args.rse, file['scope'], file['name'], file['bytes'], file['adler32'])
+
+    measure('add_replicas, one by one', single, args.replicas / 2)
+    measure('add_replicas, batched', batched, args.replicas - args.replicas / 2)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#                       http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Measures the FTS3 submission and polling throughput against the in-memory
+FTS3 stand-in of rucio.tests.mock.fts3, or against --fts if given.
+
+1. Submitting jobs with submit_bulk_transfers, on the shared session of the
+   server, and with a new session, and so a new connection, per job as before.
+2. Polling the submitted jobs with bulk_query, in the same two ways.
+"""
+
+import argparse
+import time
+
+from requests import Session
+
+from rucio.common.utils import generate_uuid
+from rucio.tests.mock.fts3 import start_server
+from rucio.transfertool import fts3
+
+
+def measure(label, function, count):
+    started_at = time.time()
+    function()
+    seconds = time.time() - started_at
+    print '%-40s %8.2f ms/op' % (label, seconds * 1000 / count)
+
+
+def files(count):
+    return [{'sources': ['mock://mock.cern.ch/benchmark/%s' % generate_uuid()],
+             'destinations': ['mock://mock.cern.ch/benchmark/%s' % generate_uuid()],
+             'metadata': {'request_id': generate_uuid(), 'scope': 'mock', 'name': 'benchmark'},
+             'filesize': 1,
+             'checksum': 'ADLER32:0cc737eb'} for _ in xrange(count)]
+
+
+def submit(host, jobs, job_size, transfer_ids, private):
+    for _ in xrange(jobs):
+        if private:
+            fts3.get_session(host).close()
+        transfer_ids.append(fts3.submit_bulk_transfers(host, files(job_size), {'job_metadata': {'issuer': 'rucio'}}))
+
+
+def poll(host, transfer_ids, query_size, private):
+    for i in xrange(0, len(transfer_ids), query_size):
+        fts3.bulk_query(transfer_ids[i:i + query_size], host, fts_session=Session() if private else None)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fts', action='store', help='FTS3 server to use instead of the stand-in')
+    parser.add_argument('--jobs', action='store', default=500, type=int, help='Number of jobs to submit')
+    parser.add_argument('--job-size', action='store', default=10, type=int, help='Number of files per job')
+    parser.add_argument('--query-size', action='store', default=50, type=int, help='Number of jobs per bulk query')
+    args = parser.parse_args()
+
+    server = None
+    host = args.fts
+    if not host:
+        server = start_server()
+        host = server.url
+
+    try:
+        private_ids, pooled_ids = [], []
+        measure('submit, new connection per job', lambda: submit(host, args.jobs, args.job_size, private_ids, True), args.jobs)
+        measure('submit, pooled session', lambda: submit(host, args.jobs, args.job_size, pooled_ids, False), args.jobs)
+        measure('bulk_query, new session per query', lambda: poll(host, private_ids, args.query_size, True), args.jobs)
+        measure('bulk_query, pooled session', lambda: poll(host, pooled_ids, args.query_size, False), args.jobs)
+    finally:
+        if server:
+            server.shutdown()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#                       http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Measures the delivery throughput of hermes, for the stomp and the email path,
+with and without pipelining.
+
+Messages are injected in the database of the configured server and delivered
+to a null broker connection; emails are only built, not sent. The numbers
+therefore reflect the retrieve/serialize/archive/delete cost in the database.
+"""
+
+import argparse
+import threading
+import time
+
+from rucio.core.message import add_message, retrieve_messages, truncate_messages
+from rucio.daemons.hermes import hermes
+
+
+class NullConnection(object):
+    """ Stomp connection discarding all messages. """
+
+    def __init__(self, *args, **kwargs):
+        self.sent = 0
+
+    def is_connected(self):
+        return True
+
+    def start(self):
+        pass
+
+    def connect(self, *args, **kwargs):
+        pass
+
+    def send(self, body, destination, headers=None):
+        self.sent += 1
+
+    def disconnect(self):
+        pass
+
+
+def inject(total, event_type):
+    """ Inserts total messages of the given event type. """
+    for i in xrange(total):
+        if event_type == 'email':
+            add_message('email', {'to': ['nobody@localhost'],
+                                  'subject': 'benchmark %i' % i,
+                                  'body': 'x' * 512})
+        else:
+            add_message(event_type, {'scope': 'benchmark', 'name': 'file_%i' % i, 'rse': 'MOCK', 'number': i})
+
+
+def measure(path, total, bulk, pipeline):
+    """ Delivers total messages through the given path and returns the rate in messages per second. """
+    truncate_messages()
+    inject(total, 'email' if path == 'email' else 'benchmark')
+    event_type = 'email' if path == 'email' else None
+
+    hermes.graceful_stop.clear()
+    if path == 'email':
+        worker = threading.Thread(target=hermes.deliver_emails, kwargs={'send_email': False, 'bulk': bulk, 'delay': 1, 'pipeline': pipeline})
+    else:
+        worker = threading.Thread(target=hermes.deliver_messages, kwargs={'brokers_resolved': ['localhost'], 'bulk': bulk, 'delay': 1, 'pipeline': pipeline})
+
+    t_start = time.time()
+    worker.start()
+    while retrieve_messages(bulk=1, event_type=event_type):
+        time.sleep(0.1)
+    elapsed = time.time() - t_start
+    hermes.graceful_stop.set()
+    worker.join()
+    return total / elapsed
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', action='store', default=20000, type=int, help='Number of messages per run')
+    parser.add_argument('--bulk', action='store', default=1000, type=int, help='Number of messages per cycle')
+    parser.add_argument('--path', action='store', default='all', choices=['all', 'stomp', 'email'], help='Delivery path to measure')
+    args = parser.parse_args()
+
+    hermes.stomp.Connection = NullConnection
+
+    paths = ['stomp', 'email'] if args.path == 'all' else [args.path]
+    for path in paths:
+        for pipeline in (False, True):
+            rate = measure(path, args.messages, args.bulk, pipeline)
+            print '%-6s pipeline=%-5s %8.1f messages/s' % (path, pipeline, rate)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#                       http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Replays a recorded updated_dids backlog through the judge-evaluator and
+measures the number of evaluated updated_dids rows per second.
+
+1. Record the backlog of an instance: --record backlog.json
+2. Replay it against a database holding the same DIDs and rules, once with
+   the former behaviour (--bulk 100 --group-size 1) and once with the
+   defaults: --replay backlog.json
+"""
+
+import argparse
+import json
+import time
+
+from rucio.core.rule import get_updated_dids
+from rucio.daemons.judge.evaluator import re_evaluator
+from rucio.db.sqla import models
+from rucio.db.sqla.constants import DIDReEvaluation
+from rucio.db.sqla.session import get_session
+
+
+def record(path):
+    with open(path, 'w') as backlog:
+        for did in get_updated_dids(total_workers=0, worker_number=0, limit=None):
+            backlog.write(json.dumps({'scope': did.scope, 'name': did.name, 'rule_evaluation_action': did.rule_evaluation_action.name}) + '\n')
+
+
+def replay(path, bulk, group_size):
+    with open(path) as backlog:
+        rows = [json.loads(line) for line in backlog]
+    for row in rows:
+        row['rule_evaluation_action'] = DIDReEvaluation.from_sym(row['rule_evaluation_action'])
+
+    session = get_session()
+    session.bulk_insert_mappings(models.UpdatedDID, rows)
+    session.commit()
+
+    started_at = time.time()
+    while get_updated_dids(total_workers=0, worker_number=0, limit=1):
+        re_evaluator(once=True, bulk=bulk, group_size=group_size)
+    seconds = time.time() - started_at
+    print '%d updated dids in %.2f s, %.1f updated dids/s (bulk %d, group size %d)' % (len(rows), seconds, len(rows) / seconds, bulk, group_size)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--record', action='store', help='Write the current updated_dids to this file')
+    parser.add_argument('--replay', action='store', help='Insert the updated_dids of this file and evaluate them')
+    parser.add_argument('--bulk', action='store', default=1000, type=int, help='Number of updated dids fetched per cycle')
+    parser.add_argument('--group-size', action='store', default=10, type=int, help='Number of dids re-evaluated per transaction')
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record)
+    if args.replay:
+        replay(args.replay, args.bulk, args.group_size)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#                       http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Measures the time and the peak memory of the injection of a rule on a
+synthetic container of --datasets datasets of --files files each.
+
+With DATASET or NONE grouping the container is resolved one dataset at a
+time, with ALL grouping it is resolved at once. Run it in a new process per
+grouping, since the peak memory of a process never decreases.
+"""
+
+import argparse
+import resource
+import time
+
+from rucio.common.utils import generate_uuid
+from rucio.core.did import add_did, attach_dids
+from rucio.core.replica import add_replicas
+from rucio.core.rule import add_rule, inject_rule
+from rucio.db.sqla.constants import DIDType
+
+
+def create_container(scope, rse, account, datasets, files):
+    container = 'benchmark_container_%s' % generate_uuid()
+    add_did(scope, container, DIDType.CONTAINER, account)
+    for _ in xrange(datasets):
+        dataset = 'benchmark_dataset_%s' % generate_uuid()
+        add_did(scope, dataset, DIDType.DATASET, account)
+        dataset_files = [{'scope': scope, 'name': 'benchmark_file_%s' % generate_uuid(), 'bytes': 1, 'adler32': '0cc737eb'} for _ in xrange(files)]
+        add_replicas(rse=rse, files=dataset_files, account=account)
+        attach_dids(scope, dataset, dataset_files, account)
+        attach_dids(scope, container, [{'scope': scope, 'name': dataset}], account)
+    return container
+
+
+def peak_memory():
+    """ Peak resident memory of the process in MB. """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--datasets', action='store', default=100, type=int, help='Number of datasets of the container')
+    parser.add_argument('--files', action='store', default=1000, type=int, help='Number of files per dataset')
+    parser.add_argument('--grouping', action='store', default='DATASET', choices=['ALL', 'DATASET', 'NONE'], help='Grouping of the rule')
+    parser.add_argument('--rse', action='store', default='MOCK', help='RSE holding the files')
+    parser.add_argument('--rse-expression', action='store', default='MOCK3', help='RSE expression of the rule')
+    parser.add_argument('--scope', action='store', default='mock', help='Scope of the created dids')
+    parser.add_argument('--account', action='store', default='root', help='Account of the created dids and rule')
+    args = parser.parse_args()
+
+    container = create_container(args.scope, args.rse, args.account, args.datasets, args.files)
+    rule_id = add_rule(dids=[{'scope': args.scope, 'name': container}], account=args.account, copies=1, rse_expression=args.rse_expression,
+                       grouping=args.grouping, weight=None, lifetime=None, locked=False, subscription_id=None, asynchronous=True)[0]
+
+    memory_before = peak_memory()
+    started_at = time.time()
+    inject_rule(rule_id=rule_id)
+    seconds = time.time() - started_at
+    print '%d files, %s grouping: %.1f s, %.1f files/s, peak memory %.1f MB (%.1f MB before the injection)' % (args.datasets * args.files, args.grouping, seconds,
+                                                                                                            args.datasets * args.files / seconds, peak_memory(), memory_before)